@@ -147,8 +147,17 @@ class DataverseStorageImp(storage.StorageAddonHttpRequestorImp):
             return parse_dataset(await response.json_content())
 
     async def _fetch_dataset_files(self, dataset_id) -> list[ItemResult]:
+        # dataset responses include all the dataset's metadata -- parse only the files
         async with self.network.GET(f"api/datasets/{dataset_id}") as response:
-            return parse_dataset_files(await response.json_content())
+            try:
+                return [
+                    parse_dataset_file(file)
+                    async for file in response.iter_json_items(
+                        "data", "latestVersion", "files"
+                    )
+                ]
+            except ValueError as e:
+                raise ValueError(f"Invalid dataset response:{e=}")
 
     async def _fetch_file(self, dataverse_id) -> ItemResult:
         async with self.network.GET(f"api/files/{dataverse_id}") as response:
@@ -233,17 +242,12 @@ def parse_dataset(data: dict) -> ItemResult:
         raise ValueError(f"Invalid dataset response: {e=}")
 
 
-def parse_dataset_files(data: dict) -> list[ItemResult]:
-    if data.get("data"):
-        data = data["data"]
+def parse_dataset_file(file: dict) -> ItemResult:
     try:
-        return [
-            ItemResult(
-                item_id=f"file/{file['dataFile']['id']}",
-                item_name=file["label"],
-                item_type=ItemType.FILE,
-            )
-            for file in data["latestVersion"]["files"]
-        ]
-    except (KeyError, IndexError) as e:
-        raise ValueError(f"Invalid dataset response:{e=}")
+        return ItemResult(
+            item_id=f"file/{file['dataFile']['id']}",
+            item_name=file["label"],
+            item_type=ItemType.FILE,
+        )
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid dataset file:{e=}")
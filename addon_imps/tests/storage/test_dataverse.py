@@ -225,3 +225,25 @@ class TestDataverseStorageImp(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(result.items, expected_result.items)
         self.assertEqual(result.total_count, expected_result.total_count)
         self.imp._fetch_dataset_files.assert_awaited_once_with("456")
+
+    async def test_fetch_dataset_files(self):
+        async def _files(*path):
+            self.assertEqual(path, ("data", "latestVersion", "files"))
+            yield {"dataFile": {"id": "789"}, "label": "File 1"}
+            yield {"dataFile": {"id": "1011"}, "label": "File 2"}
+
+        mock = self.network.GET.return_value.__aenter__.return_value
+        mock.iter_json_items = _files
+        result = await self.imp._fetch_dataset_files("456")
+        self.assertEqual(
+            result,
+            [
+                ItemResult(
+                    item_id="file/789", item_name="File 1", item_type=ItemType.FILE
+                ),
+                ItemResult(
+                    item_id="file/1011", item_name="File 2", item_type=ItemType.FILE
+                ),
+            ],
+        )
+        self.network.GET.assert_called_once_with("api/datasets/456")
@@ -4,7 +4,7 @@ from typing import TYPE_CHECKING
 
 from asgiref.sync import async_to_sync
 
-from addon_service.common.aiohttp_session import get_singleton_client_session
+from addon_service.common.aiohttp_session import get_pooled_client_session
 from addon_service.common.network import GravyvaletHttpRequestor
 from addon_toolkit import AddonImp
 from addon_toolkit.interfaces.citation import (
@@ -77,7 +77,7 @@ async def get_storage_addon_instance(
         imp = imp_cls(
             config=config,
             network=GravyvaletHttpRequestor(
-                client_session=await get_singleton_client_session(),
+                client_session=await get_pooled_client_session(config.external_api_url),
                 prefix_url=config.external_api_url,
                 account=account,
             ),
@@ -106,7 +106,7 @@ async def get_citation_addon_instance(
     return imp_cls(
         config=config,
         network=GravyvaletHttpRequestor(
-            client_session=await get_singleton_client_session(),
+            client_session=await get_pooled_client_session(config.external_api_url),
             prefix_url=config.external_api_url,
             account=account,
         ),
@@ -131,7 +131,7 @@ async def get_computing_addon_instance(
         imp = imp_cls(
             config=config,
             network=GravyvaletHttpRequestor(
-                client_session=await get_singleton_client_session(),
+                client_session=await get_pooled_client_session(config.external_api_url),
                 prefix_url=config.external_api_url,
                 account=account,
             ),
@@ -155,7 +155,7 @@ async def get_link_addon_instance(
     if issubclass(imp_cls, LinkAddonHttpRequestorImp):
         imp = imp_cls(
             network=GravyvaletHttpRequestor(
-                client_session=await get_singleton_client_session(),
+                client_session=await get_pooled_client_session(config.external_api_url),
                 prefix_url=config.external_api_url,
                 account=account,
             ),
@@ -1,6 +1,7 @@
 import traceback
 
 import jsonschema
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
 
@@ -10,7 +11,10 @@ from addon_service.common.invocation_status import InvocationStatus
 from addon_service.common.validators import validate_invocation_status
 from addon_service.configured_addon.utils import get_config_for_addon
 from addon_service.models import AddonOperationModel
-from addon_toolkit import AddonImp
+from addon_toolkit import (
+    AddonImp,
+    AddonOperationType,
+)
 from addon_toolkit.interfaces.citation import CitationConfig
 from addon_toolkit.interfaces.computing import ComputingConfig
 from addon_toolkit.interfaces.storage import StorageConfig
@@ -22,6 +26,9 @@ class AddonOperationInvocation(AddonsServiceBaseModel):
         default=InvocationStatus.STARTING.value,
     )
     operation_identifier = models.TextField()  # TODO: validator
+    # (the operation's type, kept for partitioning; empty for invocations from
+    # before partitioning by type)
+    operation_type = models.TextField(editable=False)
     operation_kwargs = models.JSONField(default=dict, blank=True)
     thru_addon = models.ForeignKey(
         "ConfiguredAddon", null=True, blank=True, on_delete=models.CASCADE
@@ -33,6 +40,16 @@ class AddonOperationInvocation(AddonsServiceBaseModel):
     exception_message = models.TextField(blank=True, default="")
     exception_context = models.TextField(blank=True, default="")
 
+    # how the result was found in `result_cache` ("hit", "stale" or "miss"), if
+    # just now performed with caching (not saved)
+    result_cache_status: str | None = None
+
+    # the table is partitioned by `operation_type`, then `created` (see migration
+    # 0019), with primary key (id, operation_type, created) -- so `id` is unique
+    # only as a random uuid, and a lookup by id alone probes each partition's
+    # index; lookups for a known invocation's row include `operation_type` and
+    # `created` (see `partition_lookup`), to search only its partition
+
     class Meta:
         indexes = [
             models.Index(fields=["operation_identifier"]),
@@ -42,6 +59,13 @@ class AddonOperationInvocation(AddonsServiceBaseModel):
     class JSONAPIMeta:
         resource_name = "addon-operation-invocations"
 
+    @property
+    def partition_lookup(self) -> dict:
+        """lookups (beyond pk) to find this invocation's row in only its partition"""
+        if self.created is None:
+            return {}
+        return {"operation_type": self.operation_type, "created": self.created}
+
     @property
     def invocation_status(self):
         return InvocationStatus(self.int_invocation_status)
@@ -70,6 +94,23 @@ class AddonOperationInvocation(AddonsServiceBaseModel):
     def imp_cls(self) -> type[AddonImp]:
         return self.thru_account.imp_cls
 
+    @property
+    def time_budget_seconds(self) -> float | None:
+        """longest to spend performing this invocation (None for no limit)
+
+        only immediate operations are limited -- the external service's budget,
+        if configured, else the operation's declared budget, else the default
+        """
+        _declaration = self.operation.declaration
+        if _declaration.operation_type is not AddonOperationType.IMMEDIATE:
+            return None
+        return (
+            self.thru_account.external_service.immediate_time_budget_seconds
+            or _declaration.time_budget_seconds
+            or settings.GRAVYVALET_IMMEDIATE_TIME_BUDGET_SECONDS
+            or None
+        )
+
     @property
     def config(self) -> StorageConfig | CitationConfig | ComputingConfig:
         if self.thru_addon:
@@ -92,6 +133,17 @@ class AddonOperationInvocation(AddonsServiceBaseModel):
                 {"thru_addon": "thru_addon and thru_account must agree"}
             )
 
+    def save(self, *args, **kwargs):
+        if self._state.adding:
+            self.operation_type = self.operation.operation_type.value
+        super().save(*args, **kwargs)
+
+    def _do_update(self, base_qs, *args, **kwargs):
+        # (updating by pk, as `save` does, in only this invocation's partition)
+        return super()._do_update(
+            base_qs.filter(**self.partition_lookup), *args, **kwargs
+        )
+
     def set_exception(self, exception: BaseException) -> None:
         self.invocation_status = InvocationStatus.ERROR
         self.exception_type = type(exception).__qualname__
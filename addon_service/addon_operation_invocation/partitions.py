@@ -0,0 +1,300 @@
+"""upkeep of the (partitioned) addon operation invocation table
+
+invocations pile up with every click in a file picker; the table is partitioned
+by `operation_type`, then each type's partition by `created`, one partition per
+day (see migration 0019) -- so each type's old invocations may be dropped a
+whole day at a time, without a long delete (nor the index bloat and vacuuming
+after)
+
+`maintain_invocation_partitions` (daily, by celery beat), for each operation type:
+- makes partitions for the next `GRAVYVALET_INVOCATION_PARTITION_DAYS_AHEAD` days
+- drops (or, with `GRAVYVALET_INVOCATION_RETENTION_ARCHIVE`, detaches, leaving a
+  table to archive and drop) each day partition older than that type's retention
+  in `GRAVYVALET_INVOCATION_RETENTION_DAYS` (0 to keep forever)
+- deletes invocations past that type's retention from its default partition
+  (which takes rows no day partition does) and from the legacy partition (with
+  invocations of every type from before partitioning), dropping the legacy
+  partition once it's empty
+
+a day's rows already in its type's default partition (e.g. with partitions not
+made in time) are moved into that day's partition when it's made
+
+>>> _upper_bound("FOR VALUES FROM ('2024-01-01 00:00:00+00') TO ('2024-01-02 00:00:00+00')")
+datetime.datetime(2024, 1, 2, 0, 0, tzinfo=datetime.timezone.utc)
+>>> _upper_bound("FOR VALUES FROM (MINVALUE) TO ('2024-01-02 00:00:00+00')")
+datetime.datetime(2024, 1, 2, 0, 0, tzinfo=datetime.timezone.utc)
+>>> _upper_bound("DEFAULT") is None
+True
+"""
+
+import dataclasses
+import datetime
+import logging
+import re
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    connection,
+    transaction,
+)
+from django.utils import timezone
+
+from addon_service.addon_operation.models import AddonOperationModel
+from addon_toolkit import AddonOperationType
+
+from .models import AddonOperationInvocation
+
+
+__all__ = (
+    "InvocationPartition",
+    "PartitionMaintenance",
+    "iter_invocation_partitions",
+    "maintain_invocation_partitions",
+)
+
+_logger = logging.getLogger(__name__)
+
+_TABLE = AddonOperationInvocation._meta.db_table
+_LEGACY_PARTITION = f"{_TABLE}_legacy"  # (see migration 0019)
+
+_UPPER_BOUND = re.compile(r"\bTO \('(?P<upper_bound>[^']+)'\)")
+
+
+@dataclasses.dataclass(frozen=True)
+class InvocationPartition:
+    name: str
+    operation_type: str | None  # (None for the legacy partition, of every type)
+    upper_bound: datetime.datetime | None  # (exclusive; None for default partitions)
+
+
+@dataclasses.dataclass
+class PartitionMaintenance:
+    """what `maintain_invocation_partitions` did"""
+
+    created: list[str] = dataclasses.field(default_factory=list)
+    expired: list[str] = dataclasses.field(default_factory=list)
+    deleted_count: int = 0
+
+
+def iter_invocation_partitions():
+    """yield each partition of the invocation table that holds rows (that is, each
+    type's day and default partitions, and the legacy partition)
+    """
+    _types_by_table = {
+        _type_table(_operation_type): _operation_type
+        for _operation_type in _operation_types()
+    }
+    with connection.cursor() as _cursor:
+        _cursor.execute(
+            "SELECT _partition.relname, pg_get_expr(_partition.relpartbound, _partition.oid),"
+            " _parent.relname"
+            " FROM pg_partition_tree(%s::regclass) _tree"
+            " JOIN pg_class _partition ON _partition.oid = _tree.relid"
+            " JOIN pg_class _parent ON _parent.oid = _tree.parentrelid"
+            " WHERE _tree.isleaf",
+            [_TABLE],
+        )
+        for _name, _bound, _parent_name in _cursor.fetchall():
+            yield InvocationPartition(
+                _name, _types_by_table.get(_parent_name), _upper_bound(_bound)
+            )
+
+
+def maintain_invocation_partitions(
+    now: datetime.datetime | None = None,
+) -> PartitionMaintenance:
+    """make upcoming partitions, expire old ones, and delete expired invocations
+    (see module docstring)
+    """
+    _now = now or timezone.now()
+    _maintenance = PartitionMaintenance()
+    _today = _now.astimezone(datetime.UTC).date()
+    for _operation_type in _operation_types():
+        if _create_type_partition(_operation_type):  # (a new operation type)
+            _maintenance.created.append(_type_table(_operation_type))
+        for _days in range(1, settings.GRAVYVALET_INVOCATION_PARTITION_DAYS_AHEAD + 1):
+            _created = _create_partition(
+                _operation_type, _today + datetime.timedelta(days=_days)
+            )
+            if _created is not None:
+                _maintenance.created.append(_created)
+    _retention_days = settings.GRAVYVALET_INVOCATION_RETENTION_DAYS
+    for _partition in list(iter_invocation_partitions()):
+        _days = _retention_days.get(_partition.operation_type)
+        if (
+            _days  # (0 keeps forever)
+            and _partition.upper_bound is not None
+            and _partition.upper_bound <= _now - datetime.timedelta(days=_days)
+        ):
+            _expire_partition(_partition.name)
+            _maintenance.expired.append(_partition.name)
+    _has_legacy = _table_exists(_LEGACY_PARTITION) and _is_partition(_LEGACY_PARTITION)
+    for _operation_type, _days in _retention_days.items():
+        if _days:
+            _maintenance.deleted_count += _delete_invocations(
+                _operation_type,
+                created_before=_now - datetime.timedelta(days=_days),
+                from_legacy=_has_legacy,
+            )
+    if (
+        _has_legacy
+        and any(_retention_days.values())
+        and not _has_rows(_LEGACY_PARTITION)
+    ):
+        _expire_partition(_LEGACY_PARTITION)
+        _maintenance.expired.append(_LEGACY_PARTITION)
+    return _maintenance
+
+
+###
+# module-private helpers
+
+
+def _operation_types() -> list[str]:
+    return [_operation_type.value for _operation_type in AddonOperationType]
+
+
+def _type_table(operation_type: str) -> str:
+    return f"{_TABLE}_{operation_type}"
+
+
+def _upper_bound(partition_bound: str) -> datetime.datetime | None:
+    _match = _UPPER_BOUND.search(partition_bound)
+    if _match is None:  # (a default partition)
+        return None
+    return datetime.datetime.fromisoformat(_match["upper_bound"])
+
+
+def _day_start(day: datetime.date) -> datetime.datetime:
+    return datetime.datetime.combine(day, datetime.time(), datetime.UTC)
+
+
+def _create_type_partition(operation_type: str) -> bool:
+    """create the given type's partition (and its default partition), if need be"""
+    _type_partition = _type_table(operation_type)
+    _q = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as _cursor:
+        if _table_exists(_type_partition):
+            return False
+        _cursor.execute(
+            f"CREATE TABLE {_q(_type_partition)} PARTITION OF {_q(_TABLE)}"
+            " FOR VALUES IN (%s) PARTITION BY RANGE (created)",
+            [operation_type],
+        )
+        _cursor.execute(
+            f"CREATE TABLE {_q(f'{_type_partition}_default')}"
+            f" PARTITION OF {_q(_type_partition)} DEFAULT"
+        )
+    return True
+
+
+def _create_partition(operation_type: str, day: datetime.date) -> str | None:
+    """create the given type's partition for the given day, if need be (returns its
+    name, if created)
+
+    any of the day's rows already in the type's default partition (which postgres
+    won't let overlap the new one) are moved into it
+    """
+    _type_partition = _type_table(operation_type)
+    _name = f"{_type_partition}_p{day:%Y%m%d}"
+    _from = _day_start(day)
+    _to = _day_start(day + datetime.timedelta(days=1))
+    _q = connection.ops.quote_name
+    try:
+        with transaction.atomic(), connection.cursor() as _cursor:
+            if _table_exists(_name):
+                return None
+            _cursor.execute(
+                f"CREATE TABLE {_q(_name)} (LIKE {_q(_TABLE)} INCLUDING DEFAULTS)"
+            )
+            _cursor.execute(
+                f"WITH _moved AS (DELETE FROM {_q(f'{_type_partition}_default')}"
+                " WHERE created >= %s AND created < %s RETURNING *)"
+                f" INSERT INTO {_q(_name)} SELECT * FROM _moved",
+                [_from, _to],
+            )
+            _cursor.execute(
+                f"ALTER TABLE {_q(_type_partition)} ATTACH PARTITION {_q(_name)}"
+                f" FOR VALUES FROM ('{_from.isoformat()}') TO ('{_to.isoformat()}')"
+            )
+    except DatabaseError:
+        _logger.exception("could not create invocation partition %s", _name)
+        return None
+    return _name
+
+
+def _expire_partition(name: str) -> None:
+    _q = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as _cursor:
+        # (foreign keys are deferred; check any pending now, or the table can't go)
+        _cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        if settings.GRAVYVALET_INVOCATION_RETENTION_ARCHIVE:
+            _cursor.execute(
+                "SELECT _parent.relname FROM pg_inherits"
+                " JOIN pg_class _parent ON _parent.oid = pg_inherits.inhparent"
+                " WHERE pg_inherits.inhrelid = %s::regclass",
+                [name],
+            )
+            ((_parent_name,),) = _cursor.fetchall()
+            _cursor.execute(
+                f"ALTER TABLE {_q(_parent_name)} DETACH PARTITION {_q(name)}"
+            )
+        else:
+            _cursor.execute(f"DROP TABLE {_q(name)}")
+
+
+def _delete_invocations(
+    operation_type: str, *, created_before, from_legacy: bool
+) -> int:
+    # (only from partitions not dropped whole: the type's default partition and
+    # the legacy partition, where invocations have no `operation_type`)
+    _q = connection.ops.quote_name
+    with connection.cursor() as _cursor:
+        _cursor.execute(
+            f"DELETE FROM {_q(f'{_type_table(operation_type)}_default')}"
+            " WHERE created < %s",
+            [created_before],
+        )
+        _deleted_count = _cursor.rowcount
+        if from_legacy:
+            _operation_identifiers = [
+                _operation.static_key
+                for _operation in AddonOperationModel.iter_all()
+                if _operation.operation_type.value == operation_type
+            ]
+            if _operation_identifiers:
+                _cursor.execute(
+                    f"DELETE FROM {_q(_LEGACY_PARTITION)}"
+                    " WHERE created < %s AND operation_identifier = ANY(%s)",
+                    [created_before, _operation_identifiers],
+                )
+                _deleted_count += _cursor.rowcount
+    return _deleted_count
+
+
+def _table_exists(name: str) -> bool:
+    with connection.cursor() as _cursor:
+        _cursor.execute("SELECT to_regclass(%s)", [name])
+        ((_existing,),) = _cursor.fetchall()
+    return _existing is not None
+
+
+def _is_partition(name: str) -> bool:
+    # (an archived legacy partition is detached, but still there)
+    with connection.cursor() as _cursor:
+        _cursor.execute(
+            "SELECT EXISTS (SELECT FROM pg_inherits WHERE inhrelid = %s::regclass)",
+            [name],
+        )
+        ((_is_partition,),) = _cursor.fetchall()
+    return _is_partition
+
+
+def _has_rows(name: str) -> bool:
+    with connection.cursor() as _cursor:
+        _cursor.execute(
+            f"SELECT EXISTS (SELECT FROM {connection.ops.quote_name(name)})"
+        )
+        ((_has_rows,),) = _cursor.fetchall()
+    return _has_rows
@@ -0,0 +1,227 @@
+"""how invocations are saved, with lighter options for immediate read-only operations
+
+by default, creating an invocation inserts its row, selects it again (with its
+related objects) and updates it with the operation result -- a lot of writing
+for a read-only browse like `list_child_items`
+
+for immediate operations with only the ACCESS capability (and no others), two
+options may be configured, each by operation name or capability name:
+- `GRAVYVALET_INVOCATION_SKIP_RESULT_FOR`: the operation result is given in the
+  api response, but not stored (later requests for the invocation show a null
+  `operation_result`)
+- `GRAVYVALET_INVOCATION_WRITE_BEHIND_FOR`: the invocation is not saved while the
+  request waits; once performed (and the request's transaction committed), it is
+  given to `invocation_writer`, which inserts buffered invocations in bulk (every
+  `GRAVYVALET_INVOCATION_WRITE_BEHIND_FLUSH_SECONDS` or each
+  `GRAVYVALET_INVOCATION_WRITE_BEHIND_BATCH_SIZE` invocations, whichever first)
+  -- so an invocation may not be found by id until a moment after it's created
+
+>>> from addon_toolkit.interfaces.storage import StorageAddonImp
+>>> _interface = StorageAddonImp.ADDON_INTERFACE
+>>> _list_child_items = _interface.get_operation_by_name("list_child_items")
+>>> _is_configured_for(_list_child_items, ("ACCESS",))
+True
+>>> _is_configured_for(_list_child_items, ("list_child_items",))
+True
+>>> _is_configured_for(_list_child_items, ("UPDATE", "get_item_info"))
+False
+"""
+
+import atexit
+import copy
+import logging
+import threading
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    connections,
+    transaction,
+)
+from django.utils import timezone
+
+from addon_toolkit import (
+    AddonCapabilities,
+    AddonOperationDeclaration,
+    AddonOperationType,
+)
+
+from .models import AddonOperationInvocation
+
+
+__all__ = (
+    "InvocationWriter",
+    "asave_invocation",
+    "asave_invocations",
+    "invocation_writer",
+    "is_immediate_read_only",
+    "save_invocation",
+    "stores_result",
+    "writes_behind",
+)
+
+_logger = logging.getLogger(__name__)
+
+# fields that change while performing an invocation
+_PERFORMED_FIELDS = (
+    "int_invocation_status",
+    "operation_result",
+    "exception_type",
+    "exception_message",
+    "exception_context",
+    "modified",
+)
+
+
+def is_immediate_read_only(declaration: AddonOperationDeclaration) -> bool:
+    """whether the given operation is immediate (a request waits on it) and has only
+    the ACCESS capability
+    """
+    return (
+        declaration.operation_type is AddonOperationType.IMMEDIATE
+        and declaration.capability == AddonCapabilities.ACCESS
+    )
+
+
+def stores_result(declaration: AddonOperationDeclaration) -> bool:
+    """whether invocations of the given operation store the operation result"""
+    return not _is_configured_for(
+        declaration, settings.GRAVYVALET_INVOCATION_SKIP_RESULT_FOR
+    )
+
+
+def writes_behind(declaration: AddonOperationDeclaration) -> bool:
+    """whether invocations of the given operation are saved by `invocation_writer`
+    (after performed) instead of before performing
+    """
+    return _is_configured_for(
+        declaration, settings.GRAVYVALET_INVOCATION_WRITE_BEHIND_FOR
+    )
+
+
+def save_invocation(invocation: AddonOperationInvocation) -> None:
+    """save a performed invocation (see `perform_invocation__blocking`)"""
+    invocation.modified = timezone.now()
+    if invocation._state.adding:  # (not yet saved; written behind)
+        transaction.on_commit(lambda: invocation_writer.enqueue(invocation))
+    else:
+        invocation.save(update_fields=_fields_to_update(invocation))
+
+
+async def asave_invocation(invocation: AddonOperationInvocation) -> None:
+    """save a performed invocation (see `perform_invocation__async`)"""
+    invocation.modified = timezone.now()
+    if invocation._state.adding:  # (not yet saved; written behind)
+        invocation_writer.enqueue(invocation)  # (outside any transaction)
+    else:
+        await invocation.asave(update_fields=_fields_to_update(invocation))
+
+
+async def asave_invocations(invocations: Iterable[AddonOperationInvocation]) -> None:
+    """save many performed invocations (see `perform_invocations__async`), with
+    one update for each set of fields to update
+    """
+    _to_update: dict[tuple[str, ...], list[AddonOperationInvocation]] = {}
+    for _invocation in invocations:
+        _invocation.modified = timezone.now()
+        if _invocation._state.adding:  # (not yet saved; written behind)
+            invocation_writer.enqueue(_invocation)
+        else:
+            _fields = tuple(_fields_to_update(_invocation))
+            _to_update.setdefault(_fields, []).append(_invocation)
+    for _fields, _invocations in _to_update.items():
+        # (bounded by the partition keys, as `save` is, to update in only these
+        # invocations' partitions -- see `AddonOperationInvocation.partition_lookup`)
+        await AddonOperationInvocation.objects.filter(
+            operation_type__in={_i.operation_type for _i in _invocations},
+            created__in={_i.created for _i in _invocations},
+        ).abulk_update(_invocations, _fields)
+
+
+class InvocationWriter:
+    """invocations to insert in bulk, buffered in this process"""
+
+    def __init__(self):
+        self._pending: list[AddonOperationInvocation] = []
+        self._lock = threading.Lock()
+        self._flush_timer: threading.Timer | None = None
+
+    def enqueue(self, invocation: AddonOperationInvocation) -> None:
+        """insert the given (unsaved) invocation soon (does not block)"""
+        _row = copy.copy(invocation)  # (so the caller may go on with its own)
+        if not stores_result(invocation.operation.declaration):
+            _row.operation_result = None
+        with self._lock:
+            self._pending.append(_row)
+            if (
+                len(self._pending)
+                >= settings.GRAVYVALET_INVOCATION_WRITE_BEHIND_BATCH_SIZE
+            ):
+                _flush_now = True
+            else:
+                _flush_now = False
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(
+                        settings.GRAVYVALET_INVOCATION_WRITE_BEHIND_FLUSH_SECONDS,
+                        self._flush_in_background,
+                    )
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+        if _flush_now:  # (don't hold up the caller on the database)
+            threading.Thread(target=self._flush_in_background, daemon=True).start()
+
+    def flush(self) -> None:
+        """insert all buffered invocations (in the calling thread)"""
+        with self._lock:
+            _pending, self._pending = self._pending, []
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+        if not _pending:
+            return
+        try:
+            with transaction.atomic():
+                AddonOperationInvocation.objects.bulk_create(_pending)
+        except DatabaseError:
+            _logger.exception(
+                "bulk insert of %d invocations failed; inserting one by one",
+                len(_pending),
+            )
+            for _row in _pending:  # (so one bad row doesn't lose them all)
+                try:
+                    with transaction.atomic():
+                        AddonOperationInvocation.objects.bulk_create([_row])
+                except DatabaseError:
+                    _logger.exception("could not insert invocation %s", _row.pk)
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush()
+        finally:  # (this thread's database connections go with it)
+            connections.close_all()
+
+
+invocation_writer = InvocationWriter()
+atexit.register(invocation_writer.flush)
+
+
+###
+# module-private helpers
+
+
+def _is_configured_for(
+    declaration: AddonOperationDeclaration, configured_names: tuple[str, ...]
+) -> bool:
+    if not is_immediate_read_only(declaration):
+        return False
+    return (
+        declaration.name in configured_names
+        or declaration.capability.name in configured_names
+    )
+
+
+def _fields_to_update(invocation: AddonOperationInvocation) -> list[str]:
+    if stores_result(invocation.operation.declaration):
+        return list(_PERFORMED_FIELDS)
+    return [_field for _field in _PERFORMED_FIELDS if _field != "operation_result"]
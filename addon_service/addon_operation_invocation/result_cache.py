@@ -0,0 +1,217 @@
+"""cache of immediate read-only operation results, served stale while revalidating
+
+browsing (e.g. clicking back and forth in a file picker) performs the same few
+operations again and again; with `GRAVYVALET_INVOCATION_RESULT_CACHE_ENABLED`,
+results of immediate operations with only the ACCESS capability are kept in the
+django cache, keyed by everything that could change them:
+- the account, its credentials (and when they were last saved) and its
+  authorized capabilities
+- the configured addon (if any) and its connected capabilities
+- the config the imp is given (with e.g. the root folder)
+- the operation and its (canonicalized) kwargs
+
+so changing any of those leaves old entries unused (until they expire)
+
+a cached result is served as is for `GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS`;
+after that (until `GRAVYVALET_INVOCATION_RESULT_CACHE_STALE_SECONDS`), it is still
+served, but the operation is also performed again in the background (by celery,
+one refresh at a time) to refresh the cached result
+
+how a result was found ("hit", "stale" or "miss") is reported in api responses'
+top-level meta, as `result_cache`
+
+>>> _canonical_json({"b": [1, 2], "a": {"d": None, "c": "c"}})
+'{"a":{"c":"c","d":null},"b":[1,2]}'
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import AddonOperationInvocation
+from .persistence import is_immediate_read_only
+
+
+__all__ = (
+    "CachedResult",
+    "InvocationResultCache",
+    "get_result_cache_stats",
+)
+
+_logger = logging.getLogger(__name__)
+
+_CACHE_KEY_PREFIX = "gv:invocation-result"
+
+_STATS: Counter[str] = Counter()
+_STATS_LOCK = threading.Lock()
+
+
+def get_result_cache_stats() -> dict[str, int]:
+    """counts of cache "hit", "stale", "miss" and "store" events in this process"""
+    with _STATS_LOCK:
+        return {_event: _STATS[_event] for _event in ("hit", "stale", "miss", "store")}
+
+
+def _count(event: str) -> None:
+    with _STATS_LOCK:
+        _STATS[event] += 1
+
+
+@dataclasses.dataclass(frozen=True)
+class CachedResult:
+    operation_result: Any  # (json, as `AddonOperationInvocation.operation_result`)
+    stored_at: float  # (as `time.time()`)
+
+    @property
+    def is_fresh(self) -> bool:
+        return (
+            time.time() - self.stored_at
+            < settings.GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS
+        )
+
+    @property
+    def cache_status(self) -> str:
+        return "hit" if self.is_fresh else "stale"
+
+
+class InvocationResultCache:
+    """cached result for one invocation's operation, kwargs, account and config"""
+
+    def __init__(self, cache_key: str):
+        self._cache_key = cache_key
+
+    @classmethod
+    def for_invocation(
+        cls, invocation: AddonOperationInvocation
+    ) -> "InvocationResultCache | None":
+        """the result cache for the given invocation (None if its operation's results
+        aren't cached)
+
+        (may query the database, for the invocation's account and config)
+        """
+        if not (
+            settings.GRAVYVALET_INVOCATION_RESULT_CACHE_ENABLED
+            and is_immediate_read_only(invocation.operation.declaration)
+        ):
+            return None
+        return cls(_cache_key(invocation))
+
+    def lookup(self) -> CachedResult | None:
+        try:
+            _cached = cache.get(self._cache_key)
+        except Exception:  # a cache outage should not stop invocations
+            _logger.exception("invocation result cache lookup failed")
+            _cached = None
+        return self._counted(_cached)
+
+    async def alookup(self) -> CachedResult | None:
+        try:
+            _cached = await cache.aget(self._cache_key)
+        except Exception:
+            _logger.exception("invocation result cache lookup failed")
+            _cached = None
+        return self._counted(_cached)
+
+    def store(self, operation_result: Any) -> None:
+        _entry = self._entry_to_store(operation_result)
+        if _entry is None:
+            return
+        try:
+            cache.set(self._cache_key, _entry, timeout=_stale_seconds())
+        except Exception:
+            _logger.exception("invocation result cache store failed")
+        else:
+            _count("store")
+
+    async def astore(self, operation_result: Any) -> None:
+        _entry = self._entry_to_store(operation_result)
+        if _entry is None:
+            return
+        try:
+            await cache.aset(self._cache_key, _entry, timeout=_stale_seconds())
+        except Exception:
+            _logger.exception("invocation result cache store failed")
+        else:
+            _count("store")
+
+    def claim_refresh(self) -> bool:
+        """whether the caller should refresh the (stale) cached result -- true for
+        only one caller at a time (or until the fresh-seconds pass, if it fails)
+        """
+        try:
+            return cache.add(
+                self._refresh_key,
+                1,
+                timeout=settings.GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS,
+            )
+        except Exception:
+            _logger.exception("invocation result cache refresh claim failed")
+            return False
+
+    async def aclaim_refresh(self) -> bool:
+        try:
+            return await cache.aadd(
+                self._refresh_key,
+                1,
+                timeout=settings.GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS,
+            )
+        except Exception:
+            _logger.exception("invocation result cache refresh claim failed")
+            return False
+
+    @property
+    def _refresh_key(self) -> str:
+        return f"{self._cache_key}:refresh"
+
+    def _counted(self, cached: CachedResult | None) -> CachedResult | None:
+        _count("miss" if cached is None else cached.cache_status)
+        return cached
+
+    def _entry_to_store(self, operation_result: Any) -> CachedResult | None:
+        _max_bytes = settings.GRAVYVALET_INVOCATION_RESULT_CACHE_MAX_BYTES
+        if len(_canonical_json(operation_result)) > _max_bytes:
+            return None
+        return CachedResult(operation_result=operation_result, stored_at=time.time())
+
+
+###
+# module-private helpers
+
+
+def _stale_seconds() -> int:
+    return max(
+        settings.GRAVYVALET_INVOCATION_RESULT_CACHE_STALE_SECONDS,
+        settings.GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS,
+    )
+
+
+def _canonical_json(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _cache_key(invocation: AddonOperationInvocation) -> str:
+    _account = invocation.thru_account
+    _credentials = _account._credentials
+    _addon = invocation.thru_addon
+    _identity = _canonical_json(
+        [
+            _account.pk,
+            _credentials and [_credentials.pk, _credentials.modified.isoformat()],
+            _account.int_authorized_capabilities,
+            _addon and [_addon.pk, _addon.int_connected_capabilities],
+            dataclasses.asdict(invocation.config),
+            invocation.operation_identifier,
+            invocation.operation_kwargs,
+        ]
+    )
+    _digest = hashlib.sha256(_identity.encode()).hexdigest()
+    # (account pk kept plain, for looking into the cache by account)
+    return f"{_CACHE_KEY_PREFIX}:{_account.pk}:{_digest}"
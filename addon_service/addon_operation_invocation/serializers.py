@@ -22,8 +22,8 @@ from addon_service.configured_addon.polymorphic_serializers import (
 from addon_service.models import (
     AddonOperationInvocation,
     AddonOperationModel,
-    UserReference,
 )
+from addon_service.user_reference.known_users import get_user_reference_pk
 from app import settings
 
 
@@ -99,6 +99,12 @@ class AddonOperationInvocationSerializer(serializers.HyperlinkedModelSerializer)
         "by_user": "addon_service.serializers.UserReferenceSerializer",
     }
 
+    def get_root_meta(self, resource, many):
+        _result_cache_status = getattr(self.instance, "result_cache_status", None)
+        if many or _result_cache_status is None:
+            return {}
+        return {"result_cache": _result_cache_status}
+
     def to_internal_value(self, data):
         validated_data = super().to_internal_value(data)
         return validated_data
@@ -115,11 +121,40 @@ class AddonOperationInvocationSerializer(serializers.HyperlinkedModelSerializer)
         _operation = _imp_cls.get_operation_declaration(_operation_name)
         _request = self.context["request"]
         _user_uri = get_user_uri(_request) or f"{settings.OSF_BASE_URL}/anonymous"
-        _user, _ = UserReference.objects.get_or_create(user_uri=_user_uri)
         return AddonOperationInvocation(
             operation=AddonOperationModel(_imp_cls.ADDON_INTERFACE, _operation),
             operation_kwargs=validated_data["operation_kwargs"],
             thru_addon=_thru_addon,
             thru_account=_thru_account,
-            by_user=_user,
+            by_user_id=get_user_reference_pk(_request, _user_uri),
         )
+
+
+class AddonOperationInvocationBatchEntrySerializer(AddonOperationInvocationSerializer):
+    """api serializer for one of a batch of invocations (see
+    `AddonOperationInvocationViewSet.as_async_batch_view`)
+
+    each entry's meta has how its result was found in the result cache (if
+    cached) and, if it failed, the type of error
+    """
+
+    class Meta(AddonOperationInvocationSerializer.Meta):
+        fields = [
+            *AddonOperationInvocationSerializer.Meta.fields,
+            "result_cache",
+            "error",
+        ]
+        meta_fields = ["result_cache", "error"]
+
+    result_cache = serializers.CharField(
+        source="result_cache_status", read_only=True, allow_null=True
+    )
+    error = serializers.SerializerMethodField()
+
+    def get_error(self, invocation):
+        if not invocation.exception_type:
+            return None
+        return {"type": invocation.exception_type}
+
+    def get_root_meta(self, resource, many):
+        return {}
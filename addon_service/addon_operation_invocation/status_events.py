@@ -0,0 +1,168 @@
+"""invocation status changes, pushed to clients as server-sent events
+
+eventual operations are performed by celery (see `perform_invocation__celery`),
+which publishes each change of an invocation's status on a redis pub/sub channel
+of the invocation's own; `GET /v1/addon-operation-invocations/{pk}/events` (see
+`AddonOperationInvocationViewSet.as_async_events_view`) subscribes, and passes
+each new status on as a `status` event -- until a final status (SUCCESS or ERROR),
+or until `GRAVYVALET_INVOCATION_EVENTS_MAX_SECONDS` pass (when a browser's
+`EventSource` would reconnect)
+
+after each `GRAVYVALET_INVOCATION_EVENTS_HEARTBEAT_SECONDS` without news, the
+stream gets a comment (so proxies keep it open) and the status is read again from
+the database (in case a message was missed, e.g. while redis was unavailable)
+
+>>> _sse_event("status", {"invocation_status": "GOING"})
+'event: status\\ndata: {"invocation_status": "GOING"}\\n\\n'
+"""
+
+import asyncio
+import json
+import logging
+from collections.abc import AsyncIterator
+
+import redis.asyncio
+from django.conf import settings
+
+from addon_service.common.invocation_status import InvocationStatus
+from addon_service.common.redis_client import (
+    get_async_redis,
+    get_redis,
+)
+
+from .models import AddonOperationInvocation
+
+
+__all__ = (
+    "FINAL_STATUSES",
+    "invocation_status_events",
+    "publish_invocation_status",
+)
+
+_logger = logging.getLogger(__name__)
+
+_CHANNEL_PREFIX = "gv:invocation-status"
+
+FINAL_STATUSES = frozenset((InvocationStatus.SUCCESS, InvocationStatus.ERROR))
+
+
+def publish_invocation_status(invocation_pk: str, status: InvocationStatus) -> None:
+    """tell any subscribed clients the given invocation's (new, committed) status"""
+    try:
+        get_redis().publish(
+            _channel(invocation_pk),
+            json.dumps({"invocation_status": status.name}),
+        )
+    except Exception:  # (subscribers also read the status again now and then)
+        _logger.exception("could not publish invocation status")
+
+
+async def invocation_status_events(
+    invocation_pk: str, *, partition_lookup: dict | None = None
+) -> AsyncIterator[str]:
+    """server-sent events for each new status of the given invocation (starting
+    with its status now), ending after a final status
+
+    (given its `partition_lookup`, the invocation's status is read from only its
+    partition)
+
+    statuses only move forward (STARTING, GOING, then SUCCESS or ERROR), so any
+    status older than one already sent is skipped
+    """
+    _loop = asyncio.get_running_loop()
+    _give_up_at = _loop.time() + settings.GRAVYVALET_INVOCATION_EVENTS_MAX_SECONDS
+    _pubsub = await _subscribe(invocation_pk)
+    try:
+        # (read after subscribing, so no change goes unseen)
+        _status = await _read_status(invocation_pk, partition_lookup)
+        _sent_status: InvocationStatus | None = None
+        while _status is not None:
+            if _sent_status is None or _status.value > _sent_status.value:
+                yield _sse_event(
+                    "status",
+                    {"id": invocation_pk, "invocation_status": _status.name},
+                )
+                _sent_status = _status
+            if _sent_status in FINAL_STATUSES:
+                return
+            _wait_seconds = min(
+                settings.GRAVYVALET_INVOCATION_EVENTS_HEARTBEAT_SECONDS,
+                _give_up_at - _loop.time(),
+            )
+            if _wait_seconds <= 0:
+                return
+            try:
+                _status = await _next_published_status(_pubsub, _wait_seconds)
+            except Exception:
+                _logger.exception("lost invocation status subscription")
+                await _close(_pubsub)
+                _pubsub = None  # (keep on, reading the status each heartbeat)
+                _status = None
+            if _status is None:
+                yield ": heartbeat\n\n"
+                _status = await _read_status(invocation_pk, partition_lookup)
+    finally:
+        await _close(_pubsub)
+
+
+###
+# module-private helpers
+
+
+def _channel(invocation_pk) -> str:
+    return f"{_CHANNEL_PREFIX}:{invocation_pk}"
+
+
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _subscribe(invocation_pk: str) -> redis.asyncio.client.PubSub | None:
+    _pubsub = get_async_redis().pubsub()
+    try:
+        await _pubsub.subscribe(_channel(invocation_pk))
+    except Exception:  # (a redis outage should not stop the stream)
+        _logger.exception("could not subscribe to invocation status")
+        await _close(_pubsub)
+        return None
+    return _pubsub
+
+
+async def _close(pubsub: redis.asyncio.client.PubSub | None) -> None:
+    if pubsub is not None:
+        try:
+            await pubsub.aclose()
+        except Exception:
+            _logger.exception("could not close invocation status subscription")
+
+
+async def _next_published_status(
+    pubsub: redis.asyncio.client.PubSub | None, timeout: float
+) -> InvocationStatus | None:
+    """the next status published within `timeout` seconds, if any"""
+    if pubsub is None:
+        await asyncio.sleep(timeout)
+        return None
+    _loop = asyncio.get_running_loop()
+    _until = _loop.time() + timeout
+    while (_remaining := _until - _loop.time()) > 0:
+        _message = await pubsub.get_message(
+            ignore_subscribe_messages=True, timeout=_remaining
+        )
+        if _message is not None and _message["type"] == "message":
+            _name = json.loads(_message["data"])["invocation_status"]
+            return InvocationStatus[_name]
+    return None
+
+
+async def _read_status(
+    invocation_pk: str, partition_lookup: dict | None
+) -> InvocationStatus | None:
+    _int_status = (
+        await AddonOperationInvocation.objects.filter(
+            pk=invocation_pk, **(partition_lookup or {})
+        )
+        .values_list("int_invocation_status", flat=True)
+        .afirst()
+    )
+    return None if _int_status is None else InvocationStatus(_int_status)
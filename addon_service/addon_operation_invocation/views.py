@@ -1,8 +1,24 @@
+from asgiref.sync import (
+    async_to_sync,
+    sync_to_async,
+)
+from django.conf import settings
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from drf_spectacular.utils import (
     extend_schema,
     extend_schema_view,
 )
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import (
+    ParseError,
+    ValidationError,
+)
 from rest_framework.response import Response
+from rest_framework_json_api.parsers import JSONParser
 
 from addon_service.common.permissions import (
     IsAuthenticated,
@@ -11,8 +27,10 @@ from addon_service.common.permissions import (
 )
 from addon_service.common.viewsets import RetrieveCreateViewSet
 from addon_service.tasks.invocation import (
+    perform_invocation__async,
     perform_invocation__blocking,
     perform_invocation__celery,
+    perform_invocations__async,
 )
 from addon_toolkit import AddonOperationType
 
@@ -31,7 +49,25 @@ from ..configured_addon.link.serializers import ConfiguredLinkAddonSerializer
 from ..configured_addon.models import ConfiguredAddon
 from ..configured_addon.storage.serializers import ConfiguredStorageAddonSerializer
 from .models import AddonOperationInvocation
-from .serializers import AddonOperationInvocationSerializer
+from .persistence import writes_behind
+from .serializers import (
+    AddonOperationInvocationBatchEntrySerializer,
+    AddonOperationInvocationSerializer,
+)
+from .status_events import invocation_status_events
+
+
+class _BatchJSONParser(JSONParser):
+    """parses a json:api document with a list of resource objects as primary data
+    (each parsed as `JSONParser` would parse it alone)
+    """
+
+    def parse_data(self, result, parser_context):
+        _data = result.get("data") if isinstance(result, dict) else None
+        if not isinstance(_data, list):
+            raise ParseError("Received document does not contain a list of resources")
+        _parse_entry = super().parse_data
+        return [_parse_entry({"data": _entry}, parser_context) for _entry in _data]
 
 
 @extend_schema_view(
@@ -47,11 +83,356 @@ class AddonOperationInvocationViewSet(RetrieveCreateViewSet):
     queryset = AddonOperationInvocation.objects.all()
     serializer_class = AddonOperationInvocationSerializer
 
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        if actions == {"post": "batch_create"}:
+            return cls.as_async_batch_view(**initkwargs)
+        if actions == {"get": "events"}:
+            return cls.as_async_events_view(**initkwargs)
+        if settings.GRAVYVALET_ASYNC_INVOCATIONS_ENABLED and actions == {
+            "post": "create"
+        }:
+            return cls.as_async_create_view(**initkwargs)
+        return super().as_view(actions, **initkwargs)
+
+    @classmethod
+    def as_async_create_view(cls, **initkwargs):
+        """an async view for creating invocations (see `dispatch_create__async`)
+
+        under an asgi server (daphne), sync views all take turns on one thread --
+        this view instead waits for external services on the event loop, so one
+        worker may perform many invocations at once (other request methods are
+        handed to the usual sync view)
+        """
+        _actions = {"post": "create"}
+        _sync_view = super().as_view(_actions, **initkwargs)
+
+        # (async views can't be atomic requests; `perform_invocation__async` saves
+        # the invocation as it goes instead)
+        @transaction.non_atomic_requests
+        async def view(request, *args, **kwargs):
+            if request.method != "POST":
+                return await sync_to_async(_sync_view)(request, *args, **kwargs)
+            _viewset = cls._for_async_view(request, args, kwargs, _actions, initkwargs)
+            return await _viewset.dispatch_create__async(request, *args, **kwargs)
+
+        view.__name__ = _sync_view.__name__
+        view.__doc__ = _sync_view.__doc__
+        return cls._as_async_view(view, _actions, initkwargs)
+
+    @classmethod
+    def as_async_batch_view(cls, **initkwargs):
+        """an async view for creating a batch of invocations thru one addon (or
+        account) at once (see `dispatch_batch__async`)
+
+        request and response documents are as for creating one invocation, but
+        with a list of resource objects as primary data
+        """
+        _actions = {"post": "batch_create"}
+
+        @transaction.non_atomic_requests
+        async def view(request, *args, **kwargs):
+            _viewset = cls._for_async_view(request, args, kwargs, _actions, initkwargs)
+            if request.method != "POST":
+                return await sync_to_async(_viewset.dispatch)(request, *args, **kwargs)
+            return await _viewset.dispatch_batch__async(request, *args, **kwargs)
+
+        view.__name__ = f"{cls.__name__}Batch"
+        return cls._as_async_view(view, _actions, initkwargs)
+
+    @classmethod
+    def as_async_events_view(cls, **initkwargs):
+        """an async view streaming server-sent events as an invocation's status
+        changes (see `dispatch_events__async`)
+        """
+        _actions = {"get": "events"}
+
+        @transaction.non_atomic_requests
+        async def view(request, *args, **kwargs):
+            _viewset = cls._for_async_view(request, args, kwargs, _actions, initkwargs)
+            if request.method != "GET":
+                return await sync_to_async(_viewset.dispatch)(request, *args, **kwargs)
+            return await _viewset.dispatch_events__async(request, *args, **kwargs)
+
+        view.__name__ = f"{cls.__name__}Events"
+        return cls._as_async_view(view, _actions, initkwargs)
+
+    @classmethod
+    def _for_async_view(cls, request, args, kwargs, actions, initkwargs):
+        _viewset = cls(**initkwargs)
+        _viewset.action_map = actions
+        for _method, _action in actions.items():
+            setattr(_viewset, _method, getattr(_viewset, _action))
+        _viewset.request = request
+        _viewset.args = args
+        _viewset.kwargs = kwargs
+        return _viewset
+
+    @classmethod
+    def _as_async_view(cls, view, actions, initkwargs):
+        # (as set by `ViewSetMixin.as_view`, for routers and schema generation)
+        view.cls = cls
+        view.initkwargs = initkwargs
+        view.actions = actions
+        view.csrf_exempt = True  # (as `APIView.as_view`)
+        return view
+
+    async def dispatch_create__async(self, request, *args, **kwargs):
+        """same as `dispatch` for `create`, but without blocking a thread
+
+        each step that needs the database (or sync-only drf machinery) takes one
+        trip to a thread; checking permissions with osf and performing the
+        invocation happen on the running event loop
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            _serializer = await sync_to_async(self._validate_for_create)(
+                request, *args, **kwargs
+            )
+            await self.check_object_permissions__async(request, _serializer.instance)
+            await self.perform_create__async(_serializer)
+            response = await sync_to_async(self._created_response)(_serializer)
+        except Exception as exc:
+            response = await sync_to_async(self._handle_exception_nonatomic)(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def dispatch_batch__async(self, request, *args, **kwargs):
+        """create and perform a batch of invocations thru one addon (or account)
+
+        authenticates, checks permissions (once for each capability required),
+        loads the addon and account and instantiates the addon imp just once for
+        the whole batch, then performs the operations concurrently (see
+        `perform_invocations__async`); each entry in the response has its own
+        `invocation_status` and `operation_result` (an error in one operation
+        doesn't fail the others)
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            _serializer = await sync_to_async(self._validate_for_batch)(
+                request, *args, **kwargs
+            )
+            for _invocation in self._one_per_capability(_serializer.instance):
+                await self.check_object_permissions__async(request, _invocation)
+            await self.perform_batch_create__async(_serializer)
+            response = await sync_to_async(self._created_response)(_serializer)
+        except Exception as exc:
+            response = await sync_to_async(self._handle_exception_nonatomic)(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    async def dispatch_events__async(self, request, *args, **kwargs):
+        """stream the invocation's status (as server-sent events) until final
+
+        instead of polling the invocation (each poll authenticating, checking
+        permissions and reading the database), one request that authenticates
+        and checks permissions once, then waits on the invocation's status
+        channel (see `status_events`)
+        """
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            _invocation = await sync_to_async(self._get_for_events)(
+                request, *args, **kwargs
+            )
+            await self.check_object_permissions__async(request, _invocation)
+            response = self._events_response(_invocation)
+        except Exception as exc:
+            response = await sync_to_async(self._handle_exception_nonatomic)(exc)
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+    @action(detail=False, methods=["post"], url_path="batch", url_name="batch")
+    def batch_create(self, request, *args, **kwargs):
+        """create and perform a batch of invocations thru one addon (or account)
+
+        (routed to `as_async_batch_view`; this is the same, as a sync view)
+        """
+        _serializer = self._validated_batch(request)
+        for _invocation in self._one_per_capability(_serializer.instance):
+            self.check_object_permissions(request, _invocation)
+        async_to_sync(self.perform_batch_create__async)(_serializer)
+        return self._created_response(_serializer)
+
+    @action(detail=True, methods=["get"])
+    def events(self, request, *args, **kwargs):
+        """stream the invocation's status (as server-sent events) until final
+
+        (routed to `as_async_events_view`; this is the same, as a sync view --
+        but a sync server sends the stream only once it ends)
+        """
+        return self._events_response(self.get_object())
+
+    async def perform_batch_create__async(self, serializer):
+        """as `perform_create__async`, for a batch of invocations"""
+        _invocations = serializer.instance
+        _related = await self._get_narrowed_down_relation_queryset(
+            serializer, _invocations[0]
+        ).aget()
+        for _invocation in _invocations:
+            self._set_narrowed_down_relation(_invocation, _related)
+            self._prepare_to_bulk_create(_invocation)
+        if _invocations[0].thru_addon:
+            _invocations[0].thru_addon.base_account = _invocations[0].thru_account
+        await AddonOperationInvocation.objects.abulk_create(
+            [
+                _invocation
+                for _invocation in _invocations
+                if not writes_behind(_invocation.operation.declaration)
+            ]
+        )
+        _to_perform_now = []
+        for _invocation in _invocations:
+            _operation_type = _invocation.operation.operation_type
+            match _operation_type:
+                case AddonOperationType.REDIRECT | AddonOperationType.IMMEDIATE:
+                    _to_perform_now.append(_invocation)
+                case AddonOperationType.EVENTUAL:
+                    await sync_to_async(perform_invocation__celery.delay)(
+                        _invocation.pk,
+                        _invocation.created.isoformat(),
+                        _invocation.operation_type,
+                    )
+                case _:
+                    raise ValueError(f"unknown operation type: {_operation_type}")
+        await perform_invocations__async(
+            _to_perform_now,
+            concurrency=settings.GRAVYVALET_INVOCATION_BATCH_CONCURRENCY,
+        )
+
+    async def check_object_permissions__async(self, request, obj):
+        """same as `check_object_permissions`, awaiting permissions that can be"""
+        for _permission in self.get_permissions():
+            _check__async = getattr(_permission, "has_object_permission__async", None)
+            _has_permission = (
+                await _check__async(request, self, obj)
+                if _check__async is not None
+                else await sync_to_async(_permission.has_object_permission)(
+                    request, self, obj
+                )
+            )
+            if not _has_permission:
+                self.permission_denied(
+                    request,
+                    message=getattr(_permission, "message", None),
+                    code=getattr(_permission, "code", None),
+                )
+
+    async def perform_create__async(self, serializer):
+        """same as `perform_create` (after permissions checked), on the event loop"""
+        _invocation = serializer.instance
+        if writes_behind(_invocation.operation.declaration):
+            self._prepare_to_bulk_create(_invocation)
+            self._set_narrowed_down_relation(
+                _invocation,
+                await self._get_narrowed_down_relation_queryset(
+                    serializer, _invocation
+                ).aget(),
+            )
+        else:
+            await _invocation.asave()
+            _invocation = (
+                await AddonOperationInvocation.objects.filter(
+                    pk=_invocation.pk, **_invocation.partition_lookup
+                )
+                .select_related(
+                    *self._get_narrowed_down_selects(serializer),
+                    "thru_account___credentials",
+                )
+                .aget()
+            )
+        if _invocation.thru_addon:
+            _invocation.thru_addon.base_account = _invocation.thru_account
+        _operation_type = _invocation.operation.operation_type
+        match _operation_type:
+            case AddonOperationType.REDIRECT | AddonOperationType.IMMEDIATE:
+                await perform_invocation__async(_invocation)
+            case AddonOperationType.EVENTUAL:
+                await sync_to_async(perform_invocation__celery.delay)(
+                    _invocation.pk,
+                    _invocation.created.isoformat(),
+                    _invocation.operation_type,
+                )
+            case _:
+                raise ValueError(f"unknown operation type: {_operation_type}")
+        serializer.instance = _invocation
+
+    def _validate_for_create(self, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        _serializer = self.get_serializer(data=request.data)
+        _serializer.is_valid(raise_exception=True)
+        _serializer.save()  # (not yet saved to the database; see serializer `create`)
+        return _serializer
+
+    def _validate_for_batch(self, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        return self._validated_batch(request)
+
+    def _validated_batch(self, request):
+        _max_size = settings.GRAVYVALET_INVOCATION_BATCH_MAX_SIZE
+        if not request.data:
+            raise ValidationError("a batch must include at least one invocation")
+        if len(request.data) > _max_size:
+            raise ValidationError(
+                f"a batch may include at most {_max_size} invocations"
+            )
+        _serializer = self.get_serializer(data=request.data, many=True)
+        _serializer.is_valid(raise_exception=True)
+        _invocations = _serializer.save()  # (not yet saved to the database)
+        if len({(_i.thru_addon_id, _i.thru_account_id) for _i in _invocations}) != 1:
+            raise ValidationError(
+                "a batch of invocations must all be thru the same addon (or account)"
+            )
+        return _serializer
+
+    def _one_per_capability(self, invocations):
+        # (permission to perform an invocation depends only on its capability,
+        # given the same addon and account)
+        return {_i.operation.capability: _i for _i in invocations}.values()
+
+    def _get_for_events(self, request, *args, **kwargs):
+        # (as `get_object`, but without checking object permissions, done after)
+        self.initial(request, *args, **kwargs)
+        return get_object_or_404(self.get_queryset(), pk=self.kwargs["pk"])
+
+    def _events_response(self, invocation) -> StreamingHttpResponse:
+        return StreamingHttpResponse(
+            invocation_status_events(
+                str(invocation.pk), partition_lookup=invocation.partition_lookup
+            ),
+            content_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    def _handle_exception_nonatomic(self, exc):
+        # drf marks the atomic request (if any) for rollback on error; this view
+        # isn't one, so keep that to a savepoint of its own
+        with transaction.atomic():
+            return self.handle_exception(exc)
+
+    def _created_response(self, serializer) -> Response:
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED,
+            headers=self.get_success_headers(serializer.data),
+        )
+
     def get_permissions(self):
         match self.action:
-            case "retrieve" | "retrieve_related":
+            case "retrieve" | "retrieve_related" | "events":
                 return [IsAuthenticated(), SessionUserMayAccessInvocation()]
-            case "create":
+            case "create" | "batch_create":
                 return [SessionUserMayPerformInvocation()]
             case None:
                 return super().get_permissions()
@@ -60,6 +441,33 @@ class AddonOperationInvocationViewSet(RetrieveCreateViewSet):
                     f"no permission implemented for action '{self.action}'"
                 )
 
+    def get_queryset(self):
+        if self.action == "events":  # (for checking permissions)
+            return (
+                super()
+                .get_queryset()
+                .select_related(
+                    "by_user", "thru_account", "thru_addon__authorized_resource"
+                )
+            )
+        return super().get_queryset()
+
+    def perform_content_negotiation(self, request, force=False):
+        # an event stream is no renderer's; any errors are rendered as json:api
+        return super().perform_content_negotiation(
+            request, force=(force or self.action == "events")
+        )
+
+    def get_serializer_class(self):
+        if self.action == "batch_create":
+            return AddonOperationInvocationBatchEntrySerializer
+        return super().get_serializer_class()
+
+    def get_parsers(self):
+        if self.action_map.get("post") == "batch_create":
+            return [_BatchJSONParser()]
+        return super().get_parsers()
+
     def retrieve_related(self, request, *args, **kwargs):
         instance = self.get_related_instance()
         if isinstance(instance, AuthorizedAccount):
@@ -105,16 +513,31 @@ class AddonOperationInvocationViewSet(RetrieveCreateViewSet):
         return Response(serializer.data)
 
     def perform_create(self, serializer):
-        super().perform_create(serializer)
-        # after creating the AddonOperationInvocation, look into invoking it
-        _invocation = (
-            AddonOperationInvocation.objects.filter(pk=serializer.instance.pk)
-            .select_related(
-                *self._get_narrowed_down_selects(serializer),
-                "thru_account___credentials",
+        # (as `super().perform_create`, but an invocation to be written behind
+        # is saved only once performed; see `persistence.save_invocation`)
+        _invocation = serializer.save()  # (not yet saved; see serializer `create`)
+        self.check_object_permissions(self.request, _invocation)
+        if writes_behind(_invocation.operation.declaration):
+            self._prepare_to_bulk_create(_invocation)
+            self._set_narrowed_down_relation(
+                _invocation,
+                self._get_narrowed_down_relation_queryset(
+                    serializer, _invocation
+                ).get(),
+            )
+        else:
+            _invocation.save()
+            # after creating the AddonOperationInvocation, look into invoking it
+            _invocation = (
+                AddonOperationInvocation.objects.filter(
+                    pk=_invocation.pk, **_invocation.partition_lookup
+                )
+                .select_related(
+                    *self._get_narrowed_down_selects(serializer),
+                    "thru_account___credentials",
+                )
+                .first()
             )
-            .first()
-        )
         if _invocation.thru_addon:
             _invocation.thru_addon.base_account = _invocation.thru_account
         _operation_type = _invocation.operation.operation_type
@@ -122,18 +545,67 @@ class AddonOperationInvocationViewSet(RetrieveCreateViewSet):
             case AddonOperationType.REDIRECT | AddonOperationType.IMMEDIATE:
                 perform_invocation__blocking(_invocation)
             case AddonOperationType.EVENTUAL:
-                perform_invocation__celery.delay(_invocation.pk)
+                perform_invocation__celery.delay(
+                    _invocation.pk,
+                    _invocation.created.isoformat(),
+                    _invocation.operation_type,
+                )
             case _:
                 raise ValueError(f"unknown operation type: {_operation_type}")
         serializer.instance = _invocation
 
     def _get_narrowed_down_selects(self, serializer):
-        addon_resource_name = serializer.initial_data.get(
-            "thru_addon", serializer.initial_data.get("thru_account")
-        )["type"]
-        addon_type = addon_resource_name.split("-")[1]
+        addon_type = self._get_addon_type(serializer)
         return [
             f"thru_addon__configured{addon_type}addon",
             f"thru_account__authorized{addon_type}account",
             f"thru_account__external_service__external{addon_type}service",
         ]
+
+    def _get_addon_type(self, serializer) -> str:
+        _initial_data = serializer.initial_data
+        if isinstance(_initial_data, list):  # (a batch, all thru the same addon)
+            _initial_data = _initial_data[0]
+        addon_resource_name = _initial_data.get(
+            "thru_addon", _initial_data.get("thru_account")
+        )["type"]
+        return addon_resource_name.split("-")[1]
+
+    def _prepare_to_bulk_create(self, invocation) -> None:
+        # (as for an invocation to be written behind, which is bulk-created)
+        invocation.created = invocation.modified = timezone.now()
+        invocation.operation_type = invocation.operation.operation_type.value
+        # validate as `save` would (except what's already been validated
+        # by the serializer: related objects and the new, random id)
+        invocation.full_clean(
+            exclude=["thru_addon", "thru_account", "by_user"],
+            validate_unique=False,
+        )
+
+    def _get_narrowed_down_relation_queryset(self, serializer, invocation):
+        # for an invocation not yet saved: its addon (or account), with related
+        # objects selected as by `_get_narrowed_down_selects`
+        addon_type = self._get_addon_type(serializer)
+        if invocation.thru_addon_id is not None:
+            return ConfiguredAddon.objects.filter(
+                pk=invocation.thru_addon_id
+            ).select_related(
+                f"configured{addon_type}addon",
+                f"base_account__authorized{addon_type}account",
+                f"base_account__external_service__external{addon_type}service",
+                "base_account___credentials",
+            )
+        return AuthorizedAccount.objects.filter(
+            pk=invocation.thru_account_id
+        ).select_related(
+            f"authorized{addon_type}account",
+            f"external_service__external{addon_type}service",
+            "_credentials",
+        )
+
+    def _set_narrowed_down_relation(self, invocation, related) -> None:
+        if isinstance(related, ConfiguredAddon):
+            invocation.thru_addon = related
+            invocation.thru_account = related.base_account
+        else:
+            invocation.thru_account = related
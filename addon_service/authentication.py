@@ -2,7 +2,7 @@ from rest_framework import authentication as drf_authentication
 from rest_framework.request import Request as DrfRequest
 
 from addon_service.common import osf
-from addon_service.models import UserReference
+from addon_service.user_reference.known_users import known_user_cache
 
 
 class GVCombinedAuthentication(drf_authentication.BaseAuthentication):
@@ -11,7 +11,7 @@ class GVCombinedAuthentication(drf_authentication.BaseAuthentication):
     def authenticate(self, request: DrfRequest):
         _user_uri = osf.get_osf_user_uri(request)
         if _user_uri:
-            UserReference.objects.get_or_create(user_uri=_user_uri)
+            request.user_reference_pk = known_user_cache.get_or_create_pk(_user_uri)
             request.user_uri = _user_uri
             return True, None
         return None  # unauthenticated
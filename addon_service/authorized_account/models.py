@@ -7,7 +7,6 @@ from django.db import (
     models,
     transaction,
 )
-from django.utils import timezone
 
 from addon_service.addon_imp.instantiation import get_addon_instance
 from addon_service.addon_operation.models import AddonOperationModel
@@ -16,6 +15,7 @@ from addon_service.common.base_model import AddonsServiceBaseModel
 from addon_service.common.credentials_formats import CredentialsFormats
 from addon_service.common.service_types import ServiceTypes
 from addon_service.common.validators import validate_addon_capability
+from addon_service.credentials.header_cache import auth_header_cache
 from addon_service.credentials.models import ExternalCredentials
 from addon_service.oauth1 import utils as oauth1_utils
 from addon_service.oauth2 import utils as oauth2_utils
@@ -23,6 +23,7 @@ from addon_service.oauth2.models import (
     OAuth2ClientConfig,
     OAuth2TokenMetadata,
 )
+from addon_service.oauth2.refresh_lock import token_refresh_lock
 from addon_toolkit import (
     AddonCapabilities,
     AddonImp,
@@ -105,6 +106,32 @@ class AuthorizedAccount(AddonsServiceBaseModel):
             return self._credentials.decrypted_credentials
         return None
 
+    def get_auth_headers(self) -> list[tuple[str, str]]:
+        """http headers for authenticating with this account's credentials"""
+        if not self._credentials:
+            return []
+        return auth_header_cache.get_or_build(
+            self._credentials, self.credentials_format
+        )
+
+    async def aget_auth_headers(self) -> list[tuple[str, str]]:
+        """like `get_auth_headers`, but without key derivation blocking the event loop"""
+        _credentials = await sync_to_async(lambda: self._credentials)()
+        if _credentials and auth_header_cache.lookup(_credentials) is None:
+            await _credentials.aprepare_encryption_keys()
+        return await sync_to_async(self.get_auth_headers)()
+
+    def get_cached_auth_headers(self) -> list[tuple[str, str]] | None:
+        """like `get_auth_headers`, but only if at hand without db access or decryption
+
+        (safe to call from async code; returns None if the headers aren't at hand)
+        """
+        if not AuthorizedAccount._credentials.is_cached(self):
+            return None
+        if not self._credentials:
+            return []
+        return auth_header_cache.lookup(self._credentials)
+
     @credentials.setter
     def credentials(self, credentials_data: Credentials) -> None:
         if self.temporary_oauth1_credentials:
@@ -147,6 +174,7 @@ class AuthorizedAccount(AddonsServiceBaseModel):
             creds.save()
         except TypeError as e:
             raise ValidationError(e)
+        auth_header_cache.invalidate(creds.pk)
 
     @property
     def authorized_capabilities(self) -> AddonCapabilities:
@@ -321,6 +349,11 @@ class AuthorizedAccount(AddonsServiceBaseModel):
     # async functions for use in oauth2 callback flows
 
     async def refresh_oauth2_access_token(self, force=False) -> None:
+        """refresh the access token if expired or about to expire (or if `force`)
+
+        at most one worker (in any process) refreshes a given token at a time;
+        others wait for it and use the token it got
+        """
         (
             _oauth_client_config,
             _oauth_token_metadata,
@@ -330,11 +363,15 @@ class AuthorizedAccount(AddonsServiceBaseModel):
             or await sync_to_async(lambda: _oauth_token_metadata.access_token_only)()
         ):
             return
-        if (
-            force
-            or (not _oauth_token_metadata.access_token_expiration)
-            or _oauth_token_metadata.access_token_expiration < timezone.now()
-        ):
+        if not (force or _oauth_token_metadata.access_token_expires_soon):
+            return
+        _last_refreshed = _oauth_token_metadata.date_last_refreshed
+        async with token_refresh_lock(_oauth_token_metadata.pk):
+            await _oauth_token_metadata.arefresh_from_db()
+            if _oauth_token_metadata.date_last_refreshed != _last_refreshed:
+                # refreshed by another worker since this one looked -- use that
+                await self.arefresh_from_db()
+                return
             _fresh_token_result = await oauth2_utils.get_refreshed_access_token(
                 token_endpoint_url=_oauth_client_config.token_endpoint_url,
                 refresh_token=_oauth_token_metadata.refresh_token,
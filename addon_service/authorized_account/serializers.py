@@ -15,7 +15,7 @@ from addon_service.serializer_fields import (
     CredentialsField,
     EnumNameMultipleChoiceField,
 )
-from addon_service.user_reference.models import UserReference
+from addon_service.user_reference.known_users import get_user_reference_pk
 from addon_toolkit import AddonCapabilities
 
 
@@ -73,15 +73,13 @@ class AuthorizedAccountSerializer(serializers.HyperlinkedModelSerializer):
         api_base_url: str = "",
         **kwargs,
     ) -> AuthorizedAccount:
-        session_user_uri = get_user_uri(self.context["request"])
-        account_owner, _ = UserReference.objects.get_or_create(
-            user_uri=session_user_uri
-        )
+        _request = self.context["request"]
+        session_user_uri = get_user_uri(_request)
         try:
             return self.Meta.model.objects.create(
                 _display_name=display_name,
                 external_service=external_service,
-                account_owner=account_owner,
+                account_owner_id=get_user_reference_pk(_request, session_user_uri),
                 authorized_capabilities=authorized_capabilities,
                 api_base_url=api_base_url,
             )
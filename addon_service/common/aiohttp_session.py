@@ -1,53 +1,227 @@
+"""process-wide pools of reusable http connections, one pool per external host
+
+each external host (box, google drive, github, the osf api...) gets its own
+`aiohttp.ClientSession` with its own connector, so connection limits, keep-alive
+and dns caching can be tuned per host and a slow host can't starve the others
+
+aiohttp sessions belong to the event loop they were created on, so pools are kept
+per event loop (and closed when their loop shuts down; see `LoopScoped`) -- under
+daphne nearly everything runs on the one main loop, so in practice each external
+host gets one warm pool per process (closed as daphne shuts down; see `app.asgi`)
+
+occupancy and reuse are counted by aiohttp's (public) request tracing, rather
+than read from connector internals
+"""
+
+import dataclasses
 import threading
-import weakref
-from typing import MutableMapping
+from collections import defaultdict
+from urllib.parse import urlsplit
 
 import aiohttp
-from aiohttp import ClientSession
 from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from addon_service.common.loop_scoped import LoopScoped
 
 
 __all__ = (
-    "get_singleton_client_session",
-    "get_singleton_client_session__blocking",
+    "ConnectionPoolManager",
+    "PoolStats",
+    "close_all_client_sessions",
     "close_singleton_client_session",
     "close_singleton_client_session__blocking",
+    "get_pool_stats",
+    "get_pooled_client_session",
+    "get_singleton_client_session",
+    "get_singleton_client_session__blocking",
 )
 
-__SINGLETON_CLIENT_SESSION_STORE: MutableMapping[threading.Thread, ClientSession] = (
-    weakref.WeakKeyDictionary()
-)
 
+# pool key for requests not tied to any particular external host
+_DEFAULT_POOL_KEY = ""
 
-async def has_current_session():
-    thread_id = threading.current_thread()
-    return __SINGLETON_CLIENT_SESSION_STORE.get(thread_id, False)
 
+@dataclasses.dataclass
+class PoolStats:
+    """point-in-time occupancy and cumulative reuse counters for one host's pool"""
 
-async def get_singleton_client_session() -> aiohttp.ClientSession:
-    """return a reusable aiohttp client session (thread-local singleton)"""
-    thread_id = threading.current_thread()
-    if thread_id not in __SINGLETON_CLIENT_SESSION_STORE:
-        __SINGLETON_CLIENT_SESSION_STORE[thread_id] = aiohttp.ClientSession(
+    host: str
+    connection_limit: int
+    open_sessions: int = 0  # one per event loop using this host
+    requests_in_flight: int = 0  # sent, awaiting a response (each holds a connection)
+    requests_sent: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+
+    @property
+    def reuse_ratio(self) -> float:
+        _total = self.connections_created + self.connections_reused
+        return (self.connections_reused / _total) if _total else 0.0
+
+
+@dataclasses.dataclass
+class _HostCounters:
+    requests_in_flight: int = 0
+    requests_sent: int = 0
+    connections_created: int = 0
+    connections_reused: int = 0
+
+
+class ConnectionPoolManager:
+    """keeps one `aiohttp.ClientSession` per (event loop, external host)
+
+    >>> ConnectionPoolManager.pool_key('https://api.github.com/user/repos?page=2')
+    'api.github.com'
+    >>> ConnectionPoolManager.pool_key('https://API.Example:8443/v2/')
+    'api.example:8443'
+    >>> ConnectionPoolManager.pool_key('')
+    ''
+    """
+
+    def __init__(self):
+        self._sessions_by_loop: LoopScoped[dict[str, aiohttp.ClientSession]] = (
+            LoopScoped(dict, aclose=_close_sessions)
+        )
+        self._counters: defaultdict[str, _HostCounters] = defaultdict(_HostCounters)
+        self._lock = threading.Lock()  # (stats are read across threads)
+
+    @staticmethod
+    def pool_key(url: str) -> str:
+        return urlsplit(url).netloc.lower() if url else _DEFAULT_POOL_KEY
+
+    @staticmethod
+    def connection_limit(pool_key: str) -> int:
+        """max simultaneous connections for the given host (0 for no limit)"""
+        return settings.GRAVYVALET_HTTP_POOL_HOST_LIMITS.get(
+            pool_key, settings.GRAVYVALET_HTTP_POOL_LIMIT_PER_HOST
+        )
+
+    async def get_session(self, url: str) -> aiohttp.ClientSession:
+        """return a reusable session for the external host of the given url"""
+        _pool_key = self.pool_key(url)
+        _loop_sessions = self._sessions_by_loop.get()
+        with self._lock:
+            _session = _loop_sessions.get(_pool_key)
+            if _session is None or _session.closed:
+                _session = _loop_sessions[_pool_key] = self._new_session(_pool_key)
+        return _session
+
+    async def close_loop_sessions(self) -> None:
+        """close every session belonging to the running event loop"""
+        await self._sessions_by_loop.aclose()
+
+    def stats(self) -> dict[str, PoolStats]:
+        _stats: dict[str, PoolStats] = {}
+        _all_loop_sessions = self._sessions_by_loop.values()
+        with self._lock:
+            _all_sessions = [
+                (_pool_key, _session)
+                for _loop_sessions in _all_loop_sessions
+                for _pool_key, _session in _loop_sessions.items()
+                if not _session.closed
+            ]
+            _counters = {
+                _pool_key: dataclasses.replace(_host_counters)
+                for _pool_key, _host_counters in self._counters.items()
+            }
+        for _pool_key, _session in _all_sessions:
+            _pool_stats = _stats.setdefault(
+                _pool_key, PoolStats(_pool_key, self.connection_limit(_pool_key))
+            )
+            _pool_stats.open_sessions += 1
+        for _pool_key, _host_counters in _counters.items():
+            _pool_stats = _stats.setdefault(
+                _pool_key, PoolStats(_pool_key, self.connection_limit(_pool_key))
+            )
+            _pool_stats.requests_in_flight = _host_counters.requests_in_flight
+            _pool_stats.requests_sent = _host_counters.requests_sent
+            _pool_stats.connections_created = _host_counters.connections_created
+            _pool_stats.connections_reused = _host_counters.connections_reused
+        return _stats
+
+    def _new_session(self, pool_key: str) -> aiohttp.ClientSession:
+        _limit = self.connection_limit(pool_key)
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=_limit,  # each connector serves only one host...
+                limit_per_host=_limit,  # ...except the default pool
+                keepalive_timeout=settings.GRAVYVALET_HTTP_KEEPALIVE_SECONDS,
+                use_dns_cache=True,
+                ttl_dns_cache=settings.GRAVYVALET_HTTP_DNS_CACHE_SECONDS,
+            ),
             cookie_jar=aiohttp.DummyCookieJar(),  # ignore all cookies
+            trace_configs=[self._counting_trace_config(pool_key)],
         )
-    return __SINGLETON_CLIENT_SESSION_STORE[thread_id]
+
+    def _counting_trace_config(self, pool_key: str) -> aiohttp.TraceConfig:
+        _host_counters = self._counters[pool_key]
+
+        async def _on_request_start(session, context, params):
+            _host_counters.requests_sent += 1
+            _host_counters.requests_in_flight += 1
+
+        # (one or the other for every request started, even if cancelled)
+        async def _on_request_done(session, context, params):
+            _host_counters.requests_in_flight -= 1
+
+        async def _on_connection_create_end(session, context, params):
+            _host_counters.connections_created += 1
+
+        async def _on_connection_reuseconn(session, context, params):
+            _host_counters.connections_reused += 1
+
+        _trace_config = aiohttp.TraceConfig()
+        _trace_config.on_request_start.append(_on_request_start)
+        _trace_config.on_request_end.append(_on_request_done)
+        _trace_config.on_request_exception.append(_on_request_done)
+        _trace_config.on_connection_create_end.append(_on_connection_create_end)
+        _trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+        return _trace_config
+
+
+async def _close_sessions(sessions: dict[str, aiohttp.ClientSession]) -> None:
+    for _session in list(sessions.values()):
+        if not _session.closed:
+            await _session.close()
+
+
+_POOL_MANAGER = ConnectionPoolManager()
+
+
+async def get_pooled_client_session(url: str) -> aiohttp.ClientSession:
+    """return a reusable aiohttp client session for the host of the given url"""
+    return await _POOL_MANAGER.get_session(url)
+
+
+async def close_all_client_sessions() -> None:
+    """close all pooled client sessions on the running event loop (e.g. on shutdown)"""
+    await _POOL_MANAGER.close_loop_sessions()
+
+
+def get_pool_stats() -> dict[str, PoolStats]:
+    """occupancy and reuse counters for each external host's connection pool"""
+    return _POOL_MANAGER.stats()
+
+
+async def get_singleton_client_session() -> aiohttp.ClientSession:
+    """return a reusable aiohttp client session (not tied to any external host)"""
+    return await _POOL_MANAGER.get_session(_DEFAULT_POOL_KEY)
 
 
 async def close_singleton_client_session() -> None:
-    """close the reusable aiohttp client session (thread-local singleton)"""
-    if session := await has_current_session():
-        await session.close()
+    """close reusable aiohttp client sessions on the running event loop"""
+    await _POOL_MANAGER.close_loop_sessions()
 
 
 get_singleton_client_session__blocking = async_to_sync(get_singleton_client_session)
-"""return a reusable aiohttp client session (thread-local singleton)
+"""return a reusable aiohttp client session (not tied to any external host)
 
 (same as `get_singleton_client_session`, for use in non-async context)
 """
 
 close_singleton_client_session__blocking = async_to_sync(close_singleton_client_session)
-"""close the reusable aiohttp client session (thread-local singleton)
+"""close reusable aiohttp client sessions on the running event loop
 
 (same as `close_singleton_client_session`, for use in non-async context)
 """
@@ -0,0 +1,213 @@
+"""circuit breakers for external service hosts, shared by all gravyvalet processes
+
+each (external service, api host) pair gets a circuit, kept in redis:
+- "closed" (normal): requests go thru, counting failures (connection errors,
+  timeouts, 5xx responses) in a fixed time window; when the failure rate in a
+  window reaches the threshold, the circuit opens
+- "open": requests fail fast with `ExternalServiceUnavailable`, without waiting
+  on a host that's probably down
+- "half_open": once open long enough, one request (across all processes) is let
+  thru as a probe -- success closes the circuit, failure opens it again
+
+see https://martinfowler.com/bliki/CircuitBreaker.html
+"""
+
+import dataclasses
+import hashlib
+import logging
+import time
+from http import HTTPStatus
+
+import redis
+from django.conf import settings
+
+from addon_service.common import exceptions
+from addon_service.common.redis_client import get_async_redis
+
+
+__all__ = (
+    "CircuitBreaker",
+    "CircuitState",
+)
+
+_logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "gv:circuit"
+
+# a circuit with no traffic for this long is forgotten
+_CIRCUIT_TTL_SECONDS = 60 * 60 * 24
+
+# responses that count as the host failing
+_FAILURE_STATUSES = frozenset(
+    (
+        HTTPStatus.INTERNAL_SERVER_ERROR,
+        HTTPStatus.BAD_GATEWAY,
+        HTTPStatus.SERVICE_UNAVAILABLE,
+        HTTPStatus.GATEWAY_TIMEOUT,
+    )
+)
+
+# whether a request may be sent: returns "closed", "probe", or (if the circuit
+# is open) seconds until a probe may be sent
+# KEYS: circuit key; ARGV: now, open seconds, ttl
+_ALLOW_REQUEST_LUA = """
+local _circuit = redis.call('HMGET', KEYS[1], 'state', 'opened_at', 'probe_until')
+if not _circuit[1] or _circuit[1] == 'closed' then
+    return 'closed'
+end
+local _now = tonumber(ARGV[1])
+local _wait_until = math.max(
+    tonumber(_circuit[2]) + tonumber(ARGV[2]),
+    tonumber(_circuit[3]) or 0
+)
+if _now < _wait_until then
+    return tostring(_wait_until - _now)
+end
+-- one probe at a time; if it never reports back, another may try after a while
+redis.call('HSET', KEYS[1], 'state', 'half_open', 'probe_until', _now + tonumber(ARGV[2]))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 'probe'
+"""
+
+# count a request's success or failure; returns the circuit's state after
+# (or "opened", if this result opened it)
+# KEYS: circuit key; ARGV: now, success (1 or 0), is probe (1 or 0),
+#   window seconds, min requests, failure rate, ttl
+_RECORD_RESULT_LUA = """
+local _now = tonumber(ARGV[1])
+local _success = (ARGV[2] == '1')
+local _state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if _state ~= 'closed' then
+    if ARGV[3] ~= '1' then
+        return _state  -- (a request sent before the circuit opened)
+    end
+    if _success then
+        redis.call('DEL', KEYS[1])
+        return 'closed'
+    end
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', _now, 'probe_until', 0)
+    redis.call('EXPIRE', KEYS[1], ARGV[7])
+    return 'opened'
+end
+local _window = redis.call('HMGET', KEYS[1], 'window_start', 'requests', 'failures')
+local _window_start = tonumber(_window[1]) or _now
+local _requests = tonumber(_window[2]) or 0
+local _failures = tonumber(_window[3]) or 0
+if _now - _window_start > tonumber(ARGV[4]) then
+    _window_start, _requests, _failures = _now, 0, 0
+end
+_requests = _requests + 1
+if not _success then
+    _failures = _failures + 1
+end
+if _requests >= tonumber(ARGV[5]) and _failures >= _requests * tonumber(ARGV[6]) then
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], 'state', 'open', 'opened_at', _now)
+    redis.call('EXPIRE', KEYS[1], ARGV[7])
+    return 'opened'
+end
+redis.call('HSET', KEYS[1], 'window_start', _window_start, 'requests', _requests, 'failures', _failures)
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+return 'closed'
+"""
+
+
+@dataclasses.dataclass
+class CircuitState:
+    """a point-in-time view of one circuit (timestamps in seconds since epoch)"""
+
+    state: str
+    opened_at: float | None
+    window_start: float | None
+    requests: int
+    failures: int
+
+    @classmethod
+    def from_redis_hash(cls, redis_hash: dict) -> "CircuitState":
+        def _field(name: str, parse=float):
+            _value = redis_hash.get(name.encode())
+            return None if _value is None else parse(_value)
+
+        return cls(
+            state=_field("state", parse=bytes.decode) or "closed",
+            opened_at=_field("opened_at"),
+            window_start=_field("window_start"),
+            requests=_field("requests", parse=int) or 0,
+            failures=_field("failures", parse=int) or 0,
+        )
+
+
+class CircuitBreaker:
+    """the shared circuit for requests to one external service's api host"""
+
+    def __init__(self, external_service_pk, api_host: str):
+        self._external_service_pk = str(external_service_pk)
+        self._api_host = api_host
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.GRAVYVALET_CIRCUIT_BREAKER_ENABLED
+
+    @staticmethod
+    def is_failure_status(http_status: int) -> bool:
+        return http_status in _FAILURE_STATUSES
+
+    @property
+    def circuit_key(self) -> str:
+        _host_digest = hashlib.sha256(self._api_host.encode()).hexdigest()[:16]
+        return f"{_KEY_PREFIX}:{self._external_service_pk}:{_host_digest}"
+
+    async def allow_request(self) -> bool:
+        """raise `ExternalServiceUnavailable` if the circuit is open
+
+        returns whether the request is a probe (whose result must be recorded)
+        """
+        try:
+            _allowed = (
+                await get_async_redis().eval(
+                    _ALLOW_REQUEST_LUA,
+                    1,
+                    self.circuit_key,
+                    time.time(),
+                    settings.GRAVYVALET_CIRCUIT_BREAKER_OPEN_SECONDS,
+                    _CIRCUIT_TTL_SECONDS,
+                )
+            ).decode()
+        except redis.RedisError:  # a redis outage should not stop all requests
+            _logger.exception("circuit breaker unavailable")
+            return False
+        if _allowed == "closed":
+            return False
+        if _allowed == "probe":
+            _logger.info(f"probing {self._api_host} (circuit half-open)")
+            return True
+        raise exceptions.ExternalServiceUnavailable(
+            self._api_host, retry_after=float(_allowed)
+        )
+
+    async def record_result(self, *, success: bool, is_probe: bool) -> None:
+        try:
+            _state = (
+                await get_async_redis().eval(
+                    _RECORD_RESULT_LUA,
+                    1,
+                    self.circuit_key,
+                    time.time(),
+                    int(success),
+                    int(is_probe),
+                    settings.GRAVYVALET_CIRCUIT_BREAKER_WINDOW_SECONDS,
+                    settings.GRAVYVALET_CIRCUIT_BREAKER_MIN_REQUESTS,
+                    settings.GRAVYVALET_CIRCUIT_BREAKER_FAILURE_RATE,
+                    _CIRCUIT_TTL_SECONDS,
+                )
+            ).decode()
+        except redis.RedisError:
+            _logger.exception("circuit breaker unavailable")
+            return
+        if _state == "opened":
+            _logger.warning(f"circuit opened for {self._api_host}")
+
+    async def get_state(self) -> CircuitState:
+        return CircuitState.from_redis_hash(
+            await get_async_redis().hgetall(self.circuit_key)
+        )
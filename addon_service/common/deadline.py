@@ -0,0 +1,75 @@
+"""time budgets for operations, shared by every upstream request made within
+
+`time_budget` sets a deadline for the code it encloses -- including any tasks
+started within (e.g. by `asyncio.gather`), which inherit the current context --
+and cancels that code once time runs out, raising `OperationTimedOut`
+
+`GravyvaletHttpRequestor` gives each request only the time remaining
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import dataclasses
+
+from addon_service.common import exceptions
+
+
+__all__ = (
+    "remaining_seconds",
+    "time_budget",
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class _Deadline:
+    time_budget_seconds: float
+    expires_at: float  # in event-loop time
+
+
+_CURRENT_DEADLINE: contextvars.ContextVar[_Deadline | None] = contextvars.ContextVar(
+    "gravyvalet_deadline", default=None
+)
+
+
+@contextlib.asynccontextmanager
+async def time_budget(seconds: float | None):
+    """run the enclosed code within the given time budget (no limit if None)
+
+    a budget nested within another may not outlast the outer one
+    """
+    if not seconds:
+        yield
+        return
+    _loop = asyncio.get_running_loop()
+    _deadline = _Deadline(
+        time_budget_seconds=seconds,
+        expires_at=_loop.time() + seconds,
+    )
+    _enclosing = _CURRENT_DEADLINE.get()
+    if _enclosing is not None and _enclosing.expires_at < _deadline.expires_at:
+        _deadline = _enclosing
+    _token = _CURRENT_DEADLINE.set(_deadline)
+    try:
+        async with asyncio.timeout_at(_deadline.expires_at) as _timeout:
+            yield
+    except TimeoutError:
+        if _timeout.expired() or _loop.time() >= _deadline.expires_at:
+            raise exceptions.OperationTimedOut(_deadline.time_budget_seconds) from None
+        raise  # (some other timeout)
+    finally:
+        _CURRENT_DEADLINE.reset(_token)
+
+
+def remaining_seconds() -> float | None:
+    """seconds left in the current time budget (None if no budget)
+
+    raises `OperationTimedOut` if no time remains
+    """
+    _deadline = _CURRENT_DEADLINE.get()
+    if _deadline is None:
+        return None
+    _remaining = _deadline.expires_at - asyncio.get_running_loop().time()
+    if _remaining <= 0:
+        raise exceptions.OperationTimedOut(_deadline.time_budget_seconds)
+    return _remaining
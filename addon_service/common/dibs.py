@@ -11,11 +11,13 @@ _logger = logging.getLogger()
 
 
 @contextlib.contextmanager
-def dibs(model_instance, *, refresh=True):
+def dibs(model_instance, *, refresh=True, **row_lookups):
     """context manager that locks the database row for a given model instance
 
     a dibs'd block cannot be running twice for the same model instance at the same time
 
+    any `row_lookups` (e.g. a partition key) narrow down the search for the row
+
     ---
     "dibs" (noun): The right to use or enjoy something exclusively or before anyone else.
     https://en.wiktionary.org/wiki/dibs
@@ -23,7 +25,7 @@ def dibs(model_instance, *, refresh=True):
     with transaction.atomic():
         _locked_obj = (
             model_instance.__class__.objects.select_for_update()
-            .filter(pk=model_instance.pk)
+            .filter(pk=model_instance.pk, **row_lookups)
             .first()
         )
         if _locked_obj is None:
@@ -12,3 +12,32 @@ class ItemNotFound(AddonServiceException):
 
 class UnexpectedAddonError(AddonServiceException):
     pass
+
+
+class ProviderRateLimited(AddonServiceException):
+    """an external service rate limit won't allow another request for a while"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited; may retry after {retry_after:.1f} seconds")
+        self.retry_after = retry_after
+
+
+class ExternalServiceUnavailable(AddonServiceException):
+    """an external service host is failing, so requests to it fail fast for a while"""
+
+    def __init__(self, api_host: str, retry_after: float):
+        super().__init__(
+            f"{api_host} is unavailable; may retry after {retry_after:.1f} seconds"
+        )
+        self.api_host = api_host
+        self.retry_after = retry_after
+
+
+class OperationTimedOut(AddonServiceException):
+    """an operation ran out of its time budget (and was cancelled)"""
+
+    def __init__(self, time_budget_seconds: float):
+        super().__init__(
+            f"operation exceeded its time budget of {time_budget_seconds:.1f} seconds"
+        )
+        self.time_budget_seconds = time_budget_seconds
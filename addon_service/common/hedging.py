@@ -0,0 +1,111 @@
+"""hedged requests: when a safe request is slow to answer, send it again and take
+whichever response comes first
+
+most responses from a provider arrive in about the same time, but a few take
+much longer (a slow backend replica, a dropped packet) -- rather than wait out
+the slowest, send a second attempt once the first has taken longer than most
+to answer (a percentile of recent latencies until response headers, learned per
+api host) and cancel the loser -- an attempt cancelled before its answer still
+counts, as at least as long as it ran, so slow attempts aren't left out
+
+only for opted-in api hosts, and only safe requests without a body (GET, HEAD,
+PROPFIND with "Depth" 0 or 1); hedged responses are read into memory
+
+hedges add load, so all hedges in a process share a budget: each hedgeable
+request adds a fraction (`GRAVYVALET_HEDGING_BUDGET_RATIO`) of a hedge to the
+budget, and each hedge spends one whole hedge
+"""
+
+import collections
+import math
+import threading
+from http import HTTPMethod
+
+from django.conf import settings
+
+from addon_toolkit.constrained_network.http import HttpRequestInfo
+
+
+__all__ = ("RequestHedger",)
+
+
+# recent latencies kept per api host
+_LATENCY_WINDOW = 200
+
+# don't hedge until a host has this many recent latencies
+_MIN_LATENCY_SAMPLES = 20
+
+# most unspent hedges the budget may save up
+_MAX_HEDGE_BUDGET = 10.0
+
+_HEDGEABLE_METHODS = frozenset((HTTPMethod.GET, HTTPMethod.HEAD))
+_HEDGEABLE_PROPFIND_DEPTHS = frozenset(("0", "1"))
+
+_LATENCIES_BY_HOST: dict[str, collections.deque[float]] = {}
+_LATENCIES_LOCK = threading.Lock()
+
+_hedge_budget = 0.0
+_HEDGE_BUDGET_LOCK = threading.Lock()
+
+
+class RequestHedger:
+    """learned hedging delay (and shared budget) for requests to one api host"""
+
+    def __init__(self, api_host: str):
+        self._api_host = api_host
+
+    @staticmethod
+    def is_enabled_for(api_host: str) -> bool:
+        return api_host in settings.GRAVYVALET_HEDGING_HOSTS
+
+    @staticmethod
+    def accepts_request(request: HttpRequestInfo) -> bool:
+        if request.json is not None or request.content is not None:
+            return False
+        if request.http_method in _HEDGEABLE_METHODS:
+            return True
+        return (
+            request.http_method == "PROPFIND"
+            and request.headers.get("Depth") in _HEDGEABLE_PROPFIND_DEPTHS
+        )
+
+    def hedge_delay(self) -> float | None:
+        """seconds to wait for a response before hedging (None if not yet learned)
+
+        also adds to the shared hedge budget, so call once per hedgeable request
+        """
+        _add_to_budget(settings.GRAVYVALET_HEDGING_BUDGET_RATIO)
+        with _LATENCIES_LOCK:
+            _latencies = sorted(_LATENCIES_BY_HOST.get(self._api_host, ()))
+        if len(_latencies) < _MIN_LATENCY_SAMPLES:
+            return None
+        _index = math.ceil(
+            len(_latencies) * settings.GRAVYVALET_HEDGING_PERCENTILE / 100
+        )
+        return _latencies[min(_index, len(_latencies)) - 1]
+
+    def record_latency(self, seconds: float) -> None:
+        """record seconds until a response's headers arrived"""
+        with _LATENCIES_LOCK:
+            _latencies = _LATENCIES_BY_HOST.get(self._api_host)
+            if _latencies is None:
+                _latencies = _LATENCIES_BY_HOST[self._api_host] = collections.deque(
+                    maxlen=_LATENCY_WINDOW
+                )
+            _latencies.append(seconds)
+
+    @staticmethod
+    def spend_hedge() -> bool:
+        """take one hedge from the shared budget, if there's one to take"""
+        global _hedge_budget
+        with _HEDGE_BUDGET_LOCK:
+            if _hedge_budget < 1:
+                return False
+            _hedge_budget -= 1
+            return True
+
+
+def _add_to_budget(amount: float) -> None:
+    global _hedge_budget
+    with _HEDGE_BUDGET_LOCK:
+        _hedge_budget = min(_hedge_budget + amount, _MAX_HEDGE_BUDGET)
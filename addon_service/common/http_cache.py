@@ -0,0 +1,170 @@
+"""per-account cache of provider responses, revalidated with http conditional requests
+
+a cached response is never served without asking the provider first -- instead,
+the next identical GET replays the stored `ETag`/`Last-Modified` validators as
+`If-None-Match`/`If-Modified-Since`, and a `304 Not Modified` reply lets us serve
+the stored body (many providers, github among them, don't count 304s against
+rate limits)
+
+see https://www.rfc-editor.org/rfc/rfc9111 and https://www.rfc-editor.org/rfc/rfc9110#section-13
+"""
+
+import dataclasses
+import hashlib
+import json
+import logging
+import threading
+from collections import Counter
+from collections.abc import Mapping
+from http import (
+    HTTPMethod,
+    HTTPStatus,
+)
+
+from django.conf import settings
+from django.core.cache import cache
+
+from addon_toolkit.constrained_network.http import HttpRequestInfo
+from addon_toolkit.iri_utils import Multidict
+
+
+__all__ = (
+    "CachedResponse",
+    "ProviderResponseCache",
+    "get_response_cache_stats",
+    "request_digest",
+)
+
+_logger = logging.getLogger(__name__)
+
+_CACHE_KEY_PREFIX = "gv:provider-response"
+
+# request headers that make a request conditional already -- leave those alone
+_CONDITIONAL_REQUEST_HEADERS = frozenset(
+    ("if-none-match", "if-modified-since", "if-match", "if-unmodified-since")
+)
+
+_STATS: Counter[str] = Counter()
+_STATS_LOCK = threading.Lock()
+
+
+def get_response_cache_stats() -> dict[str, int]:
+    """counts of cache "hit", "miss", "revalidate" and "store" events in this process"""
+    with _STATS_LOCK:
+        return {
+            _event: _STATS[_event] for _event in ("hit", "miss", "revalidate", "store")
+        }
+
+
+def _count(event: str) -> None:
+    with _STATS_LOCK:
+        _STATS[event] += 1
+
+
+@dataclasses.dataclass
+class CachedResponse:
+    http_status: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+    @property
+    def etag(self) -> str | None:
+        return Multidict(self.headers).get("ETag")
+
+    @property
+    def last_modified(self) -> str | None:
+        return Multidict(self.headers).get("Last-Modified")
+
+    def conditional_headers(self) -> list[tuple[str, str]]:
+        _headers = []
+        if _etag := self.etag:
+            _headers.append(("If-None-Match", _etag))
+        if _last_modified := self.last_modified:
+            _headers.append(("If-Modified-Since", _last_modified))
+        return _headers
+
+
+class ProviderResponseCache:
+    """GET responses from external services, kept in the django cache for one account"""
+
+    def __init__(self, account_pk: str):
+        self._account_pk = account_pk
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.GRAVYVALET_PROVIDER_RESPONSE_CACHE_ENABLED
+
+    @staticmethod
+    def accepts_request(request: HttpRequestInfo) -> bool:
+        return request.http_method == HTTPMethod.GET and not any(
+            _key.lower() in _CONDITIONAL_REQUEST_HEADERS
+            for _key in request.headers.keys()
+        )
+
+    @staticmethod
+    def accepts_response(
+        http_status: int, headers: Mapping[str, str], content_length: int | None
+    ) -> bool:
+        """whether a response (with body of the given length, if known) may be stored"""
+        if http_status != HTTPStatus.OK:
+            return False
+        if not (headers.get("ETag") or headers.get("Last-Modified")):
+            return False  # nothing to revalidate with
+        if "no-store" in headers.get("Cache-Control", "").lower():
+            return False
+        return (content_length is None) or (
+            content_length <= settings.GRAVYVALET_PROVIDER_RESPONSE_CACHE_MAX_BYTES
+        )
+
+    def cache_key(self, full_url: str, request: HttpRequestInfo) -> str:
+        _digest = request_digest(full_url, request)
+        return f"{_CACHE_KEY_PREFIX}:{self._account_pk}:{_digest}"
+
+    async def lookup(self, cache_key: str) -> CachedResponse | None:
+        try:
+            _cached = await cache.aget(cache_key)
+        except Exception:  # a cache outage should not break provider requests
+            _logger.exception("provider response cache lookup failed")
+            _cached = None
+        _count("revalidate" if _cached else "miss")
+        return _cached
+
+    async def store(self, cache_key: str, cached_response: CachedResponse) -> None:
+        _max_bytes = settings.GRAVYVALET_PROVIDER_RESPONSE_CACHE_MAX_BYTES
+        if len(cached_response.body) > _max_bytes:
+            return  # (may happen without a content-length header)
+        try:
+            await cache.aset(
+                cache_key,
+                cached_response,
+                timeout=settings.GRAVYVALET_PROVIDER_RESPONSE_CACHE_TTL_SECONDS,
+            )
+        except Exception:
+            _logger.exception("provider response cache store failed")
+        else:
+            _count("store")
+
+    def record_hit(self) -> None:
+        _count("hit")
+
+
+def request_digest(full_url: str, request: HttpRequestInfo) -> str:
+    """hash of what identifies a GET request: url, query params and headers"""
+    _request_identity = json.dumps(
+        [
+            full_url,
+            sorted(_query_pairs(request.query)),
+            sorted((_k.lower(), _v) for _k, _v in request.headers.items()),
+        ]
+    )
+    return hashlib.sha256(_request_identity.encode()).hexdigest()
+
+
+def _query_pairs(query) -> list[tuple[str, str]]:
+    match query:
+        case None:
+            return []
+        case Mapping() | Multidict():
+            return [(str(_k), str(_v)) for _k, _v in query.items()]
+        case _:
+            return [(str(_k), str(_v)) for _k, _v in query]
@@ -0,0 +1,113 @@
+"""values (http sessions, redis clients...) kept per event loop, closed with their loop
+
+aiohttp sessions and async redis clients belong to the event loop that opened
+them, and each keeps a reference to that loop -- so they can't be kept in a
+`weakref.WeakKeyDictionary` keyed by loop (the value would keep its key alive)
+
+instead, alongside each loop's value, a task waits on that loop for it to shut
+down: `asyncio.run` (as used by `async_to_sync` outside a running loop, e.g. in
+celery tasks and management commands) cancels every task left before closing
+the loop, at which point the value is closed and forgotten -- while under daphne
+the one main loop keeps its values for the life of the process (closed by
+`aclose` as daphne shuts down; see `app.asgi`)
+"""
+
+import asyncio
+import logging
+import threading
+from collections.abc import (
+    Awaitable,
+    Callable,
+)
+from typing import (
+    Generic,
+    TypeVar,
+)
+
+
+__all__ = ("LoopScoped",)
+
+_logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+
+class LoopScoped(Generic[_T]):
+    """one value per running event loop, made when first needed and closed when
+    that loop shuts down (or `aclose` is awaited on it)
+
+    >>> import asyncio
+    >>> _closed = []
+    >>> _per_loop = LoopScoped(list, aclose=lambda _value: _closed.append(_value) or asyncio.sleep(0))
+    >>> async def _use():
+    ...     _per_loop.get().append('hello')
+    ...     return len(_per_loop)
+    >>> asyncio.run(_use())
+    1
+    >>> _closed, len(_per_loop)
+    ([['hello']], 0)
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], _T],
+        *,
+        aclose: Callable[[_T], Awaitable[None]],
+    ):
+        self._factory = factory
+        self._aclose = aclose
+        self._values: dict[asyncio.AbstractEventLoop, _T] = {}
+        self._shutdown_watchers: dict[asyncio.AbstractEventLoop, asyncio.Task] = {}
+        self._lock = threading.Lock()  # (shared by loops in different threads)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._values)
+
+    def get(self) -> _T:
+        """the running event loop's value (made now, if need be)"""
+        _loop = asyncio.get_running_loop()
+        with self._lock:
+            self._forget_closed_loops()
+            try:
+                return self._values[_loop]
+            except KeyError:
+                _value = self._values[_loop] = self._factory()
+                self._shutdown_watchers[_loop] = _loop.create_task(
+                    self._close_on_shutdown(_loop)
+                )
+                return _value
+
+    def values(self) -> list[_T]:
+        """every loop's value (as of now)"""
+        with self._lock:
+            return list(self._values.values())
+
+    async def aclose(self) -> None:
+        """close the running event loop's value, if any"""
+        await self._close(asyncio.get_running_loop())
+
+    async def _close_on_shutdown(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            await loop.create_future()  # (never done; cancelled on shutdown)
+        finally:
+            await self._close(loop)
+
+    async def _close(self, loop: asyncio.AbstractEventLoop) -> None:
+        with self._lock:
+            _value = self._values.pop(loop, None)
+            _watcher = self._shutdown_watchers.pop(loop, None)
+        if _watcher is not None and _watcher is not asyncio.current_task():
+            _watcher.cancel()
+        if _value is not None:
+            try:
+                await self._aclose(_value)
+            except Exception:
+                _logger.exception("could not close %r", _value)
+
+    def _forget_closed_loops(self) -> None:
+        # loops closed without cancelling their tasks (so no chance to close
+        # their values) -- at least let them be collected
+        for _loop in [_loop for _loop in self._values if _loop.is_closed()]:
+            del self._values[_loop]
+            del self._shutdown_watchers[_loop]
@@ -0,0 +1,321 @@
+"""metrics for requests to external services (and osf), in prometheus text format
+
+each request is counted by provider (api host), endpoint template, status class
+(e.g. "2xx", or "error" if no response) and retry count:
+- `gravyvalet_upstream_request_duration_seconds` (histogram): time until the
+  response status and headers arrived
+- `gravyvalet_upstream_request_bytes_total`, `gravyvalet_upstream_response_bytes_total`
+  (counters): payload sizes (of responses with a content-length)
+
+each process counts in memory and adds its counts into a redis hash every
+`GRAVYVALET_METRICS_FLUSH_SECONDS`; the scrape endpoint (`/v1/metrics/`) renders
+totals across all processes, so any one gravyvalet instance may be scraped
+"""
+
+import asyncio
+import dataclasses
+import ipaddress
+import json
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import redis
+from django.conf import settings
+from django.http import HttpRequest
+
+from addon_service.common import exceptions
+from addon_service.common import hmac as hmac_utils
+from addon_service.common.redis_client import get_redis
+
+
+__all__ = (
+    "endpoint_template",
+    "is_scrape_allowed",
+    "metrics_recorder",
+    "render_metrics",
+    "UpstreamRequestTimer",
+)
+
+_logger = logging.getLogger(__name__)
+
+_REDIS_KEY = "gv:metrics"
+
+_DURATION_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf"))
+
+# keep at most this many path segments in endpoint templates
+_MAX_ENDPOINT_SEGMENTS = 4
+
+# path segments that look like identifiers (with a digit, other than versions
+# like "v2"; or long; or percent-encoded)
+_VARIABLE_SEGMENT_REGEX = re.compile(r"(?!v\d+$).*\d|.{25,}|.*%")
+
+
+@dataclasses.dataclass(frozen=True)
+class _Metric:
+    name: str
+    kind: str  # "histogram" or "counter"
+    description: str
+
+
+UPSTREAM_DURATION = _Metric(
+    "gravyvalet_upstream_request_duration_seconds",
+    "histogram",
+    "time until response headers from an external service",
+)
+UPSTREAM_REQUEST_BYTES = _Metric(
+    "gravyvalet_upstream_request_bytes_total",
+    "counter",
+    "bytes sent in request bodies to external services",
+)
+UPSTREAM_RESPONSE_BYTES = _Metric(
+    "gravyvalet_upstream_response_bytes_total",
+    "counter",
+    "bytes received in response bodies from external services",
+)
+_METRICS_BY_NAME = {
+    _metric.name: _metric
+    for _metric in (UPSTREAM_DURATION, UPSTREAM_REQUEST_BYTES, UPSTREAM_RESPONSE_BYTES)
+}
+
+
+def endpoint_template(url: str) -> str:
+    """the path of a url, with likely identifiers replaced (to limit label values)
+
+    >>> endpoint_template('https://api.example/v2/files/12345/children?page=2')
+    '/v2/files/{id}/children'
+    >>> endpoint_template('/api/datasets/:persistentId/versions')
+    '/api/datasets/:persistentId/versions'
+    >>> endpoint_template('/remote.php/dav/files/a/b/c/d')
+    '/remote.php/dav/files/a/...'
+    """
+    _segments = [
+        "{id}" if _VARIABLE_SEGMENT_REGEX.match(_segment) else _segment
+        for _segment in urlsplit(url).path.strip("/").split("/")
+    ]
+    if len(_segments) > _MAX_ENDPOINT_SEGMENTS:
+        _segments = [*_segments[:_MAX_ENDPOINT_SEGMENTS], "..."]
+    return "/" + "/".join(_segments)
+
+
+def status_class(http_status: int | None) -> str:
+    """
+    >>> status_class(204)
+    '2xx'
+    >>> status_class(None)
+    'error'
+    """
+    return "error" if http_status is None else f"{http_status // 100}xx"
+
+
+class MetricsRecorder:
+    """counts in this process, added into redis every so often"""
+
+    def __init__(self):
+        self._pending: defaultdict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.GRAVYVALET_METRICS_ENABLED
+
+    def observe(self, metric: _Metric, value: float, **labels: str) -> None:
+        """add an observation to a histogram"""
+        _label_items = tuple(labels.items())
+        with self._lock:
+            for _bucket in _DURATION_BUCKETS:
+                if value <= _bucket:
+                    _le = "+Inf" if _bucket == float("inf") else str(_bucket)
+                    _bucket_labels = (*_label_items, ("le", _le))
+                    self._pending[_field(f"{metric.name}_bucket", _bucket_labels)] += 1
+            self._pending[_field(f"{metric.name}_sum", _label_items)] += value
+            self._pending[_field(f"{metric.name}_count", _label_items)] += 1
+        self._maybe_flush()
+
+    def increment(self, metric: _Metric, amount: float, **labels: str) -> None:
+        """add to a counter"""
+        with self._lock:
+            self._pending[_field(metric.name, tuple(labels.items()))] += amount
+        self._maybe_flush()
+
+    def flush(self) -> None:
+        """add counts from this process into redis"""
+        with self._lock:
+            _pending, self._pending = self._pending, defaultdict(float)
+            self._last_flush = time.monotonic()
+        if _pending:
+            _write_to_redis(_pending)
+
+    def _maybe_flush(self) -> None:
+        if (
+            time.monotonic() - self._last_flush
+            < settings.GRAVYVALET_METRICS_FLUSH_SECONDS
+        ):
+            return
+        try:
+            _loop = asyncio.get_running_loop()
+        except RuntimeError:  # no event loop; flush right here
+            self.flush()
+        else:  # don't block the event loop on redis
+            _loop.run_in_executor(None, self.flush)
+
+
+metrics_recorder = MetricsRecorder()
+
+
+class UpstreamRequestTimer:
+    """context manager to time a request to an external service
+
+    call `responded` once the response status and headers arrive; if the block
+    raises before that, the request is counted as an "error" (unless it was never
+    sent, e.g. stopped by a rate limit or circuit breaker)
+    """
+
+    def __init__(
+        self,
+        url: str,
+        *,
+        endpoint: str | None = None,  # (default: `endpoint_template(url)`)
+        retries: int = 0,
+        request_bytes: int = 0,
+    ):
+        self._labels = {
+            "provider": urlsplit(url).hostname or "",
+            "endpoint": endpoint or endpoint_template(url),
+        }
+        self._retries = retries
+        self._request_bytes = request_bytes
+        self._started = None
+        self._responded = False
+
+    def __enter__(self) -> "UpstreamRequestTimer":
+        self._started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if (
+            exc_type is not None
+            and not self._responded
+            and not issubclass(exc_type, exceptions.AddonServiceException)
+        ):
+            self._record(http_status=None, response_bytes=None)
+
+    def responded(self, http_status: int, content_length: int | None) -> None:
+        if not self._responded:
+            self._responded = True
+            self._record(http_status, content_length)
+
+    def _record(self, http_status: int | None, response_bytes: int | None) -> None:
+        if not metrics_recorder.is_enabled():
+            return
+        metrics_recorder.observe(
+            UPSTREAM_DURATION,
+            time.monotonic() - self._started,
+            **self._labels,
+            status_class=status_class(http_status),
+            retries=str(self._retries),
+        )
+        if self._request_bytes:
+            metrics_recorder.increment(
+                UPSTREAM_REQUEST_BYTES, self._request_bytes, **self._labels
+            )
+        if response_bytes:
+            metrics_recorder.increment(
+                UPSTREAM_RESPONSE_BYTES, response_bytes, **self._labels
+            )
+
+
+def render_metrics() -> str:
+    """all processes' metrics (as of their last flush), in prometheus text format
+
+    see https://prometheus.io/docs/instrumenting/exposition_formats/
+    """
+    _samples_by_metric = defaultdict(list)
+    for _field_bytes, _value in get_redis().hgetall(_REDIS_KEY).items():
+        _sample_name, _label_items = json.loads(_field_bytes)
+        _metric = _METRICS_BY_NAME.get(_sample_name) or _METRICS_BY_NAME.get(
+            _sample_name.rpartition("_")[0]
+        )
+        if _metric is not None:
+            _samples_by_metric[_metric].append(
+                (_sample_name, _label_items, float(_value))
+            )
+    _lines = []
+    for _metric, _samples in sorted(
+        _samples_by_metric.items(), key=lambda _item: _item[0].name
+    ):
+        _lines.append(f"# HELP {_metric.name} {_metric.description}")
+        _lines.append(f"# TYPE {_metric.name} {_metric.kind}")
+        for _sample_name, _label_items, _value in sorted(_samples, key=_sample_order):
+            _lines.append(f"{_sample_name}{_render_labels(_label_items)} {_value:g}")
+    return "\n".join(_lines) + "\n"
+
+
+def is_scrape_allowed(request: HttpRequest) -> bool:
+    """whether the request comes from an allowed address or is hmac-signed"""
+    try:
+        _address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        pass
+    else:
+        if any(
+            _address in ipaddress.ip_network(_allowed, strict=False)
+            for _allowed in settings.GRAVYVALET_METRICS_ALLOWED_IPS
+        ):
+            return True
+    if settings.GRAVYVALET_METRICS_HMAC_KEY:
+        try:
+            hmac_utils.validate_signed_request(
+                request,
+                settings.GRAVYVALET_METRICS_HMAC_KEY,
+                settings.OSF_HMAC_EXPIRATION_SECONDS,
+            )
+        except (hmac_utils.NotUsingHmac, hmac_utils.RejectedHmac):
+            return False
+        return True
+    return False
+
+
+###
+# module-private helpers
+
+
+def _field(sample_name: str, label_items: tuple[tuple[str, str], ...]) -> str:
+    return json.dumps([sample_name, label_items])
+
+
+def _write_to_redis(pending: dict[str, float]) -> None:
+    try:
+        with get_redis().pipeline(transaction=False) as _pipeline:
+            for _field_name, _amount in pending.items():
+                _pipeline.hincrbyfloat(_REDIS_KEY, _field_name, _amount)
+            _pipeline.execute()
+    except redis.RedisError:  # metrics are not worth failing requests over
+        _logger.exception("could not flush metrics")
+
+
+def _sample_order(sample: tuple[str, list, float]):
+    _sample_name, _label_items, _ = sample
+    _le = dict(_label_items).get("le")
+    return (
+        [_item for _item in _label_items if _item[0] != "le"],
+        _sample_name,
+        float(_le) if _le is not None else 0.0,  # (float("+Inf") works)
+    )
+
+
+def _render_labels(label_items: list) -> str:
+    if not label_items:
+        return ""
+    _rendered = ",".join(
+        f'{_name}="{_escape_label_value(_value)}"' for _name, _value in label_items
+    )
+    return f"{{{_rendered}}}"
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
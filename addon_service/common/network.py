@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import asyncio
 import contextlib
 import dataclasses
+import json
 import logging
+import time
 import typing
 import weakref
-from http import HTTPStatus
+from http import (
+    HTTPMethod,
+    HTTPStatus,
+)
 from urllib.parse import (
     urljoin,
     urlsplit,
@@ -14,8 +20,21 @@ from urllib.parse import (
 import aiohttp
 from asgiref.sync import sync_to_async
 
-from addon_service.common import exceptions
+from addon_service.common import (
+    deadline,
+    exceptions,
+    metrics,
+)
+from addon_service.common.aiohttp_session import ConnectionPoolManager
+from addon_service.common.circuit_breaker import CircuitBreaker
 from addon_service.common.credentials_formats import CredentialsFormats
+from addon_service.common.hedging import RequestHedger
+from addon_service.common.http_cache import (
+    CachedResponse,
+    ProviderResponseCache,
+)
+from addon_service.common.rate_limit import ProviderRateLimiter
+from addon_service.common.single_flight import RequestCoalescer
 from addon_toolkit.constrained_network.http import (
     HttpRequestInfo,
     HttpRequestor,
@@ -31,6 +50,19 @@ __all__ = ("GravyvaletHttpRequestor",)
 
 _logger = logging.getLogger(__name__)
 
+# requests that may be sent again after the provider throttled them
+# https://www.rfc-editor.org/rfc/rfc9110#name-idempotent-methods
+_IDEMPOTENT_METHODS = frozenset(
+    (
+        HTTPMethod.GET,
+        HTTPMethod.HEAD,
+        HTTPMethod.OPTIONS,
+        HTTPMethod.PUT,
+        HTTPMethod.DELETE,
+        "PROPFIND",
+    )
+)
+
 
 class _AiohttpResponseInfo(HttpResponseInfo):
     """an imp-friendly face for an aiohttp response (without exposing aiohttp to imps)"""
@@ -60,6 +92,49 @@ class _AiohttpResponseInfo(HttpResponseInfo):
         _response = _PrivateResponse.get(self).aiohttp_response
         return await _response.text()
 
+    async def iter_content(
+        self, chunk_size: int = 2**16
+    ) -> typing.AsyncIterator[bytes]:
+        _response = _PrivateResponse.get(self).aiohttp_response
+        async for _chunk in _response.content.iter_chunked(chunk_size):
+            yield _chunk
+
+
+class _BufferedResponseInfo(HttpResponseInfo):
+    """an imp-friendly face for a response already read into memory (e.g. from cache)"""
+
+    def __init__(self, http_status: int, headers: list[tuple[str, str]], body: bytes):
+        self._http_status = HTTPStatus(http_status)
+        self._headers = headers
+        self._body = body
+
+    @classmethod
+    def from_cached(cls, cached_response: CachedResponse) -> "_BufferedResponseInfo":
+        return cls(
+            cached_response.http_status, cached_response.headers, cached_response.body
+        )
+
+    @property
+    def http_status(self) -> HTTPStatus:
+        return self._http_status
+
+    @property
+    def headers(self) -> Multidict:
+        return Multidict(list(self._headers))
+
+    async def json_content(self) -> typing.Any:
+        return json.loads(self._body)
+
+    async def text_content(self) -> str:
+        return self._body.decode(_charset(self._headers))
+
+    async def iter_content(
+        self, chunk_size: int = 2**16
+    ) -> typing.AsyncIterator[bytes]:
+        for _start in range(0, len(self._body), chunk_size):
+            _end = _start + chunk_size
+            yield self._body[_start:_end]
+
 
 class GravyvaletHttpRequestor(HttpRequestor):
     """an `HttpRequestor` implementation using aiohttp"""
@@ -74,26 +149,173 @@ class GravyvaletHttpRequestor(HttpRequestor):
         prefix_url: str,
         account: "db.AuthorizedStorageAccount",
     ):
-        _PrivateNetworkInfo(client_session, prefix_url, account).assign(self)
+        _PrivateNetworkInfo(
+            client_session,
+            prefix_url,
+            account,
+            response_cache=(
+                ProviderResponseCache(account.pk)
+                if ProviderResponseCache.is_enabled()
+                else None
+            ),
+            rate_limiter=(
+                ProviderRateLimiter(
+                    account.external_service_id,
+                    account.pk,
+                    ConnectionPoolManager.pool_key(prefix_url),
+                )
+                if ProviderRateLimiter.is_enabled()
+                else None
+            ),
+            request_coalescer=(
+                RequestCoalescer(account.pk) if RequestCoalescer.is_enabled() else None
+            ),
+            request_hedger=(
+                RequestHedger(ConnectionPoolManager.pool_key(prefix_url))
+                if RequestHedger.is_enabled_for(
+                    ConnectionPoolManager.pool_key(prefix_url)
+                )
+                else None
+            ),
+            circuit_breaker=(
+                CircuitBreaker(
+                    account.external_service_id,
+                    ConnectionPoolManager.pool_key(prefix_url),
+                )
+                if CircuitBreaker.is_enabled()
+                else None
+            ),
+        ).assign(self)
 
     # abstract method from HttpRequestor:
     @contextlib.asynccontextmanager
     async def _do_send(self, request: HttpRequestInfo):
+        _private = _PrivateNetworkInfo.get(self)
+        _coalescer = _private.request_coalescer
+        if _coalescer is None or not _coalescer.accepts_request(request):
+            async with self._send_with_retry(request) as _response:
+                yield _response
+            return
+        _flight_key = _coalescer.flight_key(
+            _private.get_full_url(request.uri_path), request
+        )
+        async with _coalescer.flight(_flight_key) as _flight:
+            if _flight.shared_response is not None:
+                yield _BufferedResponseInfo.from_cached(_flight.shared_response)
+                return
+            async with self._send_with_retry(request) as _response:
+                if _flight.is_leader:
+                    _shared = None
+                    if (
+                        await _flight.has_followers()
+                        and _coalescer.accepts_response_size(
+                            _content_length(_response.headers)
+                        )
+                    ):
+                        _shared = await _read_into_memory(_response)
+                        _response = _BufferedResponseInfo.from_cached(_shared)
+                    await _flight.share(_shared)
+                yield _response
+
+    @contextlib.asynccontextmanager
+    async def _send_with_retry(self, request: HttpRequestInfo):
+        await _PrivateNetworkInfo.get(self).refresh_expiring_token()
         try:
-            async with self._try_send(request) as _response:
+            async with self._try_send_hedged(
+                request, retry_if_throttled=True
+            ) as _response:
                 yield _response
         except exceptions.ExpiredAccessToken:
             await _PrivateNetworkInfo.get(self).account.refresh_oauth2_access_token(
                 force=True
             )
             # if this one fails, don't try refreshing again
-            async with self._try_send(request) as _response:
+            async with self._try_send(request, retries=1) as _response:
+                yield _response
+        except _RetryThrottled:
+            # the rate limiter will wait out the provider's backoff (or fail fast)
+            async with self._try_send(request, retries=1) as _response:
                 yield _response
 
     @contextlib.asynccontextmanager
-    async def _try_send(self, request: HttpRequestInfo):
+    async def _try_send_hedged(self, request: HttpRequestInfo, **try_send_kwargs):
+        """like `_try_send`, but hedged (if enabled for this host and request)
+
+        if the first attempt is slow to answer, send a second; the first response
+        wins and the other attempt is cancelled
+        """
+        _hedger = _PrivateNetworkInfo.get(self).request_hedger
+        if _hedger is None or not _hedger.accepts_request(request):
+            async with self._try_send(request, **try_send_kwargs) as _response:
+                yield _response
+            return
+        _hedge_delay = _hedger.hedge_delay()
+        _answered = asyncio.Event()  # (set once response headers arrive)
+        _attempts = [
+            asyncio.ensure_future(
+                self._try_send_into_memory(
+                    request, _hedger, _answered, **try_send_kwargs
+                )
+            )
+        ]
+        _await_answer = asyncio.ensure_future(_answered.wait())
+        try:
+            await asyncio.wait([*_attempts, _await_answer], timeout=_hedge_delay)
+            if (
+                not (_answered.is_set() or _attempts[0].done())
+                and _hedger.spend_hedge()
+            ):
+                _logger.info(f"hedging {request.http_method} after {_hedge_delay}s")
+                _attempts.append(
+                    asyncio.ensure_future(
+                        self._try_send_into_memory(
+                            request, _hedger, _answered, **try_send_kwargs
+                        )
+                    )
+                )
+            _winner = await _first_result(_attempts)
+        finally:
+            for _future in (*_attempts, _await_answer):
+                _future.cancel()
+            await asyncio.gather(*_attempts, _await_answer, return_exceptions=True)
+        yield _BufferedResponseInfo.from_cached(_winner)
+
+    async def _try_send_into_memory(
+        self,
+        request: HttpRequestInfo,
+        hedger: RequestHedger,
+        answered: asyncio.Event,
+        **try_send_kwargs,
+    ) -> CachedResponse:
+        """send and read the response into memory, recording the latency until its
+        headers arrive (or, if cancelled before then, at least how long it ran)
+        """
+        _started = time.monotonic()
+        _headers_latency = None
+        try:
+            async with self._try_send(request, **try_send_kwargs) as _response:
+                _headers_latency = time.monotonic() - _started
+                hedger.record_latency(_headers_latency)
+                answered.set()
+                return await _read_into_memory(_response)
+        except asyncio.CancelledError:
+            if _headers_latency is None:  # (e.g. lost to a hedge)
+                hedger.record_latency(time.monotonic() - _started)
+            raise
+
+    @contextlib.asynccontextmanager
+    async def _try_send(
+        self,
+        request: HttpRequestInfo,
+        *,
+        retry_if_throttled: bool = False,
+        retries: int = 0,
+    ):
         _private = _PrivateNetworkInfo.get(self)
         _url = _private.get_full_url(request.uri_path)
+        _rate_limiter = _private.rate_limiter
+        if _rate_limiter is not None:
+            await _rate_limiter.acquire()
         _logger.info(f"sending {request.http_method} to {_url}")
 
         default_headers = await _private.get_headers()
@@ -101,9 +323,19 @@ class GravyvaletHttpRequestor(HttpRequestor):
         combined_headers = Multidict(default_headers.items())
         combined_headers.add_many(request.headers.items())
 
-        async with _private.client_session.request(
+        _cache = _private.response_cache
+        _cache_key = None
+        _cached = None
+        if _cache is not None and _cache.accepts_request(request):
+            _cache_key = _cache.cache_key(_url, request)
+            _cached = await _cache.lookup(_cache_key)
+            if _cached is not None:
+                combined_headers.add_many(_cached.conditional_headers())
+
+        async with self._send_measured(
             request.http_method,
             _url,
+            retries=retries,
             headers=combined_headers,
             params=request.query,
             json=request.json,
@@ -115,7 +347,130 @@ class GravyvaletHttpRequestor(HttpRequestor):
             ):
                 # Assume unauthorized because of token expiration.
                 raise exceptions.ExpiredAccessToken
-            yield _AiohttpResponseInfo(_response)
+            if _rate_limiter is not None:
+                _rate_limit_info = await _rate_limiter.observe(
+                    _response.status, _response.headers
+                )
+                if (
+                    retry_if_throttled
+                    and request.http_method in _IDEMPOTENT_METHODS
+                    and _rate_limit_info.is_throttled(_response.status)
+                ):
+                    raise _RetryThrottled
+            if _cache_key is None:
+                yield _AiohttpResponseInfo(_response)
+            elif _response.status == HTTPStatus.NOT_MODIFIED and _cached is not None:
+                _cache.record_hit()
+                yield _BufferedResponseInfo.from_cached(_cached)
+            elif _cache.accepts_response(
+                _response.status, _response.headers, _response.content_length
+            ):
+                _fresh = CachedResponse(
+                    http_status=_response.status,
+                    headers=[
+                        (str(_key), str(_value))
+                        for _key, _value in _response.headers.items()
+                    ],
+                    body=await _response.read(),
+                )
+                await _cache.store(_cache_key, _fresh)
+                yield _BufferedResponseInfo.from_cached(_fresh)
+            else:
+                yield _AiohttpResponseInfo(_response)
+
+    @contextlib.asynccontextmanager
+    async def _send_measured(self, http_method, url, *, retries: int, **kwargs):
+        """send thru the circuit breaker, recording metrics (if enabled)"""
+        _request_bytes = (
+            _request_size(kwargs.get("json"), kwargs.get("data"))
+            if metrics.metrics_recorder.is_enabled()
+            else 0
+        )
+        with metrics.UpstreamRequestTimer(
+            url, retries=retries, request_bytes=_request_bytes
+        ) as _timer:
+            async with self._send_thru_circuit(http_method, url, **kwargs) as _response:
+                _timer.responded(_response.status, _response.content_length)
+                yield _response
+
+    @contextlib.asynccontextmanager
+    async def _send_thru_circuit(self, *args, **kwargs):
+        """send with aiohttp, counting failures in the host's circuit breaker (if any)"""
+        _private = _PrivateNetworkInfo.get(self)
+        _remaining = deadline.remaining_seconds()
+        if _remaining is not None:  # allow only the time left in the budget
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=_remaining)
+        _circuit_breaker = _private.circuit_breaker
+        if _circuit_breaker is None:
+            async with _private.client_session.request(*args, **kwargs) as _response:
+                yield _response
+            return
+        _is_probe = await _circuit_breaker.allow_request()
+        _responded = False
+        try:
+            async with _private.client_session.request(*args, **kwargs) as _response:
+                _responded = True
+                await _circuit_breaker.record_result(
+                    success=not _circuit_breaker.is_failure_status(_response.status),
+                    is_probe=_is_probe,
+                )
+                yield _response
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if not _responded:  # (not errors while reading the response)
+                await _circuit_breaker.record_result(success=False, is_probe=_is_probe)
+            raise
+
+
+class _RetryThrottled(Exception):
+    """raised (and caught) within GravyvaletHttpRequestor._do_send"""
+
+
+async def _read_into_memory(response: HttpResponseInfo) -> CachedResponse:
+    return CachedResponse(
+        http_status=int(response.http_status),
+        headers=list(response.headers.items()),
+        body=b"".join([_chunk async for _chunk in response.iter_content()]),
+    )
+
+
+async def _first_result(attempts: list[asyncio.Future]):
+    """the result of the first attempt to succeed (if all fail, the first error)"""
+    _pending = set(attempts)
+    _first_error = None
+    while _pending:
+        _done, _pending = await asyncio.wait(
+            _pending, return_when=asyncio.FIRST_COMPLETED
+        )
+        for _attempt in _done:
+            if _attempt.exception() is None:
+                return _attempt.result()
+            _first_error = _first_error or _attempt.exception()
+    raise _first_error
+
+
+def _request_size(json_content: dict | None, content: str | None) -> int:
+    if content is not None:
+        return len(content.encode())
+    if json_content is not None:
+        return len(json.dumps(json_content).encode())
+    return 0
+
+
+def _content_length(headers: Multidict) -> int | None:
+    try:
+        return int(headers.get("Content-Length"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _charset(headers: list[tuple[str, str]]) -> str:
+    for _key, _value in headers:
+        if _key.lower() == "content-type":
+            for _param in _value.split(";")[1:]:
+                _name, _, _charset_value = _param.strip().partition("=")
+                if _name.lower() == "charset" and _charset_value:
+                    return _charset_value.strip('"')
+    return "utf-8"
 
 
 ###
@@ -166,18 +521,29 @@ class _PrivateNetworkInfo(_PrivateInfo):
     # keep network constraints away from imps
     prefix_url: str
     account: "db.AuthorizedStorageAccount"
-
-    @sync_to_async
-    def get_headers(self) -> Multidict:
-        _headers = Multidict()
-        _credentials = self.account.credentials
-        if _credentials:
-            _headers.add_many(
-                self.account.external_service.credentials_format.iter_headers(
-                    _credentials
-                )
-            )
-        return _headers
+    response_cache: ProviderResponseCache | None = None
+    rate_limiter: ProviderRateLimiter | None = None
+    request_coalescer: RequestCoalescer | None = None
+    request_hedger: RequestHedger | None = None
+    circuit_breaker: CircuitBreaker | None = None
+    checked_token_expiration: bool = False
+
+    async def refresh_expiring_token(self) -> None:
+        """refresh an oauth2 access token before it expires (checked once per requestor)"""
+        if self.checked_token_expiration:
+            return
+        self.checked_token_expiration = True
+        _credentials_format = await sync_to_async(
+            lambda: self.account.credentials_format
+        )()
+        if _credentials_format == CredentialsFormats.OAUTH2:
+            await self.account.refresh_oauth2_access_token()
+
+    async def get_headers(self) -> Multidict:
+        _auth_headers = self.account.get_cached_auth_headers()
+        if _auth_headers is None:  # may need db access and decryption
+            _auth_headers = await self.account.aget_auth_headers()
+        return Multidict(_auth_headers)
 
     def get_full_url(self, relative_url: str) -> str:
         """resolve a url relative to a given prefix
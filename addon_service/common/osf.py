@@ -10,8 +10,14 @@ from django.conf import settings
 from django.core.exceptions import PermissionDenied
 
 from addon_service.common import hmac as hmac_utils
-from addon_service.common.aiohttp_session import get_singleton_client_session
+from addon_service.common.aiohttp_session import get_pooled_client_session
 from addon_service.common.get_user_uri import get_user_uri
+from addon_service.common.metrics import UpstreamRequestTimer
+from addon_service.common.osf_permission_cache import OSFPermissionCache
+from addon_service.common.osf_token_cache import (
+    aget_token_user_uri,
+    aset_token_user_uri,
+)
 from addon_toolkit import AddonCapabilities
 
 
@@ -19,6 +25,7 @@ __all__ = (
     "OSFPermission",
     "get_osf_user_uri",
     "has_osf_permission_on_resource",
+    "has_osf_permission_on_resource__async",
 )
 
 _logger = logging.getLogger(__name__)
@@ -65,16 +72,25 @@ async def get_osf_user_uri(request: django_http.HttpRequest) -> str | None:
     _auth_headers = _osf_token_auth_headers(request)
     if not _auth_headers:
         return None
-    _client = await get_singleton_client_session()
-    async with _client.get(_osfapi_me_url(), headers=_auth_headers) as _response:
-        if HTTPStatus(_response.status).is_client_error:
-            return None
-        _response_content = await _response.json()
-        return _iri_from_osfapi_resource(_response_content["data"])
-
-
-@async_to_sync
-async def has_osf_permission_on_resource(
+    # (which user has this token may be cached -- the token itself is not)
+    [(_, _authorization)] = _auth_headers
+    _cached_user_uri = await aget_token_user_uri(_authorization)
+    if _cached_user_uri:
+        return _cached_user_uri
+    _client = await get_pooled_client_session(settings.OSF_API_BASE_URL)
+    _url = _osfapi_me_url()
+    with UpstreamRequestTimer(_url) as _timer:
+        async with _client.get(_url, headers=_auth_headers) as _response:
+            _timer.responded(_response.status, _response.content_length)
+            if HTTPStatus(_response.status).is_client_error:
+                return None
+            _response_content = await _response.json()
+            _user_uri = _iri_from_osfapi_resource(_response_content["data"])
+    await aset_token_user_uri(_authorization, _user_uri)
+    return _user_uri
+
+
+async def has_osf_permission_on_resource__async(
     request: django_http.HttpRequest,
     resource_uri: str,
     required_permission: OSFPermission,
@@ -91,33 +107,26 @@ async def has_osf_permission_on_resource(
         return False
     except hmac_utils.NotUsingHmac:
         pass  # the only acceptable hmac-related error is not using hmac at all
-    # not hmac -- ask osf
-    _client = await get_singleton_client_session()
-
-    async with _client.get(
-        _osfapi_guid_url(resource_uri),
-        params=_make_guid_query_params(request),
-        headers=[
-            *_get_osf_auth_headers(request),
-            ("Accept", "application/vnd.api+json"),  # jsonapi
-        ],
-    ) as _response:
-        if not HTTPStatus(_response.status).is_success:
-            return False  # nonexistent osfid (TODO: consider raising error?)
-        _response_content = await _response.json()
-        _embedded_referent = _response_content["data"]["embeds"]["referent"]
-        try:
-            _referent_data = _embedded_referent["data"]
-        except KeyError:  # no `data` for referent implies no permission
-            return False
-        # 'current_user_permissions' includes only explicitly assigned 'read' permission,
-        # but here we wish to consider public resources READ-able by anyone
-        if required_permission == OSFPermission.READ:
-            return bool(_referent_data)
-        return (
-            required_permission
-            in _referent_data["attributes"]["current_user_permissions"]
-        )
+    # not hmac -- ask osf (or recall what osf said recently)
+    _cache = OSFPermissionCache(request, resource_uri, required_permission)
+    _has_permission = _cache.recall()
+    if _has_permission is None:
+        _has_permission = await _cache.aget()
+        if _has_permission is None:
+            _has_permission, _is_cacheable = await _ask_osf_permission(
+                request, resource_uri, required_permission
+            )
+            if _is_cacheable:
+                await _cache.aset(_has_permission)
+        _cache.remember(_has_permission)
+    return _has_permission
+
+
+has_osf_permission_on_resource = async_to_sync(has_osf_permission_on_resource__async)
+"""check for a permission on a resource via the osf api
+
+(same as `has_osf_permission_on_resource__async`, for use in synchronous context)
+"""
 
 
 def _make_guid_query_params(request):
@@ -163,6 +172,47 @@ def _extract_osfid(osf_resource_uri: str):
     return _osfid_match["osfid"]
 
 
+async def _ask_osf_permission(
+    request: django_http.HttpRequest,
+    resource_uri: str,
+    required_permission: OSFPermission,
+) -> tuple[bool, bool]:
+    """ask the osf api for a permission; returns (has_permission, is_cacheable)"""
+    _client = await get_pooled_client_session(settings.OSF_API_BASE_URL)
+    _url = _osfapi_guid_url(resource_uri)
+    with UpstreamRequestTimer(_url, endpoint="/v2/guids/{id}/") as _timer:
+        async with _client.get(
+            _url,
+            params=_make_guid_query_params(request),
+            headers=[
+                *_get_osf_auth_headers(request),
+                ("Accept", "application/vnd.api+json"),  # jsonapi
+            ],
+        ) as _response:
+            _timer.responded(_response.status, _response.content_length)
+            _status = HTTPStatus(_response.status)
+            if not _status.is_success:
+                # nonexistent osfid (TODO: consider raising error?) or no access
+                # -- but don't hold on to a passing error
+                return False, not (
+                    _status.is_server_error or _status == HTTPStatus.TOO_MANY_REQUESTS
+                )
+            _response_content = await _response.json()
+            _embedded_referent = _response_content["data"]["embeds"]["referent"]
+            try:
+                _referent_data = _embedded_referent["data"]
+            except KeyError:  # no `data` for referent implies no permission
+                return False, True
+            # 'current_user_permissions' includes only explicitly assigned 'read' permission,
+            # but here we wish to consider public resources READ-able by anyone
+            if required_permission == OSFPermission.READ:
+                return bool(_referent_data), True
+            return (
+                required_permission
+                in _referent_data["attributes"]["current_user_permissions"]
+            ), True
+
+
 def _osfapi_guid_url(osf_resource_uri: str):
     _osfid = _extract_osfid(osf_resource_uri)
     return f"{settings.OSF_API_BASE_URL}/v2/guids/{_osfid}/"
@@ -0,0 +1,223 @@
+"""two-level cache of osf permission checks (see `osf.has_osf_permission_on_resource`)
+
+1. a memo on the request itself, so one api request asks osf once per (resource,
+   permission) -- however many objects or permission classes check it
+2. a short-lived entry in redis, shared by all gravyvalet processes; denials are
+   cached too (but for less time), while osf errors are not cached at all
+
+entries are keyed by a keyed digest of everything osf could base its answer on:
+the requesting user, the exact auth credentials (osf cookie, bearer token), the
+view-only key, the resource and the permission -- so requests with different
+credentials never share an entry, even for the same user (and the credentials
+themselves are never stored)
+
+each entry also records the "generation" of its user and its resource at the time
+osf was asked; osf backchannel messages (`addon_service.tasks.osf_backchannel`)
+bump those generations, so every entry for that user or resource stops counting
+at once (without finding and deleting each one)
+"""
+
+import hashlib
+import hmac
+import logging
+import threading
+from collections import Counter
+
+import redis
+from django import http as django_http
+from django.conf import settings
+
+from addon_service.common.get_user_uri import get_user_uri
+from addon_service.common.redis_client import (
+    get_async_redis,
+    get_redis,
+)
+
+
+__all__ = (
+    "OSFPermissionCache",
+    "get_permission_cache_stats",
+    "invalidate_resource_permissions",
+    "invalidate_user_permissions",
+)
+
+_logger = logging.getLogger(__name__)
+
+_CACHE_KEY_PREFIX = "gv:osf-permission"
+
+# (must outlast any entry, so a generation never resets under a live entry)
+_GENERATION_SECONDS = 24 * 60 * 60
+
+# attribute on a django `HttpRequest` for the request-scoped memo
+_REQUEST_MEMO_ATTR = "_gv_osf_permission_memo"
+
+_STATS: Counter[str] = Counter()
+_STATS_LOCK = threading.Lock()
+
+
+def get_permission_cache_stats() -> dict[str, int]:
+    """counts of "memo_hit", "hit", "miss" and "store" events in this process"""
+    with _STATS_LOCK:
+        return {
+            _event: _STATS[_event] for _event in ("memo_hit", "hit", "miss", "store")
+        }
+
+
+def _count(event: str) -> None:
+    with _STATS_LOCK:
+        _STATS[event] += 1
+
+
+class OSFPermissionCache:
+    """cached answer (if any) to one permission check for one request
+
+    >>> _request = django_http.HttpRequest()
+    >>> _cache = OSFPermissionCache(_request, 'https://osf.example/abcde', 'read')
+    >>> _cache.memo_key
+    ('https://osf.example/abcde', 'read')
+    >>> _cache.remember(False)
+    >>> OSFPermissionCache(_request, 'https://osf.example/abcde', 'read').recall()
+    False
+    >>> OSFPermissionCache(_request, 'https://osf.example/abcde', 'write').recall() is None
+    True
+    """
+
+    def __init__(
+        self,
+        request: django_http.HttpRequest,
+        resource_uri: str,
+        permission: str,
+    ):
+        # (memo on the underlying django request, when given a drf request)
+        self._django_request = getattr(request, "_request", request)
+        self.memo_key = (resource_uri, str(permission))
+        self._user_uri = _get_user_uri_or_none(request) or ""
+        self._resource_uri = resource_uri
+        self._check_key = _check_key(request, self._user_uri, *self.memo_key)
+        self._generations: str | None = None
+
+    def recall(self) -> bool | None:
+        """the answer already given during this request (if any)"""
+        _memo = getattr(self._django_request, _REQUEST_MEMO_ATTR, {})
+        _has_permission = _memo.get(self.memo_key)
+        if _has_permission is not None:
+            _count("memo_hit")
+        return _has_permission
+
+    def remember(self, has_permission: bool) -> None:
+        """keep the answer for the rest of this request"""
+        _memo = getattr(self._django_request, _REQUEST_MEMO_ATTR, None)
+        if _memo is None:
+            _memo = {}
+            setattr(self._django_request, _REQUEST_MEMO_ATTR, _memo)
+        _memo[self.memo_key] = has_permission
+
+    async def aget(self) -> bool | None:
+        """the answer cached in redis (if any, and still current)"""
+        if not _is_enabled():
+            return None
+        try:
+            (
+                _entry,
+                _user_generation,
+                _resource_generation,
+            ) = await get_async_redis().mget(
+                self._check_key,
+                _generation_key("user", self._user_uri),
+                _generation_key("resource", self._resource_uri),
+            )
+        except redis.RedisError:  # a redis outage should not stop all requests
+            _logger.exception("osf permission cache unavailable")
+            return None
+        self._generations = (
+            f"{int(_user_generation or 0)}:{int(_resource_generation or 0)}"
+        )
+        if _entry is not None:
+            _generations, _, _has_permission = _entry.decode().rpartition(":")
+            if _generations == self._generations:
+                _count("hit")
+                return _has_permission == "1"
+        _count("miss")
+        return None
+
+    async def aset(self, has_permission: bool) -> None:
+        """cache the answer in redis (for less time, if no permission)"""
+        if (not _is_enabled()) or (self._generations is None):
+            return  # (only after `aget`, so as not to miss an invalidation since)
+        _seconds = (
+            settings.GRAVYVALET_OSF_PERMISSION_CACHE_SECONDS
+            if has_permission
+            else settings.GRAVYVALET_OSF_PERMISSION_NEGATIVE_CACHE_SECONDS
+        )
+        if _seconds <= 0:
+            return
+        try:
+            await get_async_redis().set(
+                self._check_key,
+                f"{self._generations}:{int(has_permission)}",
+                ex=_seconds,
+            )
+        except redis.RedisError:
+            _logger.exception("osf permission cache unavailable")
+        else:
+            _count("store")
+
+
+def invalidate_user_permissions(user_uri: str) -> None:
+    """stop using cached permission checks for the given user"""
+    _bump_generation(_generation_key("user", user_uri))
+
+
+def invalidate_resource_permissions(resource_uri: str) -> None:
+    """stop using cached permission checks on the given resource"""
+    _bump_generation(_generation_key("resource", resource_uri))
+
+
+###
+# module-private helpers
+
+
+def _is_enabled() -> bool:
+    return settings.GRAVYVALET_OSF_PERMISSION_CACHE_SECONDS > 0
+
+
+def _get_user_uri_or_none(request) -> str | None:
+    try:
+        return get_user_uri(request)
+    except AttributeError:  # (no session on this request)
+        return getattr(request, "user_uri", None)
+
+
+def _check_key(
+    request: django_http.HttpRequest,
+    user_uri: str,
+    resource_uri: str,
+    permission: str,
+) -> str:
+    _digest = hmac.new(
+        # (keyed, so a digest tells nothing about the credentials in it)
+        (settings.SECRET_KEY or "").encode(),
+        "\n".join(
+            (
+                user_uri,
+                request.COOKIES.get(settings.OSF_AUTH_COOKIE_NAME, ""),
+                request.headers.get("Authorization", ""),
+                request.GET.get("view_only", ""),
+                resource_uri,
+                permission,
+            )
+        ).encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"{_CACHE_KEY_PREFIX}:check:{_digest}"
+
+
+def _generation_key(kind: str, uri: str) -> str:
+    return f"{_CACHE_KEY_PREFIX}:generation:{kind}:{uri}"
+
+
+def _bump_generation(generation_key: str) -> None:
+    with get_redis().pipeline() as _pipeline:
+        _pipeline.incr(generation_key)
+        _pipeline.expire(generation_key, _GENERATION_SECONDS)
+        _pipeline.execute()
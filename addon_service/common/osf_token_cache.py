@@ -0,0 +1,97 @@
+"""cache of which osf user each personal access token belongs to (see `osf.get_osf_user_uri`)
+
+without it, every request with a bearer token asks the osf api `/v2/users/me/`
+who the token's user is -- with it, osf is asked once per token per ttl
+(`GRAVYVALET_OSF_TOKEN_CACHE_SECONDS`)
+
+tokens are kept out of the session (see `get_user_uri`) and out of redis -- each
+cache entry is keyed by a keyed digest of the token, and holds only the user's iri;
+each user's entries are also indexed, so all of them may be evicted at once when
+osf says so (via `addon_service.tasks.osf_backchannel`, e.g. when a token is
+revoked or the user deactivated)
+"""
+
+import hashlib
+import hmac
+import logging
+
+import redis
+from django.conf import settings
+
+from addon_service.common.redis_client import (
+    get_async_redis,
+    get_redis,
+)
+
+
+__all__ = (
+    "aget_token_user_uri",
+    "aset_token_user_uri",
+    "evict_user_tokens",
+)
+
+_logger = logging.getLogger(__name__)
+
+_CACHE_KEY_PREFIX = "gv:osf-token"
+
+
+async def aget_token_user_uri(authorization: str) -> str | None:
+    """the cached iri of the user with the given "Authorization" header (if any)"""
+    if not _is_enabled():
+        return None
+    try:
+        _user_uri = await get_async_redis().get(_token_key(authorization))
+    except redis.RedisError:  # a redis outage should not stop all requests
+        _logger.exception("osf token cache unavailable")
+        return None
+    return _user_uri.decode() if _user_uri is not None else None
+
+
+async def aset_token_user_uri(authorization: str, user_uri: str) -> None:
+    if not _is_enabled():
+        return
+    _seconds = settings.GRAVYVALET_OSF_TOKEN_CACHE_SECONDS
+    _key = _token_key(authorization)
+    _user_key = _user_index_key(user_uri)
+    try:
+        async with get_async_redis().pipeline() as _pipeline:
+            _pipeline.set(_key, user_uri, ex=_seconds)
+            _pipeline.sadd(_user_key, _key)
+            _pipeline.expire(_user_key, _seconds)
+            await _pipeline.execute()
+    except redis.RedisError:
+        _logger.exception("osf token cache unavailable")
+
+
+def evict_user_tokens(user_uri: str) -> None:
+    """forget which tokens belong to the given user (so each is checked anew)"""
+    _redis = get_redis()
+    _user_key = _user_index_key(user_uri)
+    _token_keys = _redis.smembers(_user_key)
+    with _redis.pipeline() as _pipeline:
+        if _token_keys:
+            _pipeline.delete(*_token_keys)
+        _pipeline.delete(_user_key)
+        _pipeline.execute()
+
+
+###
+# module-private helpers
+
+
+def _is_enabled() -> bool:
+    return settings.GRAVYVALET_OSF_TOKEN_CACHE_SECONDS > 0
+
+
+def _token_key(authorization: str) -> str:
+    _digest = hmac.new(
+        # (keyed, so a digest tells nothing about the token)
+        (settings.SECRET_KEY or "").encode(),
+        authorization.encode(),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"{_CACHE_KEY_PREFIX}:token:{_digest}"
+
+
+def _user_index_key(user_uri: str) -> str:
+    return f"{_CACHE_KEY_PREFIX}:user:{user_uri}"
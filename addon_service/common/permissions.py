@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from rest_framework import (
     exceptions,
@@ -72,41 +73,74 @@ class SessionUserMayAccessInvocation(permissions.BasePermission):
     """for object permissions on `addon_service.models.AddonOperationInvocation`"""
 
     def has_object_permission(self, request, view, obj):
+        _may_access, _resource_uri = self._check_without_osf(request, obj)
+        return _may_access or osf.has_osf_permission_on_resource(
+            request, _resource_uri, osf.OSFPermission.READ
+        )
+
+    async def has_object_permission__async(self, request, view, obj):
+        """same as `has_object_permission`, checking with osf on the running event loop"""
+        _may_access, _resource_uri = await sync_to_async(self._check_without_osf)(
+            request, obj
+        )
+        return _may_access or await osf.has_osf_permission_on_resource__async(
+            request, _resource_uri, osf.OSFPermission.READ
+        )
+
+    def _check_without_osf(self, request, obj) -> tuple[bool, str | None]:
+        """whether the user may access the invocation (as far as known without
+        asking osf), and on which resource "read" permission would also do
+        """
         _user_uri = get_user_uri(request)
-        return bool(
+        if (
             # must be the invoker:
             (_user_uri == obj.by_user.user_uri)
             # or the account owner:
             or (_user_uri == obj.thru_account.owner_uri)
-            # or a user with "read" access on the connected osf project:
-            or osf.has_osf_permission_on_resource(
-                request,
-                obj.thru_addon.authorized_resource.resource_uri,
-                osf.OSFPermission.READ,
-            )
-        )
+        ):
+            return True, None
+        # or a user with "read" access on the connected osf project:
+        return False, obj.thru_addon.authorized_resource.resource_uri
 
 
 class SessionUserMayPerformInvocation(permissions.BasePermission):
     """for object permissions on `addon_service.models.AddonOperationInvocation`"""
 
     def has_object_permission(self, request, view, obj):
+        _may_perform, _osf_check = self._check_without_osf(request, obj)
+        return _may_perform or bool(
+            _osf_check and osf.has_osf_permission_on_resource(request, *_osf_check)
+        )
+
+    async def has_object_permission__async(self, request, view, obj):
+        """same as `has_object_permission`, checking with osf on the running event loop"""
+        _may_perform, _osf_check = await sync_to_async(self._check_without_osf)(
+            request, obj
+        )
+        return _may_perform or bool(
+            _osf_check
+            and await osf.has_osf_permission_on_resource__async(request, *_osf_check)
+        )
+
+    def _check_without_osf(
+        self, request, obj
+    ) -> tuple[bool, tuple[str, osf.OSFPermission] | None]:
+        """whether the user may perform the invocation (as far as known without
+        asking osf), and which osf permission on which resource would also do
+        """
         _user_uri = get_user_uri(request)
         _thru_addon = obj.thru_addon
         _thru_account = obj.thru_account
         if _thru_addon is None:
             # when invoking thru account, must be the owner
-            return _user_uri == _thru_account.owner_uri
+            return (_user_uri == _thru_account.owner_uri), None
         # when invoking thru addon, may be either...
-        return bool(
-            # the addon owner:
-            (_user_uri == _thru_addon.owner_uri)
-            # or a user with sufficient on the connected osf project:
-            or osf.has_osf_permission_on_resource(
-                request,
-                _thru_addon.authorized_resource.resource_uri,
-                osf.OSFPermission.for_capabilities(obj.operation.capability),
-            )
+        if _user_uri == _thru_addon.owner_uri:
+            return True, None  # the addon owner
+        # or a user with sufficient permission on the connected osf project:
+        return False, (
+            _thru_addon.authorized_resource.resource_uri,
+            osf.OSFPermission.for_capabilities(obj.operation.capability),
         )
 
 
@@ -0,0 +1,406 @@
+"""rate limits for requests to external services, shared by all gravyvalet processes
+
+each (external service, account) pair gets a token bucket in redis, and so does
+each provider (api host) across all its accounts: every request takes a token
+from both, tokens refill at a steady rate, and a request that finds either
+bucket empty waits for a token -- or, if the wait would be too long, fails fast
+with `ProviderRateLimited` instead of hammering the provider
+
+bucket sizes and refill rates may be set per host (see the
+`GRAVYVALET_RATE_LIMIT_*` settings); a provider's bucket is unlimited unless set
+
+providers' own rate-limit headers also feed the buckets: `Retry-After` on a
+throttled response (or `X-RateLimit-Remaining: 0` with `X-RateLimit-Reset`)
+blocks a bucket until the provider says to try again -- the account's bucket,
+or (for hosts with a provider-wide bucket, whose limits aren't per token) the
+provider's bucket, holding back every account
+
+see https://www.rfc-editor.org/rfc/rfc9110#field.retry-after
+and https://docs.github.com/en/rest/using-the-rest-api/rate-limits-for-the-rest-api
+"""
+
+import asyncio
+import dataclasses
+import email.utils
+import logging
+import time
+from collections.abc import Mapping
+from http import HTTPStatus
+
+import redis
+from django.conf import settings
+
+from addon_service.common import exceptions
+from addon_service.common.redis_client import (
+    get_async_redis,
+    get_redis,
+)
+
+
+__all__ = (
+    "BucketState",
+    "ProviderRateLimiter",
+    "RateLimitHeaders",
+    "get_bucket_states",
+)
+
+_logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "gv:rate-limit"
+_PROVIDER_KEY_PREFIX = "gv:rate-limit-provider"
+
+# values of X-RateLimit-Reset larger than this are timestamps, not durations
+_MIN_RESET_TIMESTAMP = 10**9
+
+# a bucket with no traffic for this long is forgotten
+_BUCKET_TTL_SECONDS = 60 * 60 * 24
+
+# take one token from each bucket, if both have one; return seconds to wait for
+# them (as a string, since redis would truncate a lua number to an integer)
+# KEYS: account bucket key, provider bucket key
+# ARGV: now, account capacity, account refill per second, provider capacity,
+#   provider refill per second, ttl (a capacity of 0 for no limit)
+_TAKE_TOKEN_LUA = """
+local _now = tonumber(ARGV[1])
+local function _refill_bucket(key, capacity, refill)
+    local _bucket = redis.call('HMGET', key, 'tokens', 'updated_at', 'blocked_until')
+    local _tokens = tonumber(_bucket[1]) or capacity
+    local _updated_at = tonumber(_bucket[2]) or _now
+    local _blocked_until = tonumber(_bucket[3]) or 0
+    _tokens = math.min(capacity, _tokens + math.max(0, _now - _updated_at) * refill)
+    local _wait = 0
+    if _blocked_until > _now then
+        _wait = _blocked_until - _now
+    elseif capacity <= 0 or _tokens >= 1 then
+        _wait = 0
+    elseif refill > 0 then
+        _wait = (1 - _tokens) / refill
+    else
+        _wait = -1
+    end
+    return _tokens, _wait
+end
+local _capacities = {tonumber(ARGV[2]), tonumber(ARGV[4])}
+local _refills = {tonumber(ARGV[3]), tonumber(ARGV[5])}
+local _tokens = {}
+local _wait = 0
+for _i = 1, 2 do
+    local _bucket_wait
+    _tokens[_i], _bucket_wait = _refill_bucket(KEYS[_i], _capacities[_i], _refills[_i])
+    if _wait >= 0 and (_bucket_wait < 0 or _bucket_wait > _wait) then
+        _wait = _bucket_wait
+    end
+end
+for _i = 1, 2 do
+    if _wait == 0 and _capacities[_i] > 0 then
+        _tokens[_i] = _tokens[_i] - 1
+    end
+    redis.call('HSET', KEYS[_i], 'tokens', _tokens[_i], 'updated_at', _now, 'capacity', _capacities[_i], 'refill_per_second', _refills[_i])
+    redis.call('EXPIRE', KEYS[_i], ARGV[6])
+end
+return tostring(_wait)
+"""
+
+# record what a provider said about its rate limit
+# KEYS: bucket key; ARGV: now, provider remaining (or ''), provider reset time (or ''),
+#   blocked until (or ''), ttl
+_OBSERVE_LUA = """
+local _now = tonumber(ARGV[1])
+if ARGV[2] ~= '' then
+    local _remaining = tonumber(ARGV[2])
+    local _tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens'))
+    if _tokens == nil or _tokens > _remaining then
+        redis.call('HSET', KEYS[1], 'tokens', _remaining, 'updated_at', _now)
+    end
+    redis.call('HSET', KEYS[1], 'provider_remaining', ARGV[2])
+end
+if ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[1], 'provider_reset_at', ARGV[3])
+end
+if ARGV[4] ~= '' then
+    local _blocked_until = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+    if tonumber(ARGV[4]) > _blocked_until then
+        redis.call('HSET', KEYS[1], 'blocked_until', ARGV[4])
+    end
+end
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
+
+
+@dataclasses.dataclass(frozen=True)
+class RateLimitHeaders:
+    """what a provider's response headers say about its rate limit (times in seconds from now)
+
+    >>> RateLimitHeaders.parse({'Retry-After': '120'}, now=0)
+    RateLimitHeaders(retry_after=120.0, remaining=None, reset_after=None)
+    >>> RateLimitHeaders.parse({'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'}, now=1445412470)
+    RateLimitHeaders(retry_after=10.0, remaining=None, reset_after=None)
+    >>> RateLimitHeaders.parse({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '1445412600'}, now=1445412480)
+    RateLimitHeaders(retry_after=None, remaining=0, reset_after=120.0)
+    >>> RateLimitHeaders.parse({'RateLimit-Remaining': '7', 'RateLimit-Reset': '30'}, now=0)
+    RateLimitHeaders(retry_after=None, remaining=7, reset_after=30.0)
+    >>> RateLimitHeaders.parse({'Retry-After': 'whenever'}, now=0)
+    RateLimitHeaders(retry_after=None, remaining=None, reset_after=None)
+    """
+
+    retry_after: float | None
+    remaining: int | None
+    reset_after: float | None
+
+    @classmethod
+    def parse(cls, headers: Mapping[str, str], now: float) -> "RateLimitHeaders":
+        return cls(
+            retry_after=_parse_retry_after(headers.get("Retry-After"), now),
+            remaining=_parse_int(
+                headers.get("X-RateLimit-Remaining", headers.get("RateLimit-Remaining"))
+            ),
+            reset_after=_parse_reset(
+                headers.get("X-RateLimit-Reset", headers.get("RateLimit-Reset")), now
+            ),
+        )
+
+    def is_throttled(self, http_status: int) -> bool:
+        """whether a response with these headers was refused for rate limiting
+
+        (some providers, github among them, throttle with "403 Forbidden")
+
+        >>> RateLimitHeaders(retry_after=None, remaining=None, reset_after=None).is_throttled(429)
+        True
+        >>> RateLimitHeaders(retry_after=None, remaining=None, reset_after=None).is_throttled(403)
+        False
+        >>> RateLimitHeaders(retry_after=None, remaining=0, reset_after=60.0).is_throttled(403)
+        True
+        """
+        if http_status == HTTPStatus.TOO_MANY_REQUESTS:
+            return True
+        return http_status in (
+            HTTPStatus.FORBIDDEN,
+            HTTPStatus.SERVICE_UNAVAILABLE,
+        ) and (self.retry_after is not None or self.remaining == 0)
+
+    def backoff_seconds(self, http_status: int) -> float | None:
+        """how long to send nothing more, if the provider asked for a pause
+
+        >>> RateLimitHeaders(retry_after=None, remaining=0, reset_after=60.0).backoff_seconds(200)
+        60.0
+        >>> RateLimitHeaders(retry_after=5.0, remaining=0, reset_after=60.0).backoff_seconds(429)
+        5.0
+        >>> RateLimitHeaders(retry_after=None, remaining=4, reset_after=60.0).backoff_seconds(200)
+        """
+        if self.is_throttled(http_status) and self.retry_after is not None:
+            return self.retry_after
+        if self.remaining == 0 and self.reset_after is not None:
+            return self.reset_after
+        if http_status == HTTPStatus.TOO_MANY_REQUESTS:
+            return settings.GRAVYVALET_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS
+        return None
+
+
+@dataclasses.dataclass
+class BucketState:
+    """a point-in-time view of one rate-limit bucket (timestamps in seconds since epoch)"""
+
+    external_service_pk: str
+    account_pk: str
+    tokens: float | None
+    capacity: float | None
+    refill_per_second: float | None
+    updated_at: float | None
+    blocked_until: float | None
+    provider_remaining: int | None
+    provider_reset_at: float | None
+
+    @classmethod
+    def from_redis_hash(
+        cls, external_service_pk: str, account_pk: str, redis_hash: dict
+    ) -> "BucketState":
+        def _field(name: str, parse=float):
+            _value = redis_hash.get(name.encode())
+            return None if _value is None else parse(_value)
+
+        return cls(
+            external_service_pk=external_service_pk,
+            account_pk=account_pk,
+            tokens=_field("tokens"),
+            capacity=_field("capacity"),
+            refill_per_second=_field("refill_per_second"),
+            updated_at=_field("updated_at"),
+            blocked_until=_field("blocked_until"),
+            provider_remaining=_field("provider_remaining", parse=int),
+            provider_reset_at=_field("provider_reset_at"),
+        )
+
+
+class ProviderRateLimiter:
+    """the shared token buckets for requests to one external service thru one
+    account, and to that service's api host thru any account
+    """
+
+    def __init__(self, external_service_pk, account_pk, host: str = ""):
+        self._external_service_pk = str(external_service_pk)
+        self._account_pk = str(account_pk)
+        self._host = host
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.GRAVYVALET_RATE_LIMIT_ENABLED
+
+    @property
+    def bucket_key(self) -> str:
+        return f"{_KEY_PREFIX}:{self._external_service_pk}:{self._account_pk}"
+
+    @property
+    def provider_bucket_key(self) -> str:
+        return f"{_PROVIDER_KEY_PREFIX}:{self._host}"
+
+    @property
+    def limits_per_account(self) -> bool:
+        """whether the provider's rate limits are per account (that is, per token)
+
+        (hosts given a provider-wide bucket are taken to limit the whole app)
+        """
+        return self._host not in settings.GRAVYVALET_RATE_LIMIT_PROVIDER_BUCKETS
+
+    def bucket_config(self) -> tuple[float, float]:
+        """(size, refill per second) of each account's bucket"""
+        return settings.GRAVYVALET_RATE_LIMIT_HOST_BUCKETS.get(
+            self._host,
+            (
+                settings.GRAVYVALET_RATE_LIMIT_BUCKET_SIZE,
+                settings.GRAVYVALET_RATE_LIMIT_REFILL_PER_SECOND,
+            ),
+        )
+
+    def provider_bucket_config(self) -> tuple[float, float]:
+        """(size, refill per second) of the provider's bucket (size 0 for no limit)"""
+        return settings.GRAVYVALET_RATE_LIMIT_PROVIDER_BUCKETS.get(self._host, (0, 0))
+
+    async def acquire(self) -> None:
+        """wait for a token (from both buckets); raise `ProviderRateLimited` rather
+        than wait too long
+        """
+        _max_wait = settings.GRAVYVALET_RATE_LIMIT_MAX_WAIT_SECONDS
+        _size, _refill = self.bucket_config()
+        _provider_size, _provider_refill = self.provider_bucket_config()
+        _give_up_at = time.monotonic() + _max_wait
+        while True:
+            try:
+                _wait = float(
+                    await get_async_redis().eval(
+                        _TAKE_TOKEN_LUA,
+                        2,
+                        self.bucket_key,
+                        self.provider_bucket_key,
+                        time.time(),
+                        _size,
+                        _refill,
+                        _provider_size,
+                        _provider_refill,
+                        _BUCKET_TTL_SECONDS,
+                    )
+                )
+            except redis.RedisError:  # a redis outage should not stop all requests
+                _logger.exception("rate limit bucket unavailable")
+                return
+            if _wait == 0:
+                return
+            if _wait < 0 or (time.monotonic() + _wait > _give_up_at):
+                raise exceptions.ProviderRateLimited(retry_after=max(_wait, 0))
+            await asyncio.sleep(_wait)
+
+    async def observe(
+        self, http_status: int, headers: Mapping[str, str]
+    ) -> RateLimitHeaders:
+        """update a bucket from a provider response's rate-limit headers (the
+        account's, or the provider's if its limits aren't per account)
+        """
+        _now = time.time()
+        _info = RateLimitHeaders.parse(headers, now=_now)
+        _backoff = _info.backoff_seconds(http_status)
+        if _info.remaining is None and _backoff is None:
+            return _info  # nothing to note
+        try:
+            await get_async_redis().eval(
+                _OBSERVE_LUA,
+                1,
+                (
+                    self.bucket_key
+                    if self.limits_per_account
+                    else self.provider_bucket_key
+                ),
+                _now,
+                _optional(_info.remaining),
+                _optional(
+                    None if _info.reset_after is None else _now + _info.reset_after
+                ),
+                _optional(None if _backoff is None else _now + _backoff),
+                _BUCKET_TTL_SECONDS,
+            )
+        except redis.RedisError:
+            _logger.exception("rate limit bucket unavailable")
+        return _info
+
+    async def get_state(self) -> BucketState:
+        return BucketState.from_redis_hash(
+            self._external_service_pk,
+            self._account_pk,
+            await get_async_redis().hgetall(self.bucket_key),
+        )
+
+
+def get_bucket_states(external_service_pk=None) -> list[BucketState]:
+    """current state of every rate-limit bucket in use (optionally for one external service)"""
+    _redis = get_redis()
+    _pattern = (
+        f"{_KEY_PREFIX}:*"
+        if external_service_pk is None
+        else f"{_KEY_PREFIX}:{external_service_pk}:*"
+    )
+    _states = []
+    for _key in _redis.scan_iter(match=_pattern):
+        _, _, _service_pk, _account_pk = _key.decode().split(":")
+        _hash = _redis.hgetall(_key)
+        if _hash:  # (may have expired since the scan)
+            _states.append(BucketState.from_redis_hash(_service_pk, _account_pk, _hash))
+    return _states
+
+
+###
+# module-private helpers
+
+
+def _optional(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _parse_int(value: str | None) -> int | None:
+    try:
+        return None if value is None else int(value)
+    except ValueError:
+        return None
+
+
+def _parse_retry_after(value: str | None, now: float) -> float | None:
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:  # may be an http-date instead of seconds
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - now, 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_reset(value: str | None, now: float) -> float | None:
+    try:
+        _reset = None if value is None else float(value)
+    except ValueError:
+        return None
+    if _reset is None:
+        return None
+    if _reset > _MIN_RESET_TIMESTAMP:  # seconds since epoch (e.g. github)
+        return max(_reset - now, 0.0)
+    return max(_reset, 0.0)  # seconds from now (e.g. the ietf draft)
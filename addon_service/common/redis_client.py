@@ -0,0 +1,47 @@
+"""redis clients, for state shared by all gravyvalet processes (web and celery workers)
+
+uses the same redis as the django cache (`settings.REDIS_HOST`); like aiohttp
+sessions, async redis connections belong to the event loop that opened them,
+so async clients are kept per event loop (and closed when their loop shuts down;
+see `LoopScoped`)
+"""
+
+import functools
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+from addon_service.common.loop_scoped import LoopScoped
+
+
+__all__ = (
+    "close_loop_async_redis",
+    "get_async_redis",
+    "get_redis",
+)
+
+
+def _new_async_redis() -> redis.asyncio.Redis:
+    return redis.asyncio.Redis.from_url(settings.REDIS_HOST)
+
+
+_ASYNC_CLIENTS: LoopScoped[redis.asyncio.Redis] = LoopScoped(
+    _new_async_redis, aclose=redis.asyncio.Redis.aclose
+)
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """return an async redis client for the running event loop"""
+    return _ASYNC_CLIENTS.get()
+
+
+async def close_loop_async_redis() -> None:
+    """close the running event loop's async redis client, if any (e.g. on shutdown)"""
+    await _ASYNC_CLIENTS.aclose()
+
+
+@functools.cache
+def get_redis() -> redis.Redis:
+    """return a (thread-safe, blocking) redis client"""
+    return redis.Redis.from_url(settings.REDIS_HOST)
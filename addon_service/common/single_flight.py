@@ -0,0 +1,287 @@
+"""coalescing of identical in-flight GET requests to external services
+
+when several identical GETs (same account, url, query and headers) are in
+flight at once, only the first (the "leader") is sent; the rest ("followers")
+wait for it and get a copy of its response, read into memory
+
+within a process, followers wait on an `asyncio.Future`; optionally, flights
+also span processes thru the django cache -- a lock (`add` is atomic) names the
+leading flight, whose response is kept briefly for followers elsewhere
+
+a flight takes followers until the leader's response arrives; the leader reads
+the response into memory only if it has followers (counted in the cache, for
+followers in other processes) and the response isn't too big -- otherwise, or if
+the leader fails, each follower sends its own request
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import logging
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from collections.abc import AsyncIterator
+from http import HTTPMethod
+
+from django.conf import settings
+from django.core.cache import cache
+
+from addon_service.common.http_cache import (
+    CachedResponse,
+    request_digest,
+)
+from addon_toolkit.constrained_network.http import HttpRequestInfo
+
+
+__all__ = (
+    "Flight",
+    "RequestCoalescer",
+    "get_coalescing_stats",
+)
+
+_logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "gv:single-flight"
+
+# how often a follower in another process checks for the leader's response
+_POLL_SECONDS = 0.05
+
+
+@dataclasses.dataclass
+class _InFlight:
+    future: asyncio.Future
+    follower_count: int = 0
+
+
+# in-flight requests on each event loop, by flight key
+_FLIGHTS_BY_LOOP: weakref.WeakKeyDictionary[
+    asyncio.AbstractEventLoop, dict[str, _InFlight]
+] = weakref.WeakKeyDictionary()
+_FLIGHTS_LOCK = threading.Lock()
+
+_STATS: Counter[str] = Counter()
+_STATS_LOCK = threading.Lock()
+
+
+def get_coalescing_stats() -> dict[str, float]:
+    """counts of "lead" and "follow" events in this process, and the coalescing ratio
+
+    (the ratio is the fraction of coalescable requests answered without sending one)
+    """
+    with _STATS_LOCK:
+        _lead, _follow = _STATS["lead"], _STATS["follow"]
+    _total = _lead + _follow
+    return {
+        "lead": _lead,
+        "follow": _follow,
+        "ratio": (_follow / _total) if _total else 0.0,
+    }
+
+
+def _count(event: str) -> None:
+    with _STATS_LOCK:
+        _STATS[event] += 1
+
+
+@dataclasses.dataclass
+class Flight:
+    """one request's part in a flight of identical requests
+
+    with a `shared_response`, there's no need to send the request; otherwise send
+    it, and (if `is_leader`) `share` the response (or `None`) with any followers
+    """
+
+    flight_key: str
+    is_leader: bool = False
+    shared_response: CachedResponse | None = None
+    _in_flight: _InFlight | None = None
+    _remote_flight_id: str | None = None
+
+    async def has_followers(self) -> bool:
+        if self._in_flight is not None and self._in_flight.follower_count > 0:
+            return True
+        if self._remote_flight_id is None:
+            return False
+        return await _remote_follower_count(self.flight_key, self._remote_flight_id) > 0
+
+    async def share(self, response: CachedResponse | None) -> None:
+        if not self.is_leader:
+            raise RuntimeError("only the leading flight may share a response")
+        if self._remote_flight_id is not None:
+            if response is None:
+                # nothing to share; let followers elsewhere send their own now,
+                # rather than after this response has been streamed
+                await _release_remote_lock(self.flight_key, self._remote_flight_id)
+                self._remote_flight_id = None
+            else:
+                try:
+                    await cache.aset(
+                        _remote_response_key(self.flight_key, self._remote_flight_id),
+                        response,
+                        timeout=settings.GRAVYVALET_REQUEST_COALESCING_WAIT_SECONDS,
+                    )
+                except Exception:
+                    _logger.exception("could not share response across processes")
+        self._land(response)
+
+    def _land(self, response: CachedResponse | None) -> None:
+        # stop taking followers, then release those waiting
+        if self._in_flight is None:
+            return
+        with _FLIGHTS_LOCK:
+            _loop_flights = _FLIGHTS_BY_LOOP.get(asyncio.get_running_loop(), {})
+            if _loop_flights.get(self.flight_key) is self._in_flight:
+                del _loop_flights[self.flight_key]
+        if not self._in_flight.future.done():
+            self._in_flight.future.set_result(response)
+
+
+class RequestCoalescer:
+    """coalesces identical in-flight GETs sent thru one account"""
+
+    def __init__(self, account_pk):
+        self._account_pk = account_pk
+
+    @staticmethod
+    def is_enabled() -> bool:
+        return settings.GRAVYVALET_REQUEST_COALESCING_ENABLED
+
+    @staticmethod
+    def accepts_request(request: HttpRequestInfo) -> bool:
+        return (
+            request.http_method == HTTPMethod.GET
+            and request.json is None
+            and request.content is None
+        )
+
+    @staticmethod
+    def accepts_response_size(content_length: int | None) -> bool:
+        """whether a response (with body of the given length, if known) may be shared"""
+        return (content_length is None) or (
+            content_length <= settings.GRAVYVALET_REQUEST_COALESCING_MAX_BYTES
+        )
+
+    def flight_key(self, full_url: str, request: HttpRequestInfo) -> str:
+        _digest = request_digest(full_url, request)
+        return f"{_KEY_PREFIX}:{self._account_pk}:{_digest}"
+
+    @contextlib.asynccontextmanager
+    async def flight(self, flight_key: str) -> AsyncIterator[Flight]:
+        _loop = asyncio.get_running_loop()
+        with _FLIGHTS_LOCK:
+            _loop_flights = _FLIGHTS_BY_LOOP.setdefault(_loop, {})
+            _in_flight = _loop_flights.get(flight_key)
+            if _in_flight is None:
+                _is_leader = True
+                _in_flight = _loop_flights[flight_key] = _InFlight(
+                    _loop.create_future()
+                )
+            else:
+                _is_leader = False
+                _in_flight.follower_count += 1
+        if not _is_leader:  # follow the leader in this process
+            _shared = await asyncio.shield(_in_flight.future)
+            if _shared is not None:
+                _count("follow")
+            yield Flight(flight_key, shared_response=_shared)
+            return
+        _flight = Flight(flight_key, is_leader=True, _in_flight=_in_flight)
+        try:
+            if settings.GRAVYVALET_REQUEST_COALESCING_ACROSS_PROCESSES:
+                _remote_flight_id = uuid.uuid4().hex
+                if await _take_remote_lock(flight_key, _remote_flight_id):
+                    _flight._remote_flight_id = _remote_flight_id
+                elif (_shared := await _await_remote_leader(flight_key)) is not None:
+                    _flight.is_leader = False
+                    _flight.shared_response = _shared
+                    _flight._land(_shared)  # (local followers follow along)
+                    _count("follow")
+            if _flight.is_leader:
+                _count("lead")
+            yield _flight
+        finally:
+            _flight._land(None)  # no effect if already shared
+            if _flight._remote_flight_id is not None:
+                await _release_remote_lock(flight_key, _flight._remote_flight_id)
+
+
+###
+# module-private helpers for flights across processes
+
+
+def _remote_lock_key(flight_key: str) -> str:
+    return f"{flight_key}:lock"
+
+
+def _remote_response_key(flight_key: str, remote_flight_id: str) -> str:
+    return f"{flight_key}:{remote_flight_id}"
+
+
+def _remote_followers_key(flight_key: str, remote_flight_id: str) -> str:
+    return f"{flight_key}:{remote_flight_id}:followers"
+
+
+async def _follow_remote_leader(flight_key: str, remote_flight_id: str) -> None:
+    """let the leader (in another process) know it has one more follower"""
+    _followers_key = _remote_followers_key(flight_key, remote_flight_id)
+    _timeout = settings.GRAVYVALET_REQUEST_COALESCING_WAIT_SECONDS
+    await cache.aadd(_followers_key, 0, timeout=_timeout)
+    await cache.aincr(_followers_key)
+
+
+async def _remote_follower_count(flight_key: str, remote_flight_id: str) -> int:
+    try:
+        return await cache.aget(_remote_followers_key(flight_key, remote_flight_id), 0)
+    except Exception:
+        _logger.exception("could not count single-flight followers")
+        return 0
+
+
+async def _take_remote_lock(flight_key: str, remote_flight_id: str) -> bool:
+    try:
+        return await cache.aadd(
+            _remote_lock_key(flight_key),
+            remote_flight_id,
+            timeout=settings.GRAVYVALET_REQUEST_COALESCING_WAIT_SECONDS,
+        )
+    except Exception:  # a cache outage should not break provider requests
+        _logger.exception("could not take single-flight lock")
+        return False
+
+
+async def _await_remote_leader(flight_key: str) -> CachedResponse | None:
+    """wait for the leading flight in another process to share its response
+
+    returns `None` if the leader gave up (or took too long)
+    """
+    _lock_key = _remote_lock_key(flight_key)
+    try:
+        _leader_id = await cache.aget(_lock_key)
+        if _leader_id is not None:
+            await _follow_remote_leader(flight_key, _leader_id)
+        _give_up_at = (
+            time.monotonic() + settings.GRAVYVALET_REQUEST_COALESCING_WAIT_SECONDS
+        )
+        while _leader_id is not None and time.monotonic() < _give_up_at:
+            _shared = await cache.aget(_remote_response_key(flight_key, _leader_id))
+            if _shared is not None:
+                return _shared
+            if await cache.aget(_lock_key) != _leader_id:
+                # leader done -- check once more for its response
+                return await cache.aget(_remote_response_key(flight_key, _leader_id))
+            await asyncio.sleep(_POLL_SECONDS)
+    except Exception:
+        _logger.exception("could not coalesce requests across processes")
+    return None
+
+
+async def _release_remote_lock(flight_key: str, remote_flight_id: str) -> None:
+    _lock_key = _remote_lock_key(flight_key)
+    try:
+        if await cache.aget(_lock_key) == remote_flight_id:
+            await cache.adelete(_lock_key)
+    except Exception:
+        _logger.exception("could not release single-flight lock")
@@ -0,0 +1,238 @@
+"""chunked, resumable rotation of credentials encryption (for many rows at once)
+
+a rotation "run" is planned up front: pks of `ExternalCredentials` modified before
+the run began are split into chunks (by keyset pagination, in pk order), and the
+plan is kept in redis
+
+any number of workers (`rotate_chunks`) may then work through the same run in
+parallel -- each claims one chunk at a time (with a lease), rotates the rows in
+that chunk (grouped by `KeyParameters`, so each derived key is used for all its
+rows at once) and saves them with one `bulk_update`, then checkpoints the chunk
+as done -- a run may be resumed by starting more workers for it
+
+each worker keeps on until every chunk is done, waiting on chunks claimed by
+others -- so a chunk claimed by a crashed worker is picked up again once its
+lease runs out
+"""
+
+import dataclasses
+import datetime
+import logging
+import time
+import uuid
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from addon_service.common.redis_client import get_redis
+
+from .header_cache import auth_header_cache
+from .models import ExternalCredentials
+
+
+__all__ = (
+    "get_rotation_progress",
+    "plan_rotation",
+    "rotate_chunks",
+    "RotationProgress",
+)
+
+_logger = logging.getLogger(__name__)
+
+# how long a worker may hold a chunk before others may claim it
+_CHUNK_LEASE_SECONDS = 15 * 60
+
+# longest to wait (between checks) on chunks claimed by other workers
+_CLAIM_WAIT_SECONDS = 10
+
+# how long to keep state for a run (in redis)
+_RUN_STATE_SECONDS = 7 * 24 * 60 * 60
+
+_BULK_UPDATE_FIELDS = (
+    "encrypted_json",
+    "wrapped_data_key",
+    "_salt",
+    "_scrypt_block_size",
+    "_scrypt_cost_log2",
+    "_scrypt_parallelization",
+    "modified",
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class RotationProgress:
+    run_id: str
+    total_rows: int
+    done_rows: int
+    chunk_count: int
+    done_chunks: int
+    elapsed_seconds: float
+
+    @property
+    def is_complete(self) -> bool:
+        return self.done_chunks >= self.chunk_count
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.done_rows / self.elapsed_seconds) if self.elapsed_seconds else 0.0
+
+    @property
+    def eta_seconds(self) -> float | None:
+        """estimated seconds until complete (None if no rate to go on yet)"""
+        if self.is_complete:
+            return 0.0
+        if not self.rows_per_second:
+            return None
+        return (self.total_rows - self.done_rows) / self.rows_per_second
+
+
+def plan_rotation(
+    *,
+    chunk_size: int,
+    earlier_than: datetime.datetime | None = None,
+    legacy_only: bool = False,
+) -> str:
+    """plan a rotation run for credentials modified before `earlier_than` (or now)
+    -- with `legacy_only`, only those not yet envelope-encrypted
+
+    returns the new run's id
+    """
+    _earlier_than = earlier_than or timezone.now()
+    _queryset = _rows_to_rotate(_earlier_than, legacy_only).order_by("pk")
+    _chunks: list[str] = []
+    _total_rows = 0
+    _last_pk = None
+    while True:  # keyset pagination; no offsets
+        _page_queryset = (
+            _queryset if _last_pk is None else _queryset.filter(pk__gt=_last_pk)
+        )
+        _page = list(_page_queryset.values_list("pk", flat=True)[:chunk_size])
+        if not _page:
+            break
+        _chunks.append(f"{_page[0]} {_page[-1]} {len(_page)}")
+        _total_rows += len(_page)
+        _last_pk = _page[-1]
+    _run_id = uuid.uuid4().hex
+    with get_redis().pipeline() as _pipeline:
+        _pipeline.hset(
+            _run_key(_run_id),
+            mapping={
+                "earlier_than": _earlier_than.isoformat(),
+                "legacy_only": int(legacy_only),
+                "chunk_count": len(_chunks),
+                "total_rows": _total_rows,
+                "done_rows": 0,
+                "started_at": time.time(),
+            },
+        )
+        if _chunks:
+            _pipeline.rpush(_run_key(_run_id, "chunks"), *_chunks)
+        for _key in (_run_key(_run_id), _run_key(_run_id, "chunks")):
+            _pipeline.expire(_key, _RUN_STATE_SECONDS)
+        _pipeline.execute()
+    _logger.info(
+        "planned key rotation %s: %d rows in %d chunks",
+        _run_id,
+        _total_rows,
+        len(_chunks),
+    )
+    return _run_id
+
+
+def rotate_chunks(run_id: str) -> int:
+    """work through chunks of the given run until every one is done
+
+    chunks claimed by other workers are waited on, and claimed here if their
+    lease runs out before they're done
+
+    returns the number of rows rotated (by this worker)
+    """
+    _redis = get_redis()
+    _run = _redis.hgetall(_run_key(run_id))
+    if not _run:
+        raise ValueError(f"no key rotation run {run_id!r} (maybe expired?)")
+    _rows = _rows_to_rotate(
+        datetime.datetime.fromisoformat(_run[b"earlier_than"].decode()),
+        legacy_only=bool(int(_run.get(b"legacy_only", 0))),
+    )
+    _chunks = _redis.lrange(_run_key(run_id, "chunks"), 0, -1)
+    _rotated = 0
+    while True:
+        _wait_seconds = None
+        for _index, _chunk in enumerate(_chunks):
+            if _redis.sismember(_run_key(run_id, "done"), _index):
+                continue
+            _claim_key = _run_key(run_id, f"claim:{_index}")
+            if not _redis.set(_claim_key, 1, nx=True, ex=_CHUNK_LEASE_SECONDS):
+                # another worker has it; check again by the time its lease runs out
+                _lease_seconds = max(_redis.pttl(_claim_key), 0) / 1000
+                _wait_seconds = min(
+                    _lease_seconds,
+                    _CLAIM_WAIT_SECONDS if _wait_seconds is None else _wait_seconds,
+                )
+                continue
+            try:
+                _first_pk, _last_pk, _row_count = _chunk.decode().split()
+                _rotated += _rotate_chunk(_rows, _first_pk, _last_pk)
+                with _redis.pipeline() as _pipeline:  # checkpoint
+                    _pipeline.sadd(_run_key(run_id, "done"), _index)
+                    _pipeline.expire(_run_key(run_id, "done"), _RUN_STATE_SECONDS)
+                    _pipeline.hincrby(_run_key(run_id), "done_rows", int(_row_count))
+                    _pipeline.execute()
+            finally:
+                _redis.delete(_claim_key)
+        if _wait_seconds is None:  # every chunk done
+            return _rotated
+        time.sleep(_wait_seconds)
+
+
+def get_rotation_progress(run_id: str) -> RotationProgress:
+    _redis = get_redis()
+    _run = _redis.hgetall(_run_key(run_id))
+    if not _run:
+        raise ValueError(f"no key rotation run {run_id!r} (maybe expired?)")
+    return RotationProgress(
+        run_id=run_id,
+        total_rows=int(_run[b"total_rows"]),
+        done_rows=int(_run[b"done_rows"]),
+        chunk_count=int(_run[b"chunk_count"]),
+        done_chunks=_redis.scard(_run_key(run_id, "done")),
+        elapsed_seconds=time.time() - float(_run[b"started_at"]),
+    )
+
+
+###
+# module-private helpers
+
+
+def _run_key(run_id: str, *suffix: str) -> str:
+    return ":".join(("gv:key-rotation", run_id, *suffix))
+
+
+def _rows_to_rotate(earlier_than: datetime.datetime, legacy_only: bool):
+    _queryset = ExternalCredentials.objects.filter(modified__lte=earlier_than)
+    if legacy_only:
+        _queryset = _queryset.filter(wrapped_data_key__isnull=True)
+    return _queryset
+
+
+def _rotate_chunk(rows_to_rotate, first_pk: str, last_pk: str) -> int:
+    with transaction.atomic():
+        _rows = list(
+            rows_to_rotate.select_for_update()
+            .filter(pk__gte=first_pk, pk__lte=last_pk)
+            .order_by("pk")
+        )
+        _rows_by_key_params = defaultdict(list)
+        for _row in _rows:
+            _rows_by_key_params[_row._key_parameters].append(_row)
+        _now = timezone.now()
+        for _key_params_rows in _rows_by_key_params.values():
+            for _row in _key_params_rows:  # (same derived key for each)
+                _row.rotate_encryption__unsaved()
+                _row.modified = _now
+        ExternalCredentials.objects.bulk_update(_rows, _BULK_UPDATE_FIELDS)
+    for _row in _rows:
+        auth_header_cache.invalidate(_row.pk)
+    return len(_rows)
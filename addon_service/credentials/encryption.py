@@ -8,32 +8,41 @@ considering recommendations from:
 - https://nvlpubs.nist.gov/nistpubs/Legacy/SP/nistspecialpublication800-132.pdf
 """
 
+import asyncio
 import base64
 import dataclasses
 import functools
-import hashlib
 import json
 import os
+import threading
 
 from cryptography import fernet
 from django.conf import settings
 
+from . import key_derivation
+
 
 __all__ = (
+    "aprepare_keys",
+    "envelope_key_parameters",
+    "get_decrypt_json_count",
     "pls_decrypt_bytes",
     "pls_decrypt_json",
     "pls_encrypt_bytes",
     "pls_encrypt_json",
+    "pls_new_wrapped_data_key",
+    "pls_rewrap_data_key",
     "salt_factory",
 )
 
 
-# 32-byte key expected by cryptography.fernet.Fernet
-_KEY_BYTE_COUNT = 32
-
 # recommended len(salt) >= 16 bytes
 _SALT_BYTE_COUNT = settings.GRAVYVALET_SALT_BYTE_COUNT or 17
 
+# how many times `pls_decrypt_json` has run (see `get_decrypt_json_count`)
+_decrypt_json_count = 0
+_DECRYPT_JSON_COUNT_LOCK = threading.Lock()
+
 
 def salt_factory() -> bytes:
     return os.urandom(_SALT_BYTE_COUNT)
@@ -89,81 +98,136 @@ class KeyParameters:  # https://datatracker.ietf.org/doc/html/rfc7914#section-2
         return _scrypt_main_bytecount + _scryptromix_bytecount + _fudge
 
 
-def pls_encrypt_json(jsonable_obj, key_params: KeyParameters) -> bytes:
-    return pls_encrypt_bytes(json.dumps(jsonable_obj).encode(), key_params)
+def pls_encrypt_json(
+    jsonable_obj, key_params: KeyParameters, wrapped_data_key: bytes | None = None
+) -> bytes:
+    return pls_encrypt_bytes(
+        json.dumps(jsonable_obj).encode(), key_params, wrapped_data_key
+    )
 
 
-def pls_decrypt_json(encrypted_json: bytes, key_params: KeyParameters):
-    return json.loads(pls_decrypt_bytes(encrypted_json, key_params))
+def pls_decrypt_json(
+    encrypted_json: bytes,
+    key_params: KeyParameters,
+    wrapped_data_key: bytes | None = None,
+):
+    global _decrypt_json_count
+    with _DECRYPT_JSON_COUNT_LOCK:
+        _decrypt_json_count += 1
+    return json.loads(pls_decrypt_bytes(encrypted_json, key_params, wrapped_data_key))
 
 
-def pls_encrypt_bytes(msg: bytes, key_params: KeyParameters) -> bytes:
-    return _derive_multifernet_key(key_params).encrypt(msg)
+def get_decrypt_json_count() -> int:
+    """how many times `pls_decrypt_json` has run in this process (for debugging)"""
+    with _DECRYPT_JSON_COUNT_LOCK:
+        return _decrypt_json_count
 
 
-def pls_decrypt_bytes(encrypted: bytes, key_params: KeyParameters) -> bytes:
-    return _derive_multifernet_key(key_params).decrypt(encrypted)
+def pls_encrypt_bytes(
+    msg: bytes, key_params: KeyParameters, wrapped_data_key: bytes | None = None
+) -> bytes:
+    return _get_fernet(key_params, wrapped_data_key).encrypt(msg)
 
 
-def pls_rotate_encryption(
+def pls_decrypt_bytes(
     encrypted: bytes,
+    key_params: KeyParameters,
+    wrapped_data_key: bytes | None = None,
+) -> bytes:
+    return _get_fernet(key_params, wrapped_data_key).decrypt(encrypted)
+
+
+def envelope_key_parameters() -> KeyParameters:
+    """parameters for the key-encryption key, shared by all envelope-encrypted data"""
+    return KeyParameters(salt=settings.GRAVYVALET_KEY_ENCRYPTION_SALT)
+
+
+def pls_new_wrapped_data_key() -> tuple[bytes, KeyParameters]:
+    """a fresh random data key, wrapped (encrypted) with the key-encryption key
+
+    envelope encryption: each row gets its own data key, but every data key is
+    wrapped with the same key-encryption key -- only that key needs (expensive)
+    derivation, once per process
+    """
+    _key_params = envelope_key_parameters()
+    _wrapped = pls_encrypt_bytes(fernet.Fernet.generate_key(), _key_params)
+    return _wrapped, _key_params
+
+
+def pls_rewrap_data_key(
+    wrapped_data_key: bytes,
     stored_params: KeyParameters,
 ) -> tuple[bytes, KeyParameters]:
-    _fresh_params = KeyParameters(salt=salt_factory())
-    _stored_up_to_date = (
-        len(stored_params.salt) == len(_fresh_params.salt)
-        and stored_params.scrypt_cost_log2 == _fresh_params.scrypt_cost_log2
-        and stored_params.scrypt_block_size == _fresh_params.scrypt_block_size
-        and stored_params.scrypt_parallelization == _fresh_params.scrypt_parallelization
+    """re-wrap a data key with the current key-encryption key (and parameters)
+
+    (data encrypted with the data key is unchanged)
+    """
+    _fresh_params = envelope_key_parameters()
+    if (
+        stored_params == _fresh_params
+    ):  # key params NOT changed -- can use MultiFernet.rotate
+        _rewrapped = _derive_multifernet_key(stored_params).rotate(
+            bytes(wrapped_data_key)
+        )
+    else:  # key params HAVE changed -- unwrap and re-wrap
+        _rewrapped = pls_encrypt_bytes(
+            pls_decrypt_bytes(wrapped_data_key, stored_params), _fresh_params
+        )
+    return _rewrapped, _fresh_params
+
+
+async def aprepare_keys(key_params: KeyParameters) -> None:
+    """derive keys for the given parameters without blocking the event loop
+
+    (once derived, encrypting and decrypting with these parameters is quick)
+    """
+    await asyncio.gather(
+        *(
+            key_derivation.aderive_key_bytes(_secret, key_params)
+            for _secret in _get_secrets()
+        )
     )
-    if _stored_up_to_date:  # key params NOT changed -- can use MultiFernet.rotate
-        _fresh_encrypted = _derive_multifernet_key(stored_params).rotate(encrypted)
-        _fresh_params = stored_params
-    else:
-        # key defaults HAVE changed -- decrypt and re-encrypt
-        _decrypted = pls_decrypt_bytes(encrypted, stored_params)
-        _fresh_encrypted = pls_encrypt_bytes(_decrypted, _fresh_params)
-    return _fresh_encrypted, _fresh_params
 
 
 # deriving keys is expensive on purpose -- cache, but only in local memory
+# (derivation itself happens in a separate pool; see `key_derivation`)
 @functools.lru_cache(maxsize=settings.GRAVYVALET_DERIVED_KEY_CACHE_SIZE)
 def _derive_multifernet_key(
     key_params: KeyParameters,
     /,  # positional-only params for cache-friendliness
 ) -> fernet.MultiFernet:
+    # https://cryptography.io/en/latest/fernet/#cryptography.fernet.MultiFernet
+    return fernet.MultiFernet(
+        [_derive_fernet_key(_secret, key_params) for _secret in _get_secrets()]
+    )
+
+
+def _get_fernet(
+    key_params: KeyParameters, wrapped_data_key: bytes | None
+) -> fernet.Fernet | fernet.MultiFernet:
+    if wrapped_data_key is None:  # encrypted with a key derived for these params
+        return _derive_multifernet_key(key_params)
+    # envelope-encrypted: unwrap the data key with the (derived) key-encryption key
+    return fernet.Fernet(
+        _derive_multifernet_key(key_params).decrypt(bytes(wrapped_data_key))
+    )
+
+
+def _get_secrets() -> tuple[bytes, ...]:
     if not settings.GRAVYVALET_ENCRYPT_SECRET:
         raise RuntimeError(
             "gravyvalet can not keep your secrets without a GRAVYVALET_ENCRYPT_SECRET"
             " -- ideally chosen by strong randomness, with maybe ~128 bits of entropy"
             " (e.g. 32 hex digits; 30 d20 rolls; 10 words of a 10000-word vocabulary)"
         )
-    # https://cryptography.io/en/latest/fernet/#cryptography.fernet.MultiFernet
-    return fernet.MultiFernet(
-        [
-            _derive_fernet_key(_secret, key_params)
-            for _secret in (
-                settings.GRAVYVALET_ENCRYPT_SECRET,
-                *settings.GRAVYVALET_ENCRYPT_SECRET_PRIORS,
-            )
-        ]
+    return (
+        settings.GRAVYVALET_ENCRYPT_SECRET,
+        *settings.GRAVYVALET_ENCRYPT_SECRET_PRIORS,
     )
 
 
 def _derive_fernet_key(secret: bytes, key_params: KeyParameters) -> fernet.Fernet:
     # https://cryptography.io/en/latest/fernet/#using-passwords-with-fernet
     return fernet.Fernet(
-        base64.urlsafe_b64encode(_derive_key_bytes(secret, key_params))
-    )
-
-
-def _derive_key_bytes(secret: bytes, key_params: KeyParameters) -> bytes:
-    return hashlib.scrypt(
-        secret,
-        salt=key_params.salt,
-        n=2**key_params.scrypt_cost_log2,
-        r=key_params.scrypt_block_size,
-        p=key_params.scrypt_parallelization,
-        dklen=_KEY_BYTE_COUNT,
-        maxmem=key_params.memory_required(),
+        base64.urlsafe_b64encode(key_derivation.derive_key_bytes(secret, key_params))
     )
@@ -0,0 +1,84 @@
+"""a bounded, in-memory cache of ready-to-send auth headers for `ExternalCredentials`
+
+decrypting credentials is not cheap (scrypt key derivation, when the derived key
+isn't already cached, then fernet decryption and json parsing), and every request
+to an external service needs auth headers -- so keep the headers from each
+decryption, keyed by credentials pk and `modified` timestamp
+
+any change to the credentials row updates `modified`, so stale headers (e.g. from
+another process's token refresh) won't match; changes in this process also
+`invalidate` right away
+"""
+
+import threading
+import typing
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+if typing.TYPE_CHECKING:
+    from addon_service.common.credentials_formats import CredentialsFormats
+    from addon_service.credentials.models import ExternalCredentials
+
+
+__all__ = (
+    "AuthHeaderCache",
+    "auth_header_cache",
+)
+
+
+class AuthHeaderCache:
+    """least-recently-used auth headers, at most one entry per credentials pk"""
+
+    def __init__(self):
+        self._entries: OrderedDict[typing.Any, tuple[typing.Any, tuple]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(
+        self, credentials: "ExternalCredentials"
+    ) -> list[tuple[str, str]] | None:
+        """cached headers for the given credentials, if any (without decrypting)"""
+        with self._lock:
+            _entry = self._entries.get(credentials.pk)
+            if _entry is None or _entry[0] != credentials.modified:
+                return None
+            self._entries.move_to_end(credentials.pk)
+            return list(_entry[1])
+
+    def get_or_build(
+        self,
+        credentials: "ExternalCredentials",
+        credentials_format: "CredentialsFormats",
+    ) -> list[tuple[str, str]]:
+        """headers for the given credentials, decrypting only if not cached"""
+        _headers = self.lookup(credentials)
+        if _headers is None:
+            _headers = list(
+                credentials_format.iter_headers(credentials.decrypted_credentials)
+            )
+            self._store(credentials, _headers)
+        return _headers
+
+    def invalidate(self, credentials_pk) -> None:
+        with self._lock:
+            self._entries.pop(credentials_pk, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _store(
+        self, credentials: "ExternalCredentials", headers: list[tuple[str, str]]
+    ) -> None:
+        if credentials.pk is None:
+            return  # (not yet saved)
+        _max_size = settings.GRAVYVALET_AUTH_HEADER_CACHE_SIZE
+        with self._lock:
+            self._entries[credentials.pk] = (credentials.modified, tuple(headers))
+            self._entries.move_to_end(credentials.pk)
+            while len(self._entries) > _max_size:
+                self._entries.popitem(last=False)
+
+
+auth_header_cache = AuthHeaderCache()
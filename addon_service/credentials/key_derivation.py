@@ -0,0 +1,164 @@
+"""a dedicated pool for (expensive, on purpose) scrypt key derivation
+
+scrypt with default parameters takes hundreds of milliseconds and ~128MiB of
+memory -- rather than run on whatever web/celery thread needs a key (stalling an
+event loop, or risking a burst of cold decrypts running a pod out of memory),
+derive keys in a pool of worker processes:
+- derivations run concurrently only while their total `memory_required()` fits
+  within `GRAVYVALET_KEY_DERIVATION_MEMORY_BUDGET_MIB` (any one derivation may run
+  alone, however large); others wait their turn
+- identical derivations (same secret and `KeyParameters`) share one result, and
+  recent results are kept in local memory (`GRAVYVALET_DERIVED_KEY_CACHE_SIZE`)
+- `derive_key_bytes` blocks the calling thread; `aderive_key_bytes` awaits
+
+set `GRAVYVALET_KEY_DERIVATION_PROCESSES` to "0" to derive in a background thread
+instead of separate processes (e.g. for tests)
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import multiprocessing
+import threading
+import typing
+from collections import (
+    OrderedDict,
+    deque,
+)
+
+from django.conf import settings
+
+
+if typing.TYPE_CHECKING:
+    from addon_service.credentials.encryption import KeyParameters
+
+
+__all__ = (
+    "aderive_key_bytes",
+    "derive_key_bytes",
+    "KeyDerivationPool",
+)
+
+
+# 32-byte key expected by cryptography.fernet.Fernet
+_KEY_BYTE_COUNT = 32
+
+_MIB = 2**20
+
+
+class KeyDerivationPool:
+    def __init__(self):
+        self._lock = threading.RLock()  # (reentrant: futures may finish at once)
+        self._derived: OrderedDict[tuple, bytes] = OrderedDict()
+        self._in_flight: dict[tuple, concurrent.futures.Future] = {}
+        self._waiting: deque[tuple] = deque()
+        self._memory_in_use = 0
+        self._process_executor: concurrent.futures.Executor | None = None
+        self._thread_executor: concurrent.futures.Executor | None = None
+
+    def submit(
+        self, secret: bytes, key_params: "KeyParameters"
+    ) -> concurrent.futures.Future:
+        """a future for the derived key bytes (already done, if recently derived)"""
+        _derivation = (secret, key_params)
+        with self._lock:
+            _derived = self._derived.get(_derivation)
+            if _derived is not None:
+                self._derived.move_to_end(_derivation)
+                _future: concurrent.futures.Future = concurrent.futures.Future()
+                _future.set_result(_derived)
+                return _future
+            _future = self._in_flight.get(_derivation)
+            if _future is None:  # no identical derivation in flight; start one
+                _future = self._in_flight[_derivation] = concurrent.futures.Future()
+                self._waiting.append(_derivation)
+                self._start_waiting()
+            return _future
+
+    def memory_in_use(self) -> int:
+        with self._lock:
+            return self._memory_in_use
+
+    def clear(self) -> None:
+        with self._lock:
+            self._derived.clear()
+
+    def _start_waiting(self) -> None:
+        _budget = settings.GRAVYVALET_KEY_DERIVATION_MEMORY_BUDGET_MIB * _MIB
+        with self._lock:
+            while self._waiting:
+                _secret, _key_params = self._waiting[0]
+                _memory_required = _key_params.memory_required()
+                if self._memory_in_use and (
+                    self._memory_in_use + _memory_required > _budget
+                ):
+                    return  # wait for memory to free up
+                _derivation = self._waiting.popleft()
+                self._memory_in_use += _memory_required
+                try:
+                    _executor_future = self._get_executor().submit(
+                        hashlib.scrypt,
+                        _secret,
+                        salt=_key_params.salt,
+                        n=2**_key_params.scrypt_cost_log2,
+                        r=_key_params.scrypt_block_size,
+                        p=_key_params.scrypt_parallelization,
+                        dklen=_KEY_BYTE_COUNT,
+                        maxmem=_memory_required,
+                    )
+                except BaseException as _error:
+                    if isinstance(_error, concurrent.futures.BrokenExecutor):
+                        self._process_executor = None  # (start fresh next time)
+                    _executor_future = concurrent.futures.Future()
+                    _executor_future.set_exception(_error)
+                _executor_future.add_done_callback(
+                    lambda _done, _derivation=_derivation, _memory=_memory_required: (
+                        self._finish(_derivation, _memory, _done)
+                    )
+                )
+
+    def _finish(
+        self,
+        derivation: tuple,
+        memory_required: int,
+        executor_future: concurrent.futures.Future,
+    ) -> None:
+        _error = executor_future.exception()
+        with self._lock:
+            self._memory_in_use -= memory_required
+            _future = self._in_flight.pop(derivation)
+            if _error is None and settings.GRAVYVALET_DERIVED_KEY_CACHE_SIZE:
+                self._derived[derivation] = executor_future.result()
+                while len(self._derived) > settings.GRAVYVALET_DERIVED_KEY_CACHE_SIZE:
+                    self._derived.popitem(last=False)
+            self._start_waiting()
+        if _error is None:
+            _future.set_result(executor_future.result())
+        else:
+            _future.set_exception(_error)
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        if not settings.GRAVYVALET_KEY_DERIVATION_PROCESSES:
+            if self._thread_executor is None:
+                self._thread_executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=4, thread_name_prefix="gv-key-derivation"
+                )
+            return self._thread_executor
+        if self._process_executor is None:
+            self._process_executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=settings.GRAVYVALET_KEY_DERIVATION_PROCESSES,
+                # (not "fork" -- web and celery processes have threads)
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._process_executor
+
+
+_POOL = KeyDerivationPool()
+
+
+def derive_key_bytes(secret: bytes, key_params: "KeyParameters") -> bytes:
+    return _POOL.submit(secret, key_params).result()
+
+
+async def aderive_key_bytes(secret: bytes, key_params: "KeyParameters") -> bytes:
+    return await asyncio.wrap_future(_POOL.submit(secret, key_params))
@@ -9,10 +9,14 @@ from addon_toolkit.json_arguments import json_for_dataclass
 from ..common.credentials_formats import CredentialsFormats
 from ..common.validators import validate_credentials_format
 from . import encryption
+from .header_cache import auth_header_cache
 
 
 class ExternalCredentials(AddonsServiceBaseModel):
     encrypted_json = models.BinaryField()
+    # random data key for `encrypted_json`, wrapped with the key-encryption key
+    # (null for credentials encrypted with a key derived for this row alone)
+    wrapped_data_key = models.BinaryField(null=True, blank=True)
     _salt = models.BinaryField()
     _scrypt_block_size = models.IntegerField()
     _scrypt_cost_log2 = models.IntegerField()
@@ -38,9 +42,11 @@ class ExternalCredentials(AddonsServiceBaseModel):
 
     @classmethod
     def new(cls, credential_format: CredentialsFormats = None):
-        # initialize key-parameter fields with fresh defaults
+        # initialize with a fresh data key (and key-encryption key parameters)
         _new = cls()
-        _new._key_parameters = encryption.KeyParameters()
+        _new.wrapped_data_key, _new._key_parameters = (
+            encryption.pls_new_wrapped_data_key()
+        )
         if credential_format:
             _new.int_credentials_format = credential_format.value
         return _new
@@ -48,35 +54,77 @@ class ExternalCredentials(AddonsServiceBaseModel):
     ###
     # public encryption-related methods
 
+    # (decrypted credentials, memoized until any encryption-related field changes)
+    _decrypted_credentials_memo: tuple[tuple, Credentials] | None = None
+
     @property
     def decrypted_credentials(self) -> Credentials:
         """Returns a Dataclass instance of the credentials for performing Addon Operations."""
-        return self.format.dataclass(**self._decrypted_json)
+        _memo_key = self._decryption_memo_key()
+        _memo = self._decrypted_credentials_memo
+        if _memo is None or _memo[0] != _memo_key:
+            _memo = (_memo_key, self.format.dataclass(**self._decrypted_json))
+            self._decrypted_credentials_memo = _memo
+        return _memo[1]
 
     @decrypted_credentials.setter
     def decrypted_credentials(self, value: Credentials):
         self._decrypted_json = json_for_dataclass(value)
 
+    async def aprepare_encryption_keys(self) -> None:
+        """derive this row's encryption keys (if not already at hand) off the event loop"""
+        await encryption.aprepare_keys(self._key_parameters)
+
+    @property
+    def is_envelope_encrypted(self) -> bool:
+        return self.wrapped_data_key is not None
+
     def rotate_encryption(self):
         with dibs(self):
-            self.encrypted_json, self._key_parameters = (
-                encryption.pls_rotate_encryption(
-                    encrypted=self.encrypted_json,
-                    stored_params=self._key_parameters,
+            self.rotate_encryption__unsaved()
+            self.save()
+        auth_header_cache.invalidate(self.pk)
+
+    def rotate_encryption__unsaved(self):
+        """rotate encryption in memory only (for callers that save in bulk)"""
+        if self.is_envelope_encrypted:  # only the data key needs re-wrapping
+            self.wrapped_data_key, self._key_parameters = (
+                encryption.pls_rewrap_data_key(
+                    self.wrapped_data_key, self._key_parameters
                 )
             )
-            self.save()
+        else:  # re-encrypt with a fresh (wrapped) data key
+            self._decrypted_json = self._decrypted_json
 
     ###
     # private encryption-related methods
 
     @property
     def _decrypted_json(self):
-        return encryption.pls_decrypt_json(self.encrypted_json, self._key_parameters)
+        return encryption.pls_decrypt_json(
+            self.encrypted_json, self._key_parameters, self.wrapped_data_key
+        )
 
     @_decrypted_json.setter
     def _decrypted_json(self, value):
-        self.encrypted_json = encryption.pls_encrypt_json(value, self._key_parameters)
+        if not self.is_envelope_encrypted:
+            self.wrapped_data_key, self._key_parameters = (
+                encryption.pls_new_wrapped_data_key()
+            )
+        self.encrypted_json = encryption.pls_encrypt_json(
+            value, self._key_parameters, self.wrapped_data_key
+        )
+
+    def _decryption_memo_key(self) -> tuple:
+        return (
+            _as_bytes(self.encrypted_json),
+            _as_bytes(self.wrapped_data_key),
+            _as_bytes(self._salt),
+            self._scrypt_block_size,
+            self._scrypt_cost_log2,
+            self._scrypt_parallelization,
+            self.int_credentials_format,
+        )
 
     @property
     def _key_parameters(self) -> encryption.KeyParameters:
@@ -137,3 +185,8 @@ class ExternalCredentials(AddonsServiceBaseModel):
             self.decrypted_credentials
         except TypeError as e:
             raise ValidationError(e)
+
+
+def _as_bytes(value: bytes | memoryview | None) -> bytes | None:
+    # (binary fields may be loaded from the database as memoryview)
+    return None if value is None else bytes(value)
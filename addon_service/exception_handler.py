@@ -1,4 +1,6 @@
 from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework import status
+from rest_framework.exceptions import APIException
 from rest_framework.exceptions import ValidationError as RestFrameworkValidationError
 from rest_framework.response import Response
 from rest_framework_json_api import serializers
@@ -6,6 +8,14 @@ from rest_framework_json_api.exceptions import (
     exception_handler as drfja_exception_handler,
 )
 
+from addon_service.common.exceptions import OperationTimedOut
+
+
+class GatewayTimeout(APIException):
+    status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_detail = "an external service took too long"
+    default_code = "gateway_timeout"
+
 
 def api_exception_handler(exception: Exception, context: dict) -> Response | None:
     """custom api exception handler
@@ -16,11 +26,16 @@ def api_exception_handler(exception: Exception, context: dict) -> Response | Non
     return a 400 response for django model validation errors, same as
     django-rest-framework serializer validation errors
 
+    return a 504 response for operations that ran out of time
+
     OHNO: does not translate to serializer field names -- may be a problem if model field names differ
     """
-    _api_exception = (
-        RestFrameworkValidationError(detail=serializers.as_serializer_error(exception))
-        if isinstance(exception, DjangoValidationError)
-        else exception
-    )
+    if isinstance(exception, DjangoValidationError):
+        _api_exception = RestFrameworkValidationError(
+            detail=serializers.as_serializer_error(exception)
+        )
+    elif isinstance(exception, OperationTimedOut):
+        _api_exception = GatewayTimeout(detail=str(exception))
+    else:
+        _api_exception = exception
     return drfja_exception_handler(_api_exception, context)
@@ -42,6 +42,8 @@ class ExternalService(AddonsServiceBaseModel):
     api_base_url = models.URLField(blank=True, default="")
     api_base_url_options = ArrayField(models.CharField(), null=True, blank=True)
     wb_key = models.CharField(null=False, blank=True, default="")
+    # longest to spend on an immediate operation (overrides the operation's default)
+    immediate_time_budget_seconds = models.FloatField(null=True, blank=True)
     oauth1_client_config = models.ForeignKey(
         "addon_service.OAuth1ClientConfig",
         on_delete=models.SET_NULL,
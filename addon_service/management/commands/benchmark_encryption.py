@@ -0,0 +1,329 @@
+import base64
+import concurrent.futures
+import dataclasses
+import json
+import multiprocessing
+import os
+import random
+import resource
+import time
+from collections import OrderedDict
+
+from cryptography import fernet
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# an example of what's encrypted (about the size of real credentials)
+_SAMPLE_CREDENTIALS = json.dumps(
+    {"access_token": "a" * 64, "refresh_token": "r" * 64}
+).encode()
+
+
+@dataclasses.dataclass(frozen=True)
+class _Result:
+    scrypt_cost_log2: int
+    scrypt_block_size: int
+    scrypt_parallelization: int
+    prior_secret_count: int
+    memory_required_bytes: int
+    derive_seconds: float
+    encrypt_per_second: float
+    decrypt_per_second: float
+    decrypt_prior_per_second: float  # (data encrypted with the oldest secret)
+    rotate_per_second: float
+    envelope_encrypt_per_second: float
+    envelope_decrypt_per_second: float
+    rewrap_per_second: float  # (envelope data keys)
+    peak_rss_bytes: int
+
+
+class Command(BaseCommand):
+    """benchmark credentials encryption across a grid of key-derivation parameters
+
+    for each combination of scrypt parameters and count of prior secrets, measures
+    (in a fresh process, for an honest peak rss, thru the same `encryption` api
+    and `key_derivation` pool used for credentials):
+    - time to derive a `MultiFernet` key (one scrypt derivation per secret)
+    - encrypt, decrypt and rotate throughput with that key
+    - encrypt, decrypt and re-wrap throughput with envelope encryption (a data key
+      wrapped with that key)
+
+    also simulates the derived-key cache (`GRAVYVALET_DERIVED_KEY_CACHE_SIZE`) under
+    a zipf-distributed access pattern over many accounts (each with its own salt,
+    as credentials encrypted without envelope encryption), estimating how much
+    time goes to key derivation per access
+
+    prints a table; use `--json` to also write results as json (e.g. for ci trends)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--cost-log2", type=int, nargs="+", default=[14, 15, 16, 17]
+        )
+        parser.add_argument("--block-size", type=int, nargs="+", default=[8])
+        parser.add_argument("--parallelization", type=int, nargs="+", default=[1])
+        parser.add_argument(
+            "--max-priors",
+            type=int,
+            default=2,
+            help="benchmark with 0 thru this many prior secrets",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=1000,
+            help="encrypt/decrypt/rotate operations to time",
+        )
+        parser.add_argument(
+            "--cache-sizes",
+            type=int,
+            nargs="+",
+            default=[settings.GRAVYVALET_DERIVED_KEY_CACHE_SIZE],
+            help="derived-key cache sizes to simulate",
+        )
+        parser.add_argument("--accounts", type=int, default=10_000)
+        parser.add_argument("--accesses", type=int, default=100_000)
+        parser.add_argument(
+            "--zipf-exponent",
+            type=float,
+            default=1.1,
+            help="account popularity skew (higher: a few accounts get most access)",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--json", metavar="PATH", help='write json results to PATH ("-" for stdout)'
+        )
+
+    def handle(self, *args, **options):
+        # (imported here, so benchmark processes may import this module before
+        # settings are needed -- each configures them from DJANGO_SETTINGS_MODULE)
+        from addon_service.credentials.encryption import KeyParameters
+
+        _results: list[_Result] = []
+        # one task per fresh process, so each peak rss is its own
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=1,
+        ) as _executor:
+            for _cost_log2 in options["cost_log2"]:
+                for _block_size in options["block_size"]:
+                    for _parallelization in options["parallelization"]:
+                        _key_params = KeyParameters(
+                            scrypt_cost_log2=_cost_log2,
+                            scrypt_block_size=_block_size,
+                            scrypt_parallelization=_parallelization,
+                        )
+                        for _prior_count in range(options["max_priors"] + 1):
+                            _result = _executor.submit(
+                                _benchmark,
+                                salt=_key_params.salt,
+                                cost_log2=_cost_log2,
+                                block_size=_block_size,
+                                parallelization=_parallelization,
+                                prior_count=_prior_count,
+                                iterations=options["iterations"],
+                            ).result()
+                            self._write_result(_result, first=not _results)
+                            _results.append(_result)
+        _cache_results = [
+            _simulate_derived_key_cache(
+                cache_size=_cache_size,
+                account_count=options["accounts"],
+                access_count=options["accesses"],
+                zipf_exponent=options["zipf_exponent"],
+                seed=options["seed"],
+            )
+            for _cache_size in options["cache_sizes"]
+        ]
+        self._write_cache_results(_cache_results, _results)
+        if options["json"]:
+            _json = json.dumps(
+                {
+                    "key_parameters": [dataclasses.asdict(_r) for _r in _results],
+                    "derived_key_cache": _cache_results,
+                },
+                indent=2,
+            )
+            if options["json"] == "-":
+                self.stdout.write(_json)
+            else:
+                with open(options["json"], "w") as _file:
+                    _file.write(_json)
+
+    def _write_result(self, result: _Result, *, first: bool) -> None:
+        _columns = (
+            ("N", f"2^{result.scrypt_cost_log2}"),
+            ("r", result.scrypt_block_size),
+            ("p", result.scrypt_parallelization),
+            ("priors", result.prior_secret_count),
+            ("mem MiB", f"{result.memory_required_bytes / 2**20:.0f}"),
+            ("derive ms", f"{result.derive_seconds * 1000:.0f}"),
+            ("encrypt/s", f"{result.encrypt_per_second:.0f}"),
+            ("decrypt/s", f"{result.decrypt_per_second:.0f}"),
+            ("decrypt prior/s", f"{result.decrypt_prior_per_second:.0f}"),
+            ("rotate/s", f"{result.rotate_per_second:.0f}"),
+            ("envelope enc/s", f"{result.envelope_encrypt_per_second:.0f}"),
+            ("envelope dec/s", f"{result.envelope_decrypt_per_second:.0f}"),
+            ("rewrap/s", f"{result.rewrap_per_second:.0f}"),
+            ("peak rss MiB", f"{result.peak_rss_bytes / 2**20:.0f}"),
+        )
+        if first:
+            self.stdout.write(_table_row(_name for _name, _ in _columns))
+        self.stdout.write(_table_row(_value for _, _value in _columns))
+
+    def _write_cache_results(
+        self, cache_results: list[dict], results: list[_Result]
+    ) -> None:
+        self.stdout.write("")
+        self.stdout.write(_table_row(("cache size", "hit rate", "derive ms/access")))
+        # (with the first benchmarked parameters and no prior secrets)
+        _derive_seconds = results[0].derive_seconds if results else 0.0
+        for _cache_result in cache_results:
+            _miss_rate = 1 - _cache_result["hit_rate"]
+            self.stdout.write(
+                _table_row(
+                    (
+                        _cache_result["cache_size"],
+                        f"{_cache_result['hit_rate']:.1%}",
+                        f"{_miss_rate * _derive_seconds * 1000:.1f}",
+                    )
+                )
+            )
+
+
+def _table_row(values) -> str:
+    return " | ".join(f"{_value!s:>15}" for _value in values)
+
+
+def _benchmark(
+    *,
+    salt: bytes,
+    cost_log2: int,
+    block_size: int,
+    parallelization: int,
+    prior_count: int,
+    iterations: int,
+) -> _Result:
+    # runs in a fresh process, so peak rss is for this alone (plus settings and
+    # imports, as any process that encrypts would have); keys are derived as
+    # gravyvalet derives them, thru `key_derivation` -- in threads, as with
+    # `GRAVYVALET_KEY_DERIVATION_PROCESSES=0`, to count their memory here
+    from django.test import override_settings
+
+    from addon_service.credentials import (
+        encryption,
+        key_derivation,
+    )
+
+    _secrets = [os.urandom(16) for _ in range(prior_count + 1)]
+    with override_settings(
+        GRAVYVALET_ENCRYPT_SECRET=_secrets[0],
+        GRAVYVALET_ENCRYPT_SECRET_PRIORS=tuple(_secrets[1:]),
+        GRAVYVALET_KEY_DERIVATION_PROCESSES=0,
+    ):
+        _key_params = encryption.KeyParameters(
+            salt=salt,
+            scrypt_cost_log2=cost_log2,
+            scrypt_block_size=block_size,
+            scrypt_parallelization=parallelization,
+        )
+        _started = time.perf_counter()
+        _multifernet = encryption._derive_multifernet_key(_key_params)
+        _derive_seconds = time.perf_counter() - _started
+        # (the oldest secret's key, from the pool's cache)
+        _oldest_fernet = fernet.Fernet(
+            base64.urlsafe_b64encode(
+                key_derivation.derive_key_bytes(_secrets[-1], _key_params)
+            )
+        )
+        _encrypted = encryption.pls_encrypt_bytes(_SAMPLE_CREDENTIALS, _key_params)
+        _encrypted_prior = _oldest_fernet.encrypt(_SAMPLE_CREDENTIALS)
+        # envelope encryption, with these parameters for the key-encryption key
+        _wrapped_data_key = encryption.pls_encrypt_bytes(
+            fernet.Fernet.generate_key(), _key_params
+        )
+        _envelope_encrypted = encryption.pls_encrypt_bytes(
+            _SAMPLE_CREDENTIALS, _key_params, _wrapped_data_key
+        )
+        return _Result(
+            scrypt_cost_log2=cost_log2,
+            scrypt_block_size=block_size,
+            scrypt_parallelization=parallelization,
+            prior_secret_count=prior_count,
+            memory_required_bytes=_key_params.memory_required(),
+            derive_seconds=_derive_seconds,
+            encrypt_per_second=_per_second(
+                lambda: encryption.pls_encrypt_bytes(_SAMPLE_CREDENTIALS, _key_params),
+                iterations,
+            ),
+            decrypt_per_second=_per_second(
+                lambda: encryption.pls_decrypt_bytes(_encrypted, _key_params),
+                iterations,
+            ),
+            decrypt_prior_per_second=_per_second(
+                lambda: encryption.pls_decrypt_bytes(_encrypted_prior, _key_params),
+                iterations,
+            ),
+            rotate_per_second=_per_second(
+                lambda: _multifernet.rotate(_encrypted_prior), iterations
+            ),
+            envelope_encrypt_per_second=_per_second(
+                lambda: encryption.pls_encrypt_bytes(
+                    _SAMPLE_CREDENTIALS, _key_params, _wrapped_data_key
+                ),
+                iterations,
+            ),
+            envelope_decrypt_per_second=_per_second(
+                lambda: encryption.pls_decrypt_bytes(
+                    _envelope_encrypted, _key_params, _wrapped_data_key
+                ),
+                iterations,
+            ),
+            # (as `pls_rewrap_data_key`, with unchanged parameters)
+            rewrap_per_second=_per_second(
+                lambda: _multifernet.rotate(_wrapped_data_key), iterations
+            ),
+            # (ru_maxrss is in kibibytes on linux)
+            peak_rss_bytes=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        )
+
+
+def _per_second(operation, iterations: int) -> float:
+    _started = time.perf_counter()
+    for _ in range(iterations):
+        operation()
+    _elapsed = time.perf_counter() - _started
+    return (iterations / _elapsed) if _elapsed else float("inf")
+
+
+def _simulate_derived_key_cache(
+    *,
+    cache_size: int,
+    account_count: int,
+    access_count: int,
+    zipf_exponent: float,
+    seed: int,
+) -> dict:
+    """hit rate of a least-recently-used cache, with one key per account"""
+    _random = random.Random(seed)
+    _accounts = range(account_count)
+    _weights = [1 / (_rank + 1) ** zipf_exponent for _rank in _accounts]
+    _cache: OrderedDict[int, None] = OrderedDict()
+    _hits = 0
+    for _account in _random.choices(_accounts, weights=_weights, k=access_count):
+        if _account in _cache:
+            _hits += 1
+            _cache.move_to_end(_account)
+        elif cache_size:
+            _cache[_account] = None
+            if len(_cache) > cache_size:
+                _cache.popitem(last=False)
+    return {
+        "cache_size": cache_size,
+        "account_count": account_count,
+        "access_count": access_count,
+        "zipf_exponent": zipf_exponent,
+        "hit_rate": (_hits / access_count) if access_count else 0.0,
+    }
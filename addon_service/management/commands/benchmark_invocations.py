@@ -0,0 +1,300 @@
+import asyncio
+import collections
+import contextlib
+import dataclasses
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import connections
+from django.test import (
+    AsyncClient,
+    override_settings,
+)
+from django.urls import (
+    clear_url_caches,
+    include,
+    path,
+    re_path,
+    reverse,
+)
+from django.utils import timezone
+
+
+# this module is the urlconf while benchmarking (see `_routing_invocations_to`)
+urlpatterns: list = []
+
+
+@dataclasses.dataclass(frozen=True)
+class _Result:
+    variant: str
+    request_count: int
+    concurrency: int
+    simulated_latency_seconds: float | None
+    elapsed_seconds: float
+    requests_per_second: float
+    status_counts: dict[int, int]
+
+
+class Command(BaseCommand):
+    """benchmark creating addon operation invocations, sync view vs async view
+
+    sends many concurrent requests to create invocations thru a configured addon,
+    first to the usual (sync) view and then to the async view (see
+    `AddonOperationInvocationViewSet.as_async_create_view`), all on one event loop
+    in this one process -- as a single daphne worker would handle them
+
+    requests are signed with `OSF_HMAC_KEY` as from the given addon's owner (so
+    osf is not asked about permissions); unless `--real-latency`, the operation
+    itself is performed once and then stood in for by a wait of `--latency`
+    seconds (as if the external service took that long), so results are about
+    how well each view waits, not about the external service
+
+    each invocation created is deleted afterward; prints a table, and use
+    `--json` to also write results as json
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--thru-addon",
+            required=True,
+            metavar="PK",
+            help="pk of a configured addon (with working credentials)",
+        )
+        parser.add_argument(
+            "--addon-type",
+            default="storage",
+            help='the configured addon\'s type (e.g. "storage", "citation")',
+        )
+        parser.add_argument("--operation", default="list_root_items")
+        parser.add_argument(
+            "--kwargs", default="{}", help="operation kwargs, as a json object"
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=20)
+        parser.add_argument(
+            "--latency",
+            type=float,
+            default=0.2,
+            help="seconds the simulated external service takes to respond",
+        )
+        parser.add_argument(
+            "--real-latency",
+            action="store_true",
+            help="perform every operation for real (instead of simulating latency)",
+        )
+        parser.add_argument(
+            "--json", metavar="PATH", help='write json results to PATH ("-" for stdout)'
+        )
+
+    def handle(self, *args, **options):
+        from addon_service.addon_operation_invocation.models import (
+            AddonOperationInvocation,
+        )
+        from addon_service.addon_operation_invocation.views import (
+            AddonOperationInvocationViewSet,
+        )
+        from addon_service.configured_addon.models import ConfiguredAddon
+
+        try:
+            _addon = ConfiguredAddon.objects.get(pk=options["thru_addon"])
+        except ConfiguredAddon.DoesNotExist:
+            raise CommandError(f"no configured addon {options['thru_addon']!r}")
+        _body = json.dumps(
+            {
+                "data": {
+                    "type": "addon-operation-invocations",
+                    "attributes": {
+                        "operation_name": options["operation"],
+                        "operation_kwargs": json.loads(options["kwargs"]),
+                    },
+                    "relationships": {
+                        "thru_addon": {
+                            "data": {
+                                "type": f"configured-{options['addon_type']}-addons",
+                                "id": str(_addon.pk),
+                            }
+                        }
+                    },
+                }
+            }
+        ).encode()
+        with override_settings(GRAVYVALET_ASYNC_INVOCATIONS_ENABLED=False):
+            _variants = {
+                "sync": AddonOperationInvocationViewSet.as_view({"post": "create"}),
+                "async": AddonOperationInvocationViewSet.as_async_create_view(),
+            }
+        _latency = None if options["real_latency"] else options["latency"]
+        _started_at = timezone.now()
+        _results: list[_Result] = []
+        try:
+            with _simulated_latency(_latency):
+                for _variant, _view in _variants.items():
+                    with _routing_invocations_to(_view):
+                        _result = asyncio.run(
+                            _benchmark(
+                                variant=_variant,
+                                body=_body,
+                                owner_uri=_addon.owner_uri,
+                                resource_uri=_addon.resource_uri,
+                                request_count=options["requests"],
+                                concurrency=options["concurrency"],
+                                latency=_latency,
+                            )
+                        )
+                    self._write_result(_result, first=not _results)
+                    _results.append(_result)
+        finally:
+            AddonOperationInvocation.objects.filter(
+                thru_addon=_addon, created__gte=_started_at
+            ).delete()
+        if len(_results) == 2 and _results[0].requests_per_second:
+            self.stdout.write(
+                "async/sync throughput: "
+                f"{_results[1].requests_per_second / _results[0].requests_per_second:.1f}x"
+            )
+        if options["json"]:
+            _json = json.dumps([dataclasses.asdict(_r) for _r in _results], indent=2)
+            if options["json"] == "-":
+                self.stdout.write(_json)
+            else:
+                with open(options["json"], "w") as _file:
+                    _file.write(_json)
+
+    def _write_result(self, result: _Result, *, first: bool) -> None:
+        _columns = (
+            ("view", result.variant),
+            ("requests", result.request_count),
+            ("concurrency", result.concurrency),
+            (
+                "latency ms",
+                (
+                    "real"
+                    if result.simulated_latency_seconds is None
+                    else f"{result.simulated_latency_seconds * 1000:.0f}"
+                ),
+            ),
+            ("elapsed s", f"{result.elapsed_seconds:.2f}"),
+            ("requests/s", f"{result.requests_per_second:.1f}"),
+            (
+                "statuses",
+                ",".join(
+                    f"{_status}x{_count}"
+                    for _status, _count in sorted(result.status_counts.items())
+                ),
+            ),
+        )
+        if first:
+            self.stdout.write(_table_row(_name for _name, _ in _columns))
+        self.stdout.write(_table_row(_value for _, _value in _columns))
+
+
+def _table_row(values) -> str:
+    return " | ".join(f"{_value!s:>12}" for _value in values)
+
+
+async def _benchmark(
+    *,
+    variant: str,
+    body: bytes,
+    owner_uri: str,
+    resource_uri: str,
+    request_count: int,
+    concurrency: int,
+    latency: float | None,
+) -> _Result:
+    from addon_service.common import hmac as hmac_utils
+    from addon_service.common import osf
+
+    _path = reverse("addon-operation-invocations-list")
+    _client = AsyncClient()
+    _semaphore = asyncio.Semaphore(concurrency)
+
+    async def _post() -> int:
+        _headers = hmac_utils.make_signed_headers(
+            request_url=_path,
+            request_method="POST",
+            hmac_key=settings.OSF_HMAC_KEY,
+            request_content=body,
+            additional_headers={
+                osf._OSF_HMAC_USER_HEADER: owner_uri,
+                osf._OSF_HMAC_RESOURCE_HEADER: resource_uri,
+                osf._OSF_HMAC_PERMISSIONS_HEADER: "read;write",
+            },
+        )
+        async with _semaphore:
+            _response = await _client.post(
+                _path,
+                body,
+                content_type="application/vnd.api+json",
+                headers=_headers,
+            )
+        return _response.status_code
+
+    await _post()  # (warm up: connections, imports, the recorded result)
+    _started = time.perf_counter()
+    _statuses = await asyncio.gather(*(_post() for _ in range(request_count)))
+    _elapsed = time.perf_counter() - _started
+    # (views' sync parts ran on a thread of this event loop's own; let go of
+    # its database connection along with it)
+    await sync_to_async(connections.close_all)()
+    return _Result(
+        variant=variant,
+        request_count=request_count,
+        concurrency=concurrency,
+        simulated_latency_seconds=latency,
+        elapsed_seconds=_elapsed,
+        requests_per_second=(request_count / _elapsed) if _elapsed else 0.0,
+        status_counts=dict(collections.Counter(_statuses)),
+    )
+
+
+@contextlib.contextmanager
+def _routing_invocations_to(view):
+    urlpatterns[:] = [
+        re_path(r"^v1/addon-operation-invocations/?$", view),
+        path("", include("app.urls")),
+    ]
+    clear_url_caches()
+    try:
+        with override_settings(
+            ROOT_URLCONF=__name__,
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+        ):
+            yield
+    finally:
+        clear_url_caches()
+
+
+@contextlib.contextmanager
+def _simulated_latency(latency: float | None):
+    """stand in for the external service: perform each operation once (for real),
+    then wait `latency` seconds and give the same result
+    """
+    if latency is None:
+        yield
+        return
+    from addon_toolkit.imp import AddonImp
+
+    _real_invoke_operation = AddonImp.invoke_operation
+    _recorded_results: dict[str, object] = {}
+
+    async def _invoke_operation(self, operation, json_kwargs):
+        if operation.name not in _recorded_results:
+            _recorded_results[operation.name] = await _real_invoke_operation(
+                self, operation, json_kwargs
+            )
+        else:
+            await asyncio.sleep(latency)
+        return _recorded_results[operation.name]
+
+    AddonImp.invoke_operation = _invoke_operation
+    try:
+        yield
+    finally:
+        AddonImp.invoke_operation = _real_invoke_operation
@@ -0,0 +1,43 @@
+import dataclasses
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from addon_service.common.rate_limit import get_bucket_states
+
+
+class Command(BaseCommand):
+    """show the shared rate-limit bucket for each (external service, account) in use"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--external-service", help="external service pk")
+        parser.add_argument("--json", action="store_true", help="output json lines")
+
+    def handle(self, *args, **options):
+        _states = sorted(
+            get_bucket_states(options["external_service"]),
+            key=lambda _state: (_state.external_service_pk, _state.account_pk),
+        )
+        if options["json"]:
+            for _state in _states:
+                self.stdout.write(json.dumps(dataclasses.asdict(_state)))
+            return
+        _now = time.time()
+        for _state in _states:
+            _blocked_for = (_state.blocked_until or 0) - _now
+            self.stdout.write(
+                f"external service {_state.external_service_pk}, account {_state.account_pk}:"
+                f" {_state.tokens or 0:.1f}/{_state.capacity or 0:.0f} tokens"
+                + (
+                    f", provider remaining {_state.provider_remaining}"
+                    if _state.provider_remaining is not None
+                    else ""
+                )
+                + (
+                    self.style.WARNING(f", blocked for {_blocked_for:.0f}s")
+                    if _blocked_for > 0
+                    else ""
+                )
+            )
+        self.stdout.write(self.style.SUCCESS(f"{len(_states)} rate-limit buckets"))
@@ -1,9 +1,87 @@
-from django.core.management.base import BaseCommand
+import time
 
-from addon_service.tasks.key_rotation import schedule_encryption_rotation__celery
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from addon_service.credentials import bulk_rotation
+from addon_service.tasks.key_rotation import (
+    resume_encryption_rotation,
+    schedule_encryption_rotation,
+)
 
 
 class Command(BaseCommand):
-    def handle(self, *args, **kwargs):
-        _task = schedule_encryption_rotation__celery.apply_async()
-        self.stdout.write(self.style.SUCCESS(f"scheduled task {_task}"))
+    """rotate encryption for all credentials, in chunks rotated by celery workers
+
+    start a new rotation run (or resume one that stopped), then report progress
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, help="rows per chunk")
+        parser.add_argument("--parallel", type=int, help="chunks to rotate in parallel")
+        parser.add_argument(
+            "--resume",
+            metavar="RUN_ID",
+            help="resume the given run (skipping chunks already done)",
+        )
+        parser.add_argument(
+            "--status",
+            metavar="RUN_ID",
+            help="only report progress of the given run",
+        )
+        parser.add_argument(
+            "--no-watch",
+            action="store_true",
+            help="don't wait for the run to complete",
+        )
+        parser.add_argument(
+            "--interval", type=float, default=5, help="seconds between reports"
+        )
+
+    def handle(self, *args, **options):
+        if options["status"]:
+            self._report(self._get_progress(options["status"]))
+            return
+        if options["resume"]:
+            _run_id = options["resume"]
+            self._get_progress(_run_id)  # (fail early if no such run)
+            resume_encryption_rotation(_run_id, parallel_chunks=options["parallel"])
+            self.stdout.write(f"resumed key rotation {_run_id}")
+        else:
+            _run_id = schedule_encryption_rotation(
+                chunk_size=options["chunk_size"],
+                parallel_chunks=options["parallel"],
+            )
+            self.stdout.write(f"started key rotation {_run_id}")
+        if options["no_watch"]:
+            return
+        try:
+            while True:
+                _progress = self._get_progress(_run_id)
+                self._report(_progress)
+                if _progress.is_complete:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:  # (rotation continues without watching)
+            self.stdout.write(f"stopped watching; see `--status {_run_id}`")
+
+    def _get_progress(self, run_id: str) -> bulk_rotation.RotationProgress:
+        try:
+            return bulk_rotation.get_rotation_progress(run_id)
+        except ValueError as _error:
+            raise CommandError(str(_error))
+
+    def _report(self, progress: bulk_rotation.RotationProgress) -> None:
+        _message = (
+            f"{progress.done_rows}/{progress.total_rows} rows"
+            f" ({progress.done_chunks}/{progress.chunk_count} chunks)"
+            f", {progress.rows_per_second:.1f} rows/sec"
+        )
+        if progress.is_complete:
+            self.stdout.write(self.style.SUCCESS(f"{_message}, complete"))
+        elif progress.eta_seconds is None:
+            self.stdout.write(f"{_message}, eta unknown")
+        else:
+            self.stdout.write(f"{_message}, eta {progress.eta_seconds:.0f}s")
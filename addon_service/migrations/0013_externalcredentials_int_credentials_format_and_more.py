@@ -6,15 +6,16 @@ from django.db import (
 )
 
 import addon_service.common.validators
-from addon_service.credentials.models import ExternalCredentials
-from addon_service.external_service.models import ExternalService
 
 
-def migrate_credential_format(*args, **kwargs):
+def migrate_credential_format(apps, schema_editor):
+    # use historical models, so later fields don't break this migration
+    ExternalService = apps.get_model("addon_service", "ExternalService")
+    ExternalCredentials = apps.get_model("addon_service", "ExternalCredentials")
     for service in ExternalService.objects.all():
         ExternalCredentials.objects.filter(
             authorized_account__external_service=service
-        ).update(int_credentials_format=service.credentials_format.value)
+        ).update(int_credentials_format=service.int_credentials_format)
 
 
 class Migration(migrations.Migration):
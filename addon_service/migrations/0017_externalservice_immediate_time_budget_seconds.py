@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-17 12:00
+
+from django.db import (
+    migrations,
+    models,
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("addon_service", "0016_externallinkservice_int_supported_features_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="externalservice",
+            name="immediate_time_budget_seconds",
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.20 on 2026-10-17 12:00
+
+from django.db import (
+    migrations,
+    models,
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("addon_service", "0017_externalservice_immediate_time_budget_seconds"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="externalcredentials",
+            name="wrapped_data_key",
+            field=models.BinaryField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,160 @@
+"""partition the addon operation invocation table by operation type, then each
+type's partition by `created`, one day each -- so each type's invocations may be
+kept for their own retention and dropped a whole day at a time
+
+the existing table (with all rows so far, of every type) becomes the default
+partition of the invocation table (its rows have no `operation_type`, so fit no
+type's partition); each type's partition has its own default partition, for
+rows no day partition takes, and partitions for today and a few days ahead
+(more are made daily, and expired ones dropped, by
+`maintain_invocation_partitions__celery`)
+
+postgres requires the partition keys in the primary key, so the primary key
+becomes (id, operation_type, created) -- the model still uses `id` alone as its
+pk, which is no longer unique by constraint, only by being a random uuid; a
+lookup by `id` alone probes each partition's index, so lookups for a known
+invocation include `operation_type` and `created` where they can (see
+`AddonOperationInvocation.partition_lookup`)
+"""
+
+import datetime
+
+from django.db import (
+    migrations,
+    models,
+)
+
+
+_TABLE = "addon_service_addonoperationinvocation"
+_LEGACY_PARTITION = f"{_TABLE}_legacy"
+_OPERATION_TYPES = ("redirect", "immediate", "eventual")  # (`AddonOperationType`)
+_DAYS_AHEAD = 3
+
+
+def _fetch(schema_editor, sql, params=()):
+    with schema_editor.connection.cursor() as _cursor:
+        _cursor.execute(sql, params)
+        return _cursor.fetchall()
+
+
+def _table_definition(schema_editor, table):
+    """the table's primary key name, foreign keys and (other) indexes"""
+    ((_pk_name,),) = _fetch(
+        schema_editor,
+        "SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'p'",
+        [table],
+    )
+    _foreign_keys = _fetch(
+        schema_editor,
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint"
+        " WHERE conrelid = %s::regclass AND contype = 'f'",
+        [table],
+    )
+    _indexes = _fetch(
+        schema_editor,
+        "SELECT _index.relname, pg_get_indexdef(_index.oid) FROM pg_index"
+        " JOIN pg_class _index ON _index.oid = pg_index.indexrelid"
+        " WHERE pg_index.indrelid = %s::regclass AND NOT pg_index.indisprimary",
+        [table],
+    )
+    return _pk_name, _foreign_keys, _indexes
+
+
+def _day_start(day: datetime.date) -> str:
+    return datetime.datetime.combine(day, datetime.time(), datetime.UTC).isoformat()
+
+
+def partition_invocations(apps, schema_editor):
+    _q = schema_editor.quote_name
+    _pk_name, _foreign_keys, _indexes = _table_definition(schema_editor, _TABLE)
+    # free up names for the partitioned table (the existing indexes are kept,
+    # renamed, and attached to the partitioned table's indexes below)
+    for _fk_name, _ in _foreign_keys:
+        schema_editor.execute(
+            f"ALTER TABLE {_q(_TABLE)} DROP CONSTRAINT {_q(_fk_name)}"
+        )
+    schema_editor.execute(f"ALTER TABLE {_q(_TABLE)} DROP CONSTRAINT {_q(_pk_name)}")
+    for _index_name, _ in _indexes:
+        schema_editor.execute(
+            f"ALTER INDEX {_q(_index_name)} RENAME TO {_q(_index_name[:56] + '_legacy')}"
+        )
+    schema_editor.execute(f"ALTER TABLE {_q(_TABLE)} RENAME TO {_q(_LEGACY_PARTITION)}")
+    schema_editor.execute(
+        f"CREATE TABLE {_q(_TABLE)} (LIKE {_q(_LEGACY_PARTITION)} INCLUDING DEFAULTS)"
+        " PARTITION BY LIST (operation_type)"
+    )
+    schema_editor.execute(
+        f"ALTER TABLE {_q(_TABLE)} ADD CONSTRAINT {_q(_pk_name)}"
+        " PRIMARY KEY (id, operation_type, created)"
+    )
+    _today = datetime.datetime.now(datetime.UTC).date()
+    for _operation_type in _OPERATION_TYPES:
+        _type_partition = f"{_TABLE}_{_operation_type}"
+        schema_editor.execute(
+            f"CREATE TABLE {_q(_type_partition)} PARTITION OF {_q(_TABLE)}"
+            f" FOR VALUES IN ('{_operation_type}') PARTITION BY RANGE (created)"
+        )
+        schema_editor.execute(
+            f"CREATE TABLE {_q(f'{_type_partition}_default')}"
+            f" PARTITION OF {_q(_type_partition)} DEFAULT"
+        )
+        for _days in range(_DAYS_AHEAD + 1):
+            _day = _today + datetime.timedelta(days=_days)
+            schema_editor.execute(
+                f"CREATE TABLE {_q(f'{_type_partition}_p{_day:%Y%m%d}')}"
+                f" PARTITION OF {_q(_type_partition)}"
+                f" FOR VALUES FROM ('{_day_start(_day)}')"
+                f" TO ('{_day_start(_day + datetime.timedelta(days=1))}')"
+            )
+    # (attached after the type partitions, so its rows are checked only once)
+    schema_editor.execute(
+        f"ALTER TABLE {_q(_TABLE)} ATTACH PARTITION {_q(_LEGACY_PARTITION)} DEFAULT"
+    )
+    for _fk_name, _fk_definition in _foreign_keys:
+        schema_editor.execute(
+            f"ALTER TABLE {_q(_TABLE)} ADD CONSTRAINT {_q(_fk_name)} {_fk_definition}"
+        )
+    for _, _index_definition in _indexes:  # (still naming this table)
+        schema_editor.execute(_index_definition)
+
+
+def unpartition_invocations(apps, schema_editor):
+    _q = schema_editor.quote_name
+    _pk_name, _foreign_keys, _indexes = _table_definition(schema_editor, _TABLE)
+    _unpartitioned = f"{_TABLE}_unpartitioned"
+    schema_editor.execute(
+        f"CREATE TABLE {_q(_unpartitioned)} (LIKE {_q(_TABLE)} INCLUDING DEFAULTS)"
+    )
+    schema_editor.execute(
+        f"INSERT INTO {_q(_unpartitioned)} SELECT * FROM {_q(_TABLE)}"
+    )
+    schema_editor.execute(f"DROP TABLE {_q(_TABLE)}")  # (with all its partitions)
+    schema_editor.execute(f"ALTER TABLE {_q(_unpartitioned)} RENAME TO {_q(_TABLE)}")
+    schema_editor.execute(
+        f"ALTER TABLE {_q(_TABLE)} ADD CONSTRAINT {_q(_pk_name)} PRIMARY KEY (id)"
+    )
+    for _fk_name, _fk_definition in _foreign_keys:
+        schema_editor.execute(
+            f"ALTER TABLE {_q(_TABLE)} ADD CONSTRAINT {_q(_fk_name)} {_fk_definition}"
+        )
+    for _, _index_definition in _indexes:
+        schema_editor.execute(_index_definition.replace(" ON ONLY ", " ON ", 1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("addon_service", "0018_externalcredentials_wrapped_data_key"),
+    ]
+
+    operations = [
+        # (with a constant default, added without rewriting the table; existing
+        # rows keep the empty default)
+        migrations.AddField(
+            model_name="addonoperationinvocation",
+            name="operation_type",
+            field=models.TextField(default="", editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(partition_invocations, unpartition_invocations),
+    ]
@@ -5,6 +5,7 @@ from enum import auto
 from typing import TYPE_CHECKING
 
 from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import ValidationError
 from django.db import (
@@ -114,6 +115,15 @@ class OAuth2TokenMetadata(AddonsServiceBaseModel):
                 "Error in OAuth2 Flow: Neither state nonce nor refresh token present."
             )
 
+    @property
+    def access_token_expires_soon(self) -> bool:
+        """whether the access token is expired (or will be, within the refresh skew)"""
+        if not self.access_token_expiration:
+            return True
+        return self.access_token_expiration < timezone.now() + timedelta(
+            seconds=settings.GRAVYVALET_OAUTH2_REFRESH_SKEW_SECONDS
+        )
+
     @property
     def access_token_only(self):
         if self.authorized_account:
@@ -0,0 +1,61 @@
+"""a cluster-wide lock per oauth2 token, so only one worker refreshes it at a time
+
+many requests (across many processes) may notice an expiring access token at
+once; without coordination each would spend the refresh token (some providers
+allow each refresh token only once) and overwrite the others' fresh tokens
+
+the lock holder refreshes; the others wait for it, then use its fresh token
+(see `AuthorizedAccount.refresh_oauth2_access_token`)
+"""
+
+import contextlib
+import logging
+
+import redis
+from django.conf import settings
+
+from addon_service.common.redis_client import get_async_redis
+
+
+__all__ = ("token_refresh_lock",)
+
+_logger = logging.getLogger(__name__)
+
+_KEY_PREFIX = "gv:oauth2-refresh"
+
+# how often waiting workers check whether the lock is free
+_POLL_SECONDS = 0.05
+
+
+@contextlib.asynccontextmanager
+async def token_refresh_lock(token_metadata_pk):
+    """hold the lock on refreshing the given token, waiting if another worker has it
+
+    if the lock can't be had (redis unavailable, or another worker held it too
+    long), go ahead without it -- a duplicate refresh beats no refresh
+    """
+    _lock_seconds = settings.GRAVYVALET_OAUTH2_REFRESH_LOCK_SECONDS
+    _lock = get_async_redis().lock(
+        f"{_KEY_PREFIX}:{token_metadata_pk}",
+        timeout=_lock_seconds,
+        sleep=_POLL_SECONDS,
+        blocking_timeout=_lock_seconds,
+    )
+    try:
+        _acquired = await _lock.acquire()
+    except redis.RedisError:
+        _logger.exception("oauth2 refresh lock unavailable")
+        _acquired = False
+    else:
+        if not _acquired:
+            _logger.warning(
+                f"gave up waiting for oauth2 refresh lock on token {token_metadata_pk}"
+            )
+    try:
+        yield
+    finally:
+        if _acquired:
+            try:
+                await _lock.release()
+            except redis.RedisError:  # (e.g. the lock expired first)
+                _logger.exception("could not release oauth2 refresh lock")
@@ -4,7 +4,8 @@ from http import HTTPStatus
 from secrets import token_urlsafe
 from typing import Iterable
 
-from addon_service.common.aiohttp_session import get_singleton_client_session
+from addon_service.common.aiohttp_session import get_pooled_client_session
+from addon_service.common.metrics import UpstreamRequestTimer
 from addon_toolkit.iri_utils import iri_with_query
 
 
@@ -120,19 +121,25 @@ async def get_refreshed_access_token(
 async def _token_request(
     token_endpoint_url: str, request_body: dict[str, str]
 ) -> FreshTokenResult:
-    _client = await get_singleton_client_session()
-    async with _client.post(token_endpoint_url, data=request_body) as _token_response:
-        if _token_response.content_type == "application/x-www-form-urlencoded":
-            response_text = await _token_response.text()
-            response_data = dict(urllib.parse.parse_qsl(response_text))
-            if expires := response_data.get("expires_in"):
-                response_data["expires_in"] = int(expires)
-
-            return FreshTokenResult.from_token_response_json(response_data)
-        if not HTTPStatus(_token_response.status).is_success:
-            raise RuntimeError(await _token_response.json())
-            # TODO: https://www.rfc-editor.org/rfc/rfc6749.html#section-5.2
-        return FreshTokenResult.from_token_response_json(await _token_response.json())
+    _client = await get_pooled_client_session(token_endpoint_url)
+    with UpstreamRequestTimer(token_endpoint_url) as _timer:
+        async with _client.post(
+            token_endpoint_url, data=request_body
+        ) as _token_response:
+            _timer.responded(_token_response.status, _token_response.content_length)
+            if _token_response.content_type == "application/x-www-form-urlencoded":
+                response_text = await _token_response.text()
+                response_data = dict(urllib.parse.parse_qsl(response_text))
+                if expires := response_data.get("expires_in"):
+                    response_data["expires_in"] = int(expires)
+
+                return FreshTokenResult.from_token_response_json(response_data)
+            if not HTTPStatus(_token_response.status).is_success:
+                raise RuntimeError(await _token_response.json())
+                # TODO: https://www.rfc-editor.org/rfc/rfc6749.html#section-5.2
+            return FreshTokenResult.from_token_response_json(
+                await _token_response.json()
+            )
 
 
 def _parse_scope_param_value(scope_value: str | None) -> list[str] | None:
@@ -1,6 +1,7 @@
 from . import (
     clear_expired_sessions,
     invocation,
+    invocation_retention,
     key_rotation,
     osf_backchannel,
 )
@@ -8,6 +9,7 @@ from . import (
 
 __all__ = (
     "invocation",
+    "invocation_retention",
     "key_rotation",
     "osf_backchannel",
     "clear_expired_sessions",
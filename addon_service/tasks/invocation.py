@@ -1,19 +1,53 @@
+import asyncio
+from collections.abc import (
+    Awaitable,
+    Callable,
+    Sequence,
+)
+from typing import Any
+
 import celery
+from asgiref.sync import (
+    async_to_sync,
+    sync_to_async,
+)
 from django.db import transaction
 
-from addon_service.addon_imp.instantiation import get_addon_instance__blocking
+from addon_service.addon_imp.instantiation import get_addon_instance
+from addon_service.addon_operation_invocation.persistence import (
+    asave_invocation,
+    asave_invocations,
+    save_invocation,
+)
+from addon_service.addon_operation_invocation.result_cache import (
+    CachedResult,
+    InvocationResultCache,
+)
+from addon_service.addon_operation_invocation.status_events import (
+    publish_invocation_status,
+)
+from addon_service.authorized_account.models import AuthorizedAccount
+from addon_service.common.deadline import time_budget
 from addon_service.common.dibs import dibs
 from addon_service.common.invocation_status import InvocationStatus
+from addon_service.configured_addon.models import ConfiguredAddon
 from addon_service.models import (
     AddonOperationInvocation,
     AuthorizedStorageAccount,
 )
+from addon_toolkit import (
+    AddonImp,
+    AddonOperationDeclaration,
+)
 from addon_toolkit.json_arguments import json_for_typed_value
 
 
 __all__ = (
+    "perform_invocation__async",
     "perform_invocation__blocking",
     "perform_invocation__celery",
+    "perform_invocations__async",
+    "refresh_cached_result__celery",
 )
 
 
@@ -21,36 +55,274 @@ def perform_invocation__blocking(invocation: AddonOperationInvocation) -> None:
     """perform the given invocation: run an operation thru an addon and handle any errors"""
     # implemented as a sync function for django transactions
     try:
-        _imp = get_addon_instance__blocking(
-            invocation.imp_cls,  # type: ignore[arg-type]  #(TODO: generic impstantiation)
-            invocation.thru_account,
-            invocation.config,
-        )
         _operation = invocation.operation
-        # inner transaction to contain database errors,
-        # so status can be saved in the outer transaction (from `dibs`)
-        with transaction.atomic():
-            _result = _imp.invoke_operation__blocking(
-                _operation.declaration,
-                invocation.operation_kwargs,
+        _result_cache = InvocationResultCache.for_invocation(invocation)
+        _cached = _result_cache.lookup() if _result_cache is not None else None
+        if _cached is not None:
+            _use_cached_result(invocation, _cached)
+            if not _cached.is_fresh and _result_cache.claim_refresh():
+                refresh_cached_result__celery.delay(**_refresh_kwargs(invocation))
+        else:
+            # inner transaction to contain database errors,
+            # so status can be saved in the outer transaction (from `dibs`)
+            with transaction.atomic():
+                _result = _instantiate_and_invoke__blocking(
+                    invocation.imp_cls,  # type: ignore[arg-type]  #(TODO: generic impstantiation)
+                    invocation.thru_account,
+                    invocation.config,
+                    _operation.declaration,
+                    invocation.operation_kwargs,
+                    invocation.time_budget_seconds,
+                )
+            invocation.operation_result = json_for_typed_value(
+                _operation.declaration.result_dataclass,
+                _result,
             )
-        invocation.operation_result = json_for_typed_value(
-            _operation.declaration.result_dataclass,
-            _result,
-        )
+            if _result_cache is not None:
+                invocation.result_cache_status = "miss"
+                _result_cache.store(invocation.operation_result)
         invocation.invocation_status = InvocationStatus.SUCCESS
     except BaseException as _e:
         invocation.set_exception(_e)
         raise  # TODO: or swallow?
     finally:
-        invocation.save()
+        save_invocation(invocation)
+
+
+async def perform_invocation__async(invocation: AddonOperationInvocation) -> None:
+    """perform the given invocation on the running event loop
+
+    same as `perform_invocation__blocking`, but without holding a thread while
+    the external service responds -- for use outside any transaction (e.g. from
+    an async view, which can't use `ATOMIC_REQUESTS`)
+    """
+    try:
+        # (model properties may query the database; read them all at once)
+        (
+            _imp_cls,
+            _account,
+            _config,
+            _time_budget_seconds,
+            _result_cache,
+        ) = await sync_to_async(
+            lambda: (
+                invocation.imp_cls,
+                invocation.thru_account,
+                invocation.config,
+                invocation.time_budget_seconds,
+                InvocationResultCache.for_invocation(invocation),
+            )
+        )()
+        await _perform_with_result_cache(
+            invocation,
+            _result_cache,
+            lambda: _instantiate_and_invoke(
+                _imp_cls,
+                _account,
+                _config,
+                invocation.operation.declaration,
+                invocation.operation_kwargs,
+                _time_budget_seconds,
+            ),
+        )
+    except BaseException as _e:
+        invocation.set_exception(_e)
+        raise
+    finally:
+        await asave_invocation(invocation)
+
+
+async def perform_invocations__async(
+    invocations: Sequence[AddonOperationInvocation], *, concurrency: int
+) -> None:
+    """perform the given invocations (all thru the same account and addon)
+    concurrently on the running event loop, at most `concurrency` at a time
+
+    the addon imp is instantiated once (if any result isn't cached) and shared;
+    unlike `perform_invocation__async`, errors are not raised, only recorded on
+    each invocation
+    """
+    if not invocations:
+        return
+    _first = invocations[0]
+    (
+        _imp_cls,
+        _account,
+        _config,
+        _result_caches,
+        _time_budgets,
+    ) = await sync_to_async(
+        lambda: (
+            _first.imp_cls,
+            _first.thru_account,
+            _first.config,
+            [InvocationResultCache.for_invocation(_i) for _i in invocations],
+            [_i.time_budget_seconds for _i in invocations],
+        )
+    )()
+    _imp_task: asyncio.Future[AddonImp] | None = None
+
+    def _get_imp() -> asyncio.Future[AddonImp]:
+        nonlocal _imp_task
+        if _imp_task is None:  # (first to need it; the rest wait on the same)
+            _imp_task = asyncio.ensure_future(
+                get_addon_instance(_imp_cls, _account, _config)
+            )
+        return _imp_task
+
+    async def _invoke(invocation, time_budget_seconds):
+        _imp = await _get_imp()
+        async with time_budget(time_budget_seconds):
+            return await _imp.invoke_operation(
+                invocation.operation.declaration, invocation.operation_kwargs
+            )
+
+    _semaphore = asyncio.Semaphore(concurrency)
+
+    async def _perform(invocation, result_cache, time_budget_seconds):
+        async with _semaphore:
+            try:
+                await _perform_with_result_cache(
+                    invocation,
+                    result_cache,
+                    lambda: _invoke(invocation, time_budget_seconds),
+                )
+            except Exception as _e:
+                invocation.set_exception(_e)
+
+    await asyncio.gather(*map(_perform, invocations, _result_caches, _time_budgets))
+    await asave_invocations(invocations)
+
+
+async def _perform_with_result_cache(
+    invocation: AddonOperationInvocation,
+    result_cache: InvocationResultCache | None,
+    invoke: Callable[[], Awaitable[Any]],
+) -> None:
+    _operation = invocation.operation
+    _cached = await result_cache.alookup() if result_cache is not None else None
+    if _cached is not None:
+        _use_cached_result(invocation, _cached)
+        if not _cached.is_fresh and await result_cache.aclaim_refresh():
+            await sync_to_async(refresh_cached_result__celery.delay)(
+                **_refresh_kwargs(invocation)
+            )
+    else:
+        _result = await invoke()
+        invocation.operation_result = json_for_typed_value(
+            _operation.declaration.result_dataclass,
+            _result,
+        )
+        if result_cache is not None:
+            invocation.result_cache_status = "miss"
+            await result_cache.astore(invocation.operation_result)
+    invocation.invocation_status = InvocationStatus.SUCCESS
+
+
+def _use_cached_result(
+    invocation: AddonOperationInvocation, cached: CachedResult
+) -> None:
+    invocation.operation_result = cached.operation_result
+    invocation.result_cache_status = cached.cache_status
+
+
+def _refresh_kwargs(invocation: AddonOperationInvocation) -> dict:
+    # (for `refresh_cached_result__celery`)
+    return {
+        "thru_account_pk": invocation.thru_account_id,
+        "thru_addon_pk": invocation.thru_addon_id,
+        "operation_identifier": invocation.operation_identifier,
+        "operation_kwargs": invocation.operation_kwargs,
+    }
+
+
+async def _instantiate_and_invoke(
+    imp_cls: type[AddonImp],
+    account: AuthorizedAccount,
+    config,
+    operation: AddonOperationDeclaration,
+    operation_kwargs: dict,
+    time_budget_seconds: float | None,
+):
+    _imp = await get_addon_instance(imp_cls, account, config)
+    async with time_budget(time_budget_seconds):
+        return await _imp.invoke_operation(operation, operation_kwargs)
+
+
+# (one trip to the event loop, for both instantiating and invoking)
+_instantiate_and_invoke__blocking = async_to_sync(_instantiate_and_invoke)
+
+
+def _publish_status_on_commit(invocation: AddonOperationInvocation) -> None:
+    _pk, _status = invocation.pk, invocation.invocation_status
+    transaction.on_commit(lambda: publish_invocation_status(_pk, _status))
+
+
+@celery.shared_task(acks_late=True)
+def perform_invocation__celery(
+    invocation_pk: str, created: str | None = None, operation_type: str | None = None
+) -> None:
+    # (given when the invocation was `created` and its `operation_type`, it's
+    # found in only its partition)
+    invocation = AddonOperationInvocation.objects.get(
+        pk=invocation_pk,
+        **({} if created is None else {"created": created}),
+        **({} if operation_type is None else {"operation_type": operation_type}),
+    )
+    # each status is published only once committed, so clients reading it from
+    # the database (e.g. reconnecting to its events) see the same
+    with dibs(invocation, **invocation.partition_lookup):  # TODO: handle dibs errors
+        invocation.invocation_status = InvocationStatus.GOING
+        save_invocation(invocation)
+        _publish_status_on_commit(invocation)
+    try:
+        with dibs(invocation, **invocation.partition_lookup):
+            perform_invocation__blocking(invocation)
+            _publish_status_on_commit(invocation)
+    except BaseException:
+        # the error status was saved within the rolled-back `dibs` block
+        with transaction.atomic():
+            save_invocation(invocation)
+            _publish_status_on_commit(invocation)
+        raise
 
 
 @celery.shared_task(acks_late=True)
-def perform_invocation__celery(invocation_pk: str) -> None:
-    invocation = AddonOperationInvocation.objects.get(pk=invocation_pk)
-    with dibs(invocation):  # TODO: handle dibs errors
-        perform_invocation__blocking(invocation)
+def refresh_cached_result__celery(
+    thru_account_pk: str,
+    thru_addon_pk: str | None,
+    operation_identifier: str,
+    operation_kwargs: dict,
+) -> None:
+    """perform an operation again, to refresh its stale cached result
+    (see `addon_service.addon_operation_invocation.result_cache`)
+    """
+    _account = AuthorizedAccount.objects.select_related("_credentials").get(
+        pk=thru_account_pk
+    )
+    _invocation = AddonOperationInvocation(  # (only for performing; not saved)
+        thru_account=_account,
+        thru_addon=(
+            ConfiguredAddon.objects.get(pk=thru_addon_pk)
+            if thru_addon_pk is not None
+            else None
+        ),
+        operation_identifier=operation_identifier,
+        operation_kwargs=operation_kwargs,
+    )
+    _result_cache = InvocationResultCache.for_invocation(_invocation)
+    if _result_cache is None:
+        return  # (caching since disabled)
+    _declaration = _invocation.operation.declaration
+    _result = _instantiate_and_invoke__blocking(
+        _invocation.imp_cls,
+        _account,
+        _invocation.config,
+        _declaration,
+        operation_kwargs,
+        _invocation.time_budget_seconds,
+    )
+    _result_cache.store(json_for_typed_value(_declaration.result_dataclass, _result))
 
 
 @celery.shared_task(acks_late=True)
@@ -0,0 +1,23 @@
+import logging
+
+import celery
+
+from addon_service.addon_operation_invocation.partitions import (
+    maintain_invocation_partitions,
+)
+
+
+__all__ = ("maintain_invocation_partitions__celery",)
+
+_logger = logging.getLogger(__name__)
+
+
+@celery.shared_task(acks_late=True)
+def maintain_invocation_partitions__celery() -> None:
+    _maintenance = maintain_invocation_partitions()
+    _logger.info(
+        "invocation partitions: created %s, expired %s; deleted %d invocations",
+        _maintenance.created,
+        _maintenance.expired,
+        _maintenance.deleted_count,
+    )
@@ -1,16 +1,43 @@
 import datetime
 
 import celery
+from django.conf import settings
 
+from addon_service.credentials import bulk_rotation
 from addon_service.credentials.models import ExternalCredentials
 
 
-def schedule_encryption_rotation(earlier_than: datetime.datetime | None = None):
-    _pks = ExternalCredentials.objects.filter(
-        modified__lte=(earlier_than or datetime.datetime.now(tz=datetime.UTC))
-    ).values_list("pk", flat=True)
-    for _credentials_pk in _pks.iterator():
-        rotate_credentials_encryption__celery.apply_async([_credentials_pk])
+def schedule_encryption_rotation(
+    earlier_than: datetime.datetime | None = None,
+    *,
+    chunk_size: int | None = None,
+    parallel_chunks: int | None = None,
+    legacy_only: bool = False,
+) -> str:
+    """plan a (chunked) rotation run and start workers for it; returns the run id"""
+    _run_id = bulk_rotation.plan_rotation(
+        chunk_size=(chunk_size or settings.GRAVYVALET_KEY_ROTATION_CHUNK_SIZE),
+        earlier_than=(earlier_than or datetime.datetime.now(tz=datetime.UTC)),
+        legacy_only=legacy_only,
+    )
+    if not bulk_rotation.get_rotation_progress(_run_id).is_complete:
+        resume_encryption_rotation(_run_id, parallel_chunks=parallel_chunks)
+    return _run_id
+
+
+def resume_encryption_rotation(
+    run_id: str, *, parallel_chunks: int | None = None
+) -> None:
+    """start workers for a rotation run (which skip chunks already done)"""
+    for _ in range(parallel_chunks or settings.GRAVYVALET_KEY_ROTATION_PARALLEL_CHUNKS):
+        rotate_encryption_chunks__celery.apply_async([run_id])
+
+
+def schedule_envelope_encryption() -> str:
+    """re-encrypt (in the background, in chunks) credentials not yet envelope-encrypted;
+    returns the rotation run id
+    """
+    return schedule_encryption_rotation(legacy_only=True)
 
 
 @celery.shared_task(acks_late=True)
@@ -20,6 +47,16 @@ def schedule_encryption_rotation__celery(earlier_than: str = ""):
     )
 
 
+@celery.shared_task(acks_late=True)
+def rotate_encryption_chunks__celery(run_id: str):
+    bulk_rotation.rotate_chunks(run_id)
+
+
 @celery.shared_task(acks_late=True)
 def rotate_credentials_encryption__celery(credentials_pk: str):
     ExternalCredentials.objects.get(pk=credentials_pk).rotate_encryption()
+
+
+@celery.shared_task(acks_late=True)
+def schedule_envelope_encryption__celery():
+    schedule_envelope_encryption()
@@ -2,6 +2,11 @@ import logging
 
 import celery
 
+from addon_service.common.osf_permission_cache import (
+    invalidate_resource_permissions,
+    invalidate_user_permissions,
+)
+from addon_service.common.osf_token_cache import evict_user_tokens
 from addon_service.models import UserReference
 
 
@@ -22,6 +27,13 @@ def get_handler_signature(message_body_json: dict):
                 into_user_uri=message_body_json["into_user_uri"],
                 from_user_uri=message_body_json["from_user_uri"],
             )
+        case "permissions_changed":
+            _signature = osf_permissions_changed.s(
+                resource_uri=message_body_json.get("resource_uri"),
+                user_uri=message_body_json.get("user_uri"),
+            )
+        case "token_revoked":
+            _signature = osf_token_revoked.s(user_uri=message_body_json["user_uri"])
         case _:
             raise NotImplementedError(f"Action {_action} is not Implemented")
     logger.info(
@@ -32,6 +44,8 @@ def get_handler_signature(message_body_json: dict):
 
 @celery.shared_task(acks_late=True)
 def user_deactivated(user_uri: str):
+    invalidate_user_permissions(user_uri)
+    evict_user_tokens(user_uri)
     try:
         UserReference.objects.get(user_uri=user_uri).deactivate()
     except UserReference.DoesNotExist:
@@ -40,6 +54,7 @@ def user_deactivated(user_uri: str):
 
 @celery.shared_task(acks_late=True)
 def user_reactivated(user_uri: str):
+    invalidate_user_permissions(user_uri)
     try:
         UserReference.objects.get(user_uri=user_uri).reactivate()
     except UserReference.DoesNotExist:
@@ -48,6 +63,9 @@ def user_reactivated(user_uri: str):
 
 @celery.shared_task(acks_late=True)
 def users_merged(into_user_uri: str, from_user_uri: str):
+    invalidate_user_permissions(into_user_uri)
+    invalidate_user_permissions(from_user_uri)
+    evict_user_tokens(from_user_uri)
     try:
         _from_user = UserReference.objects.get(user_uri=from_user_uri)
     except UserReference.DoesNotExist:
@@ -55,3 +73,20 @@ def users_merged(into_user_uri: str, from_user_uri: str):
     else:
         _into_user = UserReference.objects.get_or_create(user_uri=into_user_uri)
         _into_user.merge(_from_user)
+
+
+@celery.shared_task(acks_late=True)
+def osf_permissions_changed(resource_uri: str | None, user_uri: str | None):
+    # stop using cached permission checks (see `has_osf_permission_on_resource`)
+    # for the given resource and/or user (e.g. after contributors changed)
+    if resource_uri:
+        invalidate_resource_permissions(resource_uri)
+    if user_uri:
+        invalidate_user_permissions(user_uri)
+
+
+@celery.shared_task(acks_late=True)
+def osf_token_revoked(user_uri: str):
+    # forget which tokens belong to the user (see `get_osf_user_uri`), so a revoked
+    # token is no longer taken as theirs
+    evict_user_tokens(user_uri)
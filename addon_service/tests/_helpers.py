@@ -21,6 +21,7 @@ from urllib.parse import (
 
 from asgiref.sync import sync_to_async
 from django.contrib.sessions.backends.db import SessionStore
+from django.test import override_settings
 from django.urls import reverse
 from rest_framework.test import APIRequestFactory
 from rest_framework_json_api.utils import get_resource_type_from_model
@@ -66,6 +67,10 @@ class MockOSF:
                 "addon_service.common.osf.has_osf_permission_on_resource",
                 side_effect=self._mock_resource_check,
             ),
+            patch(
+                "addon_service.common.osf.has_osf_permission_on_resource__async",
+                side_effect=self._mock_resource_check,
+            ),
             patch_encryption_key_derivation(),
         ):
             yield self
@@ -143,7 +148,10 @@ class MockOAuth2ExternalService:
         client_session = await get_singleton_client_session()
         with (
             patch.object(client_session, "get", new=self._route_get),
-            patch.object(client_session, "post", new=self._route_post),
+            patch(
+                "addon_service.oauth2.utils.get_pooled_client_session",
+                AsyncMock(return_value=AsyncMock(post=self._route_post)),
+            ),
         ):
             yield self
 
@@ -245,6 +253,7 @@ class _FakeAiohttpResponse:
     status: HTTPStatus = HTTPStatus.OK
     data: dict | None = None
     content_type = "application/json"
+    content_length = None
 
     async def json(self):
         return self.data
@@ -262,9 +271,11 @@ def jsonapi_ref(obj) -> dict:
     }
 
 
-def get_test_request(user=None, method="get", path="", cookies=None):
+def get_test_request(user=None, method="get", path="", cookies=None, **kwargs):
     _factory_method = getattr(APIRequestFactory(), method)
-    _request = _factory_method(path)  # note that path is optional for view tests
+    _request = _factory_method(
+        path, **kwargs
+    )  # note that path is optional for view tests
     _request.session = SessionStore()  # Add cookies if provided
     if cookies:
         for name, value in cookies.items():
@@ -281,7 +292,30 @@ def patch_encryption_key_derivation():
         "addon_service.credentials.encryption.settings.GRAVYVALET_ENCRYPT_SECRET",
         _fake_secret,
     ), patch(
-        "addon_service.credentials.encryption.hashlib.scrypt",
+        "addon_service.credentials.key_derivation.hashlib.scrypt",
         return_value=_some_random_key,
+    ), override_settings(
+        GRAVYVALET_KEY_DERIVATION_PROCESSES=0,  # (so the patch applies)
     ):
         yield
+
+
+def forget_known_users():
+    """forget all known users (see `known_users.KnownUserCache`), in this process and
+    in redis -- for tests that commit users which are then rolled back or flushed
+    """
+    from addon_service.user_reference.known_users import known_user_cache
+
+    known_user_cache.clear()
+    clear_redis_keys("gv:known-user:*")
+
+
+def clear_redis_keys(pattern: str) -> None:
+    """delete every redis key matching the given (glob-style) pattern -- for tests
+    of what's kept in redis, which outlives each test's transaction
+    """
+    from addon_service.common.redis_client import get_redis
+
+    _keys = list(get_redis().scan_iter(pattern))
+    if _keys:
+        get_redis().delete(*_keys)
@@ -1,7 +1,28 @@
+import addon_service.addon_operation_invocation.partitions
+import addon_service.addon_operation_invocation.persistence
+import addon_service.addon_operation_invocation.result_cache
+import addon_service.addon_operation_invocation.status_events
+import addon_service.common.aiohttp_session
 import addon_service.common.filtering
 import addon_service.common.jsonapi
+import addon_service.common.loop_scoped
+import addon_service.common.metrics
+import addon_service.common.osf_permission_cache
+import addon_service.common.rate_limit
 from addon_toolkit.tests._doctest import load_doctests
 
 
 # for some reason this variable name matters
-load_tests = load_doctests(addon_service.common.filtering, addon_service.common.jsonapi)
+load_tests = load_doctests(
+    addon_service.addon_operation_invocation.partitions,
+    addon_service.addon_operation_invocation.persistence,
+    addon_service.addon_operation_invocation.result_cache,
+    addon_service.addon_operation_invocation.status_events,
+    addon_service.common.aiohttp_session,
+    addon_service.common.filtering,
+    addon_service.common.jsonapi,
+    addon_service.common.loop_scoped,
+    addon_service.common.metrics,
+    addon_service.common.osf_permission_cache,
+    addon_service.common.rate_limit,
+)
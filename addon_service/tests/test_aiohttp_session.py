@@ -0,0 +1,116 @@
+import asyncio
+import gc
+import unittest
+import weakref
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from asgiref.sync import async_to_sync
+
+from addon_service.common import aiohttp_session
+
+
+class TestConnectionPoolManager(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        _app = web.Application()
+        _app.router.add_get("/", self._handle_hello)
+        _app.router.add_get("/slow", self._handle_slow)
+        self._slow_started = asyncio.Event()
+        self._slow_finish = asyncio.Event()
+        self._server = TestServer(_app)
+        await self._server.start_server()
+        self.addAsyncCleanup(self._server.close)
+        self._pools = aiohttp_session.ConnectionPoolManager()
+        self.addAsyncCleanup(self._pools.close_loop_sessions)
+
+    async def _handle_hello(self, request):
+        return web.Response(text="hello")
+
+    async def _handle_slow(self, request):
+        self._slow_started.set()
+        await self._slow_finish.wait()
+        return web.Response(text="hello")
+
+    async def _get_slowly(self, session):
+        self._slow_started.clear()
+        async with session.get(self._server.make_url("/slow")) as _response:
+            return await _response.text()
+
+    async def _get_hello(self, session):
+        async with session.get(self._server.make_url("/")) as _response:
+            return await _response.text()
+
+    async def test_one_session_per_host(self):
+        _url = str(self._server.make_url("/"))
+        _session = await self._pools.get_session(_url)
+        self.assertIs(_session, await self._pools.get_session(f"{_url}?foo=bar"))
+        self.assertIsNot(_session, await self._pools.get_session("https://elsewhere/"))
+
+    async def test_connection_reuse(self):
+        _session = await self._pools.get_session(str(self._server.make_url("/")))
+        for _ in range(3):
+            self.assertEqual(await self._get_hello(_session), "hello")
+        _stats = self._pools.stats()[
+            self._pools.pool_key(str(self._server.make_url("/")))
+        ]
+        self.assertEqual(_stats.requests_sent, 3)
+        self.assertEqual(_stats.connections_created, 1)
+        self.assertEqual(_stats.connections_reused, 2)
+        self.assertEqual(_stats.requests_in_flight, 0)
+
+    async def test_requests_in_flight(self):
+        _url = str(self._server.make_url("/slow"))
+        _session = await self._pools.get_session(_url)
+        _get = asyncio.ensure_future(self._get_slowly(_session))
+        await self._slow_started.wait()
+        self.assertEqual(
+            self._pools.stats()[self._pools.pool_key(_url)].requests_in_flight, 1
+        )
+        self._slow_finish.set()
+        await _get
+        self.assertEqual(
+            self._pools.stats()[self._pools.pool_key(_url)].requests_in_flight, 0
+        )
+        _get = asyncio.ensure_future(self._get_slowly(_session))
+        await self._slow_started.wait()
+        _get.cancel()  # (still counted out)
+        with self.assertRaises(asyncio.CancelledError):
+            await _get
+        self.assertEqual(
+            self._pools.stats()[self._pools.pool_key(_url)].requests_in_flight, 0
+        )
+
+    async def test_close_loop_sessions(self):
+        _session = await self._pools.get_session(str(self._server.make_url("/")))
+        await self._pools.close_loop_sessions()
+        self.assertTrue(_session.closed)
+        self.assertEqual(
+            self._pools.stats()[
+                self._pools.pool_key(str(self._server.make_url("/")))
+            ].open_sessions,
+            0,
+        )
+
+
+class TestSessionsClosedWithTheirLoop(unittest.TestCase):
+    def test_async_to_sync(self):
+        # each `async_to_sync` call (outside a running loop) runs on a new event
+        # loop; its sessions should go with it, and not keep it alive
+        _pools = aiohttp_session.ConnectionPoolManager()
+        _loops: list[weakref.ref] = []
+        _sessions: list[weakref.ref] = []
+
+        async def _use_session():
+            _loops.append(weakref.ref(asyncio.get_running_loop()))
+            _session = await _pools.get_session("https://example.example/")
+            _sessions.append(weakref.ref(_session))
+            self.assertEqual(len(_pools._sessions_by_loop), 1)
+
+        for _ in range(20):
+            async_to_sync(_use_session)()
+            self.assertEqual(len(_pools._sessions_by_loop), 0)
+            self.assertEqual(_pools.stats()["example.example"].open_sessions, 0)
+        gc.collect()
+        self.assertEqual(len(_loops), 20)
+        self.assertTrue(all(_loop() is None for _loop in _loops))
+        self.assertTrue(all(_session() is None for _session in _sessions))
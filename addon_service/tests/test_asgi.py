@@ -0,0 +1,98 @@
+import asyncio
+import json
+import subprocess
+import sys
+import textwrap
+import unittest
+
+from django.conf import settings
+
+from addon_service.common import (
+    aiohttp_session,
+    redis_client,
+)
+from app import asgi
+
+
+# runs a daphne server (in a fresh process, for a fresh twisted reactor) that uses
+# a pooled session and redis client, then stops it as a signal would
+_DAPHNE_SHUTDOWN_SCRIPT = textwrap.dedent(
+    """
+    import asyncio, json
+    from daphne.server import Server  # (installs twisted's asyncio reactor)
+    from twisted.internet import reactor
+    from twisted.internet.defer import Deferred
+    from app.asgi import application
+    from addon_service.common import aiohttp_session, redis_client
+
+    _used = {}
+
+    async def _use_pools():
+        _used["session"] = await aiohttp_session.get_pooled_client_session(
+            "https://example.example/"
+        )
+        _used["redis"] = redis_client.get_async_redis()
+        await _used["redis"].ping()
+
+    def _use_pools_then_stop():
+        _use = Deferred.fromFuture(asyncio.ensure_future(_use_pools()))
+        _use.addBoth(lambda _: reactor.stop())
+
+    reactor.callWhenRunning(_use_pools_then_stop)
+    Server(
+        application,
+        endpoints=["tcp:port=0:interface=127.0.0.1"],
+        signal_handlers=False,
+    ).run()
+    print(json.dumps({
+        "session_closed": _used["session"].closed,
+        "open_sessions": sum(
+            _stats.open_sessions
+            for _stats in aiohttp_session.get_pool_stats().values()
+        ),
+        "redis_clients": len(redis_client._ASYNC_CLIENTS),
+    }))
+    """
+)
+
+
+class TestPoolsClosedOnShutdown(unittest.TestCase):
+    def test_daphne(self):
+        # daphne sends no asgi lifespan events; pools close with its reactor
+        _completed = subprocess.run(
+            # (with "test" in argv, for test settings; see `app.env.TESTING`)
+            [sys.executable, "-c", _DAPHNE_SHUTDOWN_SCRIPT, "test"],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+        self.assertEqual(_completed.returncode, 0, _completed.stderr)
+        self.assertEqual(
+            json.loads(_completed.stdout.splitlines()[-1]),
+            {"session_closed": True, "open_sessions": 0, "redis_clients": 0},
+        )
+
+    def test_lifespan(self):
+        async def _run_lifespan():
+            _session = await aiohttp_session.get_pooled_client_session(
+                "https://example.example/"
+            )
+            await redis_client.get_async_redis().ping()
+            _received = asyncio.Queue()
+            for _type in ("lifespan.startup", "lifespan.shutdown"):
+                _received.put_nowait({"type": _type})
+            _sent = []
+
+            async def _send(message):
+                _sent.append(message["type"])
+
+            await asgi.application({"type": "lifespan"}, _received.get, _send)
+            return _session, _sent
+
+        _session, _sent = asyncio.run(_run_lifespan())
+        self.assertEqual(
+            _sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+        )
+        self.assertTrue(_session.closed)
+        self.assertEqual(len(redis_client._ASYNC_CLIENTS), 0)
@@ -0,0 +1,37 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+
+class TestBenchmarkEncryption(SimpleTestCase):
+    def test_benchmark(self):
+        _out = io.StringIO()
+        call_command(
+            "benchmark_encryption",
+            "--cost-log2=4",
+            "--max-priors=1",
+            "--iterations=10",
+            "--cache-sizes",
+            "0",
+            "10",
+            "--accounts=100",
+            "--accesses=1000",
+            "--json=-",
+            stdout=_out,
+        )
+        _output = _out.getvalue()
+        self.assertIn("decrypt/s", _output)
+        _json_start = _output.index("{")
+        _json = json.loads(_output[_json_start:])
+        self.assertEqual(
+            [_r["prior_secret_count"] for _r in _json["key_parameters"]], [0, 1]
+        )
+        self.assertTrue(all(_r["peak_rss_bytes"] > 0 for _r in _json["key_parameters"]))
+        self.assertTrue(
+            all(_r["envelope_decrypt_per_second"] > 0 for _r in _json["key_parameters"])
+        )
+        _hit_rates = [_c["hit_rate"] for _c in _json["derived_key_cache"]]
+        self.assertEqual(_hit_rates[0], 0)
+        self.assertGreater(_hit_rates[1], 0)
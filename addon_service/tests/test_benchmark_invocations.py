@@ -0,0 +1,43 @@
+import io
+import json
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+
+from addon_service import models as db
+from addon_service.common.aiohttp_session import (
+    close_singleton_client_session__blocking,
+)
+from addon_service.tests import _factories
+from addon_service.tests._helpers import forget_known_users
+
+
+class TestBenchmarkInvocations(TransactionTestCase):
+    # (not `TestCase`: views under test query from other threads)
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(close_singleton_client_session__blocking)
+        # (users created here are committed, then flushed -- don't leave them known)
+        self.addCleanup(forget_known_users)
+
+    def test_benchmark(self):
+        _addon = _factories.ConfiguredStorageAddonFactory()
+        _out = io.StringIO()
+        call_command(
+            "benchmark_invocations",
+            f"--thru-addon={_addon.pk}",
+            "--requests=6",
+            "--concurrency=3",
+            "--latency=0.01",
+            "--json=-",
+            stdout=_out,
+        )
+        _output = _out.getvalue()
+        self.assertIn("requests/s", _output)
+        _json_start = _output.index("[")
+        _json = json.loads(_output[_json_start:])
+        self.assertEqual([_r["variant"] for _r in _json], ["sync", "async"])
+        for _result in _json:
+            self.assertEqual(_result["status_counts"], {"201": 6})
+        self.assertFalse(db.AddonOperationInvocation.objects.exists())
@@ -1,20 +1,55 @@
+import asyncio
 import dataclasses
 import json
+import time
 import typing
 from http import HTTPStatus
+from unittest import mock
 
-from django.urls import reverse
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import (
+    AsyncClient,
+    TestCase,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import (
+    include,
+    path,
+    re_path,
+    reverse,
+)
+from django.utils import timezone
 from rest_framework.test import APITestCase
 
+from addon_imps.storage.my_blarg import MyBlargStorage
+from addon_service import models as db
+from addon_service.addon_operation_invocation import (
+    result_cache,
+    status_events,
+)
+from addon_service.addon_operation_invocation.persistence import invocation_writer
+from addon_service.addon_operation_invocation.views import (
+    AddonOperationInvocationViewSet,
+)
 from addon_service.common.aiohttp_session import (
     close_singleton_client_session__blocking,
 )
 from addon_service.common.invocation_status import InvocationStatus
+from addon_service.common.redis_client import close_loop_async_redis
+from addon_service.tasks import invocation as invocation_tasks
 from addon_service.tests import _factories
 from addon_service.tests._helpers import (
     MockOSF,
+    forget_known_users,
+    get_test_request,
     jsonapi_ref,
 )
+from addon_toolkit import AddonCapabilities
+from addon_toolkit.interfaces.storage import (
+    ItemResult,
+    ItemType,
+)
 
 
 @dataclasses.dataclass
@@ -179,6 +214,563 @@ class TestAddonOperationInvocationCreate(APITestCase):
                 )
 
 
+# same urls, but with invocations created by the async view
+# (for `TestAddonOperationInvocationCreateAsync`, with this module as urlconf)
+urlpatterns = [
+    re_path(
+        r"^v1/addon-operation-invocations/?$",
+        AddonOperationInvocationViewSet.as_async_create_view(),
+    ),
+    path("", include("app.urls")),
+]
+
+
+class TestAddonOperationInvocationCreateAsync(TestAddonOperationInvocationCreate):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(self.settings(ROOT_URLCONF=__name__))
+        self.enterContext(
+            mock.patch(
+                "addon_service.addon_operation_invocation.views.perform_invocation__blocking",
+                side_effect=AssertionError("should not block"),
+            )
+        )
+
+
+class TestAddonOperationInvocationCreateWriteBehind(TestAddonOperationInvocationCreate):
+    # (same responses, with invocations saved after)
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(
+            self.settings(
+                GRAVYVALET_INVOCATION_SKIP_RESULT_FOR=("ACCESS",),
+                GRAVYVALET_INVOCATION_WRITE_BEHIND_FOR=("list_root_items",),
+                GRAVYVALET_INVOCATION_WRITE_BEHIND_FLUSH_SECONDS=60 * 60,
+            )
+        )
+        self.addCleanup(invocation_writer.flush)
+        # (users known once committed, tho rolled back after)
+        self.addCleanup(forget_known_users)
+
+    def test_written_behind(self):
+        _inv_case = self._INVOKE_SUCCESS_CASES[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            _resp = self._post_invocation(_inv_case, thru_addon=self._configured_addon)
+        self._assert_invocation_response(_inv_case, _resp)
+        self.assertIsNotNone(_resp.data["created"])
+        _invocations = db.AddonOperationInvocation.objects.filter(pk=_resp.data["id"])
+        self.assertFalse(_invocations.exists())
+        invocation_writer.flush()
+        _invocation = _invocations.get()
+        self.assertEqual(_invocation.invocation_status, InvocationStatus.SUCCESS)
+        self.assertEqual(_invocation.thru_addon_id, self._configured_addon.pk)
+        self.assertIsNone(_invocation.operation_result)
+
+    def test_result_not_stored(self):
+        _inv_case = self._INVOKE_SUCCESS_CASES[0]
+        with self.settings(GRAVYVALET_INVOCATION_WRITE_BEHIND_FOR=()):
+            _resp = self._post_invocation(_inv_case, thru_account=self._account)
+        self._assert_invocation_response(_inv_case, _resp)
+        _invocation = db.AddonOperationInvocation.objects.get(pk=_resp.data["id"])
+        self.assertEqual(_invocation.invocation_status, InvocationStatus.SUCCESS)
+        self.assertIsNone(_invocation.operation_result)
+
+
+class TestAddonOperationInvocationCreateAsyncWriteBehind(
+    TestAddonOperationInvocationCreateAsync,
+    TestAddonOperationInvocationCreateWriteBehind,
+):
+    pass
+
+
+class TestAddonOperationInvocationCreateCached(TestAddonOperationInvocationCreate):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(
+            self.settings(
+                GRAVYVALET_INVOCATION_RESULT_CACHE_ENABLED=True,
+                GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS=30,
+                GRAVYVALET_INVOCATION_RESULT_CACHE_STALE_SECONDS=300,
+            )
+        )
+        self._refresh = self.enterContext(
+            mock.patch.object(invocation_tasks.refresh_cached_result__celery, "delay")
+        )
+
+    def _post_for_cache_status(self, **kwargs) -> str:
+        _inv_case = self._INVOKE_SUCCESS_CASES[0]
+        _resp = self._post_invocation(_inv_case, **kwargs)
+        self._assert_invocation_response(_inv_case, _resp)
+        return json.loads(_resp.content)["meta"]["result_cache"]
+
+    def test_cached(self):
+        self.assertEqual(
+            self._post_for_cache_status(thru_addon=self._configured_addon), "miss"
+        )
+        self.assertEqual(
+            self._post_for_cache_status(thru_addon=self._configured_addon), "hit"
+        )
+        # not shared with invocations thru the account (with another config)
+        self.assertEqual(
+            self._post_for_cache_status(thru_account=self._account), "miss"
+        )
+        self._refresh.assert_not_called()
+
+    def test_stale_while_refreshing(self):
+        self._post_for_cache_status(thru_addon=self._configured_addon)
+        with mock.patch.object(
+            result_cache.time, "time", return_value=time.time() + 60
+        ):
+            self.assertEqual(
+                self._post_for_cache_status(thru_addon=self._configured_addon),
+                "stale",
+            )
+            self.assertEqual(
+                self._post_for_cache_status(thru_addon=self._configured_addon),
+                "stale",
+            )
+        self._refresh.assert_called_once()  # (one refresh at a time)
+        # refreshing stores a fresh result
+        with mock.patch.object(
+            result_cache.time, "time", return_value=time.time() + 60
+        ):
+            invocation_tasks.refresh_cached_result__celery(
+                **self._refresh.call_args.kwargs
+            )
+            self.assertEqual(
+                self._post_for_cache_status(thru_addon=self._configured_addon),
+                "hit",
+            )
+
+    def test_dropped_on_change(self):
+        self._post_for_cache_status(thru_addon=self._configured_addon)
+        self._configured_addon.root_folder = "/elsewhere"
+        self._configured_addon.save()
+        self.assertEqual(
+            self._post_for_cache_status(thru_addon=self._configured_addon), "miss"
+        )
+        self._account.authorized_capabilities ^= AddonCapabilities.UPDATE
+        self._account.save()
+        self.assertEqual(
+            self._post_for_cache_status(thru_addon=self._configured_addon), "miss"
+        )
+
+    def test_keyed_by_credentials_version(self):
+        _invocation = db.AddonOperationInvocation(
+            thru_account=self._account,
+            operation_identifier=self._account.authorized_operations[0].static_key,
+        )
+        _keys = set()
+        for _modified in (None, timezone.now(), timezone.now()):
+            self._account._credentials = (
+                None
+                if _modified is None
+                else db.ExternalCredentials(modified=_modified)
+            )
+            _keys.add(result_cache._cache_key(_invocation))
+        self.assertEqual(len(_keys), 3)
+
+    def test_no_meta_uncached(self):
+        with self.settings(GRAVYVALET_INVOCATION_RESULT_CACHE_ENABLED=False):
+            _resp = self._post_invocation(
+                self._INVOKE_SUCCESS_CASES[0], thru_addon=self._configured_addon
+            )
+        self.assertNotIn("meta", json.loads(_resp.content))
+
+
+class TestAddonOperationInvocationCreateAsyncCached(
+    TestAddonOperationInvocationCreateAsync,
+    TestAddonOperationInvocationCreateCached,
+):
+    pass
+
+
+class TestAddonOperationInvocationBatch(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls._configured_addon = _factories.ConfiguredStorageAddonFactory()
+        cls._account = cls._configured_addon.base_account
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(close_singleton_client_session__blocking)
+        self._mock_osf = MockOSF(
+            {self._configured_addon.resource_uri: {self._owner_uri: "admin"}}
+        )
+        self._mock_osf.configure_assumed_caller(self._owner_uri)
+        self.enterContext(self._mock_osf.mocking())
+
+    @property
+    def _owner_uri(self):
+        return self._configured_addon.owner_uri
+
+    def _batch_payload(self, *entries: tuple[str, dict], thru_account=None):
+        _relationships = (
+            {"thru_addon": {"data": jsonapi_ref(self._configured_addon)}}
+            if thru_account is None
+            else {"thru_account": {"data": jsonapi_ref(thru_account)}}
+        )
+        return {
+            "data": [
+                {
+                    "type": "addon-operation-invocations",
+                    "attributes": {
+                        "operation_name": _operation_name,
+                        "operation_kwargs": _operation_kwargs,
+                    },
+                    "relationships": _relationships,
+                }
+                for _operation_name, _operation_kwargs in entries
+            ],
+        }
+
+    def _post_batch(self, *entries: tuple[str, dict], thru_account=None):
+        return self.client.post(
+            reverse("addon-operation-invocations-batch"),
+            data=json.dumps(self._batch_payload(*entries, thru_account=thru_account)),
+            content_type="application/vnd.api+json",
+        )
+
+    def test_batch_as_sync_view(self):
+        _sync_view = super(
+            AddonOperationInvocationViewSet, AddonOperationInvocationViewSet
+        ).as_view({"post": "batch_create"})
+        _request = get_test_request(
+            method="post",
+            path=reverse("addon-operation-invocations-batch"),
+            data=json.dumps(
+                self._batch_payload(
+                    ("get_item_info", {"item_id": "1"}),
+                    ("get_item_info", {"item_id": "2"}),
+                )
+            ),
+            content_type="application/vnd.api+json",
+        )
+        _resp = _sync_view(_request)
+        self.assertEqual(_resp.status_code, HTTPStatus.CREATED)
+        self.assertEqual(
+            [_entry["operation_result"]["item_id"] for _entry in _resp.data],
+            ["1", "2"],
+        )
+
+    def test_batch(self):
+        with (
+            mock.patch.object(
+                invocation_tasks,
+                "get_addon_instance",
+                wraps=invocation_tasks.get_addon_instance,
+            ) as _get_addon_instance,
+            CaptureQueriesContext(connection) as _queries,
+        ):
+            _resp = self._post_batch(
+                ("get_item_info", {"item_id": "1"}),
+                ("list_root_items", {}),
+                ("get_item_info", {"item_id": "2"}),
+            )
+        self.assertEqual(_resp.status_code, HTTPStatus.CREATED)
+        # (updated in only their partitions)
+        _updates = [
+            _query["sql"]
+            for _query in _queries.captured_queries
+            if _query["sql"].startswith(
+                'UPDATE "addon_service_addonoperationinvocation"'
+            )
+        ]
+        self.assertTrue(_updates)
+        for _update in _updates:
+            self.assertIn('"operation_type" IN', _update)
+            self.assertIn('"created" IN', _update)
+        _get_addon_instance.assert_called_once()  # (one imp for the batch)
+        self.assertEqual(
+            [_entry["operation_result"].get("item_id") for _entry in _resp.data],
+            ["1", None, "2"],
+        )
+        self.assertEqual(_resp.data[1]["operation_result"]["total_count"], 1)
+        _invocations = db.AddonOperationInvocation.objects.filter(
+            pk__in=[_entry["id"] for _entry in _resp.data]
+        )
+        self.assertEqual(
+            [_invocation.invocation_status for _invocation in _invocations],
+            [InvocationStatus.SUCCESS] * 3,
+        )
+
+    def test_batch_entry_error(self):
+        def _get_item_info(item_id):
+            if item_id == "bad":
+                raise ValueError(item_id)
+            return ItemResult(item_id=item_id, item_name="", item_type=ItemType.FILE)
+
+        with mock.patch.object(
+            MyBlargStorage, "get_item_info", side_effect=_get_item_info
+        ):
+            _resp = self._post_batch(
+                ("get_item_info", {"item_id": "bad"}),
+                ("get_item_info", {"item_id": "good"}),
+            )
+        self.assertEqual(_resp.status_code, HTTPStatus.CREATED)
+        _data = json.loads(_resp.content)["data"]
+        self.assertEqual(
+            [_entry["attributes"]["invocation_status"] for _entry in _data],
+            ["ERROR", "SUCCESS"],
+        )
+        self.assertEqual(_data[0]["meta"]["error"], {"type": "ValueError"})
+        self.assertIsNone(_data[1]["meta"]["error"])
+        self.assertEqual(_data[1]["attributes"]["operation_result"]["item_id"], "good")
+
+    def test_batch_concurrency(self):
+        _waiting = 0
+        _most_waiting = 0
+
+        async def _get_item_info(imp, item_id):
+            nonlocal _waiting, _most_waiting
+            _waiting += 1
+            _most_waiting = max(_most_waiting, _waiting)
+            await asyncio.sleep(0.01)
+            _waiting -= 1
+            return ItemResult(item_id=item_id, item_name="", item_type=ItemType.FILE)
+
+        with (
+            self.settings(GRAVYVALET_INVOCATION_BATCH_CONCURRENCY=2),
+            mock.patch.object(MyBlargStorage, "get_item_info", new=_get_item_info),
+        ):
+            _resp = self._post_batch(
+                *(("get_item_info", {"item_id": str(_i)}) for _i in range(5))
+            )
+        self.assertEqual(_resp.status_code, HTTPStatus.CREATED)
+        self.assertEqual(
+            [_entry["invocation_status"] for _entry in _resp.data], ["SUCCESS"] * 5
+        )
+        self.assertEqual(_most_waiting, 2)
+
+    def test_batch_problems(self):
+        with self.subTest("not all thru the same addon"):
+            _resp = self.client.post(
+                reverse("addon-operation-invocations-batch"),
+                data=json.dumps(
+                    {
+                        "data": [
+                            {
+                                "type": "addon-operation-invocations",
+                                "attributes": {
+                                    "operation_name": "list_root_items",
+                                    "operation_kwargs": {},
+                                },
+                                "relationships": {
+                                    _thru_name: {"data": jsonapi_ref(_thru)}
+                                },
+                            }
+                            for _thru_name, _thru in (
+                                ("thru_addon", self._configured_addon),
+                                ("thru_account", self._account),
+                            )
+                        ]
+                    }
+                ),
+                content_type="application/vnd.api+json",
+            )
+            self.assertEqual(_resp.status_code, HTTPStatus.BAD_REQUEST)
+        with self.subTest("too many"):
+            with self.settings(GRAVYVALET_INVOCATION_BATCH_MAX_SIZE=2):
+                _resp = self._post_batch(*[("list_root_items", {})] * 3)
+            self.assertEqual(_resp.status_code, HTTPStatus.BAD_REQUEST)
+        with self.subTest("none"):
+            _resp = self._post_batch()
+            self.assertEqual(_resp.status_code, HTTPStatus.BAD_REQUEST)
+        with self.subTest("invalid kwargs"):
+            _resp = self._post_batch(
+                ("list_root_items", {}), ("list_root_items", {"blarg": 2})
+            )
+            self.assertEqual(_resp.status_code, HTTPStatus.BAD_REQUEST)
+        with self.subTest("not a list"):
+            _resp = self.client.post(
+                reverse("addon-operation-invocations-batch"),
+                data=json.dumps({"data": {"type": "addon-operation-invocations"}}),
+                content_type="application/vnd.api+json",
+            )
+            self.assertEqual(_resp.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(db.AddonOperationInvocation.objects.exists())
+
+    def test_batch_permissions(self):
+        with self.subTest("anonymous user cannot invoke"):
+            self._mock_osf.configure_assumed_caller(None)
+            _resp = self._post_batch(("list_root_items", {}))
+            self.assertEqual(_resp.status_code, HTTPStatus.UNAUTHORIZED)
+        with self.subTest("rando user cannot invoke"):
+            self._mock_osf.configure_assumed_caller("https://user.example/rando")
+            _resp = self._post_batch(("list_root_items", {}))
+            self.assertEqual(_resp.status_code, HTTPStatus.FORBIDDEN)
+            _resp = self._post_batch(
+                ("list_root_items", {}), thru_account=self._account
+            )
+            self.assertEqual(_resp.status_code, HTTPStatus.FORBIDDEN)
+        self.assertFalse(db.AddonOperationInvocation.objects.exists())
+
+
+class TestAddonOperationInvocationEvents(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls._invocation = _factories.AddonOperationInvocationFactory()
+
+    def setUp(self):
+        super().setUp()
+        self._mock_osf = MockOSF()
+        self._mock_osf.configure_assumed_caller(self._invocation.by_user.user_uri)
+        self.enterContext(self._mock_osf.mocking())
+        self.enterContext(
+            self.settings(GRAVYVALET_INVOCATION_EVENTS_HEARTBEAT_SECONDS=5)
+        )
+
+    @property
+    def _events_path(self):
+        return reverse(
+            "addon-operation-invocations-events",
+            kwargs={"pk": self._invocation.pk},
+        )
+
+    async def _status_events(self):
+        _resp = await AsyncClient().get(self._events_path)
+        self.assertEqual(_resp.status_code, HTTPStatus.OK)
+        self.assertEqual(_resp["Content-Type"], "text/event-stream")
+        async for _chunk in _resp.streaming_content:
+            _chunk = _chunk.decode()
+            if _chunk.startswith(":"):  # (a comment, to keep the stream open)
+                yield None
+            else:
+                _event, _data = _chunk.removesuffix("\n\n").split("\n")
+                self.assertEqual(_event, "event: status")
+                yield json.loads(_data.removeprefix("data: "))["invocation_status"]
+
+    async def _set_status(self, status: InvocationStatus, *, publish: bool):
+        self._invocation.invocation_status = status
+        await self._invocation.asave()
+        if publish:
+            await sync_to_async(status_events.publish_invocation_status)(
+                self._invocation.pk, status
+            )
+
+    async def test_pushed(self):
+        try:
+            _events = self._status_events()
+            self.assertEqual(await anext(_events), "STARTING")
+            _next_event = asyncio.ensure_future(anext(_events))
+            await asyncio.sleep(0.1)  # (as the celery task would, eventually)
+            await sync_to_async(status_events.publish_invocation_status)(
+                self._invocation.pk, InvocationStatus.GOING
+            )
+            self.assertEqual(await _next_event, "GOING")
+            _next_event = asyncio.ensure_future(anext(_events))
+            await asyncio.sleep(0.1)
+            await self._set_status(InvocationStatus.SUCCESS, publish=True)
+            self.assertEqual(await _next_event, "SUCCESS")
+            self.assertEqual([_event async for _event in _events], [])
+        finally:
+            await close_loop_async_redis()
+
+    async def test_final_at_once(self):
+        await self._set_status(InvocationStatus.ERROR, publish=False)
+        try:
+            self.assertEqual(
+                [_event async for _event in self._status_events()], ["ERROR"]
+            )
+        finally:
+            await close_loop_async_redis()
+
+    def test_as_sync_view(self):
+        self._invocation.invocation_status = InvocationStatus.SUCCESS
+        self._invocation.save()
+        _sync_view = super(
+            AddonOperationInvocationViewSet, AddonOperationInvocationViewSet
+        ).as_view({"get": "events"})
+        _resp = _sync_view(
+            get_test_request(path=self._events_path, HTTP_ACCEPT="text/event-stream"),
+            pk=self._invocation.pk,
+        )
+        self.assertEqual(_resp.status_code, HTTPStatus.OK)
+        # (served synchronously, the stream is sent once ended)
+        with self.assertWarnsRegex(Warning, "synchronously"):
+            (_event,) = [_chunk.decode() for _chunk in _resp]
+        self.assertIn('"invocation_status": "SUCCESS"', _event)
+
+    async def test_unpublished_change(self):
+        try:
+            with self.settings(GRAVYVALET_INVOCATION_EVENTS_HEARTBEAT_SECONDS=0.1):
+                _events = self._status_events()
+                self.assertEqual(await anext(_events), "STARTING")
+                await self._set_status(InvocationStatus.SUCCESS, publish=False)
+                # (found on the next heartbeat, after a keep-alive comment)
+                self.assertEqual([_e async for _e in _events], [None, "SUCCESS"])
+        finally:
+            await close_loop_async_redis()
+
+    async def test_gives_up(self):
+        try:
+            with self.settings(
+                GRAVYVALET_INVOCATION_EVENTS_HEARTBEAT_SECONDS=0.1,
+                GRAVYVALET_INVOCATION_EVENTS_MAX_SECONDS=0.25,
+            ):
+                _first, *_rest = [_e async for _e in self._status_events()]
+        finally:
+            await close_loop_async_redis()
+        self.assertEqual(_first, "STARTING")
+        self.assertEqual(set(_rest), {None})  # (only heartbeats, until giving up)
+
+    def test_permissions(self):
+        with self.subTest("anonymous user cannot listen"):
+            self._mock_osf.configure_assumed_caller(None)
+            _resp = self.client.get(self._events_path)
+            self.assertEqual(_resp.status_code, HTTPStatus.UNAUTHORIZED)
+        with self.subTest("rando user cannot listen"):
+            self._mock_osf.configure_assumed_caller("https://user.example/rando")
+            _resp = self.client.get(self._events_path)
+            self.assertEqual(_resp.status_code, HTTPStatus.FORBIDDEN)
+        with self.subTest("no such invocation"):
+            self._mock_osf.configure_assumed_caller(self._invocation.by_user.user_uri)
+            _resp = self.client.get(
+                reverse(
+                    "addon-operation-invocations-events",
+                    kwargs={"pk": "00000000-0000-0000-0000-000000000000"},
+                )
+            )
+            self.assertEqual(_resp.status_code, HTTPStatus.NOT_FOUND)
+
+    def _perform_by_celery(self) -> list[InvocationStatus]:
+        """statuses published (and committed) while performing the invocation"""
+        _published = []
+        with (
+            mock.patch.object(
+                invocation_tasks,
+                "publish_invocation_status",
+                side_effect=lambda _pk, _status: _published.append(_status),
+            ),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            try:
+                invocation_tasks.perform_invocation__celery(self._invocation.pk)
+            except ValueError:
+                pass
+        return _published
+
+    def test_published_by_celery(self):
+        self.assertEqual(
+            self._perform_by_celery(),
+            [InvocationStatus.GOING, InvocationStatus.SUCCESS],
+        )
+
+    def test_published_error_committed(self):
+        with mock.patch.object(
+            invocation_tasks,
+            "_instantiate_and_invoke__blocking",
+            side_effect=ValueError("oh no"),
+        ):
+            self.assertEqual(
+                self._perform_by_celery(),
+                [InvocationStatus.GOING, InvocationStatus.ERROR],
+            )
+        self._invocation.refresh_from_db()
+        self.assertEqual(self._invocation.invocation_status, InvocationStatus.ERROR)
+
+
 class TestAddonOperationInvocationErrors(APITestCase):
     @classmethod
     def setUpTestData(cls):
@@ -213,6 +805,7 @@ class TestAddonOperationInvocationErrors(APITestCase):
     def test_methods_not_allowed(self):
         _methods_not_allowed = {
             self._invocation_list_path: {"get", "patch", "put"},
+            reverse("addon-operation-invocations-batch"): {"get", "patch", "put"},
             self._detail_path: {"put", "post", "delete"},
             self._related_path("thru_addon"): {"patch", "put", "post", "delete"},
             self._related_path("thru_account"): {"patch", "put", "post", "delete"},
@@ -1,5 +1,6 @@
 import urllib
 from http import HTTPStatus
+from unittest.mock import patch
 
 from django.core.exceptions import ValidationError
 from django.test import TestCase
@@ -12,6 +13,7 @@ from addon_service.authorized_account.storage.views import (
 )
 from addon_service.common.credentials_formats import CredentialsFormats
 from addon_service.common.service_types import ServiceTypes
+from addon_service.credentials import encryption
 from addon_service.tests import _factories
 from addon_service.tests._helpers import (
     MockOSF,
@@ -474,6 +476,38 @@ class TestAuthorizedStorageAccountModel(TestCase):
                 with self.assertRaises(ValidationError):
                     account.credentials = invalid_credentials
 
+    def test_auth_headers__cached(self):
+        account = _factories.AuthorizedStorageAccountFactory(
+            credentials_format=CredentialsFormats.PERSONAL_ACCESS_TOKEN,
+            credentials=AccessTokenCredentials(access_token="token"),
+        )
+        account = db.AuthorizedStorageAccount.objects.get(pk=account.pk)
+        self.assertIsNone(account.get_cached_auth_headers())  # not loaded yet
+        with patch(
+            "addon_service.credentials.models.encryption.pls_decrypt_json",
+            wraps=encryption.pls_decrypt_json,
+        ) as _decrypt:
+            for _ in range(3):
+                self.assertEqual(
+                    account.get_auth_headers(), [("PRIVATE-TOKEN", "token")]
+                )
+            self.assertEqual(
+                account.get_cached_auth_headers(), [("PRIVATE-TOKEN", "token")]
+            )
+            self.assertEqual(_decrypt.call_count, 1)
+            # new credentials, new headers (decrypted once, when validated on save)
+            _decrypt.reset_mock()
+            account.credentials = AccessTokenCredentials(access_token="new_token")
+            self.assertIsNone(account.get_cached_auth_headers())
+            for _ in range(3):
+                self.assertEqual(
+                    account.get_auth_headers(), [("PRIVATE-TOKEN", "new_token")]
+                )
+            self.assertEqual(_decrypt.call_count, 1)
+            # same headers, but re-encrypted
+            account._credentials.rotate_encryption()
+            self.assertIsNone(account.get_cached_auth_headers())
+
 
 class TestAuthorizedStorageAccountRelatedView(TestCase):
     @classmethod
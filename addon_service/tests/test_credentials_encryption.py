@@ -0,0 +1,198 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from addon_service import models as db
+from addon_service.common.credentials_formats import CredentialsFormats
+from addon_service.credentials import (
+    bulk_rotation,
+    encryption,
+    key_derivation,
+)
+from addon_service.tasks import key_rotation
+from addon_service.tests import _factories
+from addon_service.tests._helpers import (
+    clear_redis_keys,
+    patch_encryption_key_derivation,
+)
+from addon_toolkit.credentials import AccessTokenCredentials
+
+
+class TestEnvelopeEncryption(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(patch_encryption_key_derivation())
+
+    def _make_account(self, access_token="token"):
+        return _factories.AuthorizedStorageAccountFactory(
+            credentials_format=CredentialsFormats.PERSONAL_ACCESS_TOKEN,
+            credentials=AccessTokenCredentials(access_token=access_token),
+        )
+
+    def _make_legacy_credentials(self, access_token="legacy"):
+        # encrypted as before envelope encryption, with a key for this row alone
+        _account = self._make_account()
+        _credentials = _account._credentials
+        _credentials.wrapped_data_key = None
+        _credentials._key_parameters = encryption.KeyParameters()
+        _credentials.encrypted_json = encryption.pls_encrypt_json(
+            {"access_token": access_token}, _credentials._key_parameters
+        )
+        _credentials.save()
+        return db.ExternalCredentials.objects.get(pk=_credentials.pk)
+
+    def _count_derivations(self, fn):
+        encryption._derive_multifernet_key.cache_clear()
+        key_derivation._POOL.clear()
+        with mock.patch(
+            "addon_service.credentials.key_derivation.hashlib.scrypt",
+            # (same fake key as `patch_encryption_key_derivation`)
+            return_value=key_derivation.hashlib.scrypt.return_value,
+        ) as _scrypt:
+            fn()
+        return _scrypt.call_count
+
+    def test_new_credentials_envelope_encrypted(self):
+        _credentials = self._make_account()._credentials
+        self.assertTrue(_credentials.is_envelope_encrypted)
+        self.assertEqual(
+            _credentials._key_parameters, encryption.envelope_key_parameters()
+        )
+        _reloaded = db.ExternalCredentials.objects.get(pk=_credentials.pk)
+        self.assertEqual(
+            _reloaded.decrypted_credentials,
+            AccessTokenCredentials(access_token="token"),
+        )
+
+    def test_one_derivation_for_many_rows(self):
+        _pks = [self._make_account(f"token-{_n}")._credentials.pk for _n in range(5)]
+
+        def _decrypt_all():
+            for _n, _pk in enumerate(_pks):
+                self.assertEqual(
+                    db.ExternalCredentials.objects.get(pk=_pk).decrypted_credentials,
+                    AccessTokenCredentials(access_token=f"token-{_n}"),
+                )
+
+        self.assertEqual(self._count_derivations(_decrypt_all), 1)
+
+    def test_legacy_credentials_readable(self):
+        _credentials = self._make_legacy_credentials()
+        self.assertFalse(_credentials.is_envelope_encrypted)
+        self.assertEqual(
+            _credentials.decrypted_credentials,
+            AccessTokenCredentials(access_token="legacy"),
+        )
+
+    def test_rotate_legacy_to_envelope(self):
+        _credentials = self._make_legacy_credentials()
+        _credentials.rotate_encryption()
+        _reloaded = db.ExternalCredentials.objects.get(pk=_credentials.pk)
+        self.assertTrue(_reloaded.is_envelope_encrypted)
+        self.assertEqual(
+            _reloaded.decrypted_credentials,
+            AccessTokenCredentials(access_token="legacy"),
+        )
+
+    def test_rotate_rewraps_data_key(self):
+        _credentials = self._make_account()._credentials
+        _encrypted_json = bytes(_credentials.encrypted_json)
+        _wrapped_data_key = bytes(_credentials.wrapped_data_key)
+        _credentials.rotate_encryption()
+        _reloaded = db.ExternalCredentials.objects.get(pk=_credentials.pk)
+        self.assertEqual(bytes(_reloaded.encrypted_json), _encrypted_json)
+        self.assertNotEqual(bytes(_reloaded.wrapped_data_key), _wrapped_data_key)
+        self.assertEqual(
+            _reloaded.decrypted_credentials,
+            AccessTokenCredentials(access_token="token"),
+        )
+
+    def test_schedule_envelope_encryption(self):
+        _legacy = self._make_legacy_credentials()
+        _envelope = self._make_account()._credentials
+        _wrapped_data_key = bytes(_envelope.wrapped_data_key)
+        with mock.patch.object(
+            key_rotation.rotate_encryption_chunks__celery,
+            "apply_async",
+            side_effect=lambda _args: bulk_rotation.rotate_chunks(*_args),
+        ):
+            _run_id = key_rotation.schedule_envelope_encryption()
+        self.addCleanup(clear_redis_keys, f"gv:key-rotation:{_run_id}*")
+        _progress = bulk_rotation.get_rotation_progress(_run_id)
+        self.assertEqual((_progress.total_rows, _progress.done_rows), (1, 1))
+        _legacy.refresh_from_db()
+        self.assertTrue(_legacy.is_envelope_encrypted)
+        self.assertEqual(
+            _legacy.decrypted_credentials,
+            AccessTokenCredentials(access_token="legacy"),
+        )
+        _envelope.refresh_from_db()  # (left alone)
+        self.assertEqual(bytes(_envelope.wrapped_data_key), _wrapped_data_key)
+
+    def test_schedule_envelope_encryption_none_left(self):
+        self._make_account()
+        with mock.patch.object(
+            key_rotation.rotate_encryption_chunks__celery, "apply_async"
+        ) as _apply_async:
+            _run_id = key_rotation.schedule_envelope_encryption()
+        self.addCleanup(clear_redis_keys, f"gv:key-rotation:{_run_id}*")
+        _apply_async.assert_not_called()
+
+
+class TestDecryptedCredentialsMemo(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(patch_encryption_key_derivation())
+
+    def _count_decrypts(self, fn) -> int:
+        _before = encryption.get_decrypt_json_count()
+        fn()
+        return encryption.get_decrypt_json_count() - _before
+
+    def test_memoized_per_instance(self):
+        _account = _factories.AuthorizedStorageAccountFactory(
+            credentials_format=CredentialsFormats.PERSONAL_ACCESS_TOKEN,
+            credentials=AccessTokenCredentials(access_token="token"),
+        )
+        _account = db.AuthorizedStorageAccount.objects.get(pk=_account.pk)
+
+        def _read_thrice():
+            for _ in range(3):
+                self.assertEqual(
+                    _account.credentials, AccessTokenCredentials(access_token="token")
+                )
+
+        self.assertEqual(self._count_decrypts(_read_thrice), 1)
+        self.assertEqual(self._count_decrypts(_read_thrice), 0)
+        # new credentials, decrypted once (when validated on save)
+
+        def _set_and_read():
+            _account.credentials = AccessTokenCredentials(access_token="new")
+            _read_thrice_new()
+
+        def _read_thrice_new():
+            for _ in range(3):
+                self.assertEqual(_account.credentials.access_token, "new")
+
+        self.assertEqual(self._count_decrypts(_set_and_read), 1)
+        # re-wrapped data key, decrypted once (when validated on save)
+        self.assertEqual(
+            self._count_decrypts(
+                lambda: (
+                    _account._credentials.rotate_encryption(),
+                    _read_thrice_new(),
+                )
+            ),
+            1,
+        )
+
+    def test_oauth2_save(self):
+        _account = _factories.AuthorizedStorageAccountFactory(
+            credentials_format=CredentialsFormats.OAUTH2,
+        )
+        _token_metadata = _account.oauth2_token_metadata
+        _token_metadata.state_nonce = None
+        _token_metadata.refresh_token = "refresh"
+        _token_metadata.save()
+        _account.credentials = AccessTokenCredentials(access_token="token")
+        self.assertEqual(self._count_decrypts(_account.save), 1)
@@ -32,7 +32,7 @@ class TestOsfUtilsHmac(SimpleTestCase):
         self._mock_get_client = mock.AsyncMock()
         self.enterContext(
             mock.patch(
-                "addon_service.common.osf.get_singleton_client_session",
+                "addon_service.common.osf.get_pooled_client_session",
                 self._mock_get_client,
             )
         )
@@ -186,7 +186,7 @@ class TestHmacApiAuth(APITestCase):
         self._mock_get_client = mock.AsyncMock()
         self.enterContext(
             mock.patch(
-                "addon_service.common.osf.get_singleton_client_session",
+                "addon_service.common.osf.get_pooled_client_session",
                 self._mock_get_client,
             )
         )
@@ -0,0 +1,198 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from addon_service import models as db
+from addon_service.addon_operation_invocation import partitions
+from addon_service.tasks import invocation_retention
+from addon_service.tests import _factories
+
+
+_TABLE = db.AddonOperationInvocation._meta.db_table
+
+
+class TestInvocationPartitions(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls._invocation = _factories.AddonOperationInvocationFactory()
+
+    def setUp(self):
+        super().setUp()
+        self.enterContext(
+            self.settings(
+                GRAVYVALET_INVOCATION_RETENTION_DAYS={
+                    "immediate": 0,
+                    "redirect": 0,
+                    "eventual": 0,
+                },
+                GRAVYVALET_INVOCATION_RETENTION_ARCHIVE=False,
+                GRAVYVALET_INVOCATION_PARTITION_DAYS_AHEAD=3,
+            )
+        )
+
+    def _partition_names(self) -> set[str]:
+        return {_p.name for _p in partitions.iter_invocation_partitions()}
+
+    def _days_later(self, days: int) -> datetime.datetime:
+        return timezone.now() + datetime.timedelta(days=days)
+
+    def _day_partition(self, operation_type: str, when: datetime.datetime) -> str:
+        return f"{_TABLE}_{operation_type}_p{when.astimezone(datetime.UTC):%Y%m%d}"
+
+    def _invocation_exists(self, invocation=None) -> bool:
+        return db.AddonOperationInvocation.objects.filter(
+            pk=(invocation or self._invocation).pk
+        ).exists()
+
+    def _legacy_invocation(self):
+        # (as saved before partitioning by type)
+        db.AddonOperationInvocation.objects.filter(pk=self._invocation.pk).update(
+            operation_type=""
+        )
+        return self._invocation
+
+    def _maintain(self, now, **retention_days):
+        with self.settings(
+            GRAVYVALET_INVOCATION_RETENTION_DAYS={
+                "immediate": 0,
+                "redirect": 0,
+                "eventual": 0,
+                **retention_days,
+            }
+        ):
+            return partitions.maintain_invocation_partitions(now)
+
+    def test_partitioned(self):
+        _partitions = list(partitions.iter_invocation_partitions())
+        self.assertIn(
+            partitions.InvocationPartition(f"{_TABLE}_legacy", None, None), _partitions
+        )
+        self.assertIn(
+            partitions.InvocationPartition(
+                f"{_TABLE}_immediate_default", "immediate", None
+            ),
+            _partitions,
+        )
+        self.assertEqual(
+            self._partition_of(self._invocation.pk),
+            self._day_partition("immediate", self._invocation.created),
+        )
+        self.assertEqual(
+            self._partition_of(self._legacy_invocation().pk), f"{_TABLE}_legacy"
+        )
+
+    def test_creates_upcoming(self):
+        _now = self._days_later(200)
+        _maintenance = self._maintain(_now)
+        _expected = [
+            self._day_partition(_operation_type, _now + datetime.timedelta(days=_days))
+            for _operation_type in ("redirect", "immediate", "eventual")
+            for _days in (1, 2, 3)
+        ]
+        self.assertEqual(_maintenance.created, _expected)
+        self.assertLessEqual(set(_expected), self._partition_names())
+        # (once)
+        self.assertEqual(self._maintain(_now).created, [])
+        # nothing expires when kept forever
+        self.assertEqual(_maintenance.expired, [])
+        self.assertEqual(_maintenance.deleted_count, 0)
+        self.assertTrue(self._invocation_exists())
+
+    def test_moves_rows_from_default(self):
+        _now = self._days_later(200)
+        _later = db.AddonOperationInvocation.objects.filter(
+            pk=_factories.AddonOperationInvocationFactory().pk
+        )
+        _later.update(created=_now + datetime.timedelta(days=2))
+        self.assertEqual(
+            self._partition_of(_later.get().pk), f"{_TABLE}_immediate_default"
+        )
+        self._maintain(_now)
+        self.assertEqual(
+            self._partition_of(_later.get().pk),
+            self._day_partition("immediate", _now + datetime.timedelta(days=2)),
+        )
+
+    def test_drops_expired_by_type(self):
+        # immediate invocations kept for less than eventual ones: their day
+        # partitions go whole, without deleting rows
+        _immediate = self._day_partition("immediate", self._invocation.created)
+        _eventual = self._day_partition("eventual", self._invocation.created)
+        _maintenance = self._maintain(self._days_later(30), immediate=7, eventual=90)
+        self.assertIn(_immediate, _maintenance.expired)
+        self.assertNotIn(_eventual, _maintenance.expired)
+        self.assertEqual(_maintenance.deleted_count, 0)
+        self.assertFalse(self._invocation_exists())
+        self.assertFalse(self._table_exists(_immediate))
+        self.assertIn(_eventual, self._partition_names())
+
+    def test_kept_forever_by_type(self):
+        # (immediate kept forever; others still expire)
+        _immediate = self._day_partition("immediate", self._invocation.created)
+        _maintenance = self._maintain(self._days_later(100), redirect=7, eventual=7)
+        self.assertNotIn(_immediate, _maintenance.expired)
+        self.assertIn(
+            self._day_partition("eventual", self._invocation.created),
+            _maintenance.expired,
+        )
+        self.assertTrue(self._invocation_exists())
+
+    def test_archives_expired(self):
+        _immediate = self._day_partition("immediate", self._invocation.created)
+        with self.settings(GRAVYVALET_INVOCATION_RETENTION_ARCHIVE=True):
+            _maintenance = self._maintain(self._days_later(100), immediate=30)
+        self.assertIn(_immediate, _maintenance.expired)
+        self.assertNotIn(_immediate, self._partition_names())
+        self.assertFalse(self._invocation_exists())
+        # (detached, but still there to archive)
+        self.assertTrue(self._table_exists(_immediate))
+
+    def test_deletes_from_default(self):
+        _old = db.AddonOperationInvocation.objects.filter(
+            pk=_factories.AddonOperationInvocationFactory().pk
+        )
+        _old.update(created=self._days_later(-365))
+        self.assertEqual(_old.count(), 1)
+        _maintenance = self._maintain(timezone.now(), immediate=30)
+        self.assertEqual(_maintenance.deleted_count, 1)
+        self.assertEqual(_old.count(), 0)
+        self.assertTrue(self._invocation_exists())
+
+    def test_deletes_legacy(self):
+        _legacy = self._legacy_invocation()
+        _maintenance = self._maintain(self._days_later(30), immediate=7, eventual=90)
+        self.assertEqual(_maintenance.deleted_count, 1)
+        self.assertFalse(self._invocation_exists(_legacy))
+        # (the legacy partition, once empty, goes too)
+        self.assertIn(f"{_TABLE}_legacy", _maintenance.expired)
+        self.assertFalse(self._table_exists(f"{_TABLE}_legacy"))
+
+    def test_not_yet_expired(self):
+        _maintenance = self._maintain(
+            self._days_later(3), immediate=7, redirect=7, eventual=7
+        )
+        # (only the legacy partition, empty already)
+        self.assertEqual(_maintenance.expired, [f"{_TABLE}_legacy"])
+        self.assertEqual(_maintenance.deleted_count, 0)
+        self.assertTrue(self._invocation_exists())
+
+    def test_task(self):
+        invocation_retention.maintain_invocation_partitions__celery()
+        self.assertTrue(self._invocation_exists())
+
+    def _partition_of(self, invocation_pk) -> str:
+        with connection.cursor() as _cursor:
+            _cursor.execute(
+                f"SELECT tableoid::regclass::text FROM {_TABLE} WHERE id = %s",
+                [invocation_pk],
+            )
+            ((_partition_name,),) = _cursor.fetchall()
+        return _partition_name
+
+    def _table_exists(self, name: str) -> bool:
+        with connection.cursor() as _cursor:
+            _cursor.execute("SELECT to_regclass(%s)", [name])
+            ((_existing,),) = _cursor.fetchall()
+        return _existing is not None
@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import threading
+import time
+from unittest import mock
+
+from django.test import (
+    SimpleTestCase,
+    override_settings,
+)
+
+from addon_service.credentials import key_derivation
+from addon_service.credentials.encryption import KeyParameters
+
+
+_SMALL_PARAMS = {"scrypt_cost_log2": 4, "scrypt_block_size": 8}
+
+
+@override_settings(GRAVYVALET_KEY_DERIVATION_PROCESSES=0)
+class TestKeyDerivationPool(SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self._pool = key_derivation.KeyDerivationPool()
+        self._running = 0
+        self._max_running = 0
+        self._calls = 0
+        self._count_lock = threading.Lock()
+        self.enterContext(
+            mock.patch(
+                "addon_service.credentials.key_derivation.hashlib.scrypt",
+                side_effect=self._slow_scrypt,
+            )
+        )
+
+    def _slow_scrypt(self, secret, **kwargs):
+        with self._count_lock:
+            self._calls += 1
+            self._running += 1
+            self._max_running = max(self._max_running, self._running)
+        time.sleep(0.05)
+        with self._count_lock:
+            self._running -= 1
+        return secret + kwargs["salt"]
+
+    async def _derive_all(self, derivations):
+        return await asyncio.gather(
+            *(
+                asyncio.wrap_future(self._pool.submit(_secret, _params))
+                for _secret, _params in derivations
+            )
+        )
+
+    def test_single_flight(self):
+        _params = KeyParameters(**_SMALL_PARAMS)
+        _results = asyncio.run(self._derive_all([(b"secret", _params)] * 5))
+        self.assertEqual(_results, [b"secret" + _params.salt] * 5)
+        self.assertEqual(self._calls, 1)
+
+    def test_recently_derived(self):
+        _params = KeyParameters(**_SMALL_PARAMS)
+        self._pool.submit(b"secret", _params).result()
+        _future = self._pool.submit(b"secret", _params)
+        self.assertTrue(_future.done())
+        self.assertEqual(_future.result(), b"secret" + _params.salt)
+        self.assertEqual(self._calls, 1)
+
+    @override_settings(GRAVYVALET_DERIVED_KEY_CACHE_SIZE=0)
+    def test_no_cache(self):
+        _params = KeyParameters(**_SMALL_PARAMS)
+        self._pool.submit(b"secret", _params).result()
+        self._pool.submit(b"secret", _params).result()
+        self.assertEqual(self._calls, 2)
+
+    def test_memory_budget(self):
+        _params = [KeyParameters(**_SMALL_PARAMS) for _ in range(4)]
+        _memory_required = _params[0].memory_required()
+        with (
+            override_settings(GRAVYVALET_KEY_DERIVATION_MEMORY_BUDGET_MIB=1),
+            mock.patch.object(key_derivation, "_MIB", _memory_required * 2),
+        ):
+            _results = asyncio.run(
+                self._derive_all([(b"secret", _p) for _p in _params])
+            )
+        self.assertEqual(_results, [b"secret" + _p.salt for _p in _params])
+        self.assertEqual(self._calls, 4)
+        self.assertEqual(self._max_running, 2)
+        self.assertEqual(self._pool.memory_in_use(), 0)
+
+    def test_error(self):
+        with mock.patch(
+            "addon_service.credentials.key_derivation.hashlib.scrypt",
+            side_effect=ValueError("nope"),
+        ):
+            with self.assertRaises(ValueError):
+                self._pool.submit(b"secret", KeyParameters(**_SMALL_PARAMS)).result()
+        self.assertEqual(self._pool.memory_in_use(), 0)
+
+
+@override_settings(GRAVYVALET_KEY_DERIVATION_PROCESSES=1)
+class TestKeyDerivationProcesses(SimpleTestCase):
+    def test_derive_in_process(self):
+        _pool = key_derivation.KeyDerivationPool()
+        self.addCleanup(lambda: _pool._get_executor().shutdown())
+        _params = KeyParameters(**_SMALL_PARAMS)
+        self.assertEqual(
+            _pool.submit(b"secret", _params).result(timeout=60),
+            hashlib.scrypt(
+                b"secret",
+                salt=_params.salt,
+                n=2**_params.scrypt_cost_log2,
+                r=_params.scrypt_block_size,
+                p=_params.scrypt_parallelization,
+                dklen=32,
+            ),
+        )
@@ -0,0 +1,135 @@
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from addon_service import models as db
+from addon_service.common.credentials_formats import CredentialsFormats
+from addon_service.common.redis_client import get_redis
+from addon_service.credentials import (
+    bulk_rotation,
+    encryption,
+)
+from addon_service.tasks import key_rotation
+from addon_service.tests import _factories
+from addon_service.tests._helpers import (
+    clear_redis_keys,
+    patch_encryption_key_derivation,
+)
+from addon_toolkit.credentials import AccessTokenCredentials
+
+
+class TestBulkKeyRotation(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(patch_encryption_key_derivation())
+        self._credentials = [
+            _factories.AuthorizedStorageAccountFactory(
+                credentials_format=CredentialsFormats.PERSONAL_ACCESS_TOKEN,
+                credentials=AccessTokenCredentials(access_token=f"token-{_n}"),
+            )._credentials
+            for _n in range(5)
+        ]
+        # one encrypted as before envelope encryption
+        _legacy = self._credentials[0]
+        _legacy.wrapped_data_key = None
+        _legacy._key_parameters = encryption.KeyParameters()
+        _legacy.encrypted_json = encryption.pls_encrypt_json(
+            {"access_token": "token-0"}, _legacy._key_parameters
+        )
+        _legacy.save()
+        self._wrapped_before = {
+            _credentials.pk: _credentials.wrapped_data_key
+            for _credentials in self._credentials
+        }
+
+    def _plan(self, **kwargs) -> str:
+        _run_id = bulk_rotation.plan_rotation(**kwargs)
+        self.addCleanup(clear_redis_keys, f"gv:key-rotation:{_run_id}*")
+        return _run_id
+
+    def _assert_rotated(self):
+        for _n, _credentials in enumerate(self._credentials):
+            _reloaded = db.ExternalCredentials.objects.get(pk=_credentials.pk)
+            self.assertTrue(_reloaded.is_envelope_encrypted)
+            self.assertNotEqual(
+                bytes(_reloaded.wrapped_data_key),
+                bytes(self._wrapped_before[_credentials.pk] or b""),
+            )
+            self.assertEqual(
+                _reloaded.decrypted_credentials,
+                AccessTokenCredentials(access_token=f"token-{_n}"),
+            )
+
+    def test_rotate_in_chunks(self):
+        _run_id = self._plan(chunk_size=2)
+        _progress = bulk_rotation.get_rotation_progress(_run_id)
+        self.assertEqual((_progress.total_rows, _progress.chunk_count), (5, 3))
+        self.assertFalse(_progress.is_complete)
+        self.assertEqual(bulk_rotation.rotate_chunks(_run_id), 5)
+        self._assert_rotated()
+        _progress = bulk_rotation.get_rotation_progress(_run_id)
+        self.assertTrue(_progress.is_complete)
+        self.assertEqual(_progress.done_rows, 5)
+        self.assertEqual(_progress.eta_seconds, 0)
+
+    def test_resume_skips_done_chunks(self):
+        _run_id = self._plan(chunk_size=2)
+        # first chunk done before a crash
+        get_redis().sadd(f"gv:key-rotation:{_run_id}:done", 0)
+        self.assertEqual(bulk_rotation.rotate_chunks(_run_id), 3)
+        self.assertTrue(bulk_rotation.get_rotation_progress(_run_id).is_complete)
+
+    def test_claimed_chunks_waited_on(self):
+        _run_id = self._plan(chunk_size=2)
+        # another worker is rotating the last chunk (and finishes it meanwhile)
+        _claim_key = f"gv:key-rotation:{_run_id}:claim:2"
+        get_redis().set(_claim_key, 1, ex=60)
+
+        def _other_worker_done(_seconds):
+            get_redis().sadd(f"gv:key-rotation:{_run_id}:done", 2)
+            get_redis().delete(_claim_key)
+
+        with mock.patch.object(
+            bulk_rotation.time, "sleep", side_effect=_other_worker_done
+        ) as _sleep:
+            self.assertEqual(bulk_rotation.rotate_chunks(_run_id), 4)
+        _sleep.assert_called_once()
+        self.assertTrue(bulk_rotation.get_rotation_progress(_run_id).is_complete)
+
+    def test_expired_claims_picked_up(self):
+        _run_id = self._plan(chunk_size=2)
+        # another worker claimed the last chunk, then crashed
+        _claim_key = f"gv:key-rotation:{_run_id}:claim:2"
+        get_redis().set(_claim_key, 1, ex=60)
+        with mock.patch.object(
+            bulk_rotation.time,
+            "sleep",
+            side_effect=lambda _seconds: get_redis().delete(_claim_key),
+        ) as _sleep:
+            self.assertEqual(bulk_rotation.rotate_chunks(_run_id), 5)
+        self.assertLessEqual(_sleep.call_args.args[0], 10)
+        self._assert_rotated()
+        self.assertTrue(bulk_rotation.get_rotation_progress(_run_id).is_complete)
+
+    def test_no_such_run(self):
+        with self.assertRaises(ValueError):
+            bulk_rotation.rotate_chunks("no-such-run")
+
+    def test_command(self):
+        with mock.patch.object(
+            key_rotation.rotate_encryption_chunks__celery,
+            "apply_async",
+            side_effect=lambda _args: bulk_rotation.rotate_chunks(*_args),
+        ) as _apply_async:
+            _out = io.StringIO()
+            call_command(
+                "rotate_encryption", "--chunk-size=2", "--parallel=2", stdout=_out
+            )
+        self.assertEqual(_apply_async.call_count, 2)
+        _run_id = _out.getvalue().split()[3]
+        self.addCleanup(clear_redis_keys, f"gv:key-rotation:{_run_id}*")
+        self.assertIn("5/5 rows (3/3 chunks)", _out.getvalue())
+        self.assertIn("complete", _out.getvalue())
+        self._assert_rotated()
@@ -0,0 +1,94 @@
+import time
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory
+
+from addon_service import models as db
+from addon_service.authentication import GVCombinedAuthentication
+from addon_service.common.redis_client import get_redis
+from addon_service.tests import _factories
+from addon_service.tests._helpers import forget_known_users
+from addon_service.user_reference.known_users import known_user_cache
+
+
+_USER_URI = "https://osf.example/known"
+
+
+class TestKnownUserCache(TestCase):
+    def setUp(self):
+        super().setUp()
+        forget_known_users()
+        self.addCleanup(forget_known_users)
+
+    def _authenticate(self, user_uri=_USER_URI):
+        _request = APIRequestFactory().get("/")
+        with mock.patch(
+            "addon_service.common.osf.get_osf_user_uri", return_value=user_uri
+        ):
+            self.assertIsNotNone(GVCombinedAuthentication().authenticate(_request))
+        return _request
+
+    def test_known_user_without_queries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _request = self._authenticate()
+        _user = db.UserReference.objects.get(user_uri=_USER_URI)
+        self.assertEqual(_request.user_reference_pk, _user.pk)
+        with self.assertNumQueries(0):
+            _request = self._authenticate()
+        self.assertEqual(_request.user_reference_pk, _user.pk)
+        # another process (sharing redis)
+        known_user_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._authenticate().user_reference_pk, _user.pk)
+
+    def test_existing_user(self):
+        _user = _factories.UserReferenceFactory()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(
+                self._authenticate(_user.user_uri).user_reference_pk, _user.pk
+            )
+        self.assertEqual(db.UserReference.objects.filter(pk=_user.pk).count(), 1)
+        self.assertEqual(known_user_cache.lookup(_user.user_uri), _user.pk)
+
+    def test_uncommitted_not_cached(self):
+        with self.captureOnCommitCallbacks(execute=False) as _callbacks:
+            self._authenticate()
+        self.assertEqual(len(_callbacks), 1)
+        self.assertIsNone(known_user_cache.lookup(_USER_URI))
+
+    def test_forget_on_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._authenticate()
+        db.UserReference.objects.get(user_uri=_USER_URI).delete(force=True)
+        self.assertIsNone(known_user_cache.lookup(_USER_URI))
+
+    def test_bounded(self):
+        with self.settings(
+            GRAVYVALET_KNOWN_USER_CACHE_SIZE=2,
+            GRAVYVALET_KNOWN_USER_CACHE_SECONDS=0,
+        ):
+            for _n in range(3):
+                known_user_cache.remember(f"{_USER_URI}/{_n}", f"pk-{_n}")
+            self.assertIsNone(known_user_cache.lookup(f"{_USER_URI}/0"))
+            self.assertEqual(known_user_cache.lookup(f"{_USER_URI}/2"), "pk-2")
+
+    def test_deleted_elsewhere(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._authenticate()
+        # deleted by another process (which forgets it in redis, not here)
+        db.UserReference.objects.filter(user_uri=_USER_URI).delete()
+        _cache_key = f"gv:known-user:{_USER_URI}"
+        get_redis().delete(_cache_key)
+        self.assertIsNotNone(known_user_cache.lookup(_USER_URI))
+        with mock.patch(
+            "addon_service.user_reference.known_users.time.monotonic",
+            return_value=time.monotonic() + 61,
+        ):
+            self.assertIsNone(known_user_cache.lookup(_USER_URI))
+            with self.captureOnCommitCallbacks(execute=True):
+                _request = self._authenticate()
+        self.assertEqual(
+            _request.user_reference_pk,
+            db.UserReference.objects.get(user_uri=_USER_URI).pk,
+        )
@@ -0,0 +1,50 @@
+from django.test import (
+    SimpleTestCase,
+    override_settings,
+)
+from django.urls import reverse
+
+from addon_service.common import hmac as hmac_utils
+
+
+@override_settings(
+    GRAVYVALET_METRICS_ENABLED=True,
+    GRAVYVALET_METRICS_ALLOWED_IPS=("10.0.0.0/8",),
+    GRAVYVALET_METRICS_HMAC_KEY="a-metrics-key",
+)
+class TestMetricsEndpoint(SimpleTestCase):
+    def test_disabled(self):
+        with override_settings(GRAVYVALET_METRICS_ENABLED=False):
+            _response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3")
+        self.assertEqual(_response.status_code, 404)
+
+    def test_allowed_address(self):
+        _response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.1.2.3")
+        self.assertEqual(_response.status_code, 200)
+        self.assertTrue(_response["Content-Type"].startswith("text/plain"))
+
+    def test_forbidden_address(self):
+        _response = self.client.get(reverse("metrics"), REMOTE_ADDR="192.168.1.1")
+        self.assertEqual(_response.status_code, 403)
+
+    def test_hmac_signed(self):
+        _url = reverse("metrics")
+        _response = self.client.get(
+            _url,
+            REMOTE_ADDR="192.168.1.1",
+            headers=hmac_utils.make_signed_headers(
+                f"http://testserver{_url}", "GET", "a-metrics-key"
+            ),
+        )
+        self.assertEqual(_response.status_code, 200)
+
+    def test_wrong_hmac_key(self):
+        _url = reverse("metrics")
+        _response = self.client.get(
+            _url,
+            REMOTE_ADDR="192.168.1.1",
+            headers=hmac_utils.make_signed_headers(
+                f"http://testserver{_url}", "GET", "some-other-key"
+            ),
+        )
+        self.assertEqual(_response.status_code, 403)
@@ -0,0 +1,604 @@
+import abc
+import asyncio
+import json
+import time
+import unittest
+import uuid
+from http import HTTPMethod
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.core.cache import cache
+from django.test import override_settings
+
+from addon_service.common import (
+    deadline,
+    exceptions,
+    hedging,
+    http_cache,
+    metrics,
+    network,
+    single_flight,
+)
+from addon_service.common.aiohttp_session import ConnectionPoolManager
+from addon_service.common.circuit_breaker import CircuitBreaker
+from addon_service.common.network import GravyvaletHttpRequestor
+from addon_service.common.rate_limit import (
+    ProviderRateLimiter,
+    get_bucket_states,
+)
+from addon_service.common.redis_client import (
+    close_loop_async_redis,
+    get_redis,
+)
+from addon_toolkit.constrained_network.http import HttpRequestInfo
+from addon_toolkit.iri_utils import Multidict
+
+
+_LOCMEM_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+}
+
+
+class _NetworkTestCase(unittest.IsolatedAsyncioTestCase, abc.ABC):
+    settings_overrides: dict = {}
+    response_delay: float = 0
+
+    async def asyncSetUp(self):
+        self.enterContext(override_settings(**self.settings_overrides))
+        self.received_requests: list[web.Request] = []
+        _app = web.Application()
+        _app.router.add_get("/api/{name}", self._handle_get)
+        self._server = TestServer(_app)
+        await self._server.start_server()
+        self.addAsyncCleanup(self._server.close)
+        _pools = ConnectionPoolManager()
+        self.addAsyncCleanup(_pools.close_loop_sessions)
+        _prefix_url = str(self._server.make_url("/api/"))
+        self.account = mock.Mock(
+            pk=f"an-account-{uuid.uuid4().hex}",
+            external_service_id="a-service",
+            **{"get_cached_auth_headers.return_value": []},
+        )
+        self.network = GravyvaletHttpRequestor(
+            client_session=await _pools.get_session(_prefix_url),
+            prefix_url=_prefix_url,
+            account=self.account,
+        )
+
+    async def _handle_get(self, request):
+        self.received_requests.append(request)
+        if self.response_delay:
+            await asyncio.sleep(self.response_delay)
+        return self.respond(request)
+
+    @abc.abstractmethod
+    def respond(self, request) -> web.Response:
+        """the test server's response to `GET /api/{name}`"""
+
+
+class TestProviderResponseCache(_NetworkTestCase):
+    settings_overrides = {
+        "CACHES": _LOCMEM_CACHES,
+        "GRAVYVALET_PROVIDER_RESPONSE_CACHE_ENABLED": True,
+    }
+
+    def respond(self, request):
+        _etag = f'"{request.match_info["name"]}-v1"'
+        if request.headers.get("If-None-Match") == _etag:
+            return web.Response(status=304, headers={"ETag": _etag})
+        return web.json_response(
+            {"name": request.match_info["name"]}, headers={"ETag": _etag}
+        )
+
+    async def _get_json(self, name):
+        async with self.network.GET(name) as _response:
+            return _response.http_status, await _response.json_content()
+
+    async def test_revalidated_hit(self):
+        _stats_before = http_cache.get_response_cache_stats()
+        self.assertEqual(await self._get_json("foo"), (200, {"name": "foo"}))
+        self.assertEqual(await self._get_json("foo"), (200, {"name": "foo"}))
+        self.assertEqual(await self._get_json("bar"), (200, {"name": "bar"}))
+        self.assertEqual(
+            [
+                _request.headers.get("If-None-Match")
+                for _request in self.received_requests
+            ],
+            [None, '"foo-v1"', None],
+        )
+        _stats_after = http_cache.get_response_cache_stats()
+        self.assertEqual(_stats_after["miss"] - _stats_before["miss"], 2)
+        self.assertEqual(_stats_after["revalidate"] - _stats_before["revalidate"], 1)
+        self.assertEqual(_stats_after["hit"] - _stats_before["hit"], 1)
+
+    async def test_imp_conditional_request_bypasses_cache(self):
+        await self._get_json("foo")
+        async with self.network.GET(
+            "foo", headers={"If-None-Match": '"foo-v1"'}
+        ) as _response:
+            self.assertEqual(_response.http_status, 304)
+
+
+class TestStreamingResponse(_NetworkTestCase):
+    def respond(self, request):
+        return web.json_response(
+            {"data": {"items": [{"n": _n} for _n in range(1000)]}},
+        )
+
+    async def test_iter_json_items(self):
+        async with self.network.GET("foo") as _response:
+            _items = [
+                _item async for _item in _response.iter_json_items("data", "items")
+            ]
+        self.assertEqual(_items, [{"n": _n} for _n in range(1000)])
+
+    async def test_iter_content(self):
+        async with self.network.GET("foo") as _response:
+            _chunks = [
+                _chunk async for _chunk in _response.iter_content(chunk_size=100)
+            ]
+        self.assertGreater(len(_chunks), 1)
+        self.assertTrue(all(len(_chunk) <= 100 for _chunk in _chunks))
+        self.assertTrue(b"".join(_chunks).startswith(b'{"data": {"items": [{"n": 0}'))
+
+
+class TestRateLimit(_NetworkTestCase):
+    settings_overrides = {
+        "GRAVYVALET_RATE_LIMIT_ENABLED": True,
+        "GRAVYVALET_RATE_LIMIT_BUCKET_SIZE": 3,
+        "GRAVYVALET_RATE_LIMIT_REFILL_PER_SECOND": 0.01,
+        "GRAVYVALET_RATE_LIMIT_MAX_WAIT_SECONDS": 2,
+    }
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.addAsyncCleanup(close_loop_async_redis)
+        self.host = ConnectionPoolManager.pool_key(str(self._server.make_url("/api/")))
+        self.rate_limiter = ProviderRateLimiter("a-service", self.account.pk, self.host)
+        self.addCleanup(
+            get_redis().delete,
+            self.rate_limiter.bucket_key,
+            self.rate_limiter.provider_bucket_key,
+        )
+        self.responses: list[tuple[int, dict]] = []
+
+    def respond(self, request):
+        _status, _headers = self.responses.pop(0) if self.responses else (200, {})
+        return web.json_response({}, status=_status, headers=_headers)
+
+    async def _get_status(self):
+        async with self.network.GET("foo") as _response:
+            return _response.http_status
+
+    async def test_bucket_runs_dry(self):
+        for _ in range(3):
+            self.assertEqual(await self._get_status(), 200)
+        with self.assertRaises(exceptions.ProviderRateLimited):
+            await self._get_status()
+        self.assertEqual(len(self.received_requests), 3)
+        _state = await self.rate_limiter.get_state()
+        self.assertLess(_state.tokens, 1)
+        self.assertEqual(_state.capacity, 3)
+
+    async def test_retry_after(self):
+        self.responses = [(429, {"Retry-After": "1"})]
+        _start = time.monotonic()
+        self.assertEqual(await self._get_status(), 200)
+        self.assertGreaterEqual(time.monotonic() - _start, 0.9)
+        self.assertEqual(len(self.received_requests), 2)
+
+    async def test_long_retry_after_fails_fast(self):
+        self.responses = [(429, {"Retry-After": "60"})]
+        with self.assertRaises(exceptions.ProviderRateLimited) as _raised:
+            await self._get_status()
+        self.assertGreater(_raised.exception.retry_after, 50)
+        self.assertEqual(len(self.received_requests), 1)
+        # other processes see the block
+        (_state,) = [
+            _state
+            for _state in get_bucket_states("a-service")
+            if _state.account_pk == self.account.pk
+        ]
+        self.assertGreater(_state.blocked_until, time.time() + 50)
+
+    async def test_provider_remaining(self):
+        self.responses = [
+            (200, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "30"}),
+        ]
+        self.assertEqual(await self._get_status(), 200)
+        _state = await self.rate_limiter.get_state()
+        self.assertEqual(_state.provider_remaining, 0)
+        with self.assertRaises(exceptions.ProviderRateLimited):
+            await self._get_status()
+        self.assertEqual(len(self.received_requests), 1)
+
+    async def test_unthrottled_forbidden_passes_thru(self):
+        self.responses = [(403, {})]
+        self.assertEqual(await self._get_status(), 403)
+        self.assertEqual(len(self.received_requests), 1)
+
+    async def test_host_bucket(self):
+        self.enterContext(
+            override_settings(GRAVYVALET_RATE_LIMIT_HOST_BUCKETS={self.host: (1, 0.01)})
+        )
+        self.assertEqual(await self._get_status(), 200)
+        with self.assertRaises(exceptions.ProviderRateLimited):
+            await self._get_status()
+        self.assertEqual((await self.rate_limiter.get_state()).capacity, 1)
+
+    async def test_provider_bucket_runs_dry(self):
+        self.enterContext(
+            override_settings(
+                GRAVYVALET_RATE_LIMIT_PROVIDER_BUCKETS={self.host: (2, 0.01)}
+            )
+        )
+        _other_account = ProviderRateLimiter("a-service", "another-account", self.host)
+        self.addCleanup(get_redis().delete, _other_account.bucket_key)
+        self.assertEqual(await self._get_status(), 200)
+        await _other_account.acquire()
+        # the account's own bucket has tokens left, but the provider's is empty
+        with self.assertRaises(exceptions.ProviderRateLimited):
+            await self._get_status()
+        self.assertEqual(len(self.received_requests), 1)
+        self.assertGreaterEqual((await self.rate_limiter.get_state()).tokens, 1)
+
+    async def test_provider_wide_retry_after(self):
+        self.enterContext(
+            override_settings(
+                GRAVYVALET_RATE_LIMIT_PROVIDER_BUCKETS={self.host: (100, 10)}
+            )
+        )
+        self.responses = [(429, {"Retry-After": "60"})]
+        with self.assertRaises(exceptions.ProviderRateLimited):
+            await self._get_status()
+        # the provider's bucket is blocked (not the account's), for every account
+        self.assertIsNone((await self.rate_limiter.get_state()).blocked_until)
+        self.assertGreater(
+            float(
+                get_redis().hget(self.rate_limiter.provider_bucket_key, "blocked_until")
+            ),
+            time.time() + 50,
+        )
+        _other_account = ProviderRateLimiter("a-service", "another-account", self.host)
+        self.addCleanup(get_redis().delete, _other_account.bucket_key)
+        with self.assertRaises(exceptions.ProviderRateLimited):
+            await _other_account.acquire()
+
+    async def test_per_account_retry_after(self):
+        # (with no provider-wide bucket, a provider's limits are per account)
+        self.responses = [(429, {"Retry-After": "60"})]
+        with self.assertRaises(exceptions.ProviderRateLimited):
+            await self._get_status()
+        _other_account = ProviderRateLimiter("a-service", "another-account", self.host)
+        self.addCleanup(get_redis().delete, _other_account.bucket_key)
+        await _other_account.acquire()
+
+
+class TestRequestCoalescing(_NetworkTestCase):
+    settings_overrides = {
+        "CACHES": _LOCMEM_CACHES,
+        "GRAVYVALET_REQUEST_COALESCING_ENABLED": True,
+    }
+    response_delay = 0.1
+
+    def respond(self, request):
+        return web.json_response(
+            {"name": request.match_info["name"], "query": dict(request.query)}
+        )
+
+    async def _get_json(self, name, query=None):
+        async with self.network.GET(name, query=query) as _response:
+            return await _response.json_content()
+
+    async def test_concurrent_identical_gets(self):
+        _stats_before = single_flight.get_coalescing_stats()
+        _results = await asyncio.gather(
+            *[self._get_json("foo", {"page": "1"}) for _ in range(5)],
+            self._get_json("foo", {"page": "2"}),
+        )
+        self.assertEqual(
+            _results,
+            [{"name": "foo", "query": {"page": "1"}}] * 5
+            + [{"name": "foo", "query": {"page": "2"}}],
+        )
+        self.assertEqual(len(self.received_requests), 2)
+        _stats_after = single_flight.get_coalescing_stats()
+        self.assertEqual(_stats_after["lead"] - _stats_before["lead"], 2)
+        self.assertEqual(_stats_after["follow"] - _stats_before["follow"], 4)
+
+    async def test_sequential_gets_not_coalesced(self):
+        await self._get_json("foo")
+        await self._get_json("foo")
+        self.assertEqual(len(self.received_requests), 2)
+
+    def _flight_key(self, name):
+        return single_flight.RequestCoalescer(self.account.pk).flight_key(
+            str(self._server.make_url(f"/api/{name}")),
+            HttpRequestInfo(
+                http_method=HTTPMethod.GET,
+                uri_path=name,
+                query=None,
+                headers=Multidict(),
+                json=None,
+            ),
+        )
+
+    @override_settings(GRAVYVALET_REQUEST_COALESCING_ACROSS_PROCESSES=True)
+    async def test_follow_leader_in_another_process(self):
+        _flight_key = self._flight_key("foo")
+        # another process is leading this flight, and has its response
+        await cache.aset(f"{_flight_key}:lock", "other-flight")
+        await cache.aset(
+            f"{_flight_key}:other-flight",
+            http_cache.CachedResponse(200, [], b'{"from": "elsewhere"}'),
+        )
+        self.assertEqual(await self._get_json("foo"), {"from": "elsewhere"})
+        self.assertEqual(len(self.received_requests), 0)
+
+    @override_settings(GRAVYVALET_REQUEST_COALESCING_ACROSS_PROCESSES=True)
+    async def test_lead_followers_in_another_process(self):
+        _flight_key = self._flight_key("foo")
+
+        async def _follow_from_another_process():
+            await asyncio.sleep(self.response_delay / 2)  # (once the leader's sent)
+            return await single_flight._await_remote_leader(_flight_key)
+
+        _json, _shared = await asyncio.gather(
+            self._get_json("foo"), _follow_from_another_process()
+        )
+        self.assertEqual(_json, {"name": "foo", "query": {}})
+        self.assertEqual(json.loads(_shared.body), _json)
+        self.assertEqual(len(self.received_requests), 1)
+
+    @override_settings(GRAVYVALET_REQUEST_COALESCING_ACROSS_PROCESSES=True)
+    async def test_lead_without_followers_streams(self):
+        with mock.patch.object(
+            network, "_read_into_memory", wraps=network._read_into_memory
+        ) as _read_into_memory:
+            self.assertEqual(await self._get_json("foo"), {"name": "foo", "query": {}})
+        _read_into_memory.assert_not_called()
+        # (lock released)
+        self.assertIsNone(await cache.aget(f"{self._flight_key('foo')}:lock"))
+
+
+class TestCircuitBreaker(_NetworkTestCase):
+    settings_overrides = {
+        "GRAVYVALET_CIRCUIT_BREAKER_ENABLED": True,
+        "GRAVYVALET_CIRCUIT_BREAKER_FAILURE_RATE": 0.5,
+        "GRAVYVALET_CIRCUIT_BREAKER_MIN_REQUESTS": 4,
+        "GRAVYVALET_CIRCUIT_BREAKER_OPEN_SECONDS": 60,
+    }
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.addAsyncCleanup(close_loop_async_redis)
+        self.circuit_breaker = CircuitBreaker(
+            "a-service",
+            ConnectionPoolManager.pool_key(str(self._server.make_url("/"))),
+        )
+        self.addCleanup(get_redis().delete, self.circuit_breaker.circuit_key)
+
+    def respond(self, request):
+        _status = 503 if request.match_info["name"] == "broken" else 200
+        return web.json_response({}, status=_status)
+
+    async def _get_status(self, name):
+        async with self.network.GET(name) as _response:
+            return _response.http_status
+
+    async def _open_circuit(self):
+        for _name in ("fine", "broken", "fine", "broken"):
+            await self._get_status(_name)
+        self.assertEqual((await self.circuit_breaker.get_state()).state, "open")
+
+    def _wait_out_open_circuit(self):
+        get_redis().hset(
+            self.circuit_breaker.circuit_key, "opened_at", time.time() - 61
+        )
+
+    async def test_below_failure_rate(self):
+        for _name in ("broken", "fine", "fine", "fine", "broken"):
+            await self._get_status(_name)
+        _state = await self.circuit_breaker.get_state()
+        self.assertEqual(
+            (_state.state, _state.requests, _state.failures), ("closed", 5, 2)
+        )
+
+    async def test_open_fails_fast(self):
+        await self._open_circuit()
+        with self.assertRaises(exceptions.ExternalServiceUnavailable) as _raised:
+            await self._get_status("fine")
+        self.assertGreater(_raised.exception.retry_after, 50)
+        self.assertEqual(len(self.received_requests), 4)
+
+    async def test_probe_closes(self):
+        await self._open_circuit()
+        self._wait_out_open_circuit()
+        self.assertEqual(await self._get_status("fine"), 200)
+        _state = await self.circuit_breaker.get_state()
+        self.assertEqual((_state.state, _state.requests), ("closed", 0))
+
+    async def test_probe_reopens(self):
+        await self._open_circuit()
+        self._wait_out_open_circuit()
+        self.assertEqual(await self._get_status("broken"), 503)
+        self.assertEqual((await self.circuit_breaker.get_state()).state, "open")
+        with self.assertRaises(exceptions.ExternalServiceUnavailable):
+            await self._get_status("fine")
+
+
+class TestTimeBudget(_NetworkTestCase):
+    response_delay = 0.5
+
+    def respond(self, request):
+        return web.json_response({"name": request.match_info["name"]})
+
+    async def _get_json(self, name):
+        async with self.network.GET(name) as _response:
+            return await _response.json_content()
+
+    async def test_within_budget(self):
+        async with deadline.time_budget(5):
+            self.assertEqual(await self._get_json("foo"), {"name": "foo"})
+
+    async def test_fan_out_cancelled(self):
+        _started = time.monotonic()
+        with self.assertRaises(exceptions.OperationTimedOut):
+            async with deadline.time_budget(0.2):
+                await asyncio.gather(*(self._get_json(f"foo{_n}") for _n in range(5)))
+        self.assertLess(time.monotonic() - _started, 0.5)
+
+    async def test_nested_budget_within_outer(self):
+        with self.assertRaises(exceptions.OperationTimedOut) as _raised:
+            async with deadline.time_budget(0.2):
+                async with deadline.time_budget(5):
+                    await self._get_json("foo")
+        self.assertEqual(_raised.exception.time_budget_seconds, 0.2)
+
+    async def test_no_time_remaining(self):
+        with self.assertRaises(exceptions.OperationTimedOut):
+            async with deadline.time_budget(0.2):
+                time.sleep(0.3)  # (blocking, so the budget can't cancel it)
+                await self._get_json("foo")
+        self.assertEqual(self.received_requests, [])
+
+
+class TestHedging(_NetworkTestCase):
+    settings_overrides = {
+        "GRAVYVALET_HEDGING_PERCENTILE": 90,
+        "GRAVYVALET_HEDGING_BUDGET_RATIO": 1,
+    }
+
+    def respond(self, request):
+        return web.json_response({"name": request.match_info["name"]})
+
+    async def _handle_get(self, request):
+        self.received_requests.append(request)
+        if request.match_info["name"] == "slow-body":  # (quick headers, slow body)
+            _response = web.StreamResponse()
+            await _response.prepare(request)
+            await asyncio.sleep(0.5)
+            await _response.write(b"{}")
+            await _response.write_eof()
+            return _response
+        if len(self.received_requests) == 1:  # only the first attempt is slow
+            await asyncio.sleep(2)
+        return self.respond(request)
+
+    async def asyncSetUp(self):
+        self.enterContext(mock.patch.object(hedging, "_LATENCIES_BY_HOST", {}))
+        self.enterContext(mock.patch.object(hedging, "_hedge_budget", 0.0))
+        # (the test server's host isn't known until started, so enable for all)
+        self.enterContext(
+            mock.patch.object(
+                hedging.RequestHedger, "is_enabled_for", return_value=True
+            )
+        )
+        await super().asyncSetUp()
+        _host = ConnectionPoolManager.pool_key(str(self._server.make_url("/")))
+        self.hedger = hedging.RequestHedger(_host)
+
+    def _learn_latency(self, seconds: float):
+        for _ in range(hedging._MIN_LATENCY_SAMPLES):
+            self.hedger.record_latency(seconds)
+
+    async def _get_json(self, name):
+        async with self.network.GET(name) as _response:
+            return await _response.json_content()
+
+    async def test_slow_request_hedged(self):
+        self._learn_latency(0.05)
+        _started = time.monotonic()
+        self.assertEqual(await self._get_json("foo"), {"name": "foo"})
+        self.assertLess(time.monotonic() - _started, 1)
+        self.assertEqual(len(self.received_requests), 2)
+
+    async def test_hedged_attempt_latency(self):
+        self._learn_latency(0.05)
+        await self._get_json("foo")
+        _latencies = list(hedging._LATENCIES_BY_HOST[self.hedger._api_host])
+        self.assertEqual(len(_latencies), hedging._MIN_LATENCY_SAMPLES + 2)
+        # the slow (cancelled) attempt, as at least as long as it ran
+        self.assertGreaterEqual(max(_latencies[-2:]), 0.05)
+
+    async def test_latency_until_headers(self):
+        self.assertEqual(await self._get_json("slow-body"), {})
+        (_latency,) = hedging._LATENCIES_BY_HOST[self.hedger._api_host]
+        self.assertLess(_latency, 0.5)
+
+    async def test_not_hedged_until_learned(self):
+        _started = time.monotonic()
+        self.assertEqual(await self._get_json("foo"), {"name": "foo"})
+        self.assertGreater(time.monotonic() - _started, 2)
+        self.assertEqual(len(self.received_requests), 1)
+
+    @override_settings(GRAVYVALET_HEDGING_BUDGET_RATIO=0.5)
+    async def test_hedge_budget(self):
+        self._learn_latency(0.05)
+        _started = time.monotonic()
+        await self._get_json("foo")  # (half a hedge in the budget; not enough)
+        self.assertGreater(time.monotonic() - _started, 2)
+        self.assertEqual(len(self.received_requests), 1)
+
+    def test_accepts_request(self):
+        def _request(http_method, headers=(), json=None):
+            return HttpRequestInfo(
+                http_method=http_method,
+                uri_path="foo",
+                query=None,
+                headers=Multidict(headers),
+                json=json,
+            )
+
+        self.assertTrue(self.hedger.accepts_request(_request(HTTPMethod.GET)))
+        self.assertTrue(self.hedger.accepts_request(_request(HTTPMethod.HEAD)))
+        self.assertTrue(
+            self.hedger.accepts_request(_request("PROPFIND", [("Depth", "1")]))
+        )
+        self.assertFalse(
+            self.hedger.accepts_request(_request("PROPFIND", [("Depth", "infinity")]))
+        )
+        self.assertFalse(self.hedger.accepts_request(_request(HTTPMethod.POST)))
+        self.assertFalse(
+            self.hedger.accepts_request(_request(HTTPMethod.GET, json={"a": 1}))
+        )
+
+
+class TestMetrics(_NetworkTestCase):
+    settings_overrides = {
+        "GRAVYVALET_METRICS_ENABLED": True,
+        "GRAVYVALET_METRICS_FLUSH_SECONDS": 600,
+    }
+
+    def respond(self, request):
+        return web.json_response({"name": request.match_info["name"]})
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.addCleanup(get_redis().delete, metrics._REDIS_KEY)
+        metrics.metrics_recorder.flush()
+        get_redis().delete(metrics._REDIS_KEY)
+
+    async def test_upstream_request_metrics(self):
+        for _name in ("foo", "bar", "12345"):
+            async with self.network.GET(_name) as _response:
+                await _response.json_content()
+        metrics.metrics_recorder.flush()
+        _rendered = metrics.render_metrics()
+        _labels = (
+            f'provider="{self._server.host}",endpoint="/api/{{id}}",'
+            'status_class="2xx",retries="0"'
+        )
+        self.assertIn(
+            f"gravyvalet_upstream_request_duration_seconds_count{{{_labels}}} 1",
+            _rendered,
+        )
+        self.assertIn(
+            f'gravyvalet_upstream_request_duration_seconds_bucket{{{_labels},le="+Inf"}} 1',
+            _rendered,
+        )
+        self.assertIn(
+            "# TYPE gravyvalet_upstream_response_bytes_total counter", _rendered
+        )
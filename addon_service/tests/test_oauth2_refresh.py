@@ -0,0 +1,93 @@
+import asyncio
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.test import TestCase
+from django.utils import timezone
+
+from addon_service import models as db
+from addon_service.common.credentials_formats import CredentialsFormats
+from addon_service.common.redis_client import close_loop_async_redis
+from addon_service.oauth2.utils import FreshTokenResult
+from addon_service.tests import _factories
+from addon_service.tests._helpers import patch_encryption_key_derivation
+from addon_toolkit.credentials import AccessTokenCredentials
+
+
+class TestOAuth2Refresh(TestCase):
+    def setUp(self):
+        super().setUp()
+        self.enterContext(patch_encryption_key_derivation())
+        self._account = _factories.AuthorizedStorageAccountFactory(
+            credentials_format=CredentialsFormats.OAUTH2,
+        )
+        _token_metadata = self._account.oauth2_token_metadata
+        _token_metadata.state_nonce = None
+        _token_metadata.refresh_token = "refresh"
+        _token_metadata.save()
+        self._account.credentials = AccessTokenCredentials(access_token="stale")
+        self._account.save()
+        self._token_endpoint = self.enterContext(
+            mock.patch(
+                "addon_service.oauth2.utils.get_refreshed_access_token",
+                side_effect=self._fake_token_endpoint,
+            )
+        )
+
+    async def _fake_token_endpoint(self, **kwargs):
+        await asyncio.sleep(0.1)  # long enough for other refreshes to pile up
+        return FreshTokenResult(
+            access_token=f"fresh-{self._token_endpoint.call_count}",
+            refresh_token="refresh",
+            expires_in=3600,
+            scopes=None,
+        )
+
+    def _set_expiration(self, expires_in: timedelta) -> None:
+        _token_metadata = self._account.oauth2_token_metadata
+        _token_metadata.access_token_expiration = timezone.now() + expires_in
+        _token_metadata.save()
+
+    async def _refresh_concurrently(self, *, count: int, force=False) -> list[str]:
+        _accounts = [
+            await db.AuthorizedStorageAccount.objects.aget(pk=self._account.pk)
+            for _ in range(count)
+        ]
+        try:
+            await asyncio.gather(
+                *(
+                    _account.refresh_oauth2_access_token(force=force)
+                    for _account in _accounts
+                )
+            )
+        finally:
+            await close_loop_async_redis()
+        return [
+            await sync_to_async(lambda: _account.credentials.access_token)()
+            for _account in _accounts
+        ]
+
+    async def test_unexpired(self):
+        await sync_to_async(self._set_expiration)(timedelta(hours=1))
+        _access_tokens = await self._refresh_concurrently(count=1)
+        self.assertEqual(self._token_endpoint.call_count, 0)
+        self.assertEqual(_access_tokens, ["stale"])
+
+    async def test_refresh_ahead_of_expiration(self):
+        await sync_to_async(self._set_expiration)(timedelta(seconds=10))
+        _access_tokens = await self._refresh_concurrently(count=1)
+        self.assertEqual(self._token_endpoint.call_count, 1)
+        self.assertEqual(_access_tokens, ["fresh-1"])
+
+    async def test_concurrent_refresh(self):
+        await sync_to_async(self._set_expiration)(timedelta(seconds=-10))
+        _access_tokens = await self._refresh_concurrently(count=5)
+        self.assertEqual(self._token_endpoint.call_count, 1)
+        self.assertEqual(_access_tokens, ["fresh-1"] * 5)
+
+    async def test_concurrent_forced_refresh(self):
+        await sync_to_async(self._set_expiration)(timedelta(hours=1))
+        _access_tokens = await self._refresh_concurrently(count=5, force=True)
+        self.assertEqual(self._token_endpoint.call_count, 1)
+        self.assertEqual(_access_tokens, ["fresh-1"] * 5)
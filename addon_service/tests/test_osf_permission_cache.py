@@ -0,0 +1,106 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import (
+    RequestFactory,
+    TestCase,
+)
+
+from addon_service.common import (
+    osf,
+    osf_permission_cache,
+)
+from addon_service.tasks import osf_backchannel
+from addon_service.tests._helpers import clear_redis_keys
+
+
+_RESOURCE_URI = "https://osf.example/abcde"
+_USER_URI = "https://osf.example/user"
+
+
+class TestOSFPermissionCache(TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_redis_keys("gv:osf-permission:*")
+        self.addCleanup(clear_redis_keys, "gv:osf-permission:*")
+        self._ask_osf = self.enterContext(
+            mock.patch.object(osf, "_ask_osf_permission", return_value=(True, True))
+        )
+
+    def _request(self, *, cookie="cookie", user_uri=_USER_URI, **extra):
+        _request = RequestFactory().get(
+            "/", HTTP_COOKIE=f"{settings.OSF_AUTH_COOKIE_NAME}={cookie}", **extra
+        )
+        _request.user_uri = user_uri
+        return _request
+
+    def _check(self, request, permission=osf.OSFPermission.READ) -> bool:
+        return osf.has_osf_permission_on_resource(request, _RESOURCE_URI, permission)
+
+    def test_request_memo(self):
+        _request = self._request()
+        self.assertTrue(self._check(_request))
+        self.assertTrue(self._check(_request))
+        self.assertEqual(self._ask_osf.call_count, 1)
+        self.assertTrue(self._check(_request, osf.OSFPermission.WRITE))
+        self.assertEqual(self._ask_osf.call_count, 2)
+
+    def test_shared_across_requests(self):
+        self.assertTrue(self._check(self._request()))
+        self.assertTrue(self._check(self._request()))
+        self.assertEqual(self._ask_osf.call_count, 1)
+
+    def test_not_shared_across_credentials(self):
+        self.assertTrue(self._check(self._request(cookie="cookie")))
+        self._ask_osf.return_value = (False, True)
+        self.assertFalse(self._check(self._request(cookie="other-cookie")))
+        self.assertFalse(self._check(self._request(HTTP_AUTHORIZATION="Bearer token")))
+        self.assertFalse(self._check(self._request(QUERY_STRING="view_only=key")))
+        self.assertEqual(self._ask_osf.call_count, 4)
+
+    def test_negative_cached(self):
+        self._ask_osf.return_value = (False, True)
+        self.assertFalse(self._check(self._request()))
+        self.assertFalse(self._check(self._request()))
+        self.assertEqual(self._ask_osf.call_count, 1)
+
+    def test_uncacheable_not_cached(self):
+        self._ask_osf.return_value = (False, False)
+        self.assertFalse(self._check(self._request()))
+        self._ask_osf.return_value = (True, True)
+        self.assertTrue(self._check(self._request()))
+        self.assertEqual(self._ask_osf.call_count, 2)
+
+    def test_disabled(self):
+        with self.settings(GRAVYVALET_OSF_PERMISSION_CACHE_SECONDS=0):
+            self.assertTrue(self._check(self._request()))
+            self.assertTrue(self._check(self._request()))
+        self.assertEqual(self._ask_osf.call_count, 2)
+
+    def test_backchannel_invalidates_user(self):
+        self.assertTrue(self._check(self._request()))
+        osf_backchannel.user_deactivated(user_uri=_USER_URI)
+        self._ask_osf.return_value = (False, True)
+        self.assertFalse(self._check(self._request()))
+        self.assertEqual(self._ask_osf.call_count, 2)
+
+    def test_backchannel_invalidates_resource(self):
+        self.assertTrue(self._check(self._request()))
+        _signature = osf_backchannel.get_handler_signature(
+            {"action": "permissions_changed", "resource_uri": _RESOURCE_URI}
+        )
+        _signature.apply()
+        self.assertTrue(self._check(self._request()))
+        self.assertEqual(self._ask_osf.call_count, 2)
+
+    def test_stats(self):
+        _before = osf_permission_cache.get_permission_cache_stats()
+        _request = self._request()
+        self._check(_request)
+        self._check(_request)
+        self._check(self._request())
+        _after = osf_permission_cache.get_permission_cache_stats()
+        self.assertEqual(
+            {_event: _after[_event] - _before[_event] for _event in _after},
+            {"memo_hit": 1, "hit": 1, "miss": 1, "store": 1},
+        )
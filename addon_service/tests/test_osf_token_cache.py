@@ -0,0 +1,76 @@
+from http import HTTPStatus
+from unittest import mock
+
+from django.test import TestCase
+
+from addon_service.common import osf
+from addon_service.common.redis_client import get_redis
+from addon_service.tasks import osf_backchannel
+from addon_service.tests._helpers import (
+    _FakeAiohttpResponse,
+    clear_redis_keys,
+    get_test_request,
+)
+
+
+_USER_URI = "https://osf.example/user"
+
+
+class TestOSFTokenCache(TestCase):
+    def setUp(self):
+        super().setUp()
+        clear_redis_keys("gv:osf-token:*")
+        self.addCleanup(clear_redis_keys, "gv:osf-token:*")
+        self._client = mock.MagicMock()
+        self._respond(
+            _FakeAiohttpResponse(data={"data": {"links": {"iri": _USER_URI}}})
+        )
+        self.enterContext(
+            mock.patch(
+                "addon_service.common.osf.get_pooled_client_session",
+                mock.AsyncMock(return_value=self._client),
+            )
+        )
+
+    def _respond(self, response):
+        self._client.get.return_value.__aenter__.return_value = response
+
+    def _get_user_uri(self, token="token"):
+        _request = get_test_request()
+        _request.META["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+        _user_uri = osf.get_osf_user_uri(_request)
+        self.assertFalse(_request.session.keys())  # (tokens stay out of the session)
+        return _user_uri
+
+    def test_cached(self):
+        self.assertEqual(self._get_user_uri(), _USER_URI)
+        self.assertEqual(self._get_user_uri(), _USER_URI)
+        self.assertEqual(self._client.get.call_count, 1)
+
+    def test_token_not_stored(self):
+        self._get_user_uri(token="very-secret-token")
+        for _key in get_redis().scan_iter("gv:osf-token:*"):
+            self.assertNotIn(b"very-secret-token", _key)
+
+    def test_not_shared_across_tokens(self):
+        self._get_user_uri(token="token")
+        self._respond(_FakeAiohttpResponse(status=HTTPStatus.UNAUTHORIZED))
+        self.assertIsNone(self._get_user_uri(token="other-token"))
+        self.assertIsNone(self._get_user_uri(token="other-token"))
+        self.assertEqual(self._client.get.call_count, 3)
+
+    def test_disabled(self):
+        with self.settings(GRAVYVALET_OSF_TOKEN_CACHE_SECONDS=0):
+            self._get_user_uri()
+            self._get_user_uri()
+        self.assertEqual(self._client.get.call_count, 2)
+
+    def test_backchannel_evicts(self):
+        self._get_user_uri()
+        _signature = osf_backchannel.get_handler_signature(
+            {"action": "token_revoked", "user_uri": _USER_URI}
+        )
+        _signature.apply()
+        self._respond(_FakeAiohttpResponse(status=HTTPStatus.UNAUTHORIZED))
+        self.assertIsNone(self._get_user_uri())
+        self.assertEqual(self._client.get.call_count, 2)
@@ -0,0 +1,28 @@
+import asyncio
+import gc
+import unittest
+import weakref
+
+from asgiref.sync import async_to_sync
+
+from addon_service.common import redis_client
+
+
+class TestAsyncRedisClosedWithItsLoop(unittest.TestCase):
+    def test_async_to_sync(self):
+        # each `async_to_sync` call (outside a running loop) runs on a new event
+        # loop; its redis client (and connection) should go with it
+        _loops: list[weakref.ref] = []
+
+        async def _ping():
+            _loops.append(weakref.ref(asyncio.get_running_loop()))
+            await redis_client.get_async_redis().ping()
+
+        _redis = redis_client.get_redis()
+        _client_count = len(_redis.client_list())
+        for _ in range(20):
+            async_to_sync(_ping)()
+            self.assertEqual(len(redis_client._ASYNC_CLIENTS), 0)
+        gc.collect()
+        self.assertTrue(all(_loop() is None for _loop in _loops))
+        self.assertEqual(len(_redis.client_list()), _client_count)
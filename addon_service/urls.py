@@ -80,4 +80,5 @@ urlpatterns = [
     path(r"oauth2/callback/", views.oauth2_callback_view, name="oauth2-callback"),
     path(r"oauth1/callback/", views.oauth1_callback_view, name="oauth1-callback"),
     path(r"status/", views.status, name="status"),
+    path(r"metrics/", views.metrics, name="metrics"),
 ]
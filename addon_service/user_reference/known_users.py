@@ -0,0 +1,147 @@
+"""cache of `UserReference` pks by user uri, so authenticating a known user needs no query
+
+every authenticated api request needs the caller's `UserReference` (created on
+first sight); `UserReference.objects.get_or_create` on each request meant a query
+(and, under `ATOMIC_REQUESTS`, a savepoint) on every api hit
+
+known users are kept at two levels:
+1. a bounded, least-recently-used map in this process
+   (`GRAVYVALET_KNOWN_USER_CACHE_SIZE`), each entry trusted only briefly
+   (`GRAVYVALET_KNOWN_USER_PROCESS_SECONDS`) -- deleting a user forgets it in
+   redis and in the deleting process, while other processes forget it in time
+2. redis, shared by all gravyvalet processes (`GRAVYVALET_KNOWN_USER_CACHE_SECONDS`)
+
+unknown users still go thru `get_or_create` (which copes with concurrent first
+requests for the same user by way of the unique `user_uri`), and a pk is cached
+only once the transaction that found or created it has committed -- so a rolled
+back insert is never taken as a known user
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import redis
+from django.conf import settings
+from django.db import transaction
+
+from addon_service.common.redis_client import get_redis
+
+
+__all__ = (
+    "KnownUserCache",
+    "get_user_reference_pk",
+    "known_user_cache",
+)
+
+_logger = logging.getLogger(__name__)
+
+_CACHE_KEY_PREFIX = "gv:known-user"
+
+
+class KnownUserCache:
+    """known `UserReference` pks, by user uri"""
+
+    def __init__(self):
+        # (pk, `time.monotonic()` when remembered) by user uri
+        self._pks: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create_pk(self, user_uri: str) -> str:
+        """pk of the `UserReference` with the given uri (created if need be)"""
+        _pk = self.lookup(user_uri)
+        if _pk is None:
+            from .models import UserReference
+
+            _pk = UserReference.objects.get_or_create(user_uri=user_uri)[0].pk
+            # (once committed, so other requests can't see a pk that never was)
+            transaction.on_commit(lambda: self.remember(user_uri, _pk))
+        return _pk
+
+    def lookup(self, user_uri: str) -> str | None:
+        """pk of a known user (if known), without querying the database"""
+        with self._lock:
+            _pk, _remembered_at = self._pks.get(user_uri, (None, 0.0))
+            if _pk is not None:
+                if _is_fresh(_remembered_at):
+                    self._pks.move_to_end(user_uri)
+                    return _pk
+                del self._pks[user_uri]  # (check redis, in case it's been deleted)
+        if settings.GRAVYVALET_KNOWN_USER_CACHE_SECONDS <= 0:
+            return None
+        try:
+            _cached_pk = get_redis().get(_cache_key(user_uri))
+        except redis.RedisError:  # a redis outage should not stop all requests
+            _logger.exception("known-user cache unavailable")
+            return None
+        if _cached_pk is None:
+            return None
+        _pk = _cached_pk.decode()
+        self._remember_in_process(user_uri, _pk)
+        return _pk
+
+    def remember(self, user_uri: str, pk: str) -> None:
+        self._remember_in_process(user_uri, pk)
+        if settings.GRAVYVALET_KNOWN_USER_CACHE_SECONDS <= 0:
+            return
+        try:
+            get_redis().set(
+                _cache_key(user_uri),
+                pk,
+                ex=settings.GRAVYVALET_KNOWN_USER_CACHE_SECONDS,
+            )
+        except redis.RedisError:
+            _logger.exception("known-user cache unavailable")
+
+    def forget(self, user_uri: str) -> None:
+        """forget a user (e.g. when their `UserReference` is deleted)"""
+        with self._lock:
+            self._pks.pop(user_uri, None)
+        try:
+            get_redis().delete(_cache_key(user_uri))
+        except redis.RedisError:
+            _logger.exception("known-user cache unavailable")
+
+    def clear(self) -> None:
+        """forget every user known in this process (leaving redis be)"""
+        with self._lock:
+            self._pks.clear()
+
+    def _remember_in_process(self, user_uri: str, pk: str) -> None:
+        _max_size = settings.GRAVYVALET_KNOWN_USER_CACHE_SIZE
+        if _max_size <= 0:
+            return
+        with self._lock:
+            self._pks[user_uri] = (pk, time.monotonic())
+            self._pks.move_to_end(user_uri)
+            while len(self._pks) > _max_size:
+                self._pks.popitem(last=False)
+
+
+known_user_cache = KnownUserCache()
+
+
+def get_user_reference_pk(request, user_uri: str) -> str:
+    """pk of the `UserReference` for the given uri -- from the request, if it was
+    authenticated as that user (see `GVCombinedAuthentication`)
+    """
+    _request_pk = getattr(request, "user_reference_pk", None)
+    if _request_pk and getattr(request, "user_uri", None) == user_uri:
+        return _request_pk
+    return known_user_cache.get_or_create_pk(user_uri)
+
+
+###
+# module-private helpers
+
+
+def _cache_key(user_uri: str) -> str:
+    return f"{_CACHE_KEY_PREFIX}:{user_uri}"
+
+
+def _is_fresh(remembered_at: float) -> bool:
+    return (
+        time.monotonic() - remembered_at
+        < settings.GRAVYVALET_KNOWN_USER_PROCESS_SECONDS
+    )
@@ -11,6 +11,8 @@ from addon_service.configured_addon.computing.models import ConfiguredComputingA
 from addon_service.configured_addon.storage.models import ConfiguredStorageAddon
 from addon_service.resource_reference.models import ResourceReference
 
+from .known_users import known_user_cache
+
 
 class UserReference(AddonsServiceBaseModel):
     user_uri = models.URLField(unique=True, db_index=True, null=False)
@@ -91,6 +93,7 @@ class UserReference(AddonsServiceBaseModel):
         For preventing hard deletes use deactivate instead.
         """
         if force:
+            known_user_cache.forget(self.user_uri)
             return super().delete()
         raise NotImplementedError(
             "This is to prevent hard deletes, use deactivate or force=True."
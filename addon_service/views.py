@@ -3,7 +3,12 @@
 from http import HTTPStatus
 
 from django.db import transaction
-from django.http import JsonResponse
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseForbidden,
+    JsonResponse,
+)
 
 from addon_service.addon_imp.views import AddonImpViewSet
 from addon_service.addon_operation.views import AddonOperationViewSet
@@ -20,6 +25,7 @@ from addon_service.authorized_account.link.views import AuthorizedLinkAccountVie
 from addon_service.authorized_account.storage.views import (
     AuthorizedStorageAccountViewSet,
 )
+from addon_service.common import metrics as metrics_utils
 from addon_service.configured_addon.citation.views import ConfiguredCitationAddonViewSet
 from addon_service.configured_addon.computing.views import (
     ConfiguredComputingAddonViewSet,
@@ -54,6 +60,22 @@ async def status(request):
     )
 
 
+@transaction.non_atomic_requests
+def metrics(request):
+    """
+    Serves metrics in prometheus text format (from allowed addresses or hmac-signed requests)
+    """
+    if not metrics_utils.metrics_recorder.is_enabled():
+        raise Http404
+    if not metrics_utils.is_scrape_allowed(request):
+        return HttpResponseForbidden()
+    metrics_utils.metrics_recorder.flush()
+    return HttpResponse(
+        metrics_utils.render_metrics(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 __all__ = (
     "AddonImpViewSet",
     "AddonOperationInvocationViewSet",
@@ -74,5 +96,6 @@ __all__ = (
     "UserReferenceViewSet",
     "oauth2_callback_view",
     "oauth1_callback_view",
+    "metrics",
     "status",
 )
@@ -48,6 +48,8 @@ class AddonOperationDeclaration:
         default=type(None),  # if not provided, inferred by __post_init__
         compare=False,
     )
+    # longest the operation should take (for immediate operations; None for the default)
+    time_budget_seconds: float | None = dataclasses.field(default=None, compare=False)
 
     @classmethod
     def for_function(self, fn: Callable) -> "AddonOperationDeclaration":
@@ -12,6 +12,7 @@ from addon_toolkit.iri_utils import (
     KeyValuePairs,
     Multidict,
 )
+from addon_toolkit.json_stream import iter_json_array_items
 
 
 __all__ = (
@@ -43,7 +44,17 @@ class HttpResponseInfo(typing.Protocol):
 
     async def text_content(self) -> str: ...
 
-    # TODO: streaming (when needed)
+    def iter_content(self, chunk_size: int = 2**16) -> typing.AsyncIterator[bytes]:
+        """iterate the response body in chunks of bytes, without reading it all into memory"""
+        ...
+
+    def iter_json_items(self, *path: str) -> typing.AsyncIterator[typing.Any]:
+        """iterate the items of a json array in the response body, parsing as they arrive
+
+        `path` gives the object keys leading to the array, e.g.
+        `response.iter_json_items("data", "files")` for `{"data": {"files": [...]}}`
+        """
+        return iter_json_array_items(self.iter_content(), path)
 
 
 class _MethodRequestMethod(typing.Protocol):
@@ -92,7 +103,7 @@ class HttpRequestor(typing.Protocol):
         async with self._do_send(_request_info) as _response:
             yield _response
 
-    # TODO: streaming send/receive (only if/when needed)
+    # TODO: streaming send (only if/when needed)
 
     ###
     # convenience methods for http methods
@@ -0,0 +1,164 @@
+"""incremental json parsing, for large responses that need not be held in memory all at once
+
+>>> import asyncio
+>>> async def _chunks():
+...     yield b'{"status": "OK", "data": {"files": [{"id": 1}, {"id"'
+...     yield b': 2}, "three"]}}'
+>>> async def _items():
+...     return [_item async for _item in iter_json_array_items(_chunks(), ('data', 'files'))]
+>>> asyncio.run(_items())
+[{'id': 1}, {'id': 2}, 'three']
+"""
+
+import codecs
+import json
+import re
+import typing
+
+
+__all__ = ("iter_json_array_items",)
+
+
+async def iter_json_array_items(
+    byte_chunks: typing.AsyncIterable[bytes],
+    path: typing.Sequence[str] = (),
+) -> typing.AsyncIterator[typing.Any]:
+    """yield each item of a json array, as soon as it has been fully received
+
+    `path` is a sequence of object keys leading from the top-level json value to
+    the array (empty for a top-level array); raises `ValueError` if the json does
+    not have an array at that path
+    """
+    _reader = _JsonStreamReader(byte_chunks)
+    for _key in path:
+        await _reader.enter_object_key(_key)
+    await _reader.expect("[")
+    if await _reader.peek() == "]":
+        return
+    while True:
+        yield await _reader.read_value()
+        _next = await _reader.peek()
+        await _reader.expect(_next)
+        if _next == "]":
+            return
+        if _next != ",":
+            raise ValueError(f"expected ',' or ']' in json array (got {_next!r})")
+
+
+###
+# module-private helpers
+
+# structural tokens within a json value: a complete string, an unterminated
+# string (its opening quote alone), or a bracket
+_STRUCTURE_REGEX = re.compile(r'"(?:[^"\\]|\\.)*"|"|[\[\]{}]', re.DOTALL)
+# the end of a json scalar (number, true, false, null)
+_SCALAR_END_REGEX = re.compile(r"[\s,\]}]")
+_WHITESPACE_REGEX = re.compile(r"\s*")
+
+
+class _JsonStreamReader:
+    def __init__(self, byte_chunks: typing.AsyncIterable[bytes]):
+        self._chunk_iter = aiter(byte_chunks)
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._position = 0
+        self._exhausted = False
+
+    async def peek(self) -> str:
+        """skip whitespace, return the next character"""
+        while True:
+            self._position = _WHITESPACE_REGEX.match(self._buffer, self._position).end()
+            if self._position < len(self._buffer):
+                return self._buffer[self._position]
+            if not await self._read_chunk():
+                raise ValueError("unexpected end of json")
+
+    async def expect(self, char: str) -> None:
+        _next = await self.peek()
+        if _next != char:
+            raise ValueError(f"expected {char!r} in json (got {_next!r})")
+        self._position += 1
+
+    async def enter_object_key(self, key: str) -> None:
+        """from the start of an object, move past the given key (and its colon)"""
+        await self.expect("{")
+        if await self.peek() == "}":
+            raise ValueError(f"json object has no key {key!r}")
+        while True:
+            _actual_key = await self.read_value()
+            await self.expect(":")
+            if _actual_key == key:
+                return
+            await self._skip_value()
+            _next = await self.peek()
+            if _next != ",":
+                raise ValueError(f"json object has no key {key!r}")
+            self._position += 1
+
+    async def read_value(self) -> typing.Any:
+        _start, _end = await self._find_value()
+        _value = json.loads(self._buffer[_start:_end])
+        self._drop_consumed()
+        return _value
+
+    async def _skip_value(self) -> None:
+        await self._find_value()
+        self._drop_consumed()
+
+    async def _find_value(self) -> tuple[int, int]:
+        """find the complete json value starting at the next non-whitespace character
+
+        moves position past the value and returns its (start, end) in the buffer
+        """
+        await self.peek()
+        _start = self._position
+        _depth = 0
+        _scan_from = _start
+        while True:
+            _end = self._scan(_start, _scan_from, _depth)
+            if isinstance(_end, int):
+                self._position = _end
+                return _start, _end
+            # incomplete -- remember how far we got, then read more
+            _scan_from, _depth = _end
+            if not await self._read_chunk():
+                if self._buffer[_start] not in '[{"' and _depth == 0:
+                    # a scalar may end at the end of the json
+                    self._position = len(self._buffer)
+                    return _start, self._position
+                raise ValueError("unexpected end of json")
+
+    def _scan(self, start: int, scan_from: int, depth: int) -> int | tuple[int, int]:
+        """return the end of the value at `start`, or where to resume scanning if incomplete"""
+        if self._buffer[start] not in '[{"':
+            _scalar_end = _SCALAR_END_REGEX.search(self._buffer, start)
+            return _scalar_end.start() if _scalar_end else (start, 0)
+        for _match in _STRUCTURE_REGEX.finditer(self._buffer, scan_from):
+            _token = _match.group()
+            if _token == '"':  # unterminated string -- resume from its start
+                return (_match.start(), depth)
+            if _token in "[{":
+                depth += 1
+            elif _token in "]}":
+                depth -= 1
+            if depth == 0:
+                return _match.end()
+        return (len(self._buffer), depth)
+
+    async def _read_chunk(self) -> bool:
+        if self._exhausted:
+            return False
+        try:
+            _chunk = await anext(self._chunk_iter)
+        except StopAsyncIteration:
+            self._exhausted = True
+            self._buffer += self._text_decoder.decode(b"", final=True)
+            return False
+        self._buffer += self._text_decoder.decode(_chunk)
+        return True
+
+    def _drop_consumed(self) -> None:
+        # keep the buffer from growing with the whole response
+        _consumed = self._position
+        self._buffer = self._buffer[_consumed:]
+        self._position = 0
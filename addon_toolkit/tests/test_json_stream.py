@@ -0,0 +1,56 @@
+import unittest
+
+import addon_toolkit.json_stream
+from addon_toolkit.json_stream import iter_json_array_items
+from addon_toolkit.tests._doctest import load_doctests
+
+
+load_tests = load_doctests(addon_toolkit.json_stream)
+
+
+async def _chunked(content: bytes, chunk_size: int):
+    for _start in range(0, len(content), chunk_size):
+        _end = _start + chunk_size
+        yield content[_start:_end]
+
+
+class TestIterJsonArrayItems(unittest.IsolatedAsyncioTestCase):
+    async def _items(self, content: bytes, path=(), chunk_size=1):
+        return [
+            _item
+            async for _item in iter_json_array_items(
+                _chunked(content, chunk_size), path
+            )
+        ]
+
+    async def test_any_chunk_size(self):
+        _content = (
+            '{"skip": {"nested": ["]", "}", {"a": [1, 2]}], "quote\\"": "\\\\"},'
+            ' "data": {"items": [123, -4.5e2, "ümlaut \\"q\\"", null, true,'
+            ' {"x": [{}]}, []] }, "after": 1}'
+        ).encode()
+        _expected = [123, -450.0, 'ümlaut "q"', None, True, {"x": [{}]}, []]
+        for _chunk_size in (1, 2, 3, 7, len(_content)):
+            with self.subTest(chunk_size=_chunk_size):
+                self.assertEqual(
+                    await self._items(_content, ("data", "items"), _chunk_size),
+                    _expected,
+                )
+
+    async def test_top_level(self):
+        self.assertEqual(await self._items(b" [1, 22] "), [1, 22])
+        self.assertEqual(await self._items(b"[]"), [])
+        self.assertEqual(await self._items(b"[333]", chunk_size=2), [333])
+
+    async def test_invalid(self):
+        for _content, _path in (
+            (b'{"data": []}', ("other",)),
+            (b'{"data": {}}', ("data", "items")),
+            (b'{"data": 7}', ("data",)),
+            (b"[1, 2", ()),
+            (b"[1 2]", ()),
+            (b"", ()),
+        ):
+            with self.subTest(content=_content, path=_path):
+                with self.assertRaises(ValueError):
+                    await self._items(_content, _path)
@@ -7,11 +7,68 @@ For more information on this file, see
 https://docs.djangoproject.com/en/3.1/howto/deployment/asgi/
 """
 
+import asyncio
 import os
+import sys
 
 from django.core.asgi import get_asgi_application
 
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+
+async def application(scope, receive, send):
+    # django handles only http; answer asgi "lifespan" events here
+    # https://asgi.readthedocs.io/en/latest/specs/lifespan.html
+    # (only for servers that send them -- daphne doesn't; see below)
+    if scope["type"] == "lifespan":
+        await _handle_lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
+
+
+async def close_pools():
+    """close the running event loop's pooled http sessions and redis client"""
+    # import after django setup
+    from addon_service.common.aiohttp_session import close_all_client_sessions
+    from addon_service.common.redis_client import close_loop_async_redis
+
+    await close_all_client_sessions()
+    await close_loop_async_redis()
+
+
+async def _handle_lifespan(receive, send):
+    while True:
+        _message = await receive()
+        if _message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif _message["type"] == "lifespan.shutdown":
+            try:
+                await close_pools()
+            except Exception as _e:
+                await send({"type": "lifespan.shutdown.failed", "message": repr(_e)})
+            else:
+                await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+def _close_pools_on_reactor_shutdown():
+    # daphne (4.x) sends no lifespan events, but runs on twisted's asyncio reactor
+    # (installed before it imports this module) -- close pools as that shuts down
+    # (before, while its event loop still runs; the closing is only scheduled, so
+    # starts after daphne's own "before shutdown" trigger has stopped applications)
+    if "twisted.internet.reactor" not in sys.modules:  # (not under daphne)
+        return
+    from twisted.internet import reactor
+    from twisted.internet.defer import Deferred
+
+    reactor.addSystemEventTrigger(
+        "before",
+        "shutdown",
+        lambda: Deferred.fromFuture(asyncio.ensure_future(close_pools())),
+    )
+
+
+_close_pools_on_reactor_shutdown()
@@ -70,6 +70,330 @@ OSF_BACKCHANNEL_QUEUE_NAME = os.environ.get(
 
 SILKY_PYTHON_PROFILER = os.environ.get("SILKY_PYTHON_PROFILER", False)
 
+###
+# outgoing http connection pools (one pool per external host)
+
+# max simultaneous connections to any one external host (set to "0" for no limit)
+GRAVYVALET_HTTP_POOL_LIMIT_PER_HOST = int(
+    os.environ.get("GRAVYVALET_HTTP_POOL_LIMIT_PER_HOST", 32)
+)
+# per-host overrides, as comma-separated "host=limit" pairs
+# (e.g. "api.github.com=64,www.googleapis.com=48")
+GRAVYVALET_HTTP_POOL_HOST_LIMITS = {
+    _host.strip().lower(): int(_limit)
+    for _host, _, _limit in (
+        _pair.partition("=")
+        for _pair in os.environ.get("GRAVYVALET_HTTP_POOL_HOST_LIMITS", "").split(",")
+        if _pair
+    )
+}
+# how long idle connections are kept alive for reuse
+GRAVYVALET_HTTP_KEEPALIVE_SECONDS = float(
+    os.environ.get("GRAVYVALET_HTTP_KEEPALIVE_SECONDS", 30)
+)
+# how long resolved host addresses are cached
+GRAVYVALET_HTTP_DNS_CACHE_SECONDS = int(
+    os.environ.get("GRAVYVALET_HTTP_DNS_CACHE_SECONDS", 300)
+)
+# opt-in cache of provider GET responses, revalidated with ETag/Last-Modified
+# (any non-empty value enables the cache)
+GRAVYVALET_PROVIDER_RESPONSE_CACHE_ENABLED = bool(
+    os.environ.get("GRAVYVALET_PROVIDER_RESPONSE_CACHE_ENABLED")
+)
+GRAVYVALET_PROVIDER_RESPONSE_CACHE_TTL_SECONDS = int(
+    os.environ.get("GRAVYVALET_PROVIDER_RESPONSE_CACHE_TTL_SECONDS", 60 * 60 * 24)
+)
+GRAVYVALET_PROVIDER_RESPONSE_CACHE_MAX_BYTES = int(
+    os.environ.get("GRAVYVALET_PROVIDER_RESPONSE_CACHE_MAX_BYTES", 2**20)
+)
+
+###
+# external service rate limits (token buckets per account and per provider host,
+# shared thru redis)
+
+# any non-empty value enables rate limiting
+GRAVYVALET_RATE_LIMIT_ENABLED = bool(os.environ.get("GRAVYVALET_RATE_LIMIT_ENABLED"))
+# max burst of requests per account ("0" for no limit)
+GRAVYVALET_RATE_LIMIT_BUCKET_SIZE = int(
+    os.environ.get("GRAVYVALET_RATE_LIMIT_BUCKET_SIZE", 60)
+)
+# sustained requests per second per account
+GRAVYVALET_RATE_LIMIT_REFILL_PER_SECOND = float(
+    os.environ.get("GRAVYVALET_RATE_LIMIT_REFILL_PER_SECOND", 10)
+)
+# longest a request will wait for the rate limit before failing fast
+GRAVYVALET_RATE_LIMIT_MAX_WAIT_SECONDS = float(
+    os.environ.get("GRAVYVALET_RATE_LIMIT_MAX_WAIT_SECONDS", 5)
+)
+# backoff after a "429 Too Many Requests" that doesn't say how long to wait
+GRAVYVALET_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS = float(
+    os.environ.get("GRAVYVALET_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS", 30)
+)
+# per-host overrides of each account's bucket, as comma-separated
+# "host=size/refill per second" pairs (e.g. "api.github.com=80/1.4")
+GRAVYVALET_RATE_LIMIT_HOST_BUCKETS = {
+    _host.strip().lower(): tuple(map(float, _bucket.split("/")))
+    for _host, _, _bucket in (
+        _pair.partition("=")
+        for _pair in os.environ.get("GRAVYVALET_RATE_LIMIT_HOST_BUCKETS", "").split(",")
+        if _pair
+    )
+}
+# buckets shared by every account on a host, for providers whose limits are on
+# the whole app rather than each token (their throttling then holds back every
+# account), as "host=size/refill per second" pairs (other hosts have no limit
+# but each account's)
+GRAVYVALET_RATE_LIMIT_PROVIDER_BUCKETS = {
+    _host.strip().lower(): tuple(map(float, _bucket.split("/")))
+    for _host, _, _bucket in (
+        _pair.partition("=")
+        for _pair in os.environ.get("GRAVYVALET_RATE_LIMIT_PROVIDER_BUCKETS", "").split(
+            ","
+        )
+        if _pair
+    )
+}
+
+###
+# coalescing of identical in-flight GETs to external services
+
+# any non-empty value enables coalescing (within each process)
+GRAVYVALET_REQUEST_COALESCING_ENABLED = bool(
+    os.environ.get("GRAVYVALET_REQUEST_COALESCING_ENABLED")
+)
+# any non-empty value also coalesces across processes (thru the django cache)
+GRAVYVALET_REQUEST_COALESCING_ACROSS_PROCESSES = bool(
+    os.environ.get("GRAVYVALET_REQUEST_COALESCING_ACROSS_PROCESSES")
+)
+# larger responses are not shared
+GRAVYVALET_REQUEST_COALESCING_MAX_BYTES = int(
+    os.environ.get("GRAVYVALET_REQUEST_COALESCING_MAX_BYTES", 2**20)
+)
+# longest to wait for a leading request in another process
+GRAVYVALET_REQUEST_COALESCING_WAIT_SECONDS = int(
+    os.environ.get("GRAVYVALET_REQUEST_COALESCING_WAIT_SECONDS", 10)
+)
+
+###
+# circuit breakers for external service hosts (shared thru redis)
+
+# any non-empty value enables circuit breakers
+GRAVYVALET_CIRCUIT_BREAKER_ENABLED = bool(
+    os.environ.get("GRAVYVALET_CIRCUIT_BREAKER_ENABLED")
+)
+# fraction of failed requests (errors, timeouts, 5xx) that opens the circuit...
+GRAVYVALET_CIRCUIT_BREAKER_FAILURE_RATE = float(
+    os.environ.get("GRAVYVALET_CIRCUIT_BREAKER_FAILURE_RATE", 0.5)
+)
+# ...once at least this many requests were sent...
+GRAVYVALET_CIRCUIT_BREAKER_MIN_REQUESTS = int(
+    os.environ.get("GRAVYVALET_CIRCUIT_BREAKER_MIN_REQUESTS", 10)
+)
+# ...within a window of this many seconds
+GRAVYVALET_CIRCUIT_BREAKER_WINDOW_SECONDS = int(
+    os.environ.get("GRAVYVALET_CIRCUIT_BREAKER_WINDOW_SECONDS", 60)
+)
+# how long an open circuit fails fast before a probe request
+GRAVYVALET_CIRCUIT_BREAKER_OPEN_SECONDS = int(
+    os.environ.get("GRAVYVALET_CIRCUIT_BREAKER_OPEN_SECONDS", 30)
+)
+
+###
+# time budgets for immediate operations (performed while a request waits)
+
+# longest an immediate operation may take, unless the operation or external
+# service says otherwise (set to "0" for no limit)
+GRAVYVALET_IMMEDIATE_TIME_BUDGET_SECONDS = float(
+    os.environ.get("GRAVYVALET_IMMEDIATE_TIME_BUDGET_SECONDS", 60)
+)
+
+###
+# oauth2 access token refresh
+
+# refresh access tokens this long before they expire
+GRAVYVALET_OAUTH2_REFRESH_SKEW_SECONDS = int(
+    os.environ.get("GRAVYVALET_OAUTH2_REFRESH_SKEW_SECONDS", 300)
+)
+# longest one refresh may hold the (cluster-wide) lock on a token, and
+# longest any other worker will wait on that lock before refreshing anyway
+GRAVYVALET_OAUTH2_REFRESH_LOCK_SECONDS = int(
+    os.environ.get("GRAVYVALET_OAUTH2_REFRESH_LOCK_SECONDS", 30)
+)
+
+###
+# metrics for requests to external services (scraped at /v1/metrics/)
+
+# any non-empty value enables metrics
+GRAVYVALET_METRICS_ENABLED = bool(os.environ.get("GRAVYVALET_METRICS_ENABLED"))
+# how often each process adds its counts into redis
+GRAVYVALET_METRICS_FLUSH_SECONDS = float(
+    os.environ.get("GRAVYVALET_METRICS_FLUSH_SECONDS", 10)
+)
+# addresses allowed to scrape, as comma-separated ips or networks
+# (e.g. "10.0.0.0/8,127.0.0.1")
+GRAVYVALET_METRICS_ALLOWED_IPS = tuple(
+    filter(bool, os.environ.get("GRAVYVALET_METRICS_ALLOWED_IPS", "").split(","))
+)
+# scrapes from other addresses must be hmac-signed with this key (if set)
+GRAVYVALET_METRICS_HMAC_KEY = os.environ.get("GRAVYVALET_METRICS_HMAC_KEY")
+
+###
+# hedged requests to slow external services (see addon_service/common/hedging.py)
+
+# api hosts (e.g. "api.example.com") to hedge safe requests to, comma-separated;
+# empty disables hedging
+GRAVYVALET_HEDGING_HOSTS = tuple(
+    _host.strip().lower()
+    for _host in os.environ.get("GRAVYVALET_HEDGING_HOSTS", "").split(",")
+    if _host.strip()
+)
+# hedge once a request has taken longer than this percentile of recent latencies
+GRAVYVALET_HEDGING_PERCENTILE = float(
+    os.environ.get("GRAVYVALET_HEDGING_PERCENTILE", 95)
+)
+# at most this many hedges per hedgeable request (on average)
+GRAVYVALET_HEDGING_BUDGET_RATIO = float(
+    os.environ.get("GRAVYVALET_HEDGING_BUDGET_RATIO", 0.05)
+)
+
+###
+# async creation of addon operation invocations (see AddonOperationInvocationViewSet)
+
+# any non-empty value serves `POST /v1/addon-operation-invocations/` with an async
+# view, which performs immediate operations on the event loop (under daphne)
+# instead of holding the one thread shared by sync views
+GRAVYVALET_ASYNC_INVOCATIONS_ENABLED = bool(
+    os.environ.get("GRAVYVALET_ASYNC_INVOCATIONS_ENABLED")
+)
+
+###
+# batches of addon operation invocations
+# (see AddonOperationInvocationViewSet.as_async_batch_view)
+
+# most operations one `POST /v1/addon-operation-invocations/batch/` may include...
+GRAVYVALET_INVOCATION_BATCH_MAX_SIZE = int(
+    os.environ.get("GRAVYVALET_INVOCATION_BATCH_MAX_SIZE", 100)
+)
+# ...and how many of them may wait on the external service at once
+GRAVYVALET_INVOCATION_BATCH_CONCURRENCY = int(
+    os.environ.get("GRAVYVALET_INVOCATION_BATCH_CONCURRENCY", 10)
+)
+
+###
+# server-sent events for invocation status changes
+# (see addon_service/addon_operation_invocation/status_events.py)
+
+# seconds between keep-alive comments (and re-reads of the status) on a quiet stream
+GRAVYVALET_INVOCATION_EVENTS_HEARTBEAT_SECONDS = float(
+    os.environ.get("GRAVYVALET_INVOCATION_EVENTS_HEARTBEAT_SECONDS", 15)
+)
+# longest to keep one stream open (clients may reconnect after)
+GRAVYVALET_INVOCATION_EVENTS_MAX_SECONDS = float(
+    os.environ.get("GRAVYVALET_INVOCATION_EVENTS_MAX_SECONDS", 5 * 60)
+)
+
+###
+# partitions and retention of addon operation invocations
+# (see addon_service/addon_operation_invocation/partitions.py)
+
+# days to keep invocations, by operation type ("0" keeps them forever)
+GRAVYVALET_INVOCATION_RETENTION_DAYS_IMMEDIATE = int(
+    os.environ.get("GRAVYVALET_INVOCATION_RETENTION_DAYS_IMMEDIATE", 0)
+)
+GRAVYVALET_INVOCATION_RETENTION_DAYS_REDIRECT = int(
+    os.environ.get("GRAVYVALET_INVOCATION_RETENTION_DAYS_REDIRECT", 0)
+)
+GRAVYVALET_INVOCATION_RETENTION_DAYS_EVENTUAL = int(
+    os.environ.get("GRAVYVALET_INVOCATION_RETENTION_DAYS_EVENTUAL", 0)
+)
+# any non-empty value detaches expired partitions (leaving tables to archive and
+# drop) instead of dropping them
+GRAVYVALET_INVOCATION_RETENTION_ARCHIVE = bool(
+    os.environ.get("GRAVYVALET_INVOCATION_RETENTION_ARCHIVE")
+)
+# days ahead to make (daily) partitions for
+GRAVYVALET_INVOCATION_PARTITION_DAYS_AHEAD = int(
+    os.environ.get("GRAVYVALET_INVOCATION_PARTITION_DAYS_AHEAD", 3)
+)
+
+###
+# lighter saving of immediate read-only invocations
+# (see addon_service/addon_operation_invocation/persistence.py)
+
+# operations (by name, e.g. "list_child_items", or capability, e.g. "ACCESS") with
+# results given in responses but not stored, comma-separated
+GRAVYVALET_INVOCATION_SKIP_RESULT_FOR = tuple(
+    _name.strip()
+    for _name in os.environ.get("GRAVYVALET_INVOCATION_SKIP_RESULT_FOR", "").split(",")
+    if _name.strip()
+)
+# operations (likewise) with invocations saved in bulk after the response
+GRAVYVALET_INVOCATION_WRITE_BEHIND_FOR = tuple(
+    _name.strip()
+    for _name in os.environ.get("GRAVYVALET_INVOCATION_WRITE_BEHIND_FOR", "").split(",")
+    if _name.strip()
+)
+# buffered invocations are inserted after this long, or once this many are buffered
+GRAVYVALET_INVOCATION_WRITE_BEHIND_FLUSH_SECONDS = float(
+    os.environ.get("GRAVYVALET_INVOCATION_WRITE_BEHIND_FLUSH_SECONDS", 1)
+)
+GRAVYVALET_INVOCATION_WRITE_BEHIND_BATCH_SIZE = int(
+    os.environ.get("GRAVYVALET_INVOCATION_WRITE_BEHIND_BATCH_SIZE", 100)
+)
+
+###
+# cache of immediate read-only operation results
+# (see addon_service/addon_operation_invocation/result_cache.py)
+
+# any non-empty value enables the cache
+GRAVYVALET_INVOCATION_RESULT_CACHE_ENABLED = bool(
+    os.environ.get("GRAVYVALET_INVOCATION_RESULT_CACHE_ENABLED")
+)
+# cached results are served as is for this long...
+GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS = int(
+    os.environ.get("GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS", 30)
+)
+# ...then served while refreshed in the background, until this long after stored
+GRAVYVALET_INVOCATION_RESULT_CACHE_STALE_SECONDS = int(
+    os.environ.get("GRAVYVALET_INVOCATION_RESULT_CACHE_STALE_SECONDS", 300)
+)
+# results larger than this (as json) are not cached
+GRAVYVALET_INVOCATION_RESULT_CACHE_MAX_BYTES = int(
+    os.environ.get("GRAVYVALET_INVOCATION_RESULT_CACHE_MAX_BYTES", 1024 * 1024)
+)
+
+###
+# caches of osf auth checks (see addon_service/common/osf_permission_cache.py
+# and addon_service/common/osf_token_cache.py)
+
+# seconds to cache a granted permission in redis (set to "0" to disable caching;
+# checks are still remembered for the length of one request)
+GRAVYVALET_OSF_PERMISSION_CACHE_SECONDS = int(
+    os.environ.get("GRAVYVALET_OSF_PERMISSION_CACHE_SECONDS", 30)
+)
+# seconds to cache a denied permission in redis
+GRAVYVALET_OSF_PERMISSION_NEGATIVE_CACHE_SECONDS = int(
+    os.environ.get("GRAVYVALET_OSF_PERMISSION_NEGATIVE_CACHE_SECONDS", 10)
+)
+# seconds to remember which user a personal access token belongs to (set to "0"
+# to ask osf on every request)
+GRAVYVALET_OSF_TOKEN_CACHE_SECONDS = int(
+    os.environ.get("GRAVYVALET_OSF_TOKEN_CACHE_SECONDS", 300)
+)
+# known users (see addon_service/user_reference/known_users.py) to keep in each
+# process (set to "0" to keep none) and seconds to keep them in redis (likewise)
+GRAVYVALET_KNOWN_USER_CACHE_SIZE = int(
+    os.environ.get("GRAVYVALET_KNOWN_USER_CACHE_SIZE", 4096)
+)
+GRAVYVALET_KNOWN_USER_CACHE_SECONDS = int(
+    os.environ.get("GRAVYVALET_KNOWN_USER_CACHE_SECONDS", 24 * 60 * 60)
+)
+# seconds each process may go on trusting a known user before checking redis again
+# (a deleted user is forgotten in redis, but only by the process that deleted it)
+GRAVYVALET_KNOWN_USER_PROCESS_SECONDS = int(
+    os.environ.get("GRAVYVALET_KNOWN_USER_PROCESS_SECONDS", 60)
+)
+
 ###
 # credentials encryption secrets and parameters
 #
@@ -79,12 +403,17 @@ SILKY_PYTHON_PROFILER = os.environ.get("SILKY_PYTHON_PROFILER", False)
 #    - add the old secret to GRAVYVALET_ENCRYPT_SECRET_PRIORS (comma-separated list)
 #    - (optional) update key-derivation parameters with best practices du jour
 # 2. call `.rotate_encryption()` on every `ExternalCredentials` (perhaps via
-#    celery tasks in `addon_service.tasks.key_rotation`)
+#    `python manage.py rotate_encryption`, which rotates in chunks with celery tasks
+#    in `addon_service.tasks.key_rotation`)
 # 3. remove the old secret from GRAVYVALET_ENCRYPT_SECRET_PRIORS
 GRAVYVALET_ENCRYPT_SECRET: str | None = os.environ.get("GRAVYVALET_ENCRYPT_SECRET")
 GRAVYVALET_ENCRYPT_SECRET_PRIORS = tuple(
     filter(bool, os.environ.get("GRAVYVALET_ENCRYPT_SECRET_PRIORS", "").split(","))
 )
+# salt for deriving the key-encryption key (which wraps each row's random data key)
+GRAVYVALET_KEY_ENCRYPTION_SALT = os.environ.get(
+    "GRAVYVALET_KEY_ENCRYPTION_SALT", "gravyvalet key-encryption key"
+)
 # optional overrides for scrypt key derivation parameters (when unset, use sensible defaults)
 # see https://datatracker.ietf.org/doc/html/rfc7914#section-2
 GRAVYVALET_SALT_BYTE_COUNT = int(os.environ.get("GRAVYVALET_SALT_BYTE_COUNT", 17))
@@ -97,5 +426,26 @@ GRAVYVALET_SCRYPT_PARALLELIZATION = int(
 GRAVYVALET_DERIVED_KEY_CACHE_SIZE = int(
     os.environ.get("GRAVYVALET_DERIVED_KEY_CACHE_SIZE", 512)
 )
+# worker processes for key derivation (set to "0" to derive in a background thread)
+GRAVYVALET_KEY_DERIVATION_PROCESSES = int(
+    os.environ.get("GRAVYVALET_KEY_DERIVATION_PROCESSES", 2)
+)
+# most memory (in MiB) for key derivations at once -- about 130MiB each, with
+# default scrypt parameters (but any one derivation may run alone, however large)
+GRAVYVALET_KEY_DERIVATION_MEMORY_BUDGET_MIB = int(
+    os.environ.get("GRAVYVALET_KEY_DERIVATION_MEMORY_BUDGET_MIB", 512)
+)
+# size of the decrypted auth-header cache (set to "0" to disable caching)
+GRAVYVALET_AUTH_HEADER_CACHE_SIZE = int(
+    os.environ.get("GRAVYVALET_AUTH_HEADER_CACHE_SIZE", 1024)
+)
+# rows per chunk when rotating encryption in bulk (see `rotate_encryption` command)
+GRAVYVALET_KEY_ROTATION_CHUNK_SIZE = int(
+    os.environ.get("GRAVYVALET_KEY_ROTATION_CHUNK_SIZE", 500)
+)
+# chunks to rotate in parallel (each in its own celery task)
+GRAVYVALET_KEY_ROTATION_PARALLEL_CHUNKS = int(
+    os.environ.get("GRAVYVALET_KEY_ROTATION_PARALLEL_CHUNKS", 4)
+)
 # END credentials encryption secrets and parameters
 ###
@@ -46,10 +46,18 @@ GRAVYVALET_ENCRYPT_SECRET_PRIORS: tuple[bytes, ...] = tuple(
     _prior.encode() for _prior in env.GRAVYVALET_ENCRYPT_SECRET_PRIORS
 )
 GRAVYVALET_SALT_BYTE_COUNT = env.GRAVYVALET_SALT_BYTE_COUNT
+GRAVYVALET_KEY_ENCRYPTION_SALT: bytes = env.GRAVYVALET_KEY_ENCRYPTION_SALT.encode()
 GRAVYVALET_SCRYPT_COST_LOG2 = env.GRAVYVALET_SCRYPT_COST_LOG2
 GRAVYVALET_SCRYPT_BLOCK_SIZE = env.GRAVYVALET_SCRYPT_BLOCK_SIZE
 GRAVYVALET_SCRYPT_PARALLELIZATION = env.GRAVYVALET_SCRYPT_PARALLELIZATION
 GRAVYVALET_DERIVED_KEY_CACHE_SIZE = env.GRAVYVALET_DERIVED_KEY_CACHE_SIZE
+GRAVYVALET_KEY_DERIVATION_PROCESSES = env.GRAVYVALET_KEY_DERIVATION_PROCESSES
+GRAVYVALET_KEY_DERIVATION_MEMORY_BUDGET_MIB = (
+    env.GRAVYVALET_KEY_DERIVATION_MEMORY_BUDGET_MIB
+)
+GRAVYVALET_AUTH_HEADER_CACHE_SIZE = env.GRAVYVALET_AUTH_HEADER_CACHE_SIZE
+GRAVYVALET_KEY_ROTATION_CHUNK_SIZE = env.GRAVYVALET_KEY_ROTATION_CHUNK_SIZE
+GRAVYVALET_KEY_ROTATION_PARALLEL_CHUNKS = env.GRAVYVALET_KEY_ROTATION_PARALLEL_CHUNKS
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -259,6 +267,159 @@ STATIC_URL = "/static/"
 PROVIDER_ICONS_DIR = BASE_DIR / "addon_service" / "static" / "provider_icons"
 
 
+###
+# outgoing http connection pools
+
+GRAVYVALET_HTTP_POOL_LIMIT_PER_HOST = env.GRAVYVALET_HTTP_POOL_LIMIT_PER_HOST
+GRAVYVALET_HTTP_POOL_HOST_LIMITS = env.GRAVYVALET_HTTP_POOL_HOST_LIMITS
+GRAVYVALET_HTTP_KEEPALIVE_SECONDS = env.GRAVYVALET_HTTP_KEEPALIVE_SECONDS
+GRAVYVALET_HTTP_DNS_CACHE_SECONDS = env.GRAVYVALET_HTTP_DNS_CACHE_SECONDS
+GRAVYVALET_PROVIDER_RESPONSE_CACHE_ENABLED = (
+    env.GRAVYVALET_PROVIDER_RESPONSE_CACHE_ENABLED
+)
+GRAVYVALET_PROVIDER_RESPONSE_CACHE_TTL_SECONDS = (
+    env.GRAVYVALET_PROVIDER_RESPONSE_CACHE_TTL_SECONDS
+)
+GRAVYVALET_PROVIDER_RESPONSE_CACHE_MAX_BYTES = (
+    env.GRAVYVALET_PROVIDER_RESPONSE_CACHE_MAX_BYTES
+)
+
+###
+# external service rate limits
+
+GRAVYVALET_RATE_LIMIT_ENABLED = env.GRAVYVALET_RATE_LIMIT_ENABLED
+GRAVYVALET_RATE_LIMIT_BUCKET_SIZE = env.GRAVYVALET_RATE_LIMIT_BUCKET_SIZE
+GRAVYVALET_RATE_LIMIT_REFILL_PER_SECOND = env.GRAVYVALET_RATE_LIMIT_REFILL_PER_SECOND
+GRAVYVALET_RATE_LIMIT_MAX_WAIT_SECONDS = env.GRAVYVALET_RATE_LIMIT_MAX_WAIT_SECONDS
+GRAVYVALET_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS = (
+    env.GRAVYVALET_RATE_LIMIT_DEFAULT_BACKOFF_SECONDS
+)
+GRAVYVALET_RATE_LIMIT_HOST_BUCKETS = env.GRAVYVALET_RATE_LIMIT_HOST_BUCKETS
+GRAVYVALET_RATE_LIMIT_PROVIDER_BUCKETS = env.GRAVYVALET_RATE_LIMIT_PROVIDER_BUCKETS
+
+###
+# coalescing of identical in-flight GETs to external services
+
+GRAVYVALET_REQUEST_COALESCING_ENABLED = env.GRAVYVALET_REQUEST_COALESCING_ENABLED
+GRAVYVALET_REQUEST_COALESCING_ACROSS_PROCESSES = (
+    env.GRAVYVALET_REQUEST_COALESCING_ACROSS_PROCESSES
+)
+GRAVYVALET_REQUEST_COALESCING_MAX_BYTES = env.GRAVYVALET_REQUEST_COALESCING_MAX_BYTES
+GRAVYVALET_REQUEST_COALESCING_WAIT_SECONDS = (
+    env.GRAVYVALET_REQUEST_COALESCING_WAIT_SECONDS
+)
+
+###
+# circuit breakers for external service hosts
+
+GRAVYVALET_CIRCUIT_BREAKER_ENABLED = env.GRAVYVALET_CIRCUIT_BREAKER_ENABLED
+GRAVYVALET_CIRCUIT_BREAKER_FAILURE_RATE = env.GRAVYVALET_CIRCUIT_BREAKER_FAILURE_RATE
+GRAVYVALET_CIRCUIT_BREAKER_MIN_REQUESTS = env.GRAVYVALET_CIRCUIT_BREAKER_MIN_REQUESTS
+GRAVYVALET_CIRCUIT_BREAKER_WINDOW_SECONDS = (
+    env.GRAVYVALET_CIRCUIT_BREAKER_WINDOW_SECONDS
+)
+GRAVYVALET_CIRCUIT_BREAKER_OPEN_SECONDS = env.GRAVYVALET_CIRCUIT_BREAKER_OPEN_SECONDS
+
+###
+# time budgets for immediate operations
+
+GRAVYVALET_IMMEDIATE_TIME_BUDGET_SECONDS = env.GRAVYVALET_IMMEDIATE_TIME_BUDGET_SECONDS
+
+###
+# oauth2 access token refresh
+
+GRAVYVALET_OAUTH2_REFRESH_SKEW_SECONDS = env.GRAVYVALET_OAUTH2_REFRESH_SKEW_SECONDS
+GRAVYVALET_OAUTH2_REFRESH_LOCK_SECONDS = env.GRAVYVALET_OAUTH2_REFRESH_LOCK_SECONDS
+
+###
+# metrics for requests to external services
+
+GRAVYVALET_METRICS_ENABLED = env.GRAVYVALET_METRICS_ENABLED
+GRAVYVALET_METRICS_FLUSH_SECONDS = env.GRAVYVALET_METRICS_FLUSH_SECONDS
+GRAVYVALET_METRICS_ALLOWED_IPS = env.GRAVYVALET_METRICS_ALLOWED_IPS
+GRAVYVALET_METRICS_HMAC_KEY = env.GRAVYVALET_METRICS_HMAC_KEY
+
+###
+# hedged requests to slow external services
+
+GRAVYVALET_HEDGING_HOSTS = env.GRAVYVALET_HEDGING_HOSTS
+GRAVYVALET_HEDGING_PERCENTILE = env.GRAVYVALET_HEDGING_PERCENTILE
+GRAVYVALET_HEDGING_BUDGET_RATIO = env.GRAVYVALET_HEDGING_BUDGET_RATIO
+
+###
+# async creation of addon operation invocations
+
+GRAVYVALET_ASYNC_INVOCATIONS_ENABLED = env.GRAVYVALET_ASYNC_INVOCATIONS_ENABLED
+
+###
+# batches of addon operation invocations
+
+GRAVYVALET_INVOCATION_BATCH_MAX_SIZE = env.GRAVYVALET_INVOCATION_BATCH_MAX_SIZE
+GRAVYVALET_INVOCATION_BATCH_CONCURRENCY = env.GRAVYVALET_INVOCATION_BATCH_CONCURRENCY
+
+###
+# server-sent events for invocation status changes
+
+GRAVYVALET_INVOCATION_EVENTS_HEARTBEAT_SECONDS = (
+    env.GRAVYVALET_INVOCATION_EVENTS_HEARTBEAT_SECONDS
+)
+GRAVYVALET_INVOCATION_EVENTS_MAX_SECONDS = env.GRAVYVALET_INVOCATION_EVENTS_MAX_SECONDS
+
+###
+# partitions and retention of addon operation invocations
+
+# (keyed by `AddonOperationType` value)
+GRAVYVALET_INVOCATION_RETENTION_DAYS = {
+    "immediate": env.GRAVYVALET_INVOCATION_RETENTION_DAYS_IMMEDIATE,
+    "redirect": env.GRAVYVALET_INVOCATION_RETENTION_DAYS_REDIRECT,
+    "eventual": env.GRAVYVALET_INVOCATION_RETENTION_DAYS_EVENTUAL,
+}
+GRAVYVALET_INVOCATION_RETENTION_ARCHIVE = env.GRAVYVALET_INVOCATION_RETENTION_ARCHIVE
+GRAVYVALET_INVOCATION_PARTITION_DAYS_AHEAD = (
+    env.GRAVYVALET_INVOCATION_PARTITION_DAYS_AHEAD
+)
+
+###
+# lighter saving of immediate read-only invocations
+
+GRAVYVALET_INVOCATION_SKIP_RESULT_FOR = env.GRAVYVALET_INVOCATION_SKIP_RESULT_FOR
+GRAVYVALET_INVOCATION_WRITE_BEHIND_FOR = env.GRAVYVALET_INVOCATION_WRITE_BEHIND_FOR
+GRAVYVALET_INVOCATION_WRITE_BEHIND_FLUSH_SECONDS = (
+    env.GRAVYVALET_INVOCATION_WRITE_BEHIND_FLUSH_SECONDS
+)
+GRAVYVALET_INVOCATION_WRITE_BEHIND_BATCH_SIZE = (
+    env.GRAVYVALET_INVOCATION_WRITE_BEHIND_BATCH_SIZE
+)
+
+###
+# cache of immediate read-only operation results
+
+GRAVYVALET_INVOCATION_RESULT_CACHE_ENABLED = (
+    env.GRAVYVALET_INVOCATION_RESULT_CACHE_ENABLED
+)
+GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS = (
+    env.GRAVYVALET_INVOCATION_RESULT_CACHE_FRESH_SECONDS
+)
+GRAVYVALET_INVOCATION_RESULT_CACHE_STALE_SECONDS = (
+    env.GRAVYVALET_INVOCATION_RESULT_CACHE_STALE_SECONDS
+)
+GRAVYVALET_INVOCATION_RESULT_CACHE_MAX_BYTES = (
+    env.GRAVYVALET_INVOCATION_RESULT_CACHE_MAX_BYTES
+)
+
+###
+# caches of osf auth checks
+
+GRAVYVALET_OSF_PERMISSION_CACHE_SECONDS = env.GRAVYVALET_OSF_PERMISSION_CACHE_SECONDS
+GRAVYVALET_OSF_PERMISSION_NEGATIVE_CACHE_SECONDS = (
+    env.GRAVYVALET_OSF_PERMISSION_NEGATIVE_CACHE_SECONDS
+)
+GRAVYVALET_OSF_TOKEN_CACHE_SECONDS = env.GRAVYVALET_OSF_TOKEN_CACHE_SECONDS
+GRAVYVALET_KNOWN_USER_CACHE_SIZE = env.GRAVYVALET_KNOWN_USER_CACHE_SIZE
+GRAVYVALET_KNOWN_USER_CACHE_SECONDS = env.GRAVYVALET_KNOWN_USER_CACHE_SECONDS
+GRAVYVALET_KNOWN_USER_PROCESS_SECONDS = env.GRAVYVALET_KNOWN_USER_PROCESS_SECONDS
+
+
 OSF_SENSITIVE_DATA_SECRET = env.OSF_SENSITIVE_DATA_SECRET
 OSF_SENSITIVE_DATA_SALT = env.OSF_SENSITIVE_DATA_SALT
 
@@ -289,4 +450,12 @@ CELERY_BEAT_SCHEDULE = {
         "task": "addon_service.tasks.clear_expired_sessions.clear_expired_sessions",
         "schedule": crontab(minute=0, hour=7),  # Daily midnight,
     },
+    "schedule_envelope_encryption": {
+        "task": "addon_service.tasks.key_rotation.schedule_envelope_encryption__celery",
+        "schedule": crontab(minute=0, hour=8),  # Daily 1:00 a.m.
+    },
+    "maintain_invocation_partitions": {
+        "task": "addon_service.tasks.invocation_retention.maintain_invocation_partitions__celery",
+        "schedule": crontab(minute=0, hour=9),  # Daily 4:00 a.m.
+    },
 }